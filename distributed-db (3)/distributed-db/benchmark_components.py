@@ -0,0 +1,684 @@
+#!/usr/bin/env python3
+"""
+Benchmarks dos componentes do DDB
+Mede desempenho de rede e serialização sem depender do MySQL
+"""
+
+import os
+import sys
+import json
+import logging
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from src.core.models import (
+    CONTROL_MESSAGE_TYPES, ConsistencyLevel, Message, MessageType, NodeInfo, CommunicationType, DeliveryStatus
+)
+from src.core.executor import BoundedExecutor, ExecutorOverloadedError
+from src.core.checksum import ChecksumValidator
+from src.core.result_set import ResultSet
+from src.network.socket_server import SocketServer
+from src.network.async_socket_server import AsyncSocketServer
+from src.network.framing import FrameReader, parse_frame
+from src.network.codec import MessageCodec, ENCODING_JSON, ENCODING_BINARY
+from src.network.socket_client import SocketClient
+from src.network.rpc import RpcClient
+from src.database.backend import create_backend
+from src.database.sqlite_manager import SQLiteManager
+from src.replication.replication_log import AppliedState, ReplicationLog
+from src.replication.replicator import Replicator
+from src.replication.snapshot import SnapshotDonor, SnapshotLoader
+from src.replication.anti_entropy import AntiEntropy
+
+
+def percentile(values, pct):
+    """Retorna o percentil pct (0-100) de uma lista de valores"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def echo_handler(message: Message) -> Message:
+    """Handler que responde toda QUERY com um QUERY_RESPONSE"""
+    return Message(
+        message_type=MessageType.QUERY_RESPONSE,
+        sender_id=0,
+        transaction_id=message.transaction_id,
+        data={'success': True},
+        timestamp=datetime.now()
+    )
+
+
+def sample_replicate_message() -> Message:
+    return Message(
+        message_type=MessageType.REPLICATE,
+        sender_id=1,
+        transaction_id='0d6c1f0e-8a4b-4a55-9a1e-3f4c2f9d7b21',
+        query="INSERT INTO users (name, email) VALUES ('João da Silva', 'joao@email.com')",
+        timestamp=datetime.now(),
+        communication_type=CommunicationType.BROADCAST
+    )
+
+
+def run_server_load(server, clients: int, requests_per_client: int) -> dict:
+    """
+    Abre uma conexão nova por requisição, como o DDBClient faz
+
+    Returns:
+        Dicionário com conexões por segundo e latências
+    """
+    payload = MessageCodec.encode(Message(
+        message_type=MessageType.QUERY,
+        sender_id=9999,
+        transaction_id='bench',
+        query='SELECT 1',
+        timestamp=datetime.now(),
+        communication_type=CommunicationType.UNICAST
+    ))
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            try:
+                with socket.create_connection(('127.0.0.1', server.port), timeout=30) as sock:
+                    sock.sendall(payload)
+                    FrameReader(sock).read_frame()
+                local.append(time.perf_counter() - start)
+            except OSError:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'conn_per_sec': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000 if latencies else 0,
+        'p99_ms': percentile(latencies, 99) * 1000 if latencies else 0,
+        'errors': errors[0]
+    }
+
+
+def bench_socket_servers(clients: int = 200, requests_per_client: int = 20):
+    """Compara servidor com thread por conexão e servidor asyncio"""
+    print("\n=== Benchmark: SocketServer vs AsyncSocketServer ===")
+    print(f"{clients} clientes concorrentes x {requests_per_client} conexões cada")
+
+    for name, server_cls in (('threaded', SocketServer), ('asyncio', AsyncSocketServer)):
+        server = server_cls('127.0.0.1', 0, echo_handler)
+        server.start()
+        try:
+            result = run_server_load(server, clients, requests_per_client)
+        finally:
+            server.stop()
+
+        print(
+            f"  {name:<9} {result['conn_per_sec']:>9.0f} conn/s   "
+            f"p50 {result['p50_ms']:>7.2f}ms   p99 {result['p99_ms']:>7.2f}ms   "
+            f"erros {result['errors']}"
+        )
+
+
+def legacy_encode_and_verify(message: Message) -> Message:
+    """Caminho anterior: três serializações no envio e duas no recebimento"""
+    message_str = message.to_json()
+    message_dict = json.loads(message_str)
+    message_dict = ChecksumValidator.add_checksum(message_dict)
+    wire = json.dumps(message_dict)
+
+    received = json.loads(wire)
+    if not ChecksumValidator.verify_message(received):
+        raise ValueError("checksum")
+    return Message.from_json(wire)
+
+
+def codec_encode_and_verify(message: Message) -> Message:
+    """Caminho do MessageCodec: uma serialização e um parse"""
+    return MessageCodec.decode(parse_frame(MessageCodec.encode(message)))
+
+
+def bench_message_codec(iterations: int = 20000):
+    """Compara custo de encode+verify por mensagem"""
+    print("\n=== Benchmark: encode + verify por mensagem ===")
+    message = sample_replicate_message()
+
+    for name, fn in (('legado', legacy_encode_and_verify), ('codec', codec_encode_and_verify)):
+        fn(message)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn(message)
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<9} {elapsed / iterations * 1e6:>8.2f} µs/mensagem")
+
+
+def sample_query_response(rows: int, columnar: bool = True) -> Message:
+    """QUERY_RESPONSE com linhas no formato da tabela users"""
+    if columnar:
+        created = datetime(2024, 5, 1, 12, 30)
+        data = ResultSet(
+            ['id', 'name', 'email', 'created_at'],
+            ['int', 'str', 'str', 'datetime'],
+            [(i, f'Usuário {i}', f'user{i}@email.com', created) for i in range(rows)]
+        ).to_dict()
+    else:
+        # Formato antigo: lista de dicts, com datas já convertidas em texto
+        data = [
+            {'id': i, 'name': f'Usuário {i}', 'email': f'user{i}@email.com', 'created_at': '2024-05-01T12:30:00'}
+            for i in range(rows)
+        ]
+    return Message(
+        message_type=MessageType.QUERY_RESPONSE,
+        sender_id=1,
+        transaction_id='0d6c1f0e-8a4b-4a55-9a1e-3f4c2f9d7b21',
+        data={'success': True, 'data': data, 'error': None, 'node_id': 1, 'rows_affected': rows},
+        timestamp=datetime.now(),
+        target_nodes=[9999]
+    )
+
+
+def bench_encodings(iterations: int = 5000):
+    """Compara tamanho e vazão das codificações JSON e binária"""
+    print("\n=== Benchmark: JSON vs binário compacto ===")
+    samples = [
+        ('HEARTBEAT', Message(
+            message_type=MessageType.HEARTBEAT,
+            sender_id=1,
+            timestamp=datetime.now(),
+            communication_type=CommunicationType.BROADCAST,
+            data={'is_coordinator': False}
+        ), iterations),
+        ('REPLICATE', sample_replicate_message(), iterations),
+        ('QUERY_RESPONSE 10k', sample_query_response(10000, columnar=False), max(3, iterations // 1000)),
+        ('QUERY_RESPONSE 10k tab', sample_query_response(10000), max(3, iterations // 1000)),
+    ]
+
+    for name, message, count in samples:
+        for encoding in (ENCODING_JSON, ENCODING_BINARY):
+            wire = MessageCodec.encode(message, encoding=encoding)
+            start = time.perf_counter()
+            for _ in range(count):
+                MessageCodec.decode(parse_frame(MessageCodec.encode(message, encoding=encoding)))
+            elapsed = time.perf_counter() - start
+            print(
+                f"  {name:<22} {encoding:<7} {len(wire):>9} bytes   "
+                f"{count / elapsed:>10.0f} msg/s (encode+decode)"
+            )
+
+
+def run_control_plane_load(server_cls, separate_lanes: bool, duration: float = 5,
+                           heartbeat_interval: float = 0.2, workers: int = 4,
+                           query_time: float = 0.02) -> dict:
+    """
+    Satura o plano de dados de um nó e mede a entrega dos heartbeats
+
+    O nó recebe QUERYs (RPC) e REPLICATEs de 256 KB sem pausa, executados
+    em um executor de `workers` threads que simula o MySQL dormindo
+    `query_time` por mensagem. Ao mesmo tempo, outro nó envia heartbeats a
+    cada `heartbeat_interval`; um detector de falhas com timeout de três
+    intervalos (a mesma proporção de heartbeat_interval/heartbeat_timeout
+    do node_server) conta quantas vezes o nó seria dado como falho.
+
+    Args:
+        server_cls: SocketServer ou AsyncSocketServer
+        separate_lanes: False envia os heartbeats pela faixa de dados (comportamento anterior)
+
+    Returns:
+        Dicionário com latências dos heartbeats, falsos failovers e utilização
+    """
+    timeout = heartbeat_interval * 3
+    executor = BoundedExecutor(max_workers=workers, max_queue=64, name='bench-db')
+    lock = threading.Lock()
+    busy = [0.0]
+    heartbeats = []  # Latência de entrega de cada heartbeat
+    last_heartbeat = [time.monotonic()]
+    counters = {'queries': 0, 'rejected': 0, 'replicated': 0}
+
+    def simulate_db(message: Message) -> Message:
+        started = time.perf_counter()
+        time.sleep(query_time)
+        with lock:
+            busy[0] += time.perf_counter() - started
+        return Message(MessageType.QUERY_RESPONSE, 1, data={'success': True})
+
+    def handler(message: Message):
+        if message.message_type in CONTROL_MESSAGE_TYPES:
+            now = time.monotonic()
+            with lock:
+                heartbeats.append(time.time() - message.timestamp.timestamp())
+                last_heartbeat[0] = now
+            return None
+        try:
+            return executor.submit(simulate_db, message, required=message.message_type == MessageType.REPLICATE)
+        except ExecutorOverloadedError:
+            with lock:
+                counters['rejected'] += 1
+            return Message(MessageType.QUERY_RESPONSE, 1, data={'success': False, 'error': 'sobrecarregado'})
+
+    server = server_cls('127.0.0.1', 0, handler)
+    server.start()
+    node = NodeInfo(node_id=1, host='127.0.0.1', port=server.port)
+    peer = SocketClient(timeout=2)
+    if not separate_lanes:
+        peer.control_pool, peer._control_executor = peer.pool, peer._executor
+    rpc = RpcClient()
+    stop = threading.Event()
+    false_failovers = [0]
+    max_gap = [0.0]
+
+    def query_flood():
+        while not stop.is_set():
+            try:
+                rpc.request(Message(MessageType.QUERY, 2, query='SELECT 1'), node, timeout=5)
+                with lock:
+                    counters['queries'] += 1
+            except Exception:
+                pass
+
+    def replicate_flood():
+        payload = 'x' * (256 * 1024)
+        while not stop.is_set():
+            message = Message(MessageType.REPLICATE, 2, query=f"INSERT INTO t VALUES ('{payload}')",
+                              timestamp=datetime.now(), communication_type=CommunicationType.UNICAST)
+            if peer.send_message(message, node):
+                with lock:
+                    counters['replicated'] += 1
+
+    def heartbeat_sender():
+        while not stop.is_set():
+            peer.send_message(Message(MessageType.HEARTBEAT, 2, timestamp=datetime.now(),
+                                      communication_type=CommunicationType.UNICAST), node)
+            stop.wait(heartbeat_interval)
+
+    def failure_detector():
+        suspected = False
+        while not stop.is_set():
+            gap = time.monotonic() - last_heartbeat[0]
+            max_gap[0] = max(max_gap[0], gap)
+            if gap > timeout and not suspected:
+                false_failovers[0] += 1  # O nó está vivo: seria um failover falso
+            suspected = gap > timeout
+            stop.wait(heartbeat_interval / 5)
+
+    threads = [threading.Thread(target=query_flood) for _ in range(16)]
+    threads += [threading.Thread(target=replicate_flood) for _ in range(8)]
+    threads += [threading.Thread(target=heartbeat_sender), threading.Thread(target=failure_detector)]
+    start = time.monotonic()
+    last_heartbeat[0] = start
+    for t in threads:
+        t.start()
+    stop.wait(duration)
+    stop.set()
+    elapsed = time.monotonic() - start
+    for t in threads:
+        t.join(10)
+
+    peer.close()
+    rpc.close()
+    server.stop()
+    executor.shutdown(wait=False)
+
+    return {
+        'heartbeats': len(heartbeats),
+        'p50_ms': percentile(heartbeats, 50) * 1000 if heartbeats else 0,
+        'p99_ms': percentile(heartbeats, 99) * 1000 if heartbeats else 0,
+        'max_gap_ms': max_gap[0] * 1000,
+        'false_failovers': false_failovers[0],
+        'utilization': busy[0] / (workers * elapsed),
+        'queries_per_sec': counters['queries'] / elapsed,
+        'rejected': counters['rejected'],
+        'replicated': counters['replicated']
+    }
+
+
+def bench_control_plane(duration: float = 5):
+    """Heartbeats com o plano de dados 100% ocupado: faixa única vs faixas separadas"""
+    print("\n=== Benchmark: plano de controle sob saturação ===")
+    for name, server_cls in (('threaded', SocketServer), ('asyncio', AsyncSocketServer)):
+        for separate_lanes in (False, True):
+            result = run_control_plane_load(server_cls, separate_lanes, duration)
+            lanes = 'faixas separadas' if separate_lanes else 'faixa única'
+            print(
+                f"  {name:<9} {lanes:<17} uso do banco {result['utilization']:>4.0%}   "
+                f"heartbeat p50 {result['p50_ms']:>7.2f}ms p99 {result['p99_ms']:>8.2f}ms   "
+                f"maior intervalo {result['max_gap_ms']:>7.0f}ms   "
+                f"failovers falsos {result['false_failovers']}"
+            )
+            print(
+                f"  {'':<9} {'':<17} {result['queries_per_sec']:.0f} respostas/s, "
+                f"{result['rejected']} recusadas, {result['replicated']} REPLICATEs de 256 KB"
+            )
+
+
+def bench_point_lookups(config_file: str = 'config/nodes_config.json', lookups: int = 5000):
+    """
+    Compara consultas pontuais em users com SQL literal e com prepared statements
+
+    Usa o banco do primeiro nó da configuração (MySQL ou SQLite); é pulado
+    se o driver ou o banco não estiverem disponíveis.
+    """
+    print("\n=== Benchmark: consultas pontuais (SQL literal vs prepared) ===")
+    try:
+        with open(config_file, 'r') as f:
+            db_config = json.load(f)['nodes'][0]['database']
+        manager = create_backend(dict(db_config, pool_min_size=1, pool_max_size=1))
+    except (ImportError, OSError, KeyError, ValueError) as e:
+        print(f"  ⚠ Benchmark pulado: {e}")
+        return
+
+    if not manager.connect():
+        print(f"  ⚠ Benchmark pulado: banco ({manager.engine}) indisponível")
+        return
+
+    try:
+        success, result, error, _ = manager.execute_query("SELECT id FROM users")
+        ids = [row[0] for row in result] if success and result else []
+        if not ids:
+            print(f"  ⚠ Benchmark pulado: tabela users vazia ou inacessível ({error})")
+            return
+
+        for name, run in (
+            ('literal', lambda user_id: manager.execute_query(
+                f"SELECT id, name, email FROM users WHERE id = {int(user_id)}")),
+            ('prepared', lambda user_id: manager.execute_query(
+                "SELECT id, name, email FROM users WHERE id = %s", (user_id,))),
+        ):
+            latencies = []
+            start = time.perf_counter()
+            for i in range(lookups):
+                t0 = time.perf_counter()
+                run(ids[i % len(ids)])
+                latencies.append(time.perf_counter() - t0)
+            elapsed = time.perf_counter() - start
+            print(
+                f"  {name:<9} {lookups / elapsed:>9.0f} queries/s   "
+                f"p50 {percentile(latencies, 50) * 1000:>7.3f}ms   "
+                f"p99 {percentile(latencies, 99) * 1000:>7.3f}ms"
+            )
+
+        stats = manager.get_statement_cache_stats()
+        print(f"  cache de statements: {stats['hits']} hits, {stats['misses']} misses "
+              f"(hit rate {stats['hit_rate']:.1%})")
+    finally:
+        manager.disconnect()
+
+
+def bench_replication_apply(writes: int = 2000, batch_sizes=(1, 10, 100, 500)):
+    """
+    Aplicação de escritas replicadas em um seguidor, avulsas e em lotes
+
+    Usa SQLite com synchronous=FULL (um fsync por commit), como um MySQL
+    com flush a cada transação: cada lote é aplicado em uma transação.
+    """
+    print("\n=== Benchmark: aplicação de escritas replicadas (group commit) ===")
+    for batch_size in batch_sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            origin = Replicator(1, None, None, replication_log=ReplicationLog(os.path.join(tmp, 'log')))
+            db = SQLiteManager(os.path.join(tmp, 'follower.db'), synchronous='FULL',
+                               init_script='init_sqlite.sql', pool_max_size=2)
+            if not db.connect():
+                print("  ⚠ Benchmark pulado: SQLite indisponível")
+                return
+            follower = Replicator(2, db, None, applied_state=AppliedState(os.path.join(tmp, 'state')))
+            messages = [
+                origin.record(origin.query_message(
+                    "INSERT INTO users (name, email) VALUES (%s, %s)", f'tx-{i}', [f'User {i}', f'u{i}@ddb.com']))
+                for i in range(writes)
+            ]
+            logging.disable(logging.INFO)
+            try:
+                start = time.perf_counter()
+                for first in range(0, writes, batch_size):
+                    follower.receive_batch(messages[first:first + batch_size])
+                elapsed = time.perf_counter() - start
+            finally:
+                logging.disable(logging.NOTSET)
+                db.disconnect()
+        print(f"  lote de {batch_size:>4}: {writes / elapsed:>9.0f} escritas/s   "
+              f"{elapsed / (writes / batch_size) * 1000:>8.2f}ms por lote")
+
+
+def bench_row_replication(rows: int = 50000, updates: int = 200):
+    """
+    Custo no seguidor de um UPDATE com varredura: SQL reexecutado x imagens de linhas
+
+    Cada UPDATE filtra por uma coluna sem índice (varre a tabela) e altera
+    uma linha. No modo statement o seguidor repete a varredura; no modo
+    row aplica um upsert pela chave primária.
+    """
+    print("\n=== Benchmark: replicação por statement x por linha (seguidor) ===")
+    for mode in ('statement', 'row'):
+        with tempfile.TemporaryDirectory() as tmp:
+            dbs = []
+            for name in ('origin', 'follower'):
+                db = SQLiteManager(os.path.join(tmp, f'{name}.db'), init_script='init_sqlite.sql', pool_max_size=2)
+                if not db.connect():
+                    print("  ⚠ Benchmark pulado: SQLite indisponível")
+                    return
+                db.execute_many("INSERT INTO users (name, email) VALUES (%s, %s)",
+                                [(f'User {i}', f'u{i}@ddb.com') for i in range(rows)])
+                dbs.append(db)
+            origin = Replicator(1, dbs[0], None, replication_log=ReplicationLog(os.path.join(tmp, 'log')),
+                                row_images=mode == 'row')
+            follower = Replicator(2, dbs[1], None, applied_state=AppliedState(os.path.join(tmp, 'state')))
+            logging.disable(logging.WARNING)
+            try:
+                messages = []
+                for i in range(updates):
+                    *_, message = origin.execute_write("UPDATE users SET name = %s WHERE name = %s", f'tx-{i}',
+                                                       [f'Renamed {i}', f'User {i * (rows // updates)}'])
+                    messages.append(origin.record(message))
+                start = time.perf_counter()
+                for message in messages:
+                    follower.receive(message)
+                elapsed = time.perf_counter() - start
+            finally:
+                logging.disable(logging.NOTSET)
+                for db in dbs:
+                    db.disconnect()
+        print(f"  {mode:>9}: {updates / elapsed:>8.0f} escritas/s no seguidor   "
+              f"{elapsed / updates * 1000:>7.3f}ms por escrita")
+
+
+def bench_consistency_levels(writes: int = 200, replica_ms=(1, 2, 4, 15), timeout: float = 1.0):
+    """
+    Latência de uma escrita em cada nível de consistência
+
+    Simula um cluster de len(replica_ms) + 1 nós: cada réplica confirma
+    a escrita depois do seu atraso (±50%), como uma réplica com aquela
+    latência de rede + aplicação. A espera por W ACKs custa o atraso da
+    W-ésima réplica mais rápida; `all` paga o da mais lenta.
+    """
+    print("\n=== Benchmark: latência por nível de consistência ===")
+    nodes = [NodeInfo(node_id=i, host='localhost', port=0) for i in range(1, len(replica_ms) + 2)]
+    origin = None
+
+    def fanout(message, all_nodes):
+        for node, delay in zip(nodes[1:], replica_ms):
+            ack = Message(message_type=MessageType.REPLICATE_ACK, sender_id=node.node_id,
+                          transaction_id=message.transaction_id, data={'success': True})
+            timer = threading.Timer(delay / 1000 * random.uniform(0.5, 1.5), origin.handle_replication_ack, (ack,))
+            timer.daemon = True
+            timer.start()
+        return {node.node_id: DeliveryStatus.DELIVERED for node in nodes[1:]}
+
+    origin = Replicator(1, None, None, fanout_callback=fanout)
+    logging.disable(logging.WARNING)
+    try:
+        for level in ConsistencyLevel:
+            required = level.required_acks(len(nodes))
+            latencies = []
+            for i in range(writes):
+                message = origin.query_message("UPDATE users SET name = %s WHERE id = %s",
+                                               f'{level.value}-{i}', ['x', i])
+                start = time.perf_counter()
+                acks = origin.ack_tracker.expect(message.transaction_id, required, timeout, level.value)
+                origin.ship(message, nodes)
+                acks.result()
+                latencies.append(time.perf_counter() - start)
+            print(f"  {level.value:>6} (W={required}): p50 {percentile(latencies, 50) * 1000:>7.2f}ms   "
+                  f"p99 {percentile(latencies, 99) * 1000:>7.2f}ms")
+        time.sleep(max(replica_ms) * 1.5 / 1000)  # ACKs atrasados da última escrita
+    finally:
+        logging.disable(logging.NOTSET)
+        origin.ack_tracker.close()
+
+
+def bench_snapshot_transfer(rows: int = 100000, chunk_sizes=(500, 5000), parallel=(1, 4)):
+    """
+    Vazão da cópia de um nó por snapshot, por tamanho de trecho e tabelas em paralelo
+
+    Doador e nó carregado no mesmo processo (sem rede): mede leitura,
+    codificação, compressão, CRC e gravação. As linhas são divididas em
+    4 tabelas para o paralelismo entre tabelas ter efeito.
+    """
+    print("\n=== Benchmark: snapshot em trechos ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        donor_db = SQLiteManager(os.path.join(tmp, 'donor.db'), pool_max_size=8)
+        if not donor_db.connect():
+            print("  ⚠ Benchmark pulado: SQLite indisponível")
+            return
+        for t in range(4):
+            donor_db.execute_query(f"CREATE TABLE items{t} (id INTEGER PRIMARY KEY, name TEXT, price REAL)")
+            donor_db.execute_many(f"INSERT INTO items{t} VALUES (%s, %s, %s)",
+                                  [(i, f'Item {i}', i * 0.5) for i in range(rows // 4)])
+        donor = SnapshotDonor(1, donor_db, lambda: {'1': 0}, parallel=max(parallel))
+
+        def request(message, node):
+            response = donor.handle(message)
+            if not isinstance(response, Future):
+                future = Future()
+                future.set_result(response)
+                return future
+            return response
+
+        logging.disable(logging.WARNING)
+        try:
+            for workers in parallel:
+                for chunk_rows in chunk_sizes:
+                    target_db = SQLiteManager(os.path.join(tmp, f'target-{workers}-{chunk_rows}.db'),
+                                              pool_max_size=8)
+                    target_db.connect()
+                    loader = SnapshotLoader(2, target_db, request, parallel=workers, chunk_rows=chunk_rows)
+                    loader.load(NodeInfo(node_id=1, host='localhost', port=0))
+                    stats = loader.stats
+                    target_db.disconnect()
+                    print(f"  {workers} tabela(s) por vez, trechos de {chunk_rows:>5}: "
+                          f"{stats['rows'] / stats['seconds']:>9.0f} linhas/s   "
+                          f"{stats['mb_received']:.1f} MB comprimidos")
+        finally:
+            logging.disable(logging.NOTSET)
+            donor.close()
+            donor_db.disconnect()
+
+
+def bench_anti_entropy(sizes=(10000, 50000), divergent: int = 10, leaves: int = 1024):
+    """
+    Custo de uma rodada de anti-entropia por tamanho de tabela, com `divergent` linhas diferentes
+
+    As árvores já estão montadas (como no nó, que as atualiza a cada
+    escrita): a rodada troca só as raízes, as subárvores divergentes e as
+    linhas das faixas diferentes. Para comparação, o tempo de montar a
+    árvore do zero, que é o custo de comparar lendo a tabela inteira.
+    """
+    print("\n=== Benchmark: anti-entropia (árvores de Merkle) ===")
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            dbs = []
+            for name in ('coordinator', 'replica'):
+                db = SQLiteManager(os.path.join(tmp, f'{name}.db'), init_script='init_sqlite.sql', pool_max_size=2)
+                if not db.connect():
+                    print("  ⚠ Benchmark pulado: SQLite indisponível")
+                    return
+                db.execute_many("INSERT INTO users (id, name, email, created_at) VALUES (%s, %s, %s, '2024-01-01')",
+                                [(i, f'User {i}', f'u{i}@ddb.com') for i in range(rows)])
+                dbs.append(db)
+            coordinator = AntiEntropy(1, dbs[0], None, lambda: {}, leaves=leaves)
+
+            def request(message, node):
+                response = coordinator.handle(message)
+                if not isinstance(response, Future):
+                    future = Future()
+                    future.set_result(response)
+                    return future
+                return response
+
+            replica = AntiEntropy(2, dbs[1], request, lambda: {}, leaves=leaves)
+            logging.disable(logging.WARNING)
+            try:
+                start = time.perf_counter()
+                coordinator.refresh()
+                build = time.perf_counter() - start
+                replica.refresh()
+                changed = random.sample(range(rows), divergent)
+                for i in changed:
+                    dbs[1].execute_query("UPDATE users SET name = 'Divergente' WHERE id = %s", [i])
+                replica.rows_written('users', [[i] for i in changed])
+                start = time.perf_counter()
+                summary = replica.compare_with(NodeInfo(node_id=1, host='localhost', port=0))
+                elapsed = time.perf_counter() - start
+            finally:
+                logging.disable(logging.NOTSET)
+                coordinator.close()
+                replica.close()
+                for db in dbs:
+                    db.disconnect()
+        print(f"  {rows:>7} linhas: rodada {elapsed * 1000:>7.1f}ms, {replica.get_stats()['messages']} mensagens, "
+              f"{summary['repaired']} linhas copiadas   (montar a árvore: {build * 1000:>7.1f}ms)")
+
+
+def run_all_benchmarks(quick: bool = False, config_file: str = 'config/nodes_config.json'):
+    """Executa todos os benchmarks"""
+    print("=" * 80)
+    print("  BENCHMARKS DO MIDDLEWARE DDB")
+    print("=" * 80)
+
+    scale = 0.1 if quick else 1.0
+
+    bench_message_codec(iterations=int(20000 * scale))
+
+    bench_encodings(iterations=int(5000 * scale))
+
+    bench_socket_servers(clients=max(10, int(200 * scale)), requests_per_client=max(2, int(20 * scale)))
+
+    bench_control_plane(duration=max(2.0, 10 * scale))
+
+    bench_point_lookups(config_file, lookups=int(5000 * scale))
+
+    bench_replication_apply(writes=max(200, int(2000 * scale)))
+
+    bench_row_replication(rows=max(5000, int(50000 * scale)), updates=max(50, int(200 * scale)))
+
+    bench_consistency_levels(writes=max(50, int(200 * scale)))
+
+    bench_snapshot_transfer(rows=max(20000, int(100000 * scale)))
+
+    bench_anti_entropy(sizes=(10000, 50000) if not quick else (5000, 20000))
+
+    print("\n" + "=" * 80 + "\n")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks do DDB')
+    parser.add_argument('--quick', action='store_true', help='Executa versão reduzida dos benchmarks')
+    parser.add_argument('--config', default='config/nodes_config.json',
+                        help='Configuração com o MySQL usado no benchmark de consultas pontuais')
+    args = parser.parse_args()
+
+    run_all_benchmarks(args.quick, args.config)
+    sys.exit(0)
@@ -9,20 +9,30 @@ import json
 import socket
 import argparse
 import uuid
+from collections import deque
 from datetime import datetime
-from typing import Optional, Dict, Any
+from concurrent.futures import Future
+from typing import Optional, Dict, Any, Iterator, Sequence, Tuple
 
-from src.core.models import Message, MessageType, CommunicationType, QueryResult
-from src.core.checksum import ChecksumValidator
+from src.core.models import Message, MessageType, CommunicationType, NodeInfo, QueryResult
+from src.core.result_set import Row
+from src.network.framing import FrameReader, WIRE_FORMAT_FRAMED
+from src.network.codec import ChecksumError, MessageCodec, ENCODING_JSON
+from src.network.rpc import RpcClient
 
 
 class DDBClient:
     """Cliente para acessar o DDB"""
     
-    def __init__(self, config_file: str):
+    def __init__(self, config_file: str, encoding: str = ENCODING_JSON, timeout: float = 30,
+                 consistency: Optional[str] = None):
         self.config = self.load_config(config_file)
+        self.encoding = encoding
+        self.timeout = timeout
+        self.consistency = consistency  # async, one, quorum ou all (None: padrão do nó)
         self.nodes = self.config['nodes']
         self.current_node_index = 0
+        self.rpc = RpcClient(connect_timeout=timeout, encoding=encoding)  # Uma conexão multiplexada por nó
         print(f"Cliente DDB inicializado com {len(self.nodes)} nós disponíveis")
     
     def load_config(self, config_file: str) -> dict:
@@ -40,68 +50,134 @@ class DDBClient:
         self.current_node_index = (self.current_node_index + 1) % len(self.nodes)
         return node
     
-    def send_query(self, query: str, target_node: Optional[dict] = None) -> Optional[Dict[str, Any]]:
+    def _build_query_message(self, query: Optional[str], target_node: dict, data: Optional[dict] = None,
+                             params: Optional[Sequence[Any]] = None,
+                             message_type: MessageType = MessageType.QUERY) -> Message:
+        """Cria a mensagem QUERY (ou BULK_WRITE) para o nó de destino"""
+        if self.consistency:
+            data = dict(data or {}, consistency=self.consistency)
+        return Message(
+            message_type=message_type,
+            sender_id=9999,  # ID especial para cliente
+            transaction_id=str(uuid.uuid4()),
+            query=query,
+            params=list(params) if params is not None else None,
+            data=data,
+            timestamp=datetime.now(),
+            communication_type=CommunicationType.UNICAST,
+            target_nodes=[target_node['node_id']]
+        )
+    
+    @staticmethod
+    def _is_framed(target_node: dict) -> bool:
+        # Nós ainda não migrados só entendem mensagens delimitadas por \n
+        return target_node['network'].get('wire_format', WIRE_FORMAT_FRAMED) == WIRE_FORMAT_FRAMED
+    
+    @staticmethod
+    def _node_info(target_node: dict) -> NodeInfo:
+        network = target_node['network']
+        return NodeInfo(node_id=target_node['node_id'], host=network['host'], port=network['port'])
+    
+    def submit_query(self, query: str, target_node: Optional[dict] = None,
+                     params: Optional[Sequence[Any]] = None) -> Future:
         """
-        Envia query para o DDB
+        Envia query sem aguardar o resultado
+        
+        As queries compartilham uma conexão multiplexada por nó, então
+        várias podem estar em andamento ao mesmo tempo; as respostas são
+        associadas às requisições pelo request_id e podem chegar em
+        qualquer ordem.
         
         Args:
             query: Query SQL
             target_node: Nó específico (opcional)
+            params: Valores dos placeholders %s da query (opcional)
             
         Returns:
-            Resultado da query ou None
+            Future resolvida com a mensagem QUERY_RESPONSE
         """
         if target_node is None:
             target_node = self.get_next_node()
+        if not self._is_framed(target_node):
+            raise ConnectionError(f"Nó {target_node['node_id']} usa formato legado e não suporta multiplexação")
         
-        transaction_id = str(uuid.uuid4())
+        message = self._build_query_message(query, target_node, params=params)
+        return self.rpc.call(message, self._node_info(target_node))
+    
+    def close(self):
+        """Fecha as conexões com os nós"""
+        self.rpc.close()
+    
+    def _open_connection(self, target_node: dict) -> Tuple[socket.socket, FrameReader, bool, str]:
+        """
+        Conecta ao nó e negocia o formato das mensagens
         
-        # Cria mensagem
-        message = Message(
-            message_type=MessageType.QUERY,
-            sender_id=9999,  # ID especial para cliente
-            transaction_id=transaction_id,
-            query=query,
-            timestamp=datetime.now(),
-            communication_type=CommunicationType.UNICAST,
-            target_nodes=[target_node['node_id']]
-        )
+        Returns:
+            Tupla (socket, leitor de frames, framed, codificação)
+        """
+        network = target_node['network']
+        framed = self._is_framed(target_node)
         
-        # Serializa e adiciona checksum
-        message_str = message.to_json()
-        message_dict = json.loads(message_str)
-        message_dict = ChecksumValidator.add_checksum(message_dict)
-        message_str = json.dumps(message_dict)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect((network['host'], network['port']))
+            reader = FrameReader(sock)
+            
+            # Negocia codificação binária, se solicitada
+            encoding = ENCODING_JSON
+            if framed and self.encoding != ENCODING_JSON:
+                sock.sendall(MessageCodec.encode_hello([self.encoding, ENCODING_JSON]))
+                encoding = MessageCodec.parse_hello_reply(reader.read_frame())
+        except BaseException:
+            sock.close()
+            raise
         
+        return sock, reader, framed, encoding
+    
+    def send_query(self, query: str, target_node: Optional[dict] = None,
+                   params: Optional[Sequence[Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Envia query para o DDB
+        
+        Com params, os valores vão separados do SQL (placeholders %s) e o
+        nó executa a query como prepared statement, reaproveitado entre
+        execuções do mesmo texto.
+        
+        Args:
+            query: Query SQL
+            target_node: Nó específico (opcional)
+            params: Valores dos placeholders da query (opcional)
+            
+        Returns:
+            Resultado da query ou None
+        """
+        if target_node is None:
+            target_node = self.get_next_node()
+        
+        message = self._build_query_message(query, target_node, params=params)
+        return self._request(message, target_node)
+    
+    def _request(self, message: Message, target_node: dict) -> Optional[Dict[str, Any]]:
+        """Envia a mensagem ao nó e retorna o conteúdo da resposta (ou None)"""
         # Conecta e envia
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(30)
-                
-                network = target_node['network']
-                sock.connect((network['host'], network['port']))
-                
-                # Envia query
-                sock.sendall((message_str + '\n').encode('utf-8'))
+            if self._is_framed(target_node):
+                response = self.rpc.request(message, self._node_info(target_node), self.timeout)
+                return response.data
+            
+            # Nó legado: uma conexão por query, resposta na ordem do envio
+            sock, reader, framed, encoding = self._open_connection(target_node)
+            with sock:
+                # Envia query (serializada e com checksum em uma passada)
+                sock.sendall(MessageCodec.encode(message, framed, encoding))
                 
                 # Aguarda resposta
-                buffer = ""
-                while '\n' not in buffer:
-                    data = sock.recv(4096).decode('utf-8')
-                    if not data:
-                        break
-                    buffer += data
+                frame = reader.read_frame()
                 
-                if '\n' in buffer:
-                    response_str = buffer.split('\n')[0]
-                    response_dict = json.loads(response_str)
-                    
-                    # Valida checksum
-                    if not ChecksumValidator.verify_message(response_dict):
-                        print("⚠ Aviso: Checksum inválido na resposta")
-                    
-                    response = Message.from_json(response_str)
-                    return response.data
+                if frame is not None:
+                    response = MessageCodec.decode(frame)
+                    return response.data if response else None
                 
                 return None
                 
@@ -111,37 +187,159 @@ class DDBClient:
         except ConnectionRefusedError:
             print(f"✗ Conexão recusada pelo nó {target_node['node_id']}")
             return None
+        except ChecksumError as e:
+            print(f"✗ Resposta descartada: {e}")
+            return None
         except Exception as e:
             print(f"✗ Erro ao enviar query: {e}")
             return None
     
-    def execute_query(self, query: str):
+    def bulk_write(self, query: Optional[str] = None, rows: Optional[Sequence[Sequence[Any]]] = None,
+                   statements: Optional[Sequence[str]] = None, batch_size: int = 1000,
+                   target_node: Optional[dict] = None, max_in_flight: int = 4) -> Dict[str, Any]:
+        """
+        Envia muitas linhas (ou statements) em lotes BULK_WRITE
+        
+        Cada lote de batch_size itens é aplicado pelo nó em uma transação
+        e replicado como uma unidade. Até max_in_flight lotes ficam em
+        andamento ao mesmo tempo na conexão multiplexada, então lotes
+        diferentes podem ser confirmados fora de ordem.
+        
+        Args:
+            query: Query de escrita com placeholders %s (usada com rows)
+            rows: Valores de cada linha
+            statements: Queries de escrita completas (alternativa a rows)
+            batch_size: Itens por lote
+            target_node: Nó específico (opcional)
+            max_in_flight: Lotes aguardando resposta ao mesmo tempo
+            
+        Returns:
+            Resumo com 'success', 'batches', 'rows_affected' e 'errors'
+        """
+        if (rows is None) == (statements is None):
+            raise ValueError("Informe rows (com query) ou statements")
+        if rows is not None and not query:
+            raise ValueError("rows exige uma query com placeholders")
+        if target_node is None:
+            target_node = self.get_next_node()
+        
+        items = list(rows if rows is not None else statements)
+        batches = [items[start:start + batch_size] for start in range(0, len(items), batch_size)]
+        summary = {'success': True, 'batches': len(batches), 'rows_affected': 0, 'errors': []}
+        
+        def build(batch) -> Message:
+            data = {'rows': [list(row) for row in batch]} if rows is not None else {'statements': batch}
+            return self._build_query_message(query, target_node, data, message_type=MessageType.BULK_WRITE)
+        
+        def record(response_data: Optional[Dict[str, Any]]):
+            result = QueryResult.from_dict(response_data) if response_data else None
+            if result is not None and result.success:
+                summary['rows_affected'] += result.rows_affected or 0
+            else:
+                summary['success'] = False
+                summary['errors'].append(result.error if result else "Sem resposta do nó")
+        
+        if not self._is_framed(target_node):
+            # Nó legado: um lote por conexão, em sequência
+            for batch in batches:
+                record(self._request(build(batch), target_node))
+            return summary
+        
+        node = self._node_info(target_node)
+        pending = deque()
+        
+        def wait_oldest():
+            try:
+                record(pending.popleft().result(self.timeout).data)
+            except Exception as e:
+                summary['success'] = False
+                summary['errors'].append(str(e) or type(e).__name__)
+        
+        for batch in batches:
+            if len(pending) >= max_in_flight:
+                wait_oldest()
+            try:
+                pending.append(self.rpc.call(build(batch), node))
+            except OSError as e:
+                summary['success'] = False
+                summary['errors'].append(str(e))
+        while pending:
+            wait_oldest()
+        
+        return summary
+    
+    def stream_query(self, query: str, fetch_size: int = 1000, target_node: Optional[dict] = None,
+                     params: Optional[Sequence[Any]] = None) -> Iterator[Row]:
+        """
+        Executa um SELECT em streaming, devolvendo as linhas conforme chegam
+        
+        O nó envia o resultado em vários RESULT_CHUNK de até fetch_size
+        linhas; apenas um lote fica em memória por vez. Interromper a
+        iteração fecha a conexão e o nó descarta o restante do resultado.
+        
+        Args:
+            query: Query SQL (SELECT)
+            fetch_size: Linhas por lote
+            target_node: Nó específico (opcional)
+            params: Valores dos placeholders da query (opcional)
+            
+        Returns:
+            Iterador de linhas (acessíveis por nome de coluna)
+            
+        Raises:
+            RuntimeError: Se a query falhar no nó
+            ConnectionError: Se a conexão terminar antes do último lote
+        """
+        if target_node is None:
+            target_node = self.get_next_node()
+        
+        message = self._build_query_message(query, target_node, {'stream': True, 'fetch_size': fetch_size}, params)
+        sock, reader, framed, encoding = self._open_connection(target_node)
+        
+        with sock:
+            sock.sendall(MessageCodec.encode(message, framed, encoding))
+            
+            while True:
+                frame = reader.read_frame()
+                if frame is None:
+                    raise ConnectionError(f"Nó {target_node['node_id']} encerrou o streaming antes do fim")
+                
+                response = MessageCodec.decode(frame)
+                if response is None:
+                    continue
+                
+                result = QueryResult.from_dict(response.data)
+                if not result.success:
+                    raise RuntimeError(result.error)
+                if result.data:
+                    yield from result.data
+                if response.message_type != MessageType.RESULT_CHUNK or response.data.get('last'):
+                    return
+    
+    def execute_query(self, query: str, params: Optional[Sequence[Any]] = None):
         """
         Executa query e exibe resultado
         
         Args:
             query: Query SQL
+            params: Valores dos placeholders da query (opcional)
         """
         print(f"\n{'='*80}")
         print(f"Query: {query}")
+        if params is not None:
+            print(f"Parâmetros: {list(params)}")
         print(f"{'='*80}")
         
         start_time = datetime.now()
-        result_data = self.send_query(query)
+        result_data = self.send_query(query, params=params)
         elapsed = (datetime.now() - start_time).total_seconds()
         
         if result_data is None:
             print("✗ Falha ao executar query")
             return
         
-        # Converte para QueryResult
-        result = QueryResult(
-            success=result_data.get('success', False),
-            data=result_data.get('data'),
-            error=result_data.get('error'),
-            node_id=result_data.get('node_id'),
-            rows_affected=result_data.get('rows_affected')
-        )
+        # Converte para QueryResult (linhas acessíveis por nome de coluna)
+        result = QueryResult.from_dict(result_data)
         
         # Exibe resultado
         print(f"\n📊 Resultado:")
@@ -164,6 +362,79 @@ class DDBClient:
         
         print(f"{'='*80}\n")
     
+    def execute_stream(self, query: str, fetch_size: int = 1000, params: Optional[Sequence[Any]] = None):
+        """
+        Executa SELECT em streaming e exibe resultado
+        
+        Args:
+            query: Query SQL
+            fetch_size: Linhas por lote
+            params: Valores dos placeholders da query (opcional)
+        """
+        print(f"\n{'='*80}")
+        print(f"Query (streaming): {query}")
+        print(f"{'='*80}")
+        
+        start_time = datetime.now()
+        count = 0
+        try:
+            print(f"\n  Dados:")
+            for row in self.stream_query(query, fetch_size, params=params):
+                count += 1
+                if count <= 10:  # Limita a 10 linhas
+                    print(f"    {count}. {row}")
+        except Exception as e:
+            print(f"✗ Falha no streaming: {e}")
+            return
+        elapsed = (datetime.now() - start_time).total_seconds()
+        
+        if count > 10:
+            print(f"    ... e mais {count - 10} registros")
+        print(f"\n📊 Resultado:")
+        print(f"  • Tempo: {elapsed:.3f}s")
+        print(f"  • Registros retornados: {count}")
+        print(f"{'='*80}\n")
+    
+    def execute_bulk(self, bulk_file: str, query: Optional[str] = None, batch_size: int = 1000):
+        """
+        Carrega um arquivo JSON em lotes BULK_WRITE e exibe o resumo
+        
+        Args:
+            bulk_file: Lista JSON de linhas (com query) ou de queries de escrita
+            query: Query com placeholders %s para as linhas (opcional)
+            batch_size: Itens por lote
+        """
+        try:
+            with open(bulk_file, 'r') as f:
+                items = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"✗ Erro ao ler {bulk_file}: {e}")
+            return
+        
+        print(f"\n{'='*80}")
+        print(f"Escrita em lote: {len(items)} itens de {bulk_file} (lotes de {batch_size})")
+        print(f"{'='*80}")
+        
+        start_time = datetime.now()
+        try:
+            if query:
+                summary = self.bulk_write(query, rows=items, batch_size=batch_size)
+            else:
+                summary = self.bulk_write(statements=items, batch_size=batch_size)
+        except (ValueError, OSError) as e:
+            print(f"✗ Falha na escrita em lote: {e}")
+            return
+        elapsed = (datetime.now() - start_time).total_seconds()
+        
+        print(f"\n📊 Resultado:")
+        print(f"  • Tempo: {elapsed:.3f}s ({len(items) / elapsed if elapsed else 0:.0f} itens/s)")
+        print(f"  • Status: {'✓ Sucesso' if summary['success'] else '✗ Erro'}")
+        print(f"  • Lotes: {summary['batches']}")
+        print(f"  • Linhas afetadas: {summary['rows_affected']}")
+        for error in summary['errors'][:5]:
+            print(f"  • Erro: {error}")
+        print(f"{'='*80}\n")
+    
     def interactive_mode(self):
         """Modo interativo para executar queries"""
         print("\n" + "="*80)
@@ -237,13 +508,111 @@ class DDBClient:
             print(f"  • Endereço: {network['host']}:{network['port']}")
         print("="*80 + "\n")
     
+    def fetch_stats(self) -> Dict[int, Optional[Dict[str, Any]]]:
+        """
+        Consulta as métricas de todos os nós em paralelo
+        
+        Returns:
+            Dicionário node_id -> métricas (None se o nó não respondeu)
+        """
+        futures = {}
+        stats: Dict[int, Optional[Dict[str, Any]]] = {}
+        for node in self.nodes:
+            message = Message(
+                message_type=MessageType.STATS,
+                sender_id=9999,
+                timestamp=datetime.now(),
+                target_nodes=[node['node_id']]
+            )
+            try:
+                futures[node['node_id']] = self.rpc.call(message, self._node_info(node))
+            except OSError:
+                stats[node['node_id']] = None
+        
+        for node_id, future in futures.items():
+            try:
+                stats[node_id] = future.result(self.timeout).data
+            except Exception:
+                future.cancel()
+                stats[node_id] = None
+        return stats
+    
     def show_stats(self):
-        """Exibe estatísticas básicas"""
+        """Exibe estatísticas dos nós"""
         print("\n" + "="*80)
         print("  ESTATÍSTICAS")
         print("="*80)
         print(f"\nNós disponíveis: {len(self.nodes)}")
         print(f"Nó atual (Round-Robin): {self.current_node_index}")
+        
+        for node_id, stats in sorted(self.fetch_stats().items()):
+            print(f"\nNó {node_id}:")
+            if stats is None:
+                print("  • Sem resposta")
+                continue
+            pool = stats.get('db_pool', {})
+            print(f"  • Coordenador: {'sim' if stats.get('is_coordinator') else 'não'}")
+            print(f"  • Pool MySQL: {pool.get('in_use', 0)} em uso, {pool.get('idle', 0)} ociosas "
+                  f"(máx. {pool.get('max_size', 0)}), {pool.get('waiters', 0)} aguardando")
+            print(f"  • Checkout: média {pool.get('avg_checkout_ms', 0):.2f}ms, "
+                  f"máx. {pool.get('max_checkout_ms', 0):.2f}ms, {pool.get('timeouts', 0)} timeouts")
+            print(f"  • Transações abertas: {pool.get('open_transactions', 0)}")
+            executor = stats.get('db_executor')
+            if executor:
+                print(f"  • Executor do banco: {executor['active']}/{executor['max_workers']} ativas, "
+                      f"{executor['queued']}/{executor['max_queue']} na fila "
+                      f"(espera média {executor['avg_queue_ms']:.2f}ms), {executor['rejected']} recusadas")
+            replication = stats.get('replication')
+            if replication and replication.get('log'):
+                applied = ", ".join(f"nó {origin}: {lsn}" for origin, lsn in sorted(replication['applied'].items()))
+                print(f"  • Replicação: LSN {replication['log']['last_lsn']} "
+                      f"({replication['log']['segments']} segmentos), aplicados [{applied or '-'}], "
+                      f"{replication['held']} fora de ordem")
+                determinism = replication.get('determinism')
+                if determinism:
+                    print(f"  • Modo {determinism['mode']}: {determinism['row_images']} escritas por linha "
+                          f"({determinism.get('sql_fallbacks', 0)} como SQL), "
+                          f"{determinism['nondeterministic']} não determinísticas como SQL, "
+                          f"{determinism['divergences']} divergências")
+                apply = replication.get('apply')
+                if apply:
+                    lag = ", ".join(f"nó {origin}: {item['lsns']} LSNs/{item['seconds']:.1f}s"
+                                    for origin, item in sorted(apply['lag'].items()))
+                    print(f"  • Aplicação: {apply['writes_per_s']:.0f} escritas/s "
+                          f"({apply['applied']} no total, {apply.get('duplicates', 0)} repetidas ignoradas), "
+                          f"atraso [{lag or '-'}]")
+                consistency = replication.get('consistency')
+                if consistency and consistency['levels']:
+                    levels = ", ".join(
+                        f"{level}: {item['writes']} escritas, média {item['avg_wait_ms']:.1f}ms, "
+                        f"{item['timeouts'] + item['unreachable']} sem confirmação"
+                        for level, item in sorted(consistency['levels'].items())
+                    )
+                    print(f"  • Consistência: {consistency['waiting']} aguardando ACKs [{levels}]")
+            anti_entropy = stats.get('anti_entropy')
+            if anti_entropy:
+                print(f"  • Anti-entropia: {anti_entropy['tables']} tabelas/{anti_entropy['rows']} linhas nas árvores, "
+                      f"{anti_entropy['rounds']} rodadas ({anti_entropy['skipped']} adiadas), "
+                      f"{anti_entropy['divergent_ranges']} faixas divergentes, "
+                      f"{anti_entropy['repaired'] + anti_entropy['deleted']} linhas corrigidas")
+            snapshot = stats.get('snapshot')
+            if snapshot:
+                donor = snapshot['donor']
+                line = (f"  • Snapshot: {donor['served']} servidos ({donor['open']} abertos), "
+                        f"{donor['mb_sent']:.1f} MB enviados")
+                if snapshot['last_load']:
+                    load = snapshot['last_load']
+                    line += (f", último carregado do nó {load['donor']}: {load['rows']} linhas "
+                             f"em {load['seconds']:.1f}s")
+                if snapshot['rebuilding']:
+                    line += " - RECONSTRUINDO"
+                print(line)
+            cache = stats.get('query_cache')
+            if cache:
+                print(f"  • Cache de resultados: {cache['hits']} hits, {cache['misses']} misses "
+                      f"(hit rate {cache['hit_rate']:.1%}), {cache['entries']} entradas, "
+                      f"{cache['bytes'] / 1024:.0f}/{cache['max_bytes'] / 1024:.0f} KB, "
+                      f"{cache['evictions']} evicções, {cache['invalidations']} invalidações")
         print("="*80 + "\n")
 
 
@@ -251,17 +620,37 @@ def main():
     parser = argparse.ArgumentParser(description='Cliente do DDB')
     parser.add_argument('--config', required=True, help='Arquivo de configuração JSON')
     parser.add_argument('--query', help='Query SQL para executar (modo não-interativo)')
+    parser.add_argument('--encoding', choices=['json', 'binary'], default='json',
+                        help='Codificação das mensagens (json é mais fácil de depurar)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Recebe o resultado do SELECT em lotes, sem carregá-lo inteiro em memória')
+    parser.add_argument('--fetch-size', type=int, default=1000, help='Linhas por lote no modo --stream')
+    parser.add_argument('--params', type=json.loads,
+                        help='Parâmetros da query como lista JSON, ex.: \'[42, "ana"]\' (placeholders %%s)')
+    parser.add_argument('--bulk', metavar='ARQUIVO',
+                        help='Escrita em lote: lista JSON de linhas (para a --query com %%s) ou de queries')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Itens por lote no modo --bulk')
+    parser.add_argument('--consistency', choices=['async', 'one', 'quorum', 'all'],
+                        help='Réplicas que confirmam cada escrita antes da resposta (padrão: o do nó)')
     
     args = parser.parse_args()
+    if args.params is not None and not isinstance(args.params, list):
+        parser.error('--params deve ser uma lista JSON')
     
-    client = DDBClient(args.config)
+    client = DDBClient(args.config, args.encoding, consistency=args.consistency)
     
-    if args.query:
+    if args.bulk:
+        client.execute_bulk(args.bulk, args.query, args.batch_size)
+    elif args.query and args.stream:
+        client.execute_stream(args.query, args.fetch_size, args.params)
+    elif args.query:
         # Modo não-interativo
-        client.execute_query(args.query)
+        client.execute_query(args.query, args.params)
     else:
         # Modo interativo
         client.interactive_mode()
+    
+    client.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,9 @@
+-- Esquema para nós com engine "sqlite" (config/nodes_config_sqlite.json)
+-- Executado por cada nó ao conectar (init_script)
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100) NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
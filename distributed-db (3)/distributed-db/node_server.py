@@ -10,40 +10,82 @@ import logging
 import threading
 import time
 import argparse
+import uuid
+from concurrent.futures import Future
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional
 
 from src.core.models import (
     NodeInfo, NodeStatus, Message, MessageType, 
-    CommunicationType, QueryResult
+    CommunicationType, QueryResult, DeliveryStatus, ConsistencyLevel
 )
-from src.database.mysql_manager import MySQLManager
+from src.core.sql_analysis import analyze, analysis_cache_stats
+from src.database.backend import create_backend
+from src.core.executor import BoundedExecutor, ExecutorOverloadedError
 from src.database.transaction_manager import TransactionManager
-from src.network.socket_server import SocketServer
+from src.network.socket_server import HandlerResult, SocketServer
+from src.network.async_socket_server import AsyncSocketServer
 from src.network.socket_client import SocketClient
 from src.coordination.coordinator import Coordinator
 from src.replication.replicator import Replicator
+from src.replication.replication_log import AppliedState, ReplicationLog
+from src.replication.batcher import ReplicationBatcher
+from src.replication.apply_scheduler import ApplyScheduler
+from src.replication.anti_entropy import AntiEntropy
+from src.replication.snapshot import SnapshotDonor, SnapshotError, SnapshotLoader
 from src.load_balancer.balancer import LoadBalancer
 
 
 class DistributedDBNode:
     """Nó do Banco de Dados Distribuído"""
     
-    def __init__(self, config_file: str, node_id: int):
+    # Mensagens que acessam o banco: executadas no executor do banco, fora
+    # das threads que leem os sockets. As demais (heartbeat, eleição,
+    # ACKs, stats) são respondidas na hora.
+    DB_MESSAGES = frozenset((
+        MessageType.QUERY, MessageType.BULK_WRITE, MessageType.PREPARE,
+        MessageType.COMMIT, MessageType.ABORT, MessageType.REPLICATE, MessageType.REPLICATE_BATCH
+    ))
+    # Nunca recusadas por sobrecarga: deixariam transações presas ou
+    # réplicas divergentes
+    REQUIRED_MESSAGES = frozenset((
+        MessageType.COMMIT, MessageType.ABORT, MessageType.REPLICATE, MessageType.REPLICATE_BATCH
+    ))
+    
+    def __init__(self, config_file: str, node_id: int, server_mode: Optional[str] = None):
         self.node_id = node_id
         self.setup_logging()
         
         # Carrega configuração
         self.config = self.load_config(config_file)
         self.node_config = self.get_node_config(node_id)
+        self.server_mode = server_mode or self.node_config['network'].get('server_mode', 'threaded')
         
         # Componentes
         self.db_manager = None
+        self.db_executor = None
         self.transaction_manager = None
         self.socket_server = None
-        self.socket_client = SocketClient()
+        network_config = self.node_config['network']
+        self.socket_client = SocketClient(
+            max_connections_per_peer=network_config.get('max_connections_per_peer', 4),
+            idle_timeout=network_config.get('idle_timeout', 60),
+            fanout_workers=network_config.get('fanout_workers', 16),
+            control_workers=network_config.get('control_workers', 4),
+            encoding=network_config.get('encoding', 'binary')
+        )
         self.coordinator = None
         self.replicator = None
+        self.replication_log = None
+        self.replication_batcher = None
+        self.apply_scheduler = None
+        self.snapshot_donor = None
+        self.snapshot_loader = None
+        self.anti_entropy = None
+        self.anti_entropy_interval = 300  # Segundos entre comparações com o coordenador (0: desligada)
+        self._replicate_lock = threading.Lock()  # Ordem do log = ordem dos lotes
+        self.default_consistency = ConsistencyLevel.ASYNC  # Escritas sem 'consistency' na mensagem
+        self.ack_timeout = 5.0  # Prazo para as réplicas confirmarem (segundos)
         self.load_balancer = LoadBalancer()
         
         # Estado
@@ -51,6 +93,13 @@ class DistributedDBNode:
         self.running = False
         self.heartbeat_interval = 5  # segundos
         self.heartbeat_timeout = 15  # segundos
+        self.stream_fetch_size = 1000  # linhas por RESULT_CHUNK, se o cliente não informar
+        self._catching_up = set()  # Origens com catch-up agendado
+        self._catch_up_lock = threading.Lock()
+        self.bootstrap_from: Optional[int] = None  # Doador do snapshot carregado ao iniciar
+        self.rebuilding = False  # Carregando um snapshot: não aplica escritas nem atende queries
+        self._rebuild_lock = threading.Lock()
+        self.rebuild_retry_interval = 10  # Segundos até tentar outro doador após um snapshot falho
         
         self.logger.info(f"Nó {self.node_id} inicializado")
     
@@ -83,28 +132,107 @@ class DistributedDBNode:
     
     def initialize_components(self):
         """Inicializa todos os componentes"""
-        # MySQL
-        db_config = self.node_config['database']
-        self.db_manager = MySQLManager(
-            host=db_config['host'],
-            user=db_config['user'],
-            password=db_config['password'],
-            database=db_config['database'],
-            port=db_config.get('port', 3306)
-        )
+        # Banco local (MySQL ou SQLite, conforme `engine`)
+        self.db_manager = create_backend(self.node_config['database'])
         
         if not self.db_manager.connect():
-            self.logger.error("Falha ao conectar ao MySQL")
+            self.logger.error(f"Falha ao conectar ao banco ({self.db_manager.engine})")
             sys.exit(1)
         
+        # Executor das mensagens que acessam o banco (fila limitada)
+        db_config = self.node_config['database']
+        self.db_executor = BoundedExecutor(
+            max_workers=db_config.get('db_workers', db_config.get('pool_max_size', 10)),
+            max_queue=db_config.get('db_queue_size', 256),
+            name='db'
+        )
+        
         # Gerenciadores
         self.transaction_manager = TransactionManager(self.node_id)
+        
+        # Log de replicação (escritas deste nó) e LSNs aplicados das outras origens
+        replication_config = self.node_config.get('replication', {})
+        log_dir = replication_config.get('log_dir', f"data/replog/node{self.node_id}")
+        self.replication_log = ReplicationLog(
+            log_dir,
+            segment_bytes=int(replication_config.get('segment_mb', 64) * 1024 * 1024),
+            fsync=replication_config.get('fsync', False),
+            max_segments=replication_config.get('max_segments', 0)
+        )
+        
+        # Replicação por statement (SQL reexecutado) ou por linha (imagens das linhas alteradas)
+        replication_mode = replication_config.get('mode', 'statement')
+        if replication_mode not in ('statement', 'row'):
+            raise ValueError(f"Modo de replicação desconhecido: {replication_mode} (use statement ou row)")
+        
+        # Escritas recebidas aplicadas em paralelo, em ordem por tabela
+        apply_workers = replication_config.get('apply_workers', 4)
+        if apply_workers > 1:
+            self.apply_scheduler = ApplyScheduler(BoundedExecutor(max_workers=apply_workers, name='apply'))
+        
+        # Anti-entropia: árvores de Merkle das tabelas, comparadas com as do coordenador
+        self.anti_entropy = AntiEntropy(
+            self.node_id,
+            self.db_manager,
+            self.socket_client.call,
+            lambda: self.replicator.positions(),
+            leaves=replication_config.get('anti_entropy_leaves', 1024)
+        )
+        self.anti_entropy_interval = replication_config.get('anti_entropy_interval', 300)
+        self.rebuild_retry_interval = replication_config.get('rebuild_retry_interval', 10)
         self.replicator = Replicator(
             self.node_id,
             self.db_manager,
-            self.send_message_wrapper
+            self.send_message_wrapper,
+            self.send_message_detailed_wrapper,
+            replication_log=self.replication_log,
+            applied_state=AppliedState(
+                log_dir,
+                window=replication_config.get('dedup_window', 10000),
+                flush_interval=replication_config.get('applied_flush_ms', 100) / 1000,
+                fsync=replication_config.get('fsync', False)
+            ),
+            request_callback=self.socket_client.call,
+            pull_batch_size=replication_config.get('pull_batch_size', 1000),
+            apply_scheduler=self.apply_scheduler,
+            row_images=replication_mode == 'row',
+            row_image_max_rows=replication_config.get('row_image_max_rows', 10000),
+            rebuild_callback=self.request_rebuild,
+            anti_entropy=self.anti_entropy,
+            delivery_retries=replication_config.get('delivery_retries', 1)
+        )
+        
+        # Snapshot: cópia inicial de um nó novo ou atrasado demais para o catch-up
+        snapshot_workers = replication_config.get('snapshot_workers', 4)
+        self.snapshot_donor = SnapshotDonor(
+            self.node_id,
+            self.db_manager,
+            self.replicator.positions,
+            parallel=snapshot_workers,
+            max_mb_per_s=replication_config.get('snapshot_max_mb_per_s', 20),
+            quiesce_callback=self.replicator.quiesce
+        )
+        self.snapshot_loader = SnapshotLoader(
+            self.node_id,
+            self.db_manager,
+            self.socket_client.call,
+            parallel=snapshot_workers,
+            chunk_rows=replication_config.get('snapshot_chunk_rows', 5000)
         )
         
+        # Consistência das escritas: quantas réplicas confirmam antes da resposta
+        self.default_consistency = ConsistencyLevel(replication_config.get('consistency', 'async'))
+        self.ack_timeout = replication_config.get('ack_timeout', 5.0)
+        
+        # Group commit da replicação: escritas enviadas em lotes
+        batch_window_ms = replication_config.get('batch_window_ms', 5)
+        if batch_window_ms > 0:
+            self.replication_batcher = ReplicationBatcher(
+                lambda batch: self.replicator.ship_batch(batch, self.all_nodes),
+                window_ms=batch_window_ms,
+                max_batch=replication_config.get('batch_max_writes', 500)
+            )
+        
         # Coordenador
         self.coordinator = Coordinator(
             self.node_id,
@@ -113,11 +241,21 @@ class DistributedDBNode:
         
         # Socket Server
         network_config = self.node_config['network']
-        self.socket_server = SocketServer(
-            host=network_config['host'],
-            port=network_config['port'],
-            message_handler=self.handle_message
-        )
+        if self.server_mode == 'asyncio':
+            self.socket_server = AsyncSocketServer(
+                host=network_config['host'],
+                port=network_config['port'],
+                message_handler=self.handle_message,
+                max_workers=network_config.get('handler_workers', 32),
+                control_workers=network_config.get('control_workers', 4)
+            )
+        else:
+            self.socket_server = SocketServer(
+                host=network_config['host'],
+                port=network_config['port'],
+                message_handler=self.handle_message
+            )
+        self.logger.info(f"Servidor de sockets no modo {self.server_mode}")
         
         # Inicializa lista de nós
         self.initialize_nodes_list()
@@ -135,12 +273,19 @@ class DistributedDBNode:
                 last_heartbeat=datetime.now()
             )
             self.all_nodes.append(node_info)
+            
+            # Nós ainda não migrados recebem mensagens delimitadas por \n
+            wire_format = node_config['network'].get('wire_format')
+            if wire_format:
+                self.socket_client.set_peer_wire_format(node_info.node_id, wire_format)
         
         self.logger.info(f"{len(self.all_nodes)} nós registrados")
     
     def start(self):
         """Inicia o nó"""
         self.running = True
+        if self.bootstrap_from is not None:
+            self.rebuilding = True  # Antes de aceitar conexões: nada é aplicado sobre o banco antigo
         
         # Inicia socket server
         self.socket_server.start()
@@ -148,6 +293,10 @@ class DistributedDBNode:
         # Inicia threads de manutenção
         threading.Thread(target=self.heartbeat_loop, daemon=True).start()
         threading.Thread(target=self.check_nodes_health, daemon=True).start()
+        if self.bootstrap_from is not None:
+            threading.Thread(target=self.rebuild_from, args=(self.bootstrap_from,), daemon=True).start()
+        if self.anti_entropy_interval > 0:
+            self.anti_entropy.start(self.anti_entropy_interval, self.anti_entropy_peer)
         
         # Aguarda um pouco e inicia eleição
         time.sleep(2)
@@ -171,9 +320,35 @@ class DistributedDBNode:
         if self.socket_server:
             self.socket_server.stop()
         
+        if self.replication_batcher:
+            self.replication_batcher.close()
+        
+        self.socket_client.close()
+        
+        if self.replicator:
+            self.replicator.ack_tracker.close()
+        
+        if self.snapshot_donor:
+            self.snapshot_donor.close()
+        
+        if self.anti_entropy:
+            self.anti_entropy.close()
+        
+        if self.db_executor:
+            self.db_executor.shutdown(wait=False)
+        
+        if self.apply_scheduler:
+            self.apply_scheduler.shutdown(wait=False)
+        
         if self.db_manager:
             self.db_manager.disconnect()
         
+        if self.replication_log:
+            self.replication_log.close()
+        
+        if self.replicator and self.replicator.applied_state:
+            self.replicator.applied_state.close()
+        
         self.logger.info("Nó parado")
     
     def heartbeat_loop(self):
@@ -189,7 +364,7 @@ class DistributedDBNode:
             sender_id=self.node_id,
             timestamp=datetime.now(),
             communication_type=CommunicationType.BROADCAST,
-            data={'is_coordinator': self.coordinator.is_coordinator}
+            data={'is_coordinator': self.coordinator.is_coordinator, 'last_lsn': self.replicator.last_lsn}
         )
         
         self.send_message_wrapper(heartbeat_msg, self.all_nodes)
@@ -199,6 +374,12 @@ class DistributedDBNode:
         while self.running:
             time.sleep(self.heartbeat_interval * 2)
             
+            # Libera conexões presas por PREPAREs que nunca terminaram
+            self.db_manager.abort_stale_transactions()
+            
+            # Esquece replicações cujos ACKs não vieram (réplica caiu depois de receber)
+            self.replicator.cleanup_old_replications()
+            
             current_time = datetime.now()
             timeout = timedelta(seconds=self.heartbeat_timeout)
             
@@ -218,32 +399,48 @@ class DistributedDBNode:
                             self.logger.warning("Coordenador falhou - iniciando eleição")
                             self.coordinator.start_election(self.all_nodes)
     
-    def handle_message(self, message: Message) -> Optional[Message]:
+    def handle_message(self, message: Message) -> HandlerResult:
         """
         Processa mensagem recebida
 
+        Mensagens de controle são tratadas na thread que as recebeu; as que
+        acessam o banco vão para o executor do banco e a resposta volta
+        como Future.
+
         Args:
             message: Mensagem recebida
 
         Returns:
-            Mensagem de resposta, ou None
+            Mensagem de resposta, iterador (streaming), Future, ou None
         """
         try:
             handler_map = {
                 MessageType.HEARTBEAT: self.handle_heartbeat,
                 MessageType.QUERY: self.handle_query,
+                MessageType.BULK_WRITE: self.handle_bulk_write,
                 MessageType.PREPARE: self.handle_prepare,
                 MessageType.COMMIT: self.handle_commit,
                 MessageType.ABORT: self.handle_abort,
                 MessageType.REPLICATE: self.handle_replicate,
+                MessageType.REPLICATE_BATCH: self.handle_replicate_batch,
                 MessageType.REPLICATE_ACK: self.handle_replicate_ack,
+                MessageType.REPLICATION_PULL: self.handle_replication_pull,
                 MessageType.ELECTION: self.handle_election,
                 MessageType.ACK: self.handle_election_ack,
                 MessageType.COORDINATOR: self.handle_coordinator_announcement,
+                MessageType.STATS: self.handle_stats,
+                MessageType.SNAPSHOT: self.handle_snapshot,
+                MessageType.ANTI_ENTROPY: self.handle_anti_entropy,
             }
 
+            # Qualquer mensagem de um nó prova que ele está vivo: um nó
+            # ocupado replicando não é dado como falho por atrasar heartbeats
+            self.mark_alive(message.sender_id)
+
             handler = handler_map.get(message.message_type)
-            if handler:
+            if handler and message.message_type in self.DB_MESSAGES:
+                return self.schedule_db_work(handler, message)
+            elif handler:
                 return handler(message)
             else:
                 self.logger.warning(f"Tipo de mensagem desconhecido: {message.message_type}")
@@ -253,36 +450,249 @@ class DistributedDBNode:
 
         return None
     
+    def schedule_db_work(self, handler, message: Message) -> HandlerResult:
+        """
+        Agenda uma mensagem no executor do banco
+
+        Mensagens da mesma transação (PREPARE, COMMIT, ABORT) e REPLICATEs
+        (avulsos ou em lote) do mesmo nó são executados na ordem de chegada. Com a fila cheia,
+        responde na hora com erro em vez de enfileirar sem limite.
+
+        Args:
+            handler: Handler da mensagem
+            message: Mensagem recebida
+
+        Returns:
+            Future da resposta, ou a resposta de sobrecarga
+        """
+        if self.rebuilding:
+            if message.message_type in (MessageType.REPLICATE, MessageType.REPLICATE_BATCH):
+                return None  # Sem ACK: as escritas voltam pelo catch-up depois do snapshot
+            if message.message_type not in (MessageType.COMMIT, MessageType.ABORT):
+                return self.overloaded_response(
+                    message, f"Nó {self.node_id} reconstruindo os dados a partir de um snapshot"
+                )
+        
+        if message.message_type in (MessageType.REPLICATE, MessageType.REPLICATE_BATCH):
+            key = ('replicate', message.sender_id)
+        elif message.message_type in (MessageType.PREPARE, MessageType.COMMIT, MessageType.ABORT):
+            key = ('transaction', message.transaction_id)
+        else:
+            key = None
+        
+        try:
+            future = self.db_executor.submit(
+                self._run_handler, handler, message,
+                key=key, required=message.message_type in self.REQUIRED_MESSAGES
+            )
+        except ExecutorOverloadedError as e:
+            self.logger.warning(f"{message.message_type.value} recusada: {e}")
+            return self.overloaded_response(message, f"Nó {self.node_id} sobrecarregado: {e}")
+        return self._flatten(future)
+    
+    @staticmethod
+    def _flatten(future: Future) -> Future:
+        """
+        Future da resposta final de um handler agendado
+        
+        Um handler que precisa esperar outro evento (ACKs das réplicas)
+        devolve um Future em vez de ocupar a thread do banco; a resposta
+        sai quando ele terminar.
+        """
+        response = Future()
+        
+        def done(current: Future):
+            try:
+                result = current.result()
+            except BaseException as e:
+                response.set_exception(e)
+                return
+            if isinstance(result, Future):
+                result.add_done_callback(done)
+            else:
+                response.set_result(result)
+        
+        future.add_done_callback(done)
+        return response
+    
+    def _run_handler(self, handler, message: Message) -> HandlerResult:
+        try:
+            return handler(message)
+        except Exception as e:
+            self.logger.error(f"Erro ao processar mensagem: {e}", exc_info=True)
+            return None
+    
+    def overloaded_response(self, message: Message, error: str) -> HandlerResult:
+        """Resposta imediata a uma mensagem recusada por sobrecarga"""
+        if message.message_type == MessageType.PREPARE:
+            self.transaction_manager.vote_on_prepare(message.transaction_id, False)
+            return self._send_vote(message, False, error)
+        
+        if message.data and message.data.get('stream'):
+            result = QueryResult(success=False, error=error, node_id=self.node_id)
+            return iter([self._result_chunk(message, 0, result, last=True)])
+        return self.error_response(message, error)
+    
     def handle_heartbeat(self, message: Message):
-        """Processa heartbeat"""
-        sender_id = message.sender_id
+        """
+        Processa heartbeat (a atualização de liveness já foi feita em handle_message)
+
+        O heartbeat anuncia o último LSN do log do remetente; se este nó
+        ficou para trás, agenda o catch-up.
+        """
+        last_lsn = (message.data or {}).get('last_lsn')
+        if self.rebuilding:
+            return
+        if last_lsn and self.replicator.needs_catch_up(message.sender_id, last_lsn):
+            self.schedule_catch_up(message.sender_id)
+    
+    def schedule_catch_up(self, origin_id: int):
+        """
+        Agenda o catch-up das escritas de um nó de origem
+        
+        Roda no executor do banco com a mesma chave dos REPLICATEs da
+        origem, então não se mistura com eles; um catch-up por origem de
+        cada vez.
+        """
+        origin = next((n for n in self.all_nodes if n.node_id == origin_id), None)
+        if origin is None:
+            return
+        with self._catch_up_lock:
+            if origin_id in self._catching_up:
+                return
+            self._catching_up.add(origin_id)
         
-        # Atualiza informação do nó
+        self.logger.info(f"Atrasado em relação ao nó {origin_id} - iniciando catch-up")
+        try:
+            future = self.db_executor.submit(
+                self.replicator.catch_up, origin, key=('replicate', origin_id), required=True
+            )
+        except RuntimeError:
+            self._catching_up.discard(origin_id)  # Executor encerrado
+            return
+        future.add_done_callback(lambda _: self._catching_up.discard(origin_id))
+    
+    def rebuild_from(self, donor_id: int) -> bool:
+        """
+        Substitui os dados deste nó por um snapshot de outro nó
+        
+        Durante a carga, as escritas replicadas recebidas são descartadas
+        sem ACK e as queries recusadas. No fim, a posição de replicação do
+        snapshot é adotada e o catch-up de cada origem busca o que foi
+        escrito depois dele. Se a carga falhar, as tabelas já foram
+        limpas: o nó continua recusando queries e escritas replicadas e
+        tenta de novo, de preferência com outro doador.
+        
+        Args:
+            donor_id: Nó que envia o snapshot
+            
+        Returns:
+            True se o snapshot foi carregado
+        """
+        donor = next((n for n in self.all_nodes if n.node_id == donor_id and n.node_id != self.node_id), None)
+        if donor is None:
+            self.logger.error(f"Nó doador {donor_id} desconhecido")
+            if self.rebuilding:
+                self.retry_rebuild(donor_id)
+            return False
+        if not self._rebuild_lock.acquire(blocking=False):
+            return False  # Já reconstruindo
+        
+        self.rebuilding = True
+        self.logger.warning(f"Reconstruindo os dados a partir de um snapshot do nó {donor_id}")
+        try:
+            positions = self.snapshot_loader.load(donor)
+            self.replicator.reset_positions(positions)
+            self.anti_entropy.reset()
+            self.rebuilding = False  # Só com o snapshot inteiro o nó volta a atender
+        except SnapshotError as e:
+            self.logger.error(f"Snapshot do nó {donor_id} falhou - dados locais incompletos, nó fora de "
+                              f"serviço até a próxima tentativa: {e}")
+            self.retry_rebuild(donor_id)
+            return False
+        finally:
+            self._rebuild_lock.release()
+        
+        for origin in positions:
+            if origin != self.node_id:
+                self.schedule_catch_up(origin)
+        return True
+    
+    def retry_rebuild(self, failed_donor: int):
+        """Agenda outra reconstrução em rebuild_retry_interval, de outro doador ativo se houver"""
+        def retry():
+            if not self.running or not self.rebuilding:
+                return
+            donors = [n for n in self.all_nodes if n.node_id != self.node_id and n.status == NodeStatus.ACTIVE]
+            donor = next((n for n in donors if n.node_id != failed_donor), None) or next(iter(donors), None)
+            self.rebuild_from(donor.node_id if donor else failed_donor)
+        
+        timer = threading.Timer(self.rebuild_retry_interval, retry)
+        timer.daemon = True
+        timer.start()
+    
+    def request_rebuild(self, origin_node: NodeInfo):
+        """Reconstrói este nó em segundo plano (o log da origem não tem mais o que falta)"""
+        if not self.rebuilding:
+            threading.Thread(target=self.rebuild_from, args=(origin_node.node_id,), daemon=True).start()
+    
+    def anti_entropy_peer(self) -> Optional[NodeInfo]:
+        """Nó de referência da anti-entropia: o coordenador (None se for este nó ou estiver inativo)"""
+        coordinator_id = self.coordinator.current_coordinator
+        if self.rebuilding or coordinator_id is None or coordinator_id == self.node_id:
+            return None
+        return next((n for n in self.all_nodes
+                     if n.node_id == coordinator_id and n.status == NodeStatus.ACTIVE), None)
+    
+    def mark_alive(self, sender_id: int):
+        """Registra que o nó acabou de se comunicar"""
         node = next((n for n in self.all_nodes if n.node_id == sender_id), None)
-        if node:
+        if node and node.node_id != self.node_id:
             node.last_heartbeat = datetime.now()
             if node.status != NodeStatus.ACTIVE:
                 self.logger.info(f"Nó {sender_id} voltou a ficar ativo")
                 node.status = NodeStatus.ACTIVE
     
-    def handle_query(self, message: Message) -> Message:
-        """Executa query localmente e retorna a resposta"""
+    def handle_query(self, message: Message):
+        """
+        Executa query localmente e retorna a resposta
+
+        Escritas com consistência síncrona (one, quorum, all) só são
+        respondidas quando réplicas suficientes confirmarem ou o prazo
+        expirar; a resposta volta como Future.
+        """
         query = message.query
         transaction_id = message.transaction_id
+        info = analyze(query)  # Memoizado: a mesma query não é reanalisada
+
+        # SELECT em streaming: resposta em vários RESULT_CHUNK
+        if message.data and message.data.get('stream') and not info.is_write:
+            return self.stream_query(message)
+
+        try:
+            level = self.consistency_of(message)
+        except ValueError as e:
+            return self.error_response(message, str(e))
 
         self.logger.info(f"Executando query local: {query[:50]}...")
 
-        # Executa query
-        success, data, error, rows_affected = self.db_manager.execute_query(query)
+        # Executa query (escritas já saem com o REPLICATE montado e recebem
+        # o LSN antes que outra escrita na mesma tabela faça commit)
+        acks = None
+        if info.is_write:
+            with self.replicator.ordered(query):
+                success, data, error, rows_affected, replicate_msg = self.replicator.execute_write(
+                    query, transaction_id, message.params
+                )
+                if replicate_msg is not None:
+                    acks = self.replicate_write(replicate_msg, level)
+        else:
+            success, data, error, rows_affected = self.db_manager.execute_query(query, message.params)
 
-        # Incrementa contador
+        # Incrementa contador (escritas já foram commitadas: autocommit por query)
         me = next(n for n in self.all_nodes if n.node_id == self.node_id)
         self.load_balancer.increment_query_count(me)
 
-        # Se foi escrita bem-sucedida, commita
-        if success and self.replicator.is_write_query(query):
-            self.db_manager.commit()
-
         # Prepara resposta
         result = QueryResult(
             success=success,
@@ -302,68 +712,295 @@ class DistributedDBNode:
             target_nodes=[message.sender_id]
         )
 
-        # Replica em background (assíncrono em relação ao cliente)
-        if success and self.replicator.is_write_query(query):
+        # Replicada em background; no modo assíncrono responde sem esperar
+        if acks is not None:
+            return self.respond_after_acks(response_msg, acks, level)
+
+        return response_msg
+    
+    def handle_bulk_write(self, message: Message) -> Message:
+        """
+        Aplica uma escrita em lote e a replica como uma unidade
+        
+        O lote inteiro é executado em uma transação (um commit) e enviado
+        aos outros nós em um único REPLICATE, em vez de uma query, um
+        commit e uma replicação por linha.
+        """
+        data = message.data or {}
+        size = len(data.get('rows') or data.get('statements') or [])
+        self.logger.info(f"Executando escrita em lote com {size} itens")
+        
+        try:
+            level = self.consistency_of(message)
+        except ValueError as e:
+            return self.error_response(message, str(e))
+        
+        acks = None
+        if self.replicator.is_bulk(data):
+            with self.replicator.ordered(message.query, data):
+                success, error, rows_affected = self.replicator.apply_bulk(message.query, data)
+                if success:
+                    bulk = {key: data[key] for key in ('rows', 'statements') if key in data}
+                    acks = self.replicate_write(
+                        self.replicator.bulk_message(message.query, bulk, message.transaction_id), level
+                    )
+        else:
+            success, error, rows_affected = False, "BULK_WRITE sem 'rows' ou 'statements'", 0
+        
+        me = next(n for n in self.all_nodes if n.node_id == self.node_id)
+        self.load_balancer.increment_query_count(me)
+        
+        result = QueryResult(success=success, error=error, node_id=self.node_id, rows_affected=rows_affected)
+        response_msg = Message(
+            message_type=MessageType.QUERY_RESPONSE,
+            sender_id=self.node_id,
+            transaction_id=message.transaction_id,
+            data=result.to_dict(),
+            timestamp=datetime.now(),
+            communication_type=CommunicationType.UNICAST,
+            target_nodes=[message.sender_id]
+        )
+        if acks is not None:
+            return self.respond_after_acks(response_msg, acks, level)
+        return response_msg
+    
+    def consistency_of(self, message: Message) -> ConsistencyLevel:
+        """
+        Nível de consistência pedido pela escrita (ou o padrão do nó)
+        
+        Raises:
+            ValueError: Se o nível informado não existe
+        """
+        value = (message.data or {}).get('consistency')
+        if value is None:
+            return self.default_consistency
+        try:
+            return ConsistencyLevel(value)
+        except ValueError:
+            options = ", ".join(level.value for level in ConsistencyLevel)
+            raise ValueError(f"Consistência desconhecida: {value} (use {options})") from None
+    
+    def error_response(self, message: Message, error: str) -> Message:
+        """Resposta de erro a uma QUERY ou BULK_WRITE que não foi executada"""
+        result = QueryResult(success=False, error=error, node_id=self.node_id)
+        return Message(
+            message_type=MessageType.QUERY_RESPONSE,
+            sender_id=self.node_id,
+            transaction_id=message.transaction_id,
+            data=result.to_dict(),
+            timestamp=datetime.now(),
+            communication_type=CommunicationType.UNICAST,
+            target_nodes=[message.sender_id]
+        )
+    
+    def replicate_write(self, replicate_msg: Message,
+                        level: ConsistencyLevel = ConsistencyLevel.ASYNC) -> Optional[Future]:
+        """
+        Grava uma escrita local no log de replicação e a envia aos outros nós
+        
+        Chamado na thread que fez a escrita, dentro de Replicator.ordered,
+        para que a ordem dos LSNs siga a ordem dos commits. Com o batcher,
+        a escrita segue no próximo lote; sem ele, é enviada sozinha por
+        uma thread própria.
+        
+        Args:
+            replicate_msg: Mensagem REPLICATE da escrita
+            level: Consistência pedida pela escrita
+        
+        Returns:
+            Future com o número de ACKs recebidos, se o nível exige
+            confirmações; None no modo assíncrono
+        """
+        acks = None
+        required = level.required_acks(len(self.all_nodes))
+        if required > 0:
+            # Registrado antes do envio: o ACK de uma réplica rápida não se perde
+            if replicate_msg.transaction_id is None:
+                replicate_msg.transaction_id = str(uuid.uuid4())
+            acks = self.replicator.ack_tracker.expect(
+                replicate_msg.transaction_id, required, self.ack_timeout, level.value
+            )
+        
+        if self.replication_batcher is None:
+            self.replicator.record(replicate_msg)
             threading.Thread(
-                target=self.replicator.replicate_query,
-                args=(query, transaction_id, self.all_nodes),
+                target=self.replicator.ship,
+                args=(replicate_msg, self.all_nodes),
                 daemon=True
             ).start()
+            return acks
+        
+        with self._replicate_lock:
+            self.replicator.record(replicate_msg)
+            self.replication_batcher.add(replicate_msg)
+        return acks
+    
+    def respond_after_acks(self, response_msg: Message, acks: Future, level: ConsistencyLevel) -> Future:
+        """
+        Responde à escrita quando W réplicas confirmarem
+        
+        Se o prazo expirar (ou não houver réplicas alcançáveis suficientes),
+        o cliente recebe um erro: a escrita foi aplicada neste nó e segue
+        sendo replicada, mas não atingiu a durabilidade pedida.
+        """
+        required = level.required_acks(len(self.all_nodes))
+        response = Future()
+        
+        def done(future: Future):
+            confirmed = future.result()
+            if confirmed < required:
+                response_msg.data = dict(
+                    response_msg.data,
+                    success=False,
+                    error=(f"Escrita aplicada no nó {self.node_id}, mas confirmada por {confirmed} "
+                           f"de {required} réplicas (consistência {level.value})")
+                )
+            response.set_result(response_msg)
+        
+        acks.add_done_callback(done)
+        return response
+    
+    def stream_query(self, message: Message) -> Iterator[Message]:
+        """
+        Executa um SELECT em streaming, gerando um RESULT_CHUNK por lote
 
-        return response_msg
+        O servidor de sockets só pede o próximo lote depois de enviar o
+        anterior, então a memória fica limitada a um lote. O último chunk
+        tem 'last': True e traz o total de linhas (ou o erro).
+
+        Cada lote é lido por uma tarefa no executor do banco, como as
+        outras queries, e não na thread da conexão: o primeiro passa pela
+        admissão (fila cheia: erro imediato) e os seguintes, de um stream
+        já aceito, entram mesmo com a fila cheia.
+        """
+        fetch_size = message.data.get('fetch_size') or self.stream_fetch_size
+        me = next(n for n in self.all_nodes if n.node_id == self.node_id)
+        self.load_balancer.increment_query_count(me)
+
+        seq = 0
+        total = 0
+        chunks = self.db_manager.stream_query(message.query, message.params, fetch_size=fetch_size)
+        try:
+            while True:
+                try:
+                    chunk = self.db_executor.submit(next, chunks, None, required=seq > 0).result()
+                except ExecutorOverloadedError as e:
+                    self.logger.warning(f"Query em streaming recusada: {e}")
+                    final = QueryResult(success=False, error=f"Nó {self.node_id} sobrecarregado: {e}",
+                                        node_id=self.node_id, rows_affected=total)
+                    break
+                if chunk is None:
+                    final = QueryResult(success=True, node_id=self.node_id, rows_affected=total)
+                    break
+                total += len(chunk)
+                result = QueryResult(success=True, data=chunk, node_id=self.node_id, rows_affected=len(chunk))
+                yield self._result_chunk(message, seq, result, last=False)
+                seq += 1
+        except Exception as e:
+            self.logger.error(f"Erro no streaming da query: {e}")
+            final = QueryResult(success=False, error=str(e), node_id=self.node_id, rows_affected=total)
+        finally:
+            chunks.close()  # Devolve a conexão ao pool, também se o cliente desistiu
+
+        yield self._result_chunk(message, seq, final, last=True)
+
+    def _result_chunk(self, request: Message, seq: int, result: QueryResult, last: bool) -> Message:
+        """Monta um RESULT_CHUNK da resposta a uma query em streaming"""
+        data = result.to_dict()
+        data['seq'] = seq
+        data['last'] = last
+        return Message(
+            message_type=MessageType.RESULT_CHUNK,
+            sender_id=self.node_id,
+            transaction_id=request.transaction_id,
+            data=data,
+            timestamp=datetime.now(),
+            communication_type=CommunicationType.UNICAST,
+            target_nodes=[request.sender_id]
+        )
     
     def handle_prepare(self, message: Message):
         """Fase PREPARE do 2PC"""
         transaction_id = message.transaction_id
         query = message.query
         
-        # Tenta preparar transação
-        self.db_manager.begin_transaction()
-        success, _, error, _ = self.db_manager.execute_query(query)
+        # Tenta preparar transação (fica presa a uma conexão até COMMIT/ABORT)
+        if self.db_manager.begin_transaction(transaction_id):
+            success, _, error, _ = self.db_manager.execute_query(query, message.params, transaction_id=transaction_id)
+            if success:
+                self.anti_entropy.query_written(query)  # Fora do log de replicação: relida por inteiro
+        else:
+            success, error = False, "Não foi possível iniciar a transação"
         
         # Vota
         vote = success
         self.transaction_manager.vote_on_prepare(transaction_id, vote)
-        
-        # Envia voto
+        return self._send_vote(message, vote, error)
+    
+    def _send_vote(self, message: Message, vote: bool, error: Optional[str]) -> Optional[Message]:
+        """Envia o voto de um PREPARE"""
         vote_msg = Message(
             message_type=MessageType.ACK,
             sender_id=self.node_id,
-            transaction_id=transaction_id,
+            transaction_id=message.transaction_id,
             data={'vote': vote, 'error': error},
             timestamp=datetime.now(),
             communication_type=CommunicationType.UNICAST,
             target_nodes=[message.sender_id]
         )
         
+        # PREPARE via RPC: o voto volta como resposta na mesma conexão
+        if message.request_id is not None:
+            return vote_msg
+        
         self.send_message_wrapper(vote_msg, self.all_nodes)
+        return None
     
     def handle_commit(self, message: Message):
         """Fase COMMIT do 2PC"""
-        self.db_manager.commit()
+        self.db_manager.commit(message.transaction_id)
         self.logger.info(f"Transação {message.transaction_id} commitada")
     
     def handle_abort(self, message: Message):
         """Fase ABORT do 2PC"""
-        self.db_manager.rollback()
+        self.db_manager.rollback(message.transaction_id)
         self.logger.info(f"Transação {message.transaction_id} abortada")
     
     def handle_replicate(self, message: Message):
         """Processa requisição de replicação"""
-        success = self.replicator.handle_replication_request(message)
-        
-        if success:
-            self.db_manager.commit()
-        else:
-            self.db_manager.rollback()
-        
-        # Envia ACK
-        self.replicator.send_replication_ack(
-            message.transaction_id,
-            message.sender_id,
-            success,
-            self.all_nodes
-        )
+        # A query replicada é commitada (autocommit) ao ser executada; uma
+        # mensagem fora de ordem fica guardada e é confirmada quando aplicada
+        self.replicator.submit_batch([message]).add_done_callback(self._ack_applied)
+    
+    def handle_replicate_batch(self, message: Message):
+        """Aplica um lote de escritas de outro nó e confirma com um ACK"""
+        entries = (message.data or {}).get('entries') or []
+        batch = [self.replicator.decode_entry(entry) for entry in entries]
+        self.replicator.submit_batch(batch).add_done_callback(self._ack_applied)
+    
+    def _ack_applied(self, future):
+        """
+        Confirma as escritas replicadas quando terminam de ser aplicadas
+
+        Com aplicação em paralelo, o handler só agenda as escritas e libera
+        a vez para a próxima mensagem da origem; o ACK sai da thread que
+        terminou de aplicá-las.
+        """
+        self.replicator.send_replication_acks(future.result(), self.all_nodes)
+    
+    def handle_replication_pull(self, message: Message) -> Message:
+        """Responde a um pedido de catch-up com registros do log de replicação"""
+        return self.replicator.serve_pull(message)
+    
+    def handle_snapshot(self, message: Message) -> HandlerResult:
+        """Atende um nó que está copiando os dados deste (SNAPSHOT begin/chunk/end)"""
+        return self.snapshot_donor.handle(message)
+    
+    def handle_anti_entropy(self, message: Message) -> HandlerResult:
+        """Atende uma réplica comparando as árvores de Merkle com as deste nó"""
+        if self.rebuilding:
+            return self.anti_entropy.reply(message, {'error': f"Nó {self.node_id} reconstruindo os dados"})
+        return self.anti_entropy.handle(message)
     
     def handle_replicate_ack(self, message: Message):
         """Processa ACK de replicação"""
@@ -381,19 +1018,61 @@ class DistributedDBNode:
         """Processa anúncio de coordenador"""
         self.coordinator.handle_coordinator_announcement(message)
     
+    def collect_stats(self) -> dict:
+        """Reúne as métricas do nó"""
+        return {
+            'node_id': self.node_id,
+            'is_coordinator': self.coordinator.is_coordinator,
+            'db_pool': self.db_manager.get_pool_stats(),
+            'db_executor': self.db_executor.get_stats(),
+            'statement_cache': self.db_manager.get_statement_cache_stats(),
+            'query_cache': self.db_manager.get_query_cache_stats(),
+            'sql_analysis': analysis_cache_stats(),
+            'replication': self.replicator.get_replication_stats(),
+            'replication_batcher': self.replication_batcher.get_stats() if self.replication_batcher else None,
+            'anti_entropy': self.anti_entropy.get_stats(),
+            'snapshot': {
+                'rebuilding': self.rebuilding,
+                'donor': self.snapshot_donor.get_stats(),
+                'last_load': self.snapshot_loader.stats or None
+            },
+            'peer_connections': self.socket_client.pool.get_stats(),
+            'control_connections': self.socket_client.control_pool.get_stats()
+        }
+    
+    def handle_stats(self, message: Message) -> Message:
+        """Responde com as métricas do nó"""
+        return Message(
+            message_type=MessageType.STATS,
+            sender_id=self.node_id,
+            data=self.collect_stats(),
+            timestamp=datetime.now(),
+            communication_type=CommunicationType.UNICAST,
+            target_nodes=[message.sender_id]
+        )
+    
     def send_message_wrapper(self, message: Message, all_nodes: List[NodeInfo]) -> int:
         """Wrapper para enviar mensagens"""
         return self.socket_client.send_by_type(message, all_nodes, self.node_id)
+    
+    def send_message_detailed_wrapper(self, message: Message, all_nodes: List[NodeInfo]) -> Dict[int, DeliveryStatus]:
+        """Wrapper para enviar mensagens retornando o resultado por nó"""
+        return self.socket_client.send_by_type_detailed(message, all_nodes, self.node_id)
 
 
 def main():
     parser = argparse.ArgumentParser(description='Servidor de Nó do DDB')
     parser.add_argument('--config', required=True, help='Arquivo de configuração JSON')
     parser.add_argument('--node-id', type=int, required=True, help='ID do nó')
+    parser.add_argument('--server-mode', choices=['threaded', 'asyncio'],
+                        help='Implementação do servidor de sockets (padrão: config ou threaded)')
+    parser.add_argument('--bootstrap-from', type=int, metavar='NODE_ID',
+                        help='Carrega os dados de um snapshot deste nó antes de aplicar a replicação')
     
     args = parser.parse_args()
     
-    node = DistributedDBNode(args.config, args.node_id)
+    node = DistributedDBNode(args.config, args.node_id, args.server_mode)
+    node.bootstrap_from = args.bootstrap_from
     node.initialize_components()
     node.start()
 
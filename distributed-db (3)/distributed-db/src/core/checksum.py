@@ -1,6 +1,7 @@
 import hashlib
 import json
 from typing import Any
+from .result_set import to_json_value
 
 
 class ChecksumValidator:
@@ -18,7 +19,7 @@ class ChecksumValidator:
             String hexadecimal do checksum
         """
         if isinstance(data, (dict, list)):
-            data_str = json.dumps(data, sort_keys=True)
+            data_str = json.dumps(data, sort_keys=True, default=to_json_value)
         else:
             data_str = str(data)
         
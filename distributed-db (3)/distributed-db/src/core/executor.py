@@ -0,0 +1,191 @@
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional
+
+
+class ExecutorOverloadedError(RuntimeError):
+    """A fila do executor está cheia: a tarefa foi recusada"""
+
+
+class _Task:
+    """Tarefa na fila e os metadados usados nas métricas"""
+
+    __slots__ = ('future', 'fn', 'args', 'key', 'enqueued_at')
+
+    def __init__(self, fn: Callable, args: tuple, key: Optional[Hashable]):
+        self.future = Future()
+        self.fn = fn
+        self.args = args
+        self.key = key
+        self.enqueued_at = time.monotonic()
+
+
+class BoundedExecutor:
+    """
+    Pool de threads com fila limitada e ordem por chave
+
+    Diferente do ThreadPoolExecutor, cuja fila cresce sem limite, recusa
+    novas tarefas com ExecutorOverloadedError quando já há `max_queue`
+    esperando: sob sobrecarga o cliente recebe um erro imediato em vez de
+    esperar atrás de uma fila que só aumenta. Tarefas `required` (ex.:
+    COMMIT, ABORT e replicação, que não podem ser perdidas) entram mesmo
+    com a fila cheia.
+
+    Tarefas com a mesma `key` executam uma de cada vez, na ordem de
+    submissão (ex.: PREPARE e COMMIT de uma transação); chaves diferentes
+    executam em paralelo.
+    """
+
+    def __init__(self, max_workers: int = 10, max_queue: int = 256, name: str = 'executor'):
+        if max_workers < 1:
+            raise ValueError("max_workers deve ser ao menos 1")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.name = name
+        self.logger = logging.getLogger(__name__)
+
+        self._cond = threading.Condition()
+        self._ready: Deque[_Task] = deque()  # Prontas para executar
+        self._waiting: Dict[Hashable, Deque[_Task]] = {}  # Chave em execução -> tarefas atrás dela
+        self._queued = 0  # Prontas + esperando a chave
+        self._workers: List[threading.Thread] = []
+        self._idle_workers = 0
+        self._shutdown = False
+
+        # Métricas
+        self._active = 0
+        self._submitted = 0
+        self._completed = 0
+        self._rejected = 0
+        self._max_queued = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        """Tarefas aguardando uma thread livre"""
+        return self._queued
+
+    def submit(self, fn: Callable, *args: Any, key: Optional[Hashable] = None,
+               required: bool = False) -> Future:
+        """
+        Agenda fn(*args) e retorna o Future do resultado
+
+        Args:
+            fn: Função a executar
+            *args: Argumentos de fn
+            key: Tarefas com a mesma chave executam em ordem, uma por vez
+            required: Aceita mesmo com a fila cheia
+
+        Returns:
+            Future com o resultado (ou a exceção) de fn
+
+        Raises:
+            ExecutorOverloadedError: Se a fila estiver cheia
+            RuntimeError: Se o executor já foi encerrado
+        """
+        task = _Task(fn, args, key)
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError(f"Executor {self.name} encerrado")
+            if not required and self._queued >= self.max_queue:
+                self._rejected += 1
+                raise ExecutorOverloadedError(
+                    f"Fila do executor {self.name} cheia ({self._queued} tarefas aguardando)"
+                )
+
+            self._submitted += 1
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+            if key is not None and key in self._waiting:
+                self._waiting[key].append(task)  # Mesma chave em execução: espera a vez
+            else:
+                if key is not None:
+                    self._waiting[key] = deque()
+                self._ready.append(task)
+                self._wake_worker()
+        return task.future
+
+    def _wake_worker(self):
+        """Acorda uma thread ociosa ou cria outra, até max_workers (com o lock)"""
+        if self._idle_workers > 0:
+            self._cond.notify()
+        elif len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._work, name=f"{self.name}-{len(self._workers)}", daemon=True
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._ready and not self._shutdown:
+                    self._idle_workers += 1
+                    self._cond.wait()
+                    self._idle_workers -= 1
+                if not self._ready:
+                    return  # Encerrado e sem tarefas pendentes
+                task = self._ready.popleft()
+                self._queued -= 1
+                self._active += 1
+                waited = time.monotonic() - task.enqueued_at
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+            if task.future.set_running_or_notify_cancel():
+                try:
+                    result = task.fn(*task.args)
+                except BaseException as e:
+                    task.future.set_exception(e)
+                else:
+                    task.future.set_result(result)
+
+            with self._cond:
+                self._active -= 1
+                self._completed += 1
+                if task.key is not None:
+                    # Libera a próxima tarefa da mesma chave
+                    pending = self._waiting[task.key]
+                    if pending:
+                        self._ready.append(pending.popleft())
+                        self._wake_worker()
+                    else:
+                        del self._waiting[task.key]
+
+    def shutdown(self, wait: bool = True):
+        """
+        Encerra o executor após as tarefas já aceitas
+
+        Args:
+            wait: Aguarda as threads terminarem
+        """
+        with self._cond:
+            self._shutdown = True
+            workers = list(self._workers)
+            self._cond.notify_all()
+        if wait:
+            for worker in workers:
+                if worker is not threading.current_thread():
+                    worker.join()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna métricas do executor"""
+        with self._cond:
+            started = self._completed + self._active
+            return {
+                'workers': len(self._workers),
+                'max_workers': self.max_workers,
+                'active': self._active,
+                'queued': self._queued,
+                'max_queue': self.max_queue,
+                'max_queued': self._max_queued,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'avg_queue_ms': (self._wait_total / started * 1000) if started else 0.0,
+                'max_queue_ms': self._wait_max * 1000
+            }
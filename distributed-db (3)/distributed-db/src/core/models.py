@@ -3,6 +3,7 @@ from dataclasses import dataclass
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 import json
+from .result_set import ResultSet, to_json_value
 
 
 class MessageType(Enum):
@@ -19,6 +20,22 @@ class MessageType(Enum):
     COMMIT = "COMMIT"
     ABORT = "ABORT"
     ACK = "ACK"
+    RESULT_CHUNK = "RESULT_CHUNK"  # Lote de um SELECT em streaming
+    STATS = "STATS"  # Métricas do nó (pools, filas)
+    BULK_WRITE = "BULK_WRITE"  # Várias linhas/statements aplicados em uma transação
+    REPLICATION_PULL = "REPLICATION_PULL"  # Pedido de um intervalo do log de replicação
+    REPLICATE_BATCH = "REPLICATE_BATCH"  # Registros do log de replicação (resposta ao PULL)
+    SNAPSHOT = "SNAPSHOT"  # Cópia das tabelas de um nó doador, em trechos (pedido e resposta)
+    ANTI_ENTROPY = "ANTI_ENTROPY"  # Comparação das árvores de Merkle entre réplicas (pedido e resposta)
+
+
+# Plano de controle (liveness, eleição, votos e métricas): mensagens
+# pequenas que usam conexões e threads próprias para não esperar atrás de
+# queries e replicação quando o nó está saturado
+CONTROL_MESSAGE_TYPES = frozenset((
+    MessageType.HEARTBEAT, MessageType.HEARTBEAT_ACK, MessageType.ELECTION,
+    MessageType.COORDINATOR, MessageType.ACK, MessageType.STATS
+))
 
 
 class NodeStatus(Enum):
@@ -36,6 +53,41 @@ class CommunicationType(Enum):
     MULTICAST = "MULTICAST"
 
 
+class DeliveryStatus(Enum):
+    """Resultado da entrega de uma mensagem a um nó"""
+    DELIVERED = "DELIVERED"
+    TIMED_OUT = "TIMED_OUT"
+    REFUSED = "REFUSED"
+    FAILED = "FAILED"
+
+
+class ConsistencyLevel(Enum):
+    """Confirmações de réplicas esperadas antes de responder a uma escrita"""
+    ASYNC = "async"  # Responde sem esperar a replicação
+    ONE = "one"  # Ao menos uma réplica aplicou a escrita
+    QUORUM = "quorum"  # A maioria do cluster, contando este nó, tem a escrita
+    ALL = "all"  # Todas as réplicas aplicaram a escrita
+
+    def required_acks(self, cluster_size: int) -> int:
+        """
+        Número de REPLICATE_ACKs (W) que a escrita precisa
+
+        Args:
+            cluster_size: Nós do cluster, incluindo o que recebeu a escrita
+
+        Returns:
+            ACKs de réplicas a esperar (0 no modo assíncrono)
+        """
+        replicas = max(cluster_size - 1, 0)
+        if self is ConsistencyLevel.ONE:
+            return min(1, replicas)
+        if self is ConsistencyLevel.QUORUM:
+            return cluster_size // 2  # Maioria = cluster_size // 2 + 1, e este nó já conta
+        if self is ConsistencyLevel.ALL:
+            return replicas
+        return 0
+
+
 @dataclass
 class NodeInfo:
     """Informações de um nó do DDB"""
@@ -80,10 +132,12 @@ class Message:
     timestamp: Optional[datetime] = None
     communication_type: CommunicationType = CommunicationType.UNICAST
     target_nodes: Optional[List[int]] = None
+    request_id: Optional[int] = None  # Correlaciona requisição e resposta em conexões multiplexadas
+    params: Optional[List[Any]] = None  # Valores dos placeholders (%s) da query
     
-    def to_json(self) -> str:
-        """Serializa mensagem para JSON"""
-        return json.dumps({
+    def to_dict(self) -> Dict[str, Any]:
+        """Converte mensagem para dicionário serializável"""
+        return {
             'message_type': self.message_type.value,
             'sender_id': self.sender_id,
             'transaction_id': self.transaction_id,
@@ -92,13 +146,14 @@ class Message:
             'checksum': self.checksum,
             'timestamp': self.timestamp.isoformat() if self.timestamp else None,
             'communication_type': self.communication_type.value,
-            'target_nodes': self.target_nodes
-        })
+            'target_nodes': self.target_nodes,
+            'request_id': self.request_id,
+            'params': self.params
+        }
     
     @classmethod
-    def from_json(cls, json_str: str) -> 'Message':
-        """Deserializa mensagem do JSON"""
-        data = json.loads(json_str)
+    def from_dict(cls, data: Dict[str, Any]) -> 'Message':
+        """Cria mensagem a partir de um dicionário já decodificado"""
         return cls(
             message_type=MessageType(data['message_type']),
             sender_id=data['sender_id'],
@@ -108,8 +163,19 @@ class Message:
             checksum=data.get('checksum'),
             timestamp=datetime.fromisoformat(data['timestamp']) if data.get('timestamp') else None,
             communication_type=CommunicationType(data.get('communication_type', 'UNICAST')),
-            target_nodes=data.get('target_nodes')
+            target_nodes=data.get('target_nodes'),
+            request_id=data.get('request_id'),
+            params=data.get('params')
         )
+    
+    def to_json(self) -> str:
+        """Serializa mensagem para JSON"""
+        return json.dumps(self.to_dict(), default=to_json_value)
+    
+    @classmethod
+    def from_json(cls, json_str: str) -> 'Message':
+        """Deserializa mensagem do JSON"""
+        return cls.from_dict(json.loads(json_str))
 
 
 @dataclass
@@ -131,7 +197,7 @@ class Transaction:
 class QueryResult:
     """Resultado de uma query"""
     success: bool
-    data: Optional[List[Dict[str, Any]]] = None
+    data: Optional[ResultSet] = None
     error: Optional[str] = None
     node_id: Optional[int] = None
     execution_time: Optional[float] = None
@@ -140,9 +206,24 @@ class QueryResult:
     def to_dict(self) -> Dict[str, Any]:
         return {
             'success': self.success,
-            'data': self.data,
+            'data': self.data.to_dict() if isinstance(self.data, ResultSet) else self.data,
             'error': self.error,
             'node_id': self.node_id,
             'execution_time': self.execution_time,
             'rows_affected': self.rows_affected
         }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'QueryResult':
+        """Reconstrói o resultado recebido, com os dados em formato tabular"""
+        rows = data.get('data')
+        if ResultSet.is_result_set_dict(rows):
+            rows = ResultSet.from_dict(rows)
+        return cls(
+            success=data.get('success', False),
+            data=rows,
+            error=data.get('error'),
+            node_id=data.get('node_id'),
+            execution_time=data.get('execution_time'),
+            rows_affected=data.get('rows_affected')
+        )
@@ -0,0 +1,188 @@
+import base64
+from collections.abc import Mapping
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+
+# Tipos lógicos das colunas, independentes do SGBD
+TYPE_INT = 'int'
+TYPE_FLOAT = 'float'
+TYPE_DECIMAL = 'decimal'
+TYPE_STR = 'str'
+TYPE_DATETIME = 'datetime'
+TYPE_DATE = 'date'
+TYPE_TIME = 'time'
+TYPE_BYTES = 'bytes'
+TYPE_UNKNOWN = 'unknown'
+
+
+def to_json_value(value: Any) -> Any:
+    """
+    Converte valores que o JSON não suporta (hook `default` do json.dumps)
+
+    A conversão inversa é feita sob demanda pelo Row, a partir do tipo da
+    coluna, então o formato é estável e não depende de str().
+    """
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"Tipo não serializável em JSON: {type(value).__name__}")
+
+
+def _convert(value: Any, column_type: str) -> Any:
+    """Restaura o tipo original de um valor que passou por JSON"""
+    if value is None:
+        return None
+    if column_type == TYPE_DATETIME and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if column_type == TYPE_DATE and isinstance(value, str):
+        return date.fromisoformat(value)
+    if column_type == TYPE_DECIMAL and isinstance(value, (str, int, float)):
+        return Decimal(str(value))
+    if column_type == TYPE_TIME and isinstance(value, (int, float)):
+        return timedelta(seconds=value)
+    if column_type == TYPE_BYTES and isinstance(value, str):
+        return base64.b64decode(value)
+    return value
+
+
+def infer_type(value: Any) -> str:
+    """Infere o tipo lógico de uma coluna a partir de um valor"""
+    if isinstance(value, int):
+        return TYPE_INT
+    if isinstance(value, float):
+        return TYPE_FLOAT
+    if isinstance(value, Decimal):
+        return TYPE_DECIMAL
+    if isinstance(value, str):
+        return TYPE_STR
+    if isinstance(value, datetime):
+        return TYPE_DATETIME
+    if isinstance(value, date):
+        return TYPE_DATE
+    if isinstance(value, timedelta):
+        return TYPE_TIME
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return TYPE_BYTES
+    return TYPE_UNKNOWN
+
+
+class Row(Mapping):
+    """
+    Visão de uma linha de um ResultSet
+
+    Permite acesso por nome de coluna (row['email']) ou por posição
+    (row[0]) sem materializar um dicionário por linha. A conversão de
+    tipos (ex.: datetime serializado como texto) é feita no acesso.
+    """
+
+    __slots__ = ('_result_set', '_values')
+
+    def __init__(self, result_set: 'ResultSet', values: Sequence[Any]):
+        self._result_set = result_set
+        self._values = values
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            index = key
+        else:
+            index = self._result_set.column_index[key]
+        return _convert(self._values[index], self._result_set.types[index])
+
+    def __iter__(self):
+        return iter(self._result_set.columns)
+
+    def __len__(self):
+        return len(self._values)
+
+    def values_tuple(self) -> tuple:
+        """Valores da linha já convertidos, na ordem das colunas"""
+        types = self._result_set.types
+        return tuple(_convert(value, types[i]) for i, value in enumerate(self._values))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class ResultSet:
+    """
+    Resultado de um SELECT em formato tabular
+
+    Em vez de uma lista de dicionários (que repete o nome de cada coluna
+    em toda linha), guarda um cabeçalho com nomes e tipos das colunas e as
+    linhas como tuplas, exatamente como vêm de um cursor não-dicionário.
+    """
+
+    def __init__(self, columns: List[str], types: List[str], rows: List[Sequence[Any]]):
+        self.columns = list(columns)
+        self.types = list(types)
+        self.rows = rows
+        self._column_index: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def from_rows(cls, columns: List[str], rows: List[Sequence[Any]],
+                  types: Optional[List[Optional[str]]] = None) -> 'ResultSet':
+        """
+        Cria ResultSet inferindo os tipos que o driver não informou
+
+        Args:
+            columns: Nomes das colunas
+            rows: Linhas como tuplas
+            types: Tipos conhecidos (None onde for preciso inferir)
+        """
+        types = list(types) if types else [None] * len(columns)
+        for index, column_type in enumerate(types):
+            if column_type is None or column_type == TYPE_UNKNOWN:
+                sample = next((row[index] for row in rows if row[index] is not None), None)
+                types[index] = infer_type(sample) if sample is not None else TYPE_UNKNOWN
+        return cls(columns, types, rows)
+
+    @property
+    def column_index(self) -> Dict[str, int]:
+        if self._column_index is None:
+            self._column_index = {name: i for i, name in enumerate(self.columns)}
+        return self._column_index
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        for values in self.rows:
+            yield Row(self, values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Row(self, values) for values in self.rows[index]]
+        return Row(self, self.rows[index])
+
+    def __bool__(self):
+        return bool(self.rows)
+
+    def as_dicts(self) -> List[Dict[str, Any]]:
+        """Materializa as linhas como dicionários (formato antigo)"""
+        return [dict(row.items()) for row in self]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'columns': self.columns,
+            'types': self.types,
+            'rows': self.rows
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ResultSet':
+        return cls(data['columns'], data.get('types') or [TYPE_UNKNOWN] * len(data['columns']), data['rows'])
+
+    @staticmethod
+    def is_result_set_dict(data: Any) -> bool:
+        return isinstance(data, dict) and 'columns' in data and 'rows' in data
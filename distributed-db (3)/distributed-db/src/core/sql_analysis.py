@@ -0,0 +1,413 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+
+# Tipos de statement
+KIND_SELECT = 'SELECT'
+KIND_INSERT = 'INSERT'
+KIND_UPDATE = 'UPDATE'
+KIND_DELETE = 'DELETE'
+KIND_REPLACE = 'REPLACE'
+KIND_OTHER = 'OTHER'
+
+WRITE_KINDS = frozenset((
+    KIND_INSERT, KIND_UPDATE, KIND_DELETE, KIND_REPLACE,
+    'CREATE', 'DROP', 'ALTER', 'TRUNCATE', 'RENAME', 'LOAD', 'CALL'
+))
+ROW_KINDS = frozenset((KIND_SELECT, 'SHOW', 'DESCRIBE', 'EXPLAIN', 'TABLE', 'VALUES'))
+_KNOWN_KINDS = WRITE_KINDS | ROW_KINDS | frozenset((
+    'SET', 'USE', 'START', 'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'LOCK', 'UNLOCK',
+    'GRANT', 'REVOKE', 'ANALYZE', 'OPTIMIZE', 'FLUSH', 'KILL', 'DO', 'HANDLER', 'PREPARE', 'EXECUTE'
+))
+_KIND_ALIASES = {'DESC': 'DESCRIBE'}
+_CTE_BODY_KINDS = frozenset((KIND_SELECT, KIND_INSERT, KIND_UPDATE, KIND_DELETE, KIND_REPLACE))
+
+_LEXER_RE = re.compile(r"""
+    (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<quoted>`(?:[^`]|``)*`)
+  | (?P<comment>--(?:[ \t][^\n]*)?(?=\n|$)|\#[^\n]*|/\*.*?\*/)
+  | (?P<placeholder>%s|\?)
+  | (?P<number>\b(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)\b|\.\d+\b)
+  | (?P<word>[^\W\d]\w*|\d+\w*)
+  | (?P<space>\s+)
+  | (?P<symbol>.)
+""", re.VERBOSE | re.DOTALL)
+
+# Tabelas seguem estas palavras-chave
+_TABLE_KEYWORDS = frozenset(('FROM', 'JOIN', 'INTO', 'UPDATE', 'TABLE', 'TRUNCATE'))
+_LIST_KEYWORDS = frozenset(('FROM', 'UPDATE'))  # Aceitam várias tabelas separadas por vírgula
+_CLAUSE_KEYWORDS = frozenset((
+    'WHERE', 'JOIN', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'CROSS', 'NATURAL', 'STRAIGHT_JOIN',
+    'ON', 'USING', 'GROUP', 'ORDER', 'LIMIT', 'HAVING', 'SET', 'UNION', 'FOR', 'WINDOW',
+    'PARTITION', 'VALUES', 'VALUE', 'SELECT', 'LOCK', 'USE', 'FORCE', 'IGNORE', 'INTO', 'AS',
+    'DUAL', 'LATERAL'
+))
+
+# Funções cujo resultado muda a cada execução (ou depende da sessão)
+_NON_DETERMINISTIC_CALLS = frozenset((
+    'NOW', 'CURDATE', 'CURTIME', 'SYSDATE', 'UNIX_TIMESTAMP', 'RAND', 'UUID', 'UUID_SHORT',
+    'CONNECTION_ID', 'LAST_INSERT_ID', 'FOUND_ROWS', 'ROW_COUNT', 'USER', 'SESSION_USER',
+    'SYSTEM_USER', 'DATABASE', 'SCHEMA', 'SLEEP', 'GET_LOCK', 'RELEASE_LOCK', 'IS_FREE_LOCK',
+    'RANDOM_BYTES', 'BENCHMARK'
+))
+_NON_DETERMINISTIC_WORDS = frozenset((
+    'CURRENT_DATE', 'CURRENT_TIME', 'CURRENT_TIMESTAMP', 'CURRENT_USER', 'LOCALTIME',
+    'LOCALTIMESTAMP', 'UTC_DATE', 'UTC_TIME', 'UTC_TIMESTAMP'
+))
+
+# Listas de literais que variam de tamanho: IN (...) e as linhas de VALUES
+_IN_LIST_RE = re.compile(r"(\b(?:in|values?)\s*)\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_REPEATED_ROWS_RE = re.compile(r"(\bvalues?\s*)(\([^()]*\))(?:\s*,\s*\2)+")
+
+ANALYSIS_CACHE_SIZE = 4096
+
+
+@dataclass(frozen=True)
+class StatementInfo:
+    """Resultado da análise de uma query"""
+    kind: str                  # SELECT, INSERT, ..., ou OTHER
+    tables: FrozenSet[str]     # Tabelas referenciadas (minúsculas, sem schema)
+    fingerprint: str           # Query normalizada com literais trocados por '?'
+    is_write: bool             # Altera dados ou esquema (precisa de replicação)
+    returns_rows: bool         # Produz um result set
+    deterministic: bool        # Mesmo resultado a cada execução com os mesmos dados
+
+
+@dataclass(frozen=True)
+class RowTarget:
+    """Escrita em uma tabela só, cujas linhas alteradas podem ser capturadas"""
+    kind: str                  # INSERT, UPDATE ou DELETE
+    table: str                 # Tabela alterada (minúscula, sem schema)
+    where: str                 # Condição após o WHERE, como no texto ('' = todas as linhas)
+    where_params: int          # Posição, nos params, do primeiro placeholder da condição
+    columns: FrozenSet[str]    # Colunas atribuídas (SET do UPDATE, lista do INSERT)
+
+
+# Tornam a captura de linhas imprecisa: várias tabelas, subconjunto
+# ordenado, INSERT de um SELECT ou com atualização em conflito
+_ROW_TARGET_BLOCKERS = frozenset((
+    'JOIN', 'USING', 'ORDER', 'LIMIT', 'SELECT', 'DUPLICATE', 'CONFLICT', 'RETURNING', 'WITH', 'PARTITION'
+))
+_ROW_TARGET_MODIFIERS = frozenset(('LOW_PRIORITY', 'DELAYED', 'HIGH_PRIORITY', 'QUICK', 'IGNORE'))
+
+
+def _tokenize(query: str) -> List[Tuple[str, str]]:
+    return [(match.lastgroup, match.group()) for match in _LEXER_RE.finditer(query)]
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Normaliza o texto da query (ex.: para chave de cache)
+
+    Remove comentários, junta espaços em branco e o ';' final, preservando
+    literais e identificadores entre aspas.
+    """
+    parts = []
+    for token_type, text in _tokenize(query):
+        if token_type in ('space', 'comment'):
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+        else:
+            parts.append(text)
+    return ''.join(parts).strip().rstrip(';').rstrip()
+
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def to_qmark(query: str) -> str:
+    """
+    Troca os placeholders %s (estilo format) por ? (estilo qmark)
+
+    Só placeholders fora de literais e comentários são trocados; '%%'
+    vira '%'. Memoizado como analyze().
+    """
+    parts = []
+    percent = False  # Último token foi um '%' isolado
+    for token_type, text in _tokenize(query):
+        if token_type == 'placeholder':
+            parts.append('?')
+        elif token_type == 'symbol' and text == '%' and percent:
+            percent = False  # Segundo '%' de um '%%'
+            continue
+        else:
+            percent = token_type == 'symbol' and text == '%'
+            parts.append(text)
+    return ''.join(parts)
+
+
+def _fingerprint(tokens: List[Tuple[str, str]]) -> str:
+    parts = []
+    for token_type, text in tokens:
+        if token_type in ('space', 'comment'):
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+        elif token_type in ('string', 'number', 'placeholder'):
+            parts.append('?')
+        elif token_type == 'quoted':
+            parts.append(text.strip('`').lower())
+        else:
+            parts.append(text.lower())
+    fingerprint = ''.join(parts).strip().rstrip(';').rstrip()
+    fingerprint = _REPEATED_ROWS_RE.sub(r'\1\2', fingerprint)
+    return _IN_LIST_RE.sub(r'\1(?+)', fingerprint)
+
+
+def _statement_kind(words: List[str], depths: List[int]) -> str:
+    for index, word in enumerate(words):
+        if word == '(':
+            continue
+        kind = _KIND_ALIASES.get(word, word)
+        if kind == 'WITH':
+            # WITH ... SELECT/UPDATE/DELETE: o comando vem depois das CTEs
+            for later, depth in zip(words[index + 1:], depths[index + 1:]):
+                if depth == depths[index] and later in _CTE_BODY_KINDS:
+                    return later
+            return KIND_OTHER
+        return kind if kind in _KNOWN_KINDS else KIND_OTHER
+    return KIND_OTHER
+
+
+def _extract_tables(names: List[str], upper: List[str]) -> FrozenSet[str]:
+    tables = set()
+
+    def read_name(i: int) -> Tuple[Optional[str], int]:
+        # Nome simples ou schema.tabela
+        if i >= len(names) or not (names[i].startswith('`') or names[i][0].isalnum() or names[i][0] == '_'):
+            return None, i
+        name = names[i]
+        i += 1
+        if i + 1 < len(names) and names[i] == '.':
+            name = names[i + 1]
+            i += 2
+        return name.strip('`').lower(), i
+
+    i = 0
+    while i < len(names):
+        keyword = upper[i]
+        i += 1
+        if keyword not in _TABLE_KEYWORDS:
+            continue
+        if keyword == 'TRUNCATE' and i < len(names) and upper[i] == 'TABLE':
+            i += 1
+        while i < len(names) and upper[i] in ('IF', 'NOT', 'EXISTS'):  # IF [NOT] EXISTS
+            i += 1
+        while True:
+            start = i
+            name, i = read_name(i)
+            if name is None or (upper[start] in _CLAUSE_KEYWORDS and not names[start].startswith('`')):
+                break
+            tables.add(name)
+            if keyword not in _LIST_KEYWORDS:
+                break
+            # Alias opcional e próxima tabela da lista
+            if i < len(names) and upper[i] == 'AS':
+                i += 2
+            elif i < len(names) and upper[i] not in _CLAUSE_KEYWORDS and names[i] not in (',', '(', ')', ';'):
+                i += 1
+            if i < len(names) and names[i] == ',':
+                i += 1
+                continue
+            break
+    return frozenset(tables)
+
+
+def _cte_names(names: List[str], upper: List[str], depths: List[int]) -> FrozenSet[str]:
+    """Nomes definidos em WITH nome AS (...), que não são tabelas"""
+    if 'WITH' not in upper:
+        return frozenset()
+    start = upper.index('WITH')
+    ctes = set()
+    for i in range(start + 1, len(names) - 1):
+        if depths[i] != depths[start]:
+            continue
+        if upper[i] in _CTE_BODY_KINDS:
+            break  # Início do comando principal
+        if upper[i + 1] in ('AS', '(') and upper[i] not in ('RECURSIVE', ',', ')'):
+            ctes.add(names[i].strip('`').lower())
+    return frozenset(ctes)
+
+
+def _is_deterministic(upper: List[str]) -> bool:
+    for i, word in enumerate(upper):
+        if word in _NON_DETERMINISTIC_WORDS or word == '@':  # Variáveis de sessão/sistema
+            return False
+        if word in _NON_DETERMINISTIC_CALLS and i + 1 < len(upper) and upper[i + 1] == '(':
+            return False
+    return True
+
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def analyze(query: str) -> StatementInfo:
+    """
+    Analisa uma query SQL sem consultar o banco
+
+    O resultado é memoizado pelo texto exato da query, então chamadas
+    repetidas (roteamento, cache, replicação, métricas) custam uma busca
+    em dicionário. Comentários, parênteses iniciais e CTEs (WITH) são
+    tratados; a análise é léxica e não valida a sintaxe.
+
+    Args:
+        query: Query SQL
+
+    Returns:
+        StatementInfo com tipo, tabelas, fingerprint e propriedades
+    """
+    tokens = _tokenize(query)
+    significant = [(token_type, text) for token_type, text in tokens
+                   if token_type not in ('space', 'comment', 'string', 'number', 'placeholder')]
+    names = [text for _, text in significant]
+    upper = [text.upper() for text in names]
+
+    depths = []
+    depth = 0
+    for word in names:
+        if word == ')':
+            depth -= 1
+        depths.append(depth)
+        if word == '(':
+            depth += 1
+
+    kind = _statement_kind(upper, depths)
+    tables = _extract_tables(names, upper) - _cte_names(names, upper, depths)
+    if kind == 'CALL':
+        tables = frozenset()  # O procedimento pode escrever em qualquer tabela
+
+    return StatementInfo(
+        kind=kind,
+        tables=tables,
+        fingerprint=_fingerprint(tokens),
+        is_write=kind in WRITE_KINDS,
+        returns_rows=kind in ROW_KINDS,
+        deterministic=_is_deterministic(upper)
+    )
+
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def row_target(query: str) -> Optional[RowTarget]:
+    """
+    Identifica a tabela e as linhas alteradas por um INSERT, UPDATE ou DELETE
+
+    Reconhece INSERT de uma linha (VALUES), UPDATE ... SET ... [WHERE] e
+    DELETE FROM ... [WHERE] sobre uma tabela sem alias. Com JOIN, ORDER
+    BY/LIMIT, INSERT ... SELECT ou ON DUPLICATE KEY, as linhas afetadas
+    não se deduzem do texto e a função retorna None. Memoizado como analyze().
+
+    Args:
+        query: Query SQL
+
+    Returns:
+        RowTarget, ou None se as linhas alteradas não podem ser capturadas
+    """
+    info = analyze(query)
+    if info.kind not in (KIND_INSERT, KIND_UPDATE, KIND_DELETE) or len(info.tables) != 1:
+        return None
+    table, = info.tables
+
+    # Tokens significativos com a posição no texto e a profundidade de parênteses
+    tokens = []
+    depth = 0
+    for match in _LEXER_RE.finditer(query):
+        token_type, text = match.lastgroup, match.group()
+        if token_type in ('space', 'comment'):
+            continue
+        if text == ')':
+            depth -= 1
+        tokens.append((token_type, text, text.upper(), depth, match.start(), match.end()))
+        if text == '(':
+            depth += 1
+    while tokens and tokens[-1][1] == ';':
+        tokens.pop()
+
+    top = [token for token in tokens if token[3] == 0]
+    if any(token[2] in _ROW_TARGET_BLOCKERS and token[0] == 'word' for token in top):
+        return None
+    words = [token[2] for token in top]
+
+    def name_at(i: int) -> Tuple[Optional[str], int]:
+        # Nome simples ou schema.tabela a partir de top[i]
+        if i >= len(top) or top[i][0] not in ('word', 'quoted'):
+            return None, i
+        name, i = top[i][1], i + 1
+        if i + 1 < len(top) and top[i][1] == '.':
+            name, i = top[i + 1][1], i + 2
+        return name.strip('`').lower(), i
+
+    def skip_modifiers(i: int) -> int:
+        while i < len(top) and words[i] in _ROW_TARGET_MODIFIERS:
+            i += 1
+        return i
+
+    where = ''
+    where_params = 0
+    columns = set()
+    if info.kind == KIND_INSERT:
+        i = skip_modifiers(1)
+        if i < len(top) and words[i] == 'INTO':
+            i += 1
+        name, i = name_at(i)
+        if name != table:
+            return None
+        if i < len(top) and top[i][1] == '(':
+            # Lista de colunas: nomes dentro dos parênteses
+            close = next((j for j in range(i + 1, len(tokens)) if tokens[j][3] == 0 and tokens[j][1] == ')'), None)
+            start = tokens.index(top[i])
+            columns = {token[1].strip('`').lower() for token in tokens[start + 1:close] if token[1] != ','}
+            i = top.index(tokens[close]) + 1
+        if i >= len(top) or words[i] not in ('VALUES', 'VALUE'):
+            return None
+        # Uma linha só: um grupo de parênteses depois de VALUES
+        if [token[1] for token in top[i + 1:]] != ['(', ')']:
+            return None
+    else:
+        if info.kind == KIND_UPDATE:
+            name, i = name_at(skip_modifiers(1))
+            if i >= len(top) or words[i] != 'SET':
+                return None
+        else:
+            i = skip_modifiers(1)
+            if i >= len(top) or words[i] != 'FROM':
+                return None
+            name, i = name_at(i + 1)
+        if name != table:
+            return None
+
+        where_at = next((j for j in range(i, len(top)) if words[j] == 'WHERE'), None)
+        if info.kind == KIND_UPDATE:
+            # Colunas atribuídas: nome antes de cada '=' no nível do SET
+            assignments = top[i + 1:where_at]
+            for j, token in enumerate(assignments):
+                if token[1] == '=' and j > 0 and (j == 1 or assignments[j - 2][1] in (',', '.')):
+                    columns.add(assignments[j - 1][1].strip('`').lower())
+        elif i < len(top) and where_at != i:
+            return None  # Alias ou sintaxe não reconhecida
+        if where_at is not None:
+            position = top[where_at][5]
+            where = query[position:top[-1][5]].strip()
+            where_params = sum(1 for token in tokens if token[0] == 'placeholder' and token[4] < position)
+
+    return RowTarget(
+        kind=info.kind,
+        table=table,
+        where=where,
+        where_params=where_params,
+        columns=frozenset(columns)
+    )
+
+
+def is_write(query: str) -> bool:
+    """Atalho: a query altera dados ou esquema?"""
+    return analyze(query).is_write
+
+
+def analysis_cache_stats() -> Dict[str, Any]:
+    """Acertos e falhas da memoização de analyze()"""
+    info = analyze.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_rate': info.hits / lookups if lookups else 0.0,
+        'entries': info.currsize,
+        'max_entries': info.maxsize
+    }
@@ -0,0 +1,959 @@
+import logging
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Sequence, Tuple, Type, Union
+from .connection_pool import DatabasePool, PoolTimeoutError
+from .statement_cache import StatementCache, StatementCacheStats
+from .query_cache import QueryCache
+from ..core.result_set import ResultSet
+from ..core.sql_analysis import KIND_DELETE, KIND_INSERT, KIND_SELECT, StatementInfo, analyze, row_target
+
+
+ENGINE_MYSQL = 'mysql'
+ENGINE_SQLITE = 'sqlite'
+
+_SCHEMA_KINDS = frozenset(('CREATE', 'ALTER', 'DROP', 'RENAME'))  # Podem mudar chaves primárias
+_KEY_CHUNK = 500  # Chaves por SELECT ao ler as linhas alteradas
+
+
+class StorageBackend(ABC):
+    """
+    Armazenamento local de um nó, independente do SGBD
+
+    Implementa sobre um pool de conexões DB-API tudo o que não depende do
+    banco: queries avulsas em autocommit, transações explícitas presas a
+    uma conexão pelo transaction_id, streaming, escritas em lote, cache de
+    prepared statements e cache de resultados. Cada SGBD fornece apenas
+    como abrir conexões, iniciar transações, criar cursores e descrever
+    as colunas.
+    """
+
+    engine = ''  # Nome do SGBD nos logs
+    errors: Tuple[Type[Exception], ...] = ()  # Erros do driver tratados como falha da query
+    connection_errors: Tuple[Type[Exception], ...] = ()  # Erros que inutilizam a conexão
+    lock_clause = ''  # Sufixo do SELECT que trava as linhas lidas até o commit
+
+    def __init__(self, pool_min_size: int = 2, pool_max_size: int = 10, checkout_timeout: float = 5,
+                 validation_interval: float = 30, max_lifetime: float = 1800,
+                 statement_cache_size: int = 64, bulk_batch_size: int = 1000,
+                 query_cache_mb: float = 0, query_cache_ttl: float = 30):
+        self.logger = logging.getLogger(type(self).__module__)
+        self.pool = DatabasePool(
+            connect=self._open_connection,
+            validate=self._validate_connection,
+            reset=self._reset_connection,
+            min_size=pool_min_size,
+            max_size=pool_max_size,
+            checkout_timeout=checkout_timeout,
+            validation_interval=validation_interval,
+            max_lifetime=max_lifetime
+        )
+        self._transactions: Dict[str, Tuple[Any, float]] = {}  # transaction_id -> (conexão, início)
+        self._transactions_lock = threading.Lock()
+        self.statement_cache_size = statement_cache_size  # Prepared statements por conexão
+        self.statement_stats = StatementCacheStats()
+        self.bulk_batch_size = bulk_batch_size  # Linhas por executemany em escritas em lote
+
+        # Cache de resultados de SELECT (desativado com query_cache_mb = 0)
+        self.query_cache = (
+            QueryCache(int(query_cache_mb * 1024 * 1024), query_cache_ttl) if query_cache_mb > 0 else None
+        )
+        self._transaction_writes: Dict[str, List[FrozenSet[str]]] = {}  # Tabelas a invalidar no commit
+        self._primary_keys: Dict[str, Optional[Tuple[str, ...]]] = {}  # Tabela -> colunas da chave primária
+
+    # ------------------------------------------------------------------
+    # Pontos de extensão de cada SGBD
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def _open_connection(self):
+        """Abre uma nova conexão em modo autocommit"""
+
+    @abstractmethod
+    def _start_transaction(self, conn):
+        """Inicia uma transação explícita na conexão"""
+
+    @abstractmethod
+    def _cursor(self, conn, dictionary: bool = False, buffered: bool = True):
+        """Cria um cursor (buffered=False: linhas lidas sob demanda)"""
+
+    @abstractmethod
+    def _prepare(self, conn, sql: str):
+        """Cria o statement reaproveitável guardado no cache da conexão"""
+
+    @abstractmethod
+    def _describe(self, cursor) -> Tuple[List[str], List[Optional[str]]]:
+        """Nomes e tipos lógicos das colunas (None onde for preciso inferir)"""
+
+    @abstractmethod
+    def describe_target(self) -> str:
+        """Onde estão os dados (para logs)"""
+
+    def _validate_connection(self, conn) -> bool:
+        """Verifica se uma conexão ociosa ainda está utilizável"""
+        return True
+
+    def _reset_connection(self, conn):
+        """Desfaz transação deixada aberta antes de devolver a conexão ao pool"""
+        if conn.in_transaction:
+            conn.rollback()
+
+    def _translate(self, query: str) -> str:
+        """Adapta os placeholders %s ao estilo do driver"""
+        return query
+
+    def _primary_key_columns(self, conn, table: str) -> Optional[Tuple[str, ...]]:
+        """Colunas da chave primária da tabela, em ordem (None se não houver)"""
+        return None
+
+    def _inserted_key(self, cursor, table: str, key: Sequence[str]) -> Optional[Tuple[Any, ...]]:
+        """Chave da linha que o último INSERT do cursor criou (None se desconhecida)"""
+        return None
+
+    def upsert_sql(self, table: str, columns: Sequence[str], key: Sequence[str]) -> Optional[str]:
+        """INSERT que atualiza a linha se a chave já existir (None: não suportado)"""
+        return None
+
+    def _list_tables(self, conn) -> List[str]:
+        """Tabelas de dados do banco"""
+        raise NotImplementedError(f"Snapshot não suportado pelo {self.engine}")
+
+    def _table_ddl(self, conn, table: str) -> Optional[str]:
+        """CREATE TABLE da tabela"""
+        raise NotImplementedError(f"Snapshot não suportado pelo {self.engine}")
+
+    def _start_snapshot(self, connections: List[Any], at_snapshot: Callable[[], Any]) -> Any:
+        """
+        Inicia nas conexões leituras do mesmo instante do banco
+
+        at_snapshot é chamado com as escritas bloqueadas, depois que todas
+        as conexões fixaram o instante; o seu retorno é devolvido.
+        """
+        raise NotImplementedError(f"Snapshot não suportado pelo {self.engine}")
+
+    def _without_constraints(self, conn, disabled: bool):
+        """Liga/desliga a verificação de chaves estrangeiras na conexão (cargas de snapshot)"""
+
+    # ------------------------------------------------------------------
+    # Conexões
+    # ------------------------------------------------------------------
+
+    def connect(self) -> bool:
+        """Abre o pool de conexões com o banco de dados"""
+        try:
+            self.pool.open()
+            self.logger.info(
+                f"Conectado ao {self.engine} em {self.describe_target()} "
+                f"(pool {self.pool.min_size}-{self.pool.max_size} conexões)"
+            )
+            return True
+        except self.errors as e:
+            self.logger.error(f"Erro ao conectar ao {self.engine}: {e}")
+            return False
+
+    def disconnect(self):
+        """Fecha as conexões com o banco de dados"""
+        with self._transactions_lock:
+            pending, self._transactions = list(self._transactions.values()), {}
+            self._transaction_writes.clear()
+        for conn, _ in pending:
+            self.pool.release(conn, discard=True)
+        if not self.pool.closed:
+            self.pool.close()
+            self.logger.info(f"Desconectado do {self.engine}")
+
+    def is_connected(self) -> bool:
+        """Verifica se o pool está aberto"""
+        return not self.pool.closed
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Métricas do pool de conexões (espera, checkouts, tamanho)"""
+        stats = self.pool.get_stats()
+        with self._transactions_lock:
+            stats['open_transactions'] = len(self._transactions)
+        stats['engine'] = self.engine
+        return stats
+
+    @contextmanager
+    def _borrow(self, transaction_id: Optional[str] = None):
+        """
+        Empresta a conexão de uma unidade de trabalho
+
+        Sem transaction_id, pega uma conexão do pool só durante o bloco.
+        Com transaction_id, usa a conexão presa à transação.
+        """
+        if transaction_id is not None:
+            yield self._transaction_connection(transaction_id)
+            return
+
+        conn = self.pool.acquire()
+        discard = False
+        try:
+            yield conn
+        except self.connection_errors:
+            discard = True  # Conexão perdida: não volta ao pool
+            raise
+        finally:
+            self.pool.release(conn, discard=discard)
+
+    @contextmanager
+    def get_cursor(self, dictionary: bool = True, transaction_id: Optional[str] = None):
+        """Context manager para cursor"""
+        with self._borrow(transaction_id) as conn:
+            cursor = self._cursor(conn, dictionary=dictionary)
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    def _statements(self, conn) -> StatementCache:
+        """Cache de prepared statements da conexão (criado no primeiro uso)"""
+        cache = getattr(conn, '_ddb_statements', None)
+        if cache is None:
+            cache = StatementCache(
+                prepare=lambda sql: self._prepare(conn, sql),
+                close=lambda cursor: cursor.close(),
+                capacity=self.statement_cache_size,
+                stats=self.statement_stats
+            )
+            conn._ddb_statements = cache
+        return cache
+
+    def get_statement_cache_stats(self) -> Dict[str, Any]:
+        """Acertos e falhas do cache de prepared statements"""
+        return self.statement_stats.to_dict()
+
+    def build_result_set(self, cursor) -> ResultSet:
+        """
+        Monta o ResultSet direto de um cursor não-dicionário
+
+        Os nomes e tipos das colunas vêm de cursor.description e as linhas
+        ficam como as tuplas devolvidas pelo driver, sem dict por linha.
+        """
+        columns, types = self._describe(cursor)
+        return ResultSet.from_rows(columns, cursor.fetchall(), types)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def stream_query(self, query: str, params: Optional[Sequence[Any]] = None,
+                     fetch_size: int = 1000) -> Iterator[ResultSet]:
+        """
+        Executa um SELECT devolvendo o resultado em lotes
+
+        Empresta uma conexão do pool e usa um cursor não-bufferizado: as
+        linhas são lidas do banco com fetchmany conforme o consumidor
+        avança, então a memória usada fica limitada a um lote qualquer que
+        seja o tamanho do resultado.
+
+        Args:
+            query: Query SQL (SELECT)
+            params: Parâmetros da query
+            fetch_size: Linhas por lote
+
+        Returns:
+            Iterador de ResultSet, um por lote
+
+        Raises:
+            Exception: O erro do driver se a query falhar
+        """
+        connection = self.pool.acquire()
+        cursor = self._cursor(connection, buffered=False)
+        finished = False
+        try:
+            self.logger.info(f"Executando query em streaming: {query[:100]}...")
+            if params is not None:
+                cursor.execute(self._translate(query), tuple(params))
+            else:
+                cursor.execute(query)
+            columns, types = self._describe(cursor)
+            total = 0
+
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                chunk = ResultSet.from_rows(columns, rows, types)
+                types = chunk.types  # Tipos inferidos no primeiro lote valem para os demais
+                total += len(rows)
+                yield chunk
+
+            self.logger.info(f"Streaming concluído - {total} registros")
+            finished = True
+        finally:
+            try:
+                cursor.close()
+            except self.errors:
+                finished = False
+            # Se o consumidor desistiu, ainda pode haver linhas não lidas
+            # na conexão: ela é descartada em vez de voltar ao pool
+            self.pool.release(connection, discard=not finished)
+
+    def execute_query(self, query: str, params: Optional[Sequence[Any]] = None,
+                      transaction_id: Optional[str] = None) -> Tuple[bool, Optional[ResultSet], Optional[str], int]:
+        """
+        Executa uma query SQL
+
+        Sem transaction_id a query roda em autocommit em uma conexão
+        emprestada do pool; com transaction_id, dentro da transação aberta
+        por begin_transaction. Queries com params usam prepared statements
+        cacheados por conexão (parse e plano feitos uma vez só).
+
+        Args:
+            query: Query SQL (placeholders %s)
+            params: Parâmetros da query
+            transaction_id: Transação explícita (opcional)
+
+        Returns:
+            Tupla (sucesso, dados, erro, rows_affected)
+        """
+        start_time = time.time()
+
+        # Cache de resultados: só SELECTs determinísticos fora de transação
+        info = analyze(query)
+        cache_key = snapshot = None
+        if self.query_cache is not None and transaction_id is None and self._is_cacheable(info):
+            cache_key = self.query_cache.make_key(query, params)
+            cached = self.query_cache.get(cache_key)
+            if cached is not None:
+                self.logger.debug(f"Resultado em cache para: {query[:100]}...")
+                return True, cached, None, len(cached)
+            snapshot = self.query_cache.snapshot(info.tables)
+
+        try:
+            with self._borrow(transaction_id) as conn:
+                self.logger.info(f"Executando query: {query[:100]}...")
+
+                if params is not None:
+                    # Query parametrizada: statement preparado e reaproveitado
+                    statements = self._statements(conn)
+                    cursor = statements.get(query)
+                    try:
+                        cursor.execute(self._translate(query), tuple(params))
+                        outcome = self._collect(query, cursor, start_time)
+                    except self.errors:
+                        statements.discard(query)
+                        raise
+                else:
+                    cursor = self._cursor(conn)
+                    try:
+                        cursor.execute(query)
+                        outcome = self._collect(query, cursor, start_time)
+                    finally:
+                        cursor.close()
+
+        except self.errors + (PoolTimeoutError, KeyError) as e:
+            error_msg = f"Erro ao executar query: {e}"
+            self.logger.error(error_msg)
+            return False, None, error_msg, 0
+
+        if snapshot is not None and outcome[1] is not None:
+            self.query_cache.put(cache_key, outcome[1], snapshot)
+        if info.kind in _SCHEMA_KINDS:
+            self._primary_keys.clear()
+        self._invalidate(query, transaction_id)
+        return outcome
+
+    @staticmethod
+    def _is_cacheable(info: StatementInfo) -> bool:
+        return info.kind == KIND_SELECT and info.deterministic and bool(info.tables)
+
+    def _invalidate(self, query: str, transaction_id: Optional[str] = None):
+        """
+        Invalida o cache de resultados das tabelas escritas pela query
+
+        Dentro de uma transação, a invalidação fica para o commit: até lá
+        as outras conexões ainda leem os dados antigos.
+        """
+        info = analyze(query)
+        if self.query_cache is None or not info.is_write:
+            return
+        tables = info.tables
+        if transaction_id is not None:
+            with self._transactions_lock:
+                if transaction_id in self._transactions:
+                    self._transaction_writes.setdefault(transaction_id, []).append(tables)
+            return
+        self._invalidate_tables(tables)
+
+    def _invalidate_tables(self, tables: FrozenSet[str]):
+        if tables:
+            self.query_cache.invalidate_tables(tables)
+        else:
+            self.query_cache.clear()  # Tabelas desconhecidas: descarta tudo
+
+    def get_query_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Métricas do cache de resultados (None se desativado)"""
+        return self.query_cache.get_stats() if self.query_cache is not None else None
+
+    def _collect(self, query: str, cursor, start_time: float) -> Tuple[bool, Optional[ResultSet], Optional[str], int]:
+        """Lê o resultado do cursor já executado"""
+        # SELECT, SHOW, WITH ... SELECT etc. produzem linhas
+        if analyze(query).returns_rows:
+            results = self.build_result_set(cursor)
+            execution_time = time.time() - start_time
+            self.logger.info(f"Query executada com sucesso em {execution_time:.3f}s - {len(results)} registros")
+            return True, results, None, len(results)
+
+        # INSERT, UPDATE, DELETE
+        rows_affected = cursor.rowcount
+        execution_time = time.time() - start_time
+        self.logger.info(f"Query executada com sucesso em {execution_time:.3f}s - {rows_affected} linhas afetadas")
+        return True, None, None, rows_affected
+
+    # ------------------------------------------------------------------
+    # Imagens de linhas (replicação por linha)
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def quote(name: str) -> str:
+        """Identificador entre crases (aceito pelo MySQL e pelo SQLite)"""
+        return '`' + name.replace('`', '``') + '`'
+
+    def primary_key(self, table: str) -> Optional[Tuple[str, ...]]:
+        """
+        Colunas da chave primária da tabela, consultadas uma vez e guardadas
+
+        DDL executado por este backend descarta o que foi guardado.
+        """
+        if table in self._primary_keys:
+            return self._primary_keys[table]
+        try:
+            with self._borrow() as conn:
+                key = self._primary_key_columns(conn, table)
+        except self.errors + (PoolTimeoutError,) as e:
+            self.logger.warning(f"Chave primária de {table} indisponível: {e}")
+            return None
+        self._primary_keys[table] = key or None
+        return key or None
+
+    def delete_sql(self, table: str, key: Sequence[str]) -> str:
+        """DELETE de uma linha pela chave primária"""
+        condition = ' AND '.join(f"{self.quote(column)} = %s" for column in key)
+        return f"DELETE FROM {self.quote(table)} WHERE {condition}"
+
+    def _read_rows(self, cursor, table: str, key: Sequence[str],
+                   keys: List[Tuple[Any, ...]]) -> Tuple[List[str], List[List[Any]]]:
+        """Lê as linhas atuais das chaves informadas (SELECT * em blocos)"""
+        columns: List[str] = []
+        rows: List[List[Any]] = []
+        match = ' AND '.join(f"{self.quote(column)} = %s" for column in key)
+        for start in range(0, len(keys), _KEY_CHUNK):
+            chunk = keys[start:start + _KEY_CHUNK]
+            condition = ' OR '.join(f"({match})" for _ in chunk)
+            cursor.execute(self._translate(f"SELECT * FROM {self.quote(table)} WHERE {condition}"),
+                           tuple(value for values in chunk for value in values))
+            columns = [column[0] for column in cursor.description]
+            rows.extend(list(row) for row in cursor.fetchall())
+        return columns, rows
+
+    def execute_with_row_images(self, query: str, params: Optional[Sequence[Any]] = None,
+                                max_rows: int = 10000
+                                ) -> Tuple[bool, Optional[ResultSet], Optional[str], int, Optional[Dict[str, Any]]]:
+        """
+        Executa uma escrita e captura as linhas que ela alterou
+
+        Em uma transação: lê as chaves primárias que a condição do UPDATE
+        ou DELETE seleciona (travando-as), executa a query e, se ela
+        afetou exatamente essas linhas, lê os valores novos pela chave.
+        Um INSERT de uma linha é lido pelo id gerado (lastrowid). As
+        réplicas aplicam as imagens como upserts e deletes pela chave, sem
+        reavaliar a condição nem funções como NOW() e RAND().
+
+        Sem imagem (tabela sem chave primária, query não reconhecida por
+        row_target, mais de max_rows linhas, contagem diferente da
+        esperada), a query é executada normalmente e a imagem é None.
+
+        Args:
+            query: Query de escrita (placeholders %s)
+            params: Parâmetros da query
+            max_rows: Máximo de linhas capturadas
+
+        Returns:
+            Tupla (sucesso, dados, erro, rows_affected, imagem); a imagem é
+            {'table', 'key', 'columns', 'upserts'} ou {'table', 'key', 'deletes'}
+        """
+        target = row_target(query)
+        key = self.primary_key(target.table) if target else None
+        if key is None or (target.kind != KIND_INSERT and target.columns & {column.lower() for column in key}):
+            # Sem chave, ou UPDATE que muda a própria chave
+            return self.execute_query(query, params) + (None,)
+
+        start_time = time.time()
+        table = target.table
+        try:
+            with self._borrow() as conn:
+                # Se algo falhar, o reset do pool desfaz a transação
+                self._start_transaction(conn)
+                cursor = self._cursor(conn)
+                try:
+                    keys = None
+                    if target.kind != KIND_INSERT:
+                        select = f"SELECT {', '.join(self.quote(column) for column in key)} FROM {self.quote(table)}"
+                        if target.where:
+                            select += f" WHERE {target.where}"
+                        select += self.lock_clause
+                        if params is not None:
+                            cursor.execute(self._translate(select), tuple(params[target.where_params:]))
+                        else:
+                            cursor.execute(select)
+                        keys = [tuple(row) for row in cursor.fetchall()]
+
+                    if params is not None:
+                        cursor.execute(self._translate(query), tuple(params))
+                    else:
+                        cursor.execute(query)
+                    rows_affected = cursor.rowcount
+
+                    image = None
+                    if keys is not None and rows_affected == len(keys) and len(keys) <= max_rows:
+                        if target.kind == KIND_DELETE:
+                            image = {'table': table, 'key': list(key), 'deletes': [list(values) for values in keys]}
+                        else:
+                            columns, rows = self._read_rows(cursor, table, key, keys)
+                            image = {'table': table, 'key': list(key), 'columns': columns, 'upserts': rows}
+                    elif keys is not None:
+                        self.logger.warning(
+                            f"Imagem de linhas descartada ({rows_affected} linhas afetadas, {len(keys)} "
+                            f"selecionadas, limite {max_rows}) - replicada como SQL: {query[:80]}"
+                        )
+                    elif target.kind == KIND_INSERT and rows_affected == 1:
+                        inserted = self._inserted_key(cursor, table, key)
+                        columns, rows = self._read_rows(cursor, table, key, [inserted]) if inserted else ([], [])
+                        if len(rows) == 1:
+                            image = {'table': table, 'key': list(key), 'columns': columns, 'upserts': rows}
+                finally:
+                    cursor.close()
+                conn.commit()
+
+        except self.errors + (PoolTimeoutError,) as e:
+            error_msg = f"Erro ao executar query: {e}"
+            self.logger.error(error_msg)
+            return False, None, error_msg, 0, None
+
+        self._invalidate(query)
+        execution_time = time.time() - start_time
+        captured = len(image.get('upserts') or image.get('deletes')) if image else 0
+        self.logger.info(
+            f"Query executada com sucesso em {execution_time:.3f}s - {rows_affected} linhas afetadas, "
+            f"{captured} capturadas"
+        )
+        return True, None, None, rows_affected, image
+
+    # ------------------------------------------------------------------
+    # Snapshot (cópia inicial de um nó)
+    # ------------------------------------------------------------------
+
+    def list_tables(self) -> List[str]:
+        """Tabelas de dados do banco, em ordem alfabética"""
+        with self._borrow() as conn:
+            return sorted(self._list_tables(conn))
+
+    def open_snapshot(self, connections: int, at_snapshot: Callable[[], Any]) -> Tuple[List[Any], Any]:
+        """
+        Abre conexões que leem todas o mesmo instante do banco
+
+        As conexões ficam fora do pool (duram o snapshot inteiro) e as
+        escritas ficam bloqueadas só enquanto elas fixam o instante.
+
+        Args:
+            connections: Número de conexões (leituras em paralelo)
+            at_snapshot: Chamado com as escritas bloqueadas (ex.: posição do log)
+
+        Returns:
+            Tupla (conexões, retorno de at_snapshot)
+        """
+        opened = []
+        try:
+            for _ in range(connections):
+                opened.append(self._open_connection())
+            return opened, self._start_snapshot(opened, at_snapshot)
+        except BaseException:
+            self.close_snapshot(opened)
+            raise
+
+    def table_ddl(self, conn, table: str) -> Optional[str]:
+        """CREATE TABLE da tabela, lido em uma conexão do snapshot"""
+        return self._table_ddl(conn, table)
+
+    def close_snapshot(self, connections: List[Any]):
+        """Encerra as leituras do snapshot e fecha as conexões"""
+        for conn in connections:
+            try:
+                conn.rollback()
+                conn.close()
+            except self.errors:
+                pass
+
+    def read_chunk(self, conn, table: str, key: Optional[Sequence[str]], after: Optional[Sequence[Any]],
+                   offset: int, limit: int) -> Tuple[List[str], List[List[Any]]]:
+        """
+        Lê um trecho da tabela em uma conexão do snapshot, na ordem da chave primária
+
+        Com chave, continua depois da última chave lida (keyset); sem
+        chave, ordena por todas as colunas e pula `offset` linhas, estável
+        porque o snapshot não muda.
+
+        Returns:
+            Tupla (colunas, linhas)
+        """
+        cursor = self._cursor(conn)
+        try:
+            if key:
+                order = ', '.join(self.quote(column) for column in key)
+                sql = f"SELECT * FROM {self.quote(table)}"
+                params: Tuple[Any, ...] = ()
+                if after is not None:
+                    sql += f" WHERE ({order}) > ({', '.join(['%s'] * len(key))})"
+                    params = tuple(after)
+                sql += f" ORDER BY {order} LIMIT {int(limit)}"
+            else:
+                cursor.execute(f"SELECT * FROM {self.quote(table)} LIMIT 0")
+                order = ', '.join(str(i + 1) for i in range(len(cursor.description)))
+                cursor.fetchall()
+                sql = f"SELECT * FROM {self.quote(table)} ORDER BY {order} LIMIT {int(limit)} OFFSET {int(offset)}"
+                params = ()
+            cursor.execute(self._translate(sql), params)
+            columns = [column[0] for column in cursor.description]
+            return columns, [list(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def scan_table(self, table: str, key: Sequence[str], chunk_rows: int = 5000
+                   ) -> Iterator[Tuple[List[str], List[List[Any]]]]:
+        """
+        Percorre a tabela inteira em trechos, na ordem da chave primária
+
+        Cada trecho usa uma conexão do pool por vez (sem prender uma
+        conexão durante a varredura toda).
+
+        Yields:
+            Tuplas (colunas, linhas)
+        """
+        after = None
+        while True:
+            with self._borrow() as conn:
+                columns, rows = self.read_chunk(conn, table, key, after, 0, chunk_rows)
+            if rows:
+                yield columns, rows
+            if len(rows) < chunk_rows:
+                return
+            positions = [columns.index(column) for column in key]
+            after = [rows[-1][i] for i in positions]
+
+    def read_rows(self, table: str, key: Sequence[str],
+                  keys: List[Sequence[Any]]) -> Tuple[List[str], List[List[Any]]]:
+        """Linhas atuais das chaves informadas (as que não existem mais ficam de fora)"""
+        if not keys:
+            return [], []
+        with self._borrow() as conn:
+            cursor = self._cursor(conn)
+            try:
+                return self._read_rows(cursor, table, key, [tuple(values) for values in keys])
+            finally:
+                cursor.close()
+
+    def clear_table(self, table: str) -> bool:
+        """Apaga todas as linhas da tabela (antes de carregar um snapshot)"""
+        try:
+            with self._borrow() as conn:
+                self._without_constraints(conn, True)
+                try:
+                    cursor = self._cursor(conn)
+                    try:
+                        cursor.execute(f"DELETE FROM {self.quote(table)}")
+                    finally:
+                        cursor.close()
+                finally:
+                    self._without_constraints(conn, False)
+        except self.errors + (PoolTimeoutError,) as e:
+            self.logger.error(f"Erro ao limpar {table}: {e}")
+            return False
+        if self.query_cache is not None:
+            self._invalidate_tables(frozenset((table,)))
+        return True
+
+    def load_rows(self, table: str, columns: Sequence[str], key: Optional[Sequence[str]],
+                  rows: Sequence[Sequence[Any]]) -> Tuple[bool, Optional[str]]:
+        """
+        Grava um trecho de snapshot em uma transação
+
+        Com chave, usa upsert: repetir um trecho, ou uma escrita replicada
+        que chegou antes dele, não gera chave duplicada. As chaves
+        estrangeiras não são verificadas, pois as tabelas chegam em paralelo.
+
+        Returns:
+            Tupla (sucesso, erro)
+        """
+        sql = self.upsert_sql(table, columns, key) if key else None
+        if sql is None:
+            names = ', '.join(self.quote(column) for column in columns)
+            sql = f"INSERT INTO {self.quote(table)} ({names}) VALUES ({', '.join(['%s'] * len(columns))})"
+        try:
+            with self._borrow() as conn:
+                self._without_constraints(conn, True)
+                try:
+                    self._start_transaction(conn)
+                    cursor = self._cursor(conn)
+                    try:
+                        cursor.executemany(self._translate(sql), [tuple(row) for row in rows])
+                    finally:
+                        cursor.close()
+                    conn.commit()
+                finally:
+                    self._without_constraints(conn, False)
+        except self.errors + (PoolTimeoutError,) as e:
+            return False, f"Erro ao carregar {table}: {e}"
+        if self.query_cache is not None:
+            self._invalidate_tables(frozenset((table,)))
+        return True, None
+
+    # ------------------------------------------------------------------
+    # Transações
+    # ------------------------------------------------------------------
+
+    def _transaction_connection(self, transaction_id: str):
+        with self._transactions_lock:
+            entry = self._transactions.get(transaction_id)
+        if entry is None:
+            raise KeyError(f"Transação {transaction_id} não está aberta neste nó")
+        return entry[0]
+
+    def begin_transaction(self, transaction_id: str) -> bool:
+        """
+        Inicia uma transação presa a uma conexão do pool
+
+        Args:
+            transaction_id: Identificador usado nas queries, commit e rollback
+        """
+        try:
+            conn = self.pool.acquire()
+        except self.errors + (PoolTimeoutError,) as e:
+            self.logger.error(f"Erro ao iniciar transação: {e}")
+            return False
+
+        try:
+            self._start_transaction(conn)
+        except self.errors as e:
+            self.pool.release(conn, discard=True)
+            self.logger.error(f"Erro ao iniciar transação: {e}")
+            return False
+
+        with self._transactions_lock:
+            previous = self._transactions.pop(transaction_id, None)
+            self._transaction_writes.pop(transaction_id, None)
+            self._transactions[transaction_id] = (conn, time.monotonic())
+        if previous:
+            self.logger.warning(f"Transação {transaction_id} reiniciada - versão anterior revertida")
+            self.pool.release(previous[0])
+
+        self.logger.info(f"Transação {transaction_id} iniciada")
+        return True
+
+    def _finish_transaction(self, transaction_id: str, commit: bool) -> bool:
+        with self._transactions_lock:
+            entry = self._transactions.pop(transaction_id, None)
+            writes = self._transaction_writes.pop(transaction_id, ())
+        action = "commitar" if commit else "reverter"
+        if entry is None:
+            self.logger.warning(f"Não há transação {transaction_id} para {action}")
+            return False
+
+        conn = entry[0]
+        try:
+            if commit:
+                conn.commit()
+            else:
+                conn.rollback()
+        except self.errors as e:
+            self.logger.error(f"Erro ao {action} transação {transaction_id}: {e}")
+            self.pool.release(conn, discard=True)
+            return False
+
+        self.pool.release(conn)
+        if commit and self.query_cache is not None:
+            for tables in writes:
+                self._invalidate_tables(tables)
+        self.logger.info(f"Transação {transaction_id} {'commitada' if commit else 'revertida'}")
+        return True
+
+    def commit(self, transaction_id: str) -> bool:
+        """Commit da transação"""
+        return self._finish_transaction(transaction_id, commit=True)
+
+    def rollback(self, transaction_id: str) -> bool:
+        """Rollback da transação"""
+        return self._finish_transaction(transaction_id, commit=False)
+
+    def abort_stale_transactions(self, timeout_seconds: float = 300) -> int:
+        """
+        Reverte transações abertas há mais de timeout_seconds
+
+        Evita que um PREPARE sem COMMIT/ABORT prenda uma conexão do pool
+        para sempre.
+
+        Returns:
+            Número de transações revertidas
+        """
+        now = time.monotonic()
+        with self._transactions_lock:
+            stale = [tid for tid, (_, started) in self._transactions.items() if now - started > timeout_seconds]
+        for tid in stale:
+            self.logger.warning(f"Transação {tid} aberta há mais de {timeout_seconds}s - revertendo")
+            self.rollback(tid)
+        return len(stale)
+
+    def execute_many(self, query: str, rows: Sequence[Sequence[Any]],
+                     batch_size: Optional[int] = None) -> Tuple[bool, Optional[str], int]:
+        """
+        Executa a mesma query de escrita para muitas linhas em uma transação
+
+        As linhas são enviadas com executemany em lotes de batch_size.
+        Todos os lotes são confirmados com um único commit, ou nenhum.
+
+        Args:
+            query: Query SQL com placeholders %s
+            rows: Valores de cada linha
+            batch_size: Linhas por executemany (padrão: bulk_batch_size)
+
+        Returns:
+            Tupla (sucesso, erro, linhas_afetadas)
+        """
+        batch_size = batch_size or self.bulk_batch_size
+        start_time = time.time()
+        sql = self._translate(query)
+
+        try:
+            with self._borrow() as conn:
+                # Se algo falhar, o reset do pool desfaz a transação
+                self._start_transaction(conn)
+                cursor = self._cursor(conn)
+                try:
+                    rows_affected = 0
+                    for start in range(0, len(rows), batch_size):
+                        cursor.executemany(sql, [tuple(row) for row in rows[start:start + batch_size]])
+                        rows_affected += max(cursor.rowcount, 0)
+                finally:
+                    cursor.close()
+                conn.commit()
+
+            self._invalidate(query)
+            execution_time = time.time() - start_time
+            self.logger.info(
+                f"Escrita em lote executada em {execution_time:.3f}s - {len(rows)} linhas, "
+                f"{rows_affected} afetadas"
+            )
+            return True, None, rows_affected
+
+        except self.errors + (PoolTimeoutError,) as e:
+            error_msg = f"Erro na escrita em lote: {e}"
+            self.logger.error(error_msg)
+            return False, error_msg, 0
+
+    def execute_transaction(self, queries: List[Union[str, Tuple[str, Optional[Sequence[Any]]]]],
+                            rows_affected: Optional[List[int]] = None) -> Tuple[bool, Optional[str]]:
+        """
+        Executa múltiplas queries em uma transação
+
+        Args:
+            queries: Lista de queries SQL, ou de tuplas (query, params)
+            rows_affected: Lista que recebe as linhas afetadas por cada query (opcional)
+
+        Returns:
+            Tupla (sucesso, erro)
+        """
+        transaction_id = str(uuid.uuid4())
+        if not self.begin_transaction(transaction_id):
+            return False, "Não foi possível iniciar a transação"
+
+        try:
+            for item in queries:
+                query, params = (item, None) if isinstance(item, str) else item
+                success, _, error, affected = self.execute_query(query, params, transaction_id=transaction_id)
+                if rows_affected is not None:
+                    rows_affected.append(affected)
+                if not success:
+                    self.rollback(transaction_id)
+                    return False, error
+
+            if not self.commit(transaction_id):
+                return False, "Erro ao commitar transação"
+            return True, None
+
+        except Exception as e:
+            self.rollback(transaction_id)
+            error_msg = f"Erro na transação: {e}"
+            self.logger.error(error_msg)
+            return False, error_msg
+
+    def test_connection(self) -> bool:
+        """Testa a conexão com o banco"""
+        try:
+            if not self.is_connected():
+                self.connect()
+
+            with self.get_cursor(dictionary=False) as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            return True
+        except self.errors + (PoolTimeoutError,) as e:
+            self.logger.error(f"Teste de conexão falhou: {e}")
+            return False
+
+
+def create_backend(db_config: Dict[str, Any]) -> StorageBackend:
+    """
+    Cria o armazenamento do nó a partir da seção `database` da configuração
+
+    `engine` escolhe o SGBD: 'mysql' (padrão) ou 'sqlite'. Os drivers são
+    importados só quando usados, então um nó SQLite não precisa do
+    mysql-connector instalado.
+
+    Args:
+        db_config: Seção `database` do nó em nodes_config.json
+
+    Returns:
+        Backend ainda não conectado (chame connect())
+
+    Raises:
+        ValueError: Se o engine for desconhecido
+    """
+    engine = db_config.get('engine', ENGINE_MYSQL).lower()
+    options = dict(
+        pool_min_size=db_config.get('pool_min_size', 2),
+        pool_max_size=db_config.get('pool_max_size', 10),
+        checkout_timeout=db_config.get('checkout_timeout', 5),
+        max_lifetime=db_config.get('max_lifetime', 1800),
+        statement_cache_size=db_config.get('statement_cache_size', 64),
+        bulk_batch_size=db_config.get('bulk_batch_size', 1000),
+        query_cache_mb=db_config.get('query_cache_mb', 0),
+        query_cache_ttl=db_config.get('query_cache_ttl', 30)
+    )
+
+    if engine == ENGINE_MYSQL:
+        from .mysql_manager import MySQLManager
+        return MySQLManager(
+            host=db_config['host'],
+            user=db_config['user'],
+            password=db_config['password'],
+            database=db_config['database'],
+            port=db_config.get('port', 3306),
+            **options
+        )
+
+    if engine == ENGINE_SQLITE:
+        from .sqlite_manager import SQLiteManager
+        return SQLiteManager(
+            path=db_config['path'],
+            mmap_size_mb=db_config.get('mmap_size_mb', 256),
+            synchronous=db_config.get('synchronous', 'NORMAL'),
+            busy_timeout=db_config.get('busy_timeout', 5),
+            init_script=db_config.get('init_script'),
+            **options
+        )
+
+    raise ValueError(f"Engine de banco desconhecido: {engine}")
@@ -0,0 +1,274 @@
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Optional
+
+
+class PoolTimeoutError(TimeoutError):
+    """Nenhuma conexão ficou livre dentro do prazo de checkout"""
+
+
+class _PoolEntry:
+    """Conexão do pool e seus metadados"""
+
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn: Any):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class DatabasePool:
+    """
+    Pool de conexões com o banco, seguro entre threads
+
+    Independente do driver: recebe funções para abrir, validar e limpar
+    conexões. Mantém ao menos `min_size` conexões abertas e no máximo
+    `max_size`; quem pede uma conexão com o pool esgotado espera até
+    `checkout_timeout` segundos. A validação (ex.: ping) só é feita em
+    conexões ociosas há mais de `validation_interval` segundos, e conexões
+    mais antigas que `max_lifetime` são recicladas ao voltar para o pool.
+    """
+
+    def __init__(self, connect: Callable[[], Any], validate: Optional[Callable[[Any], bool]] = None,
+                 reset: Optional[Callable[[Any], None]] = None, min_size: int = 1, max_size: int = 10,
+                 checkout_timeout: float = 5, validation_interval: float = 30,
+                 max_lifetime: float = 1800):
+        if min_size > max_size:
+            raise ValueError("min_size não pode ser maior que max_size")
+        self._connect = connect
+        self._validate = validate
+        self._reset = reset
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.validation_interval = validation_interval
+        self.max_lifetime = max_lifetime
+        self.logger = logging.getLogger(__name__)
+
+        self._cond = threading.Condition()
+        self._idle: Deque[_PoolEntry] = deque()
+        self._in_use: Dict[int, _PoolEntry] = {}  # id(conn) -> entrada emprestada
+        self._opening = 0  # Conexões sendo abertas fora do lock
+        self._closed = True
+
+        # Métricas
+        self._waiters = 0
+        self._max_waiters = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @property
+    def size(self) -> int:
+        """Total de conexões abertas (ociosas + emprestadas)"""
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def open(self):
+        """
+        Abre o pool e cria as `min_size` conexões iniciais
+
+        Raises:
+            Exception: O erro do driver se alguma conexão não puder ser aberta
+        """
+        with self._cond:
+            self._closed = False
+        while True:
+            with self._cond:
+                if self.size >= self.min_size:
+                    return
+                self._opening += 1
+            entry = self._create()
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def close(self):
+        """Fecha as conexões ociosas; as emprestadas são fechadas ao voltar"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._cond.notify_all()
+        for entry in idle:
+            self._close(entry)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """
+        Empresta uma conexão durante o bloco
+
+        Se o bloco levantar exceção a conexão ainda é devolvida (após o
+        reset); use release(conn, discard=True) para descartá-la.
+        """
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        """
+        Obtém uma conexão do pool, abrindo uma nova se houver espaço
+
+        Args:
+            timeout: Tempo máximo de espera (padrão: checkout_timeout)
+
+        Returns:
+            Conexão do driver (deve ser devolvida com release)
+
+        Raises:
+            PoolTimeoutError: Se nenhuma conexão ficar livre no prazo
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waiting = False
+
+        with self._cond:
+            try:
+                while True:
+                    if self._closed:
+                        raise ConnectionError("Pool de conexões fechado")
+
+                    if self._idle:
+                        entry = self._idle.pop()  # LIFO: a mais recente tende a estar válida
+                        self._in_use[id(entry.conn)] = entry
+                        break
+
+                    if self.size < self.max_size:
+                        self._opening += 1
+                        entry = None
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"Nenhuma conexão livre em {timeout}s ({self.max_size} em uso)"
+                        )
+                    if not waiting:
+                        waiting = True
+                        self._waiters += 1
+                        self._max_waiters = max(self._max_waiters, self._waiters)
+                    self._cond.wait(remaining)
+            finally:
+                if waiting:
+                    self._waiters -= 1
+
+        if entry is None:
+            entry = self._create()
+            with self._cond:
+                self._in_use[id(entry.conn)] = entry
+        elif not self._check(entry):
+            # Conexão inválida: substitui por uma nova sem voltar à fila
+            self._close(entry)
+            with self._cond:
+                self._in_use.pop(id(entry.conn), None)
+                self._opening += 1
+                self._discarded += 1
+            entry = self._create()
+            with self._cond:
+                self._in_use[id(entry.conn)] = entry
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return entry.conn
+
+    def release(self, conn: Any, discard: bool = False):
+        """
+        Devolve uma conexão ao pool
+
+        Args:
+            conn: Conexão obtida com acquire
+            discard: Se True, fecha a conexão em vez de reaproveitá-la
+        """
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+            if entry is None:
+                return
+            # Reserva a vaga enquanto a conexão é limpa fora do lock
+            self._opening += 1
+
+        expired = time.monotonic() - entry.created_at > self.max_lifetime
+        if not discard and not expired and self._reset:
+            try:
+                self._reset(conn)
+            except Exception as e:
+                self.logger.warning(f"Falha ao limpar conexão devolvida ao pool - descartando ({e})")
+                discard = True
+
+        with self._cond:
+            self._opening -= 1
+            if discard or expired or self._closed:
+                self._discarded += 1
+                entry_to_close = entry
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+                entry_to_close = None
+            self._cond.notify()
+
+        if entry_to_close is not None:
+            self._close(entry_to_close)
+            if expired and not discard:
+                self.logger.debug("Conexão reciclada por idade máxima")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna métricas do pool"""
+        with self._cond:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'max_size': self.max_size,
+                'waiters': self._waiters,
+                'max_waiters': self._max_waiters,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'discarded': self._discarded,
+                'avg_checkout_ms': (self._wait_total / self._checkouts * 1000) if self._checkouts else 0.0,
+                'max_checkout_ms': self._wait_max * 1000
+            }
+
+    def _create(self) -> _PoolEntry:
+        """Abre uma conexão; a vaga já foi reservada em _opening"""
+        try:
+            entry = _PoolEntry(self._connect())
+        except BaseException:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._opening -= 1
+            self._created += 1
+        return entry
+
+    def _check(self, entry: _PoolEntry) -> bool:
+        """Valida a conexão apenas se ficou ociosa por muito tempo"""
+        if self._validate is None or time.monotonic() - entry.last_used < self.validation_interval:
+            return True
+        try:
+            return bool(self._validate(entry.conn))
+        except Exception:
+            return False
+
+    def _close(self, entry: _PoolEntry):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
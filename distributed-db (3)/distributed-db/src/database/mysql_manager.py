@@ -1,170 +1,160 @@
 import mysql.connector
-from mysql.connector import Error
-from typing import List, Dict, Any, Optional, Tuple
-import logging
-from contextlib import contextmanager
-import time
+from mysql.connector import Error, FieldType, InterfaceError, OperationalError
+from mysql.connector.constants import ClientFlag
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from .backend import StorageBackend, ENGINE_MYSQL
+from ..core import result_set as rs
 
 
-class MySQLManager:
-    """Gerencia conexões e operações com MySQL"""
-    
-    def __init__(self, host: str, user: str, password: str, database: str, port: int = 3306):
+# Tipos do protocolo MySQL -> tipos lógicos do ResultSet
+_MYSQL_TYPES = {
+    'TINY': rs.TYPE_INT, 'SHORT': rs.TYPE_INT, 'LONG': rs.TYPE_INT, 'INT24': rs.TYPE_INT,
+    'LONGLONG': rs.TYPE_INT, 'YEAR': rs.TYPE_INT, 'BIT': rs.TYPE_INT,
+    'FLOAT': rs.TYPE_FLOAT, 'DOUBLE': rs.TYPE_FLOAT,
+    'DECIMAL': rs.TYPE_DECIMAL, 'NEWDECIMAL': rs.TYPE_DECIMAL,
+    'DATETIME': rs.TYPE_DATETIME, 'TIMESTAMP': rs.TYPE_DATETIME,
+    'DATE': rs.TYPE_DATE, 'NEWDATE': rs.TYPE_DATE, 'TIME': rs.TYPE_TIME,
+    'VARCHAR': rs.TYPE_STR, 'VAR_STRING': rs.TYPE_STR, 'STRING': rs.TYPE_STR,
+    'ENUM': rs.TYPE_STR, 'SET': rs.TYPE_STR,
+    'GEOMETRY': rs.TYPE_BYTES,
+    # BLOB/TEXT e JSON podem chegar como str ou bytes: inferidos pelo valor
+}
+
+
+class MySQLManager(StorageBackend):
+    """
+    Gerencia conexões e operações com MySQL
+
+    As conexões vêm de um pool compartilhado pelas threads dos handlers.
+    Cada query avulsa empresta uma conexão (em autocommit) só durante a
+    sua execução; uma transação explícita fica presa a uma conexão,
+    identificada pelo transaction_id, do begin até o commit ou rollback.
+    Queries com params usam prepared statements do servidor; em
+    executemany, INSERT ... VALUES vira um INSERT multi-linha por lote.
+    """
+
+    engine = ENGINE_MYSQL
+    errors = (Error,)
+    connection_errors = (OperationalError, InterfaceError)
+    lock_clause = ' FOR UPDATE'
+
+    def __init__(self, host: str, user: str, password: str, database: str, port: int = 3306, **options):
         self.host = host
         self.user = user
         self.password = password
         self.database = database
         self.port = port
-        self.logger = logging.getLogger(__name__)
-        self._connection = None
-    
-    def connect(self) -> bool:
-        """Estabelece conexão com o banco de dados"""
-        try:
-            self._connection = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                port=self.port,
-                autocommit=False  # Controle manual de transações
-            )
-            self.logger.info(f"Conectado ao MySQL em {self.host}:{self.port}")
-            return True
-        except Error as e:
-            self.logger.error(f"Erro ao conectar ao MySQL: {e}")
-            return False
-    
-    def disconnect(self):
-        """Fecha conexão com o banco de dados"""
-        if self._connection and self._connection.is_connected():
-            self._connection.close()
-            self.logger.info("Desconectado do MySQL")
-    
-    def is_connected(self) -> bool:
-        """Verifica se está conectado"""
-        return self._connection is not None and self._connection.is_connected()
-    
-    @contextmanager
-    def get_cursor(self, dictionary: bool = True):
-        """Context manager para cursor"""
-        if not self.is_connected():
-            self.connect()
-        
-        cursor = self._connection.cursor(dictionary=dictionary, buffered=True)
-        try:
-            yield cursor
-        finally:
-            cursor.close()
-    
-    def execute_query(self, query: str, params: Optional[Tuple] = None) -> Tuple[bool, Optional[List[Dict]], Optional[str], int]:
+        self._auto_increment = set()  # Tabelas cuja chave primária é AUTO_INCREMENT
+        super().__init__(**options)
+
+    def _open_connection(self, autocommit: bool = True):
         """
-        Executa uma query SQL
-        
-        Args:
-            query: Query SQL
-            params: Parâmetros da query
-            
-        Returns:
-            Tupla (sucesso, dados, erro, rows_affected)
+        Abre uma nova conexão com o MySQL
+
+        Com FOUND_ROWS, o rowcount de um UPDATE conta as linhas encontradas
+        (como no SQLite), não só as que mudaram de valor: a captura de
+        imagens compara esse número com as chaves selecionadas.
         """
-        start_time = time.time()
-        
-        try:
-            with self.get_cursor() as cursor:
-                self.logger.info(f"Executando query: {query[:100]}...")
-                
-                cursor.execute(query, params or ())
-                
-                # Verifica se é SELECT
-                if query.strip().upper().startswith('SELECT'):
-                    results = cursor.fetchall()
-                    execution_time = time.time() - start_time
-                    self.logger.info(f"Query executada com sucesso em {execution_time:.3f}s - {len(results)} registros")
-                    return True, results, None, len(results)
-                else:
-                    # INSERT, UPDATE, DELETE
-                    rows_affected = cursor.rowcount
-                    execution_time = time.time() - start_time
-                    self.logger.info(f"Query executada com sucesso em {execution_time:.3f}s - {rows_affected} linhas afetadas")
-                    return True, None, None, rows_affected
-                    
-        except Error as e:
-            execution_time = time.time() - start_time
-            error_msg = f"Erro ao executar query: {e}"
-            self.logger.error(error_msg)
-            return False, None, error_msg, 0
-    
-    def begin_transaction(self) -> bool:
-        """Inicia uma transação"""
+        return mysql.connector.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            port=self.port,
+            autocommit=autocommit,
+            client_flags=[ClientFlag.FOUND_ROWS]
+        )
+
+    def _validate_connection(self, conn) -> bool:
+        return conn.is_connected()
+
+    def _start_transaction(self, conn):
+        conn.start_transaction()
+
+    def _cursor(self, conn, dictionary: bool = False, buffered: bool = True):
+        return conn.cursor(dictionary=dictionary, buffered=buffered)
+
+    def _prepare(self, conn, sql: str):
+        return conn.cursor(prepared=True)
+
+    def _describe(self, cursor) -> Tuple[List[str], List[Optional[str]]]:
+        """Nomes e tipos lógicos das colunas a partir de cursor.description"""
+        columns = [column[0] for column in cursor.description]
+        types = [_MYSQL_TYPES.get(FieldType.get_info(column[1])) for column in cursor.description]
+        return columns, types
+
+    def _primary_key_columns(self, conn, table: str) -> Optional[Tuple[str, ...]]:
+        cursor = conn.cursor()
         try:
-            if not self.is_connected():
-                self.connect()
-            self._connection.start_transaction()
-            self.logger.info("Transação iniciada")
-            return True
-        except Error as e:
-            self.logger.error(f"Erro ao iniciar transação: {e}")
-            return False
-    
-    def commit(self) -> bool:
-        """Commit da transação"""
+            # SHOW COLUMNS: (Field, Type, Null, Key, Default, Extra)
+            cursor.execute(f"SHOW COLUMNS FROM {self.quote(table)}")
+            columns = cursor.fetchall()
+        finally:
+            cursor.close()
+        key = [row for row in columns if row[3] == 'PRI']
+        if len(key) == 1 and 'auto_increment' in (key[0][5] or ''):
+            self._auto_increment.add(table)
+        else:
+            self._auto_increment.discard(table)
+        return tuple(row[0] for row in key) or None
+
+    def _inserted_key(self, cursor, table: str, key: Sequence[str]) -> Optional[Tuple[Any, ...]]:
+        # lastrowid é o valor da coluna AUTO_INCREMENT (gerado ou informado)
+        if table in self._auto_increment and cursor.lastrowid:
+            return (cursor.lastrowid,)
+        return None
+
+    def _list_tables(self, conn) -> List[str]:
+        cursor = conn.cursor()
         try:
-            self._connection.commit()
-            self.logger.info("Transação commitada")
-            return True
-        except Error as e:
-            self.logger.error(f"Erro ao commitar transação: {e}")
-            return False
-    
-    def rollback(self) -> bool:
-        """Rollback da transação"""
+            cursor.execute("SHOW FULL TABLES WHERE Table_type = 'BASE TABLE'")
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def _table_ddl(self, conn, table: str) -> Optional[str]:
+        cursor = conn.cursor()
         try:
-            self._connection.rollback()
-            self.logger.info("Transação revertida")
-            return True
-        except Error as e:
-            self.logger.error(f"Erro ao reverter transação: {e}")
-            return False
-    
-    def execute_transaction(self, queries: List[str]) -> Tuple[bool, Optional[str]]:
-        """
-        Executa múltiplas queries em uma transação
-        
-        Args:
-            queries: Lista de queries SQL
-            
-        Returns:
-            Tupla (sucesso, erro)
-        """
+            cursor.execute(f"SHOW CREATE TABLE {self.quote(table)}")
+            row = cursor.fetchone()
+            return row[1] if row else None
+        finally:
+            cursor.close()
+
+    def _start_snapshot(self, connections: List[Any], at_snapshot: Callable[[], Any]) -> Any:
+        # FLUSH TABLES WITH READ LOCK (requer o privilégio RELOAD) segura as
+        # escritas enquanto cada conexão abre a sua leitura consistente
+        lock = self._open_connection()
+        cursor = lock.cursor()
         try:
-            self.begin_transaction()
-            
-            for query in queries:
-                success, _, error, _ = self.execute_query(query)
-                if not success:
-                    self.rollback()
-                    return False, error
-            
-            self.commit()
-            return True, None
-            
-        except Exception as e:
-            self.rollback()
-            error_msg = f"Erro na transação: {e}"
-            self.logger.error(error_msg)
-            return False, error_msg
-    
-    def test_connection(self) -> bool:
-        """Testa a conexão com o banco"""
+            cursor.execute("FLUSH TABLES WITH READ LOCK")
+            for conn in connections:
+                snapshot_cursor = conn.cursor()
+                try:
+                    snapshot_cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                    snapshot_cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+                finally:
+                    snapshot_cursor.close()
+            return at_snapshot()
+        finally:
+            cursor.execute("UNLOCK TABLES")
+            cursor.close()
+            lock.close()
+
+    def _without_constraints(self, conn, disabled: bool):
+        cursor = conn.cursor()
         try:
-            if not self.is_connected():
-                self.connect()
-            
-            with self.get_cursor() as cursor:
-                cursor.execute("SELECT 1")
-                cursor.fetchone()
-            return True
-        except Error as e:
-            self.logger.error(f"Teste de conexão falhou: {e}")
-            return False
+            cursor.execute(f"SET SESSION foreign_key_checks = {0 if disabled else 1}")
+        finally:
+            cursor.close()
+
+    def upsert_sql(self, table: str, columns: Sequence[str], key: Sequence[str]) -> Optional[str]:
+        names = ', '.join(self.quote(column) for column in columns)
+        updates = ', '.join(f"{self.quote(column)} = VALUES({self.quote(column)})"
+                            for column in columns if column not in key) or \
+            ', '.join(f"{self.quote(column)} = {self.quote(column)}" for column in key)
+        return (f"INSERT INTO {self.quote(table)} ({names}) VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON DUPLICATE KEY UPDATE {updates}")
+
+    def describe_target(self) -> str:
+        return f"{self.host}:{self.port}"
@@ -0,0 +1,179 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, Optional, Sequence, Tuple
+from ..core.result_set import ResultSet
+from ..core.sql_analysis import normalize_sql
+
+
+# Custo fixo aproximado de uma entrada/linha/valor (objetos Python)
+_ENTRY_OVERHEAD = 256
+_ROW_OVERHEAD = 56
+_VALUE_OVERHEAD = 16
+
+
+def estimate_size(result: ResultSet) -> int:
+    """Estimativa barata, em bytes, da memória ocupada por um ResultSet"""
+    size = _ENTRY_OVERHEAD + sum(len(column) for column in result.columns)
+    for row in result.rows:
+        size += _ROW_OVERHEAD
+        for value in row:
+            if isinstance(value, (str, bytes, bytearray)):
+                size += _VALUE_OVERHEAD + len(value)
+            else:
+                size += _VALUE_OVERHEAD + 8
+    return size
+
+
+class _CacheEntry:
+    __slots__ = ('result', 'tables', 'size', 'expires_at')
+
+    def __init__(self, result: ResultSet, tables: FrozenSet[str], size: int, expires_at: float):
+        self.result = result
+        self.tables = tables
+        self.size = size
+        self.expires_at = expires_at
+
+
+class QueryCache:
+    """
+    Cache de resultados de SELECT com invalidação por tabela
+
+    As entradas são indexadas pela query normalizada mais os parâmetros,
+    limitadas pelo total estimado de bytes (o resultado menos usado
+    recentemente sai primeiro) e expiram após `ttl` segundos. Toda
+    escrita confirmada em uma tabela invalida os resultados que a leem.
+
+    Para não guardar um resultado lido antes de uma escrita concorrente,
+    o leitor tira um snapshot das gerações das tabelas antes de executar
+    a query; o put é ignorado se alguma delas mudou nesse meio tempo.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, ttl: float = 30,
+                 max_entry_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes or max(1, max_bytes // 8)
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, _CacheEntry]' = OrderedDict()
+        self._by_table: Dict[str, set] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0  # Incrementado por clear()
+        self._bytes = 0
+
+        # Métricas
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+        self._rejected = 0
+
+    @staticmethod
+    def make_key(query: str, params: Optional[Sequence[Any]] = None) -> Hashable:
+        return normalize_sql(query), tuple(params) if params is not None else None
+
+    def get(self, key: Hashable) -> Optional[ResultSet]:
+        """Retorna o resultado cacheado, ou None se ausente/expirado"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry.result
+
+    def snapshot(self, tables: Iterable[str]) -> Tuple[int, Tuple[Tuple[str, int], ...]]:
+        """Gerações atuais das tabelas, a passar para put"""
+        with self._lock:
+            return self._epoch, tuple((table, self._generations.get(table, 0)) for table in sorted(tables))
+
+    def put(self, key: Hashable, result: ResultSet, snapshot: Tuple[int, Tuple[Tuple[str, int], ...]]) -> bool:
+        """
+        Guarda um resultado lido das tabelas do snapshot
+
+        Returns:
+            True se o resultado foi guardado
+        """
+        size = estimate_size(result)
+        with self._lock:
+            epoch, generations = snapshot
+            stale = epoch != self._epoch or any(
+                self._generations.get(table, 0) != generation for table, generation in generations
+            )
+            if stale or not generations or size > self.max_entry_bytes:
+                self._rejected += 1
+                return False
+
+            if key in self._entries:
+                self._remove(key)
+            tables = frozenset(table for table, _ in generations)
+            self._entries[key] = _CacheEntry(result, tables, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+            return True
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """
+        Descarta os resultados que leem alguma das tabelas
+
+        Returns:
+            Número de entradas removidas
+        """
+        removed = 0
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+                for key in list(self._by_table.get(table, ())):
+                    self._remove(key)
+                    removed += 1
+            self._invalidations += removed
+        return removed
+
+    def clear(self):
+        """Descarta todo o cache (ex.: escrita em tabela desconhecida)"""
+        with self._lock:
+            self._epoch += 1
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna métricas do cache"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations,
+                'rejected': self._rejected
+            }
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        for table in entry.tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
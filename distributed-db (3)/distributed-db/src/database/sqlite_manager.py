@@ -0,0 +1,171 @@
+import os
+import sqlite3
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from .backend import StorageBackend, ENGINE_SQLITE
+from ..core.sql_analysis import to_qmark
+
+
+_SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+class _Connection(sqlite3.Connection):
+    """Conexão SQLite que aceita atributos (cache de statements da conexão)"""
+
+
+class SQLiteManager(StorageBackend):
+    """
+    Armazenamento do nó em um arquivo SQLite embutido
+
+    Permite rodar o cluster inteiro em uma máquina sem servidor de banco:
+    cada nó aponta para o seu arquivo. O banco usa journal WAL (leitores
+    não bloqueiam o escritor nem são bloqueados por ele), synchronous
+    NORMAL (fsync só nos checkpoints) e leitura por mmap. Transações
+    explícitas começam com BEGIN IMMEDIATE, que reserva o lock de escrita
+    logo no início em vez de falhar com SQLITE_BUSY no primeiro UPDATE.
+
+    As queries continuam usando placeholders %s como no MySQL; eles são
+    trocados por ? antes de chegar ao driver.
+    """
+
+    engine = ENGINE_SQLITE
+    errors = (sqlite3.Error,)
+    connection_errors = (sqlite3.InterfaceError,)
+
+    def __init__(self, path: str, mmap_size_mb: int = 256, synchronous: str = 'NORMAL',
+                 busy_timeout: float = 5, init_script: Optional[str] = None, **options):
+        """
+        Args:
+            path: Arquivo do banco (criado se não existir)
+            mmap_size_mb: Quanto do arquivo é lido via mmap (0 desativa)
+            synchronous: OFF, NORMAL, FULL ou EXTRA
+            busy_timeout: Segundos de espera pelo lock de escrita
+            init_script: Script SQL executado uma vez ao conectar (ex.: CREATE TABLE IF NOT EXISTS)
+        """
+        if path == ':memory:':
+            raise ValueError("SQLite em memória não é compartilhado entre conexões do pool; use um arquivo")
+        if synchronous.upper() not in _SYNCHRONOUS_MODES:
+            raise ValueError(f"synchronous inválido: {synchronous}")
+        self.path = path
+        self.mmap_size = int(mmap_size_mb * 1024 * 1024)
+        self.synchronous = synchronous.upper()
+        self.busy_timeout = busy_timeout
+        self.init_script = init_script
+        super().__init__(**options)
+
+    def connect(self) -> bool:
+        """Cria o arquivo (e o esquema, se houver init_script) e abre o pool"""
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            if self.init_script:
+                with open(self.init_script, 'r') as f:
+                    script = f.read()
+                conn = self._open_connection()
+                try:
+                    conn.executescript(script)
+                finally:
+                    conn.close()
+        except (OSError, sqlite3.Error) as e:
+            self.logger.error(f"Erro ao preparar banco SQLite {self.path}: {e}")
+            return False
+        return super().connect()
+
+    def _open_connection(self):
+        """Abre uma conexão em autocommit com WAL e mmap configurados"""
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            isolation_level=None,  # Autocommit; transações com BEGIN explícito
+            check_same_thread=False,  # Emprestada a uma thread por vez pelo pool
+            cached_statements=self.statement_cache_size,
+            factory=_Connection
+        )
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+        except sqlite3.Error:
+            conn.close()
+            raise
+        return conn
+
+    def _start_transaction(self, conn):
+        conn.execute("BEGIN IMMEDIATE")
+
+    def _cursor(self, conn, dictionary: bool = False, buffered: bool = True):
+        # Cursores SQLite já leem as linhas sob demanda: buffered não se aplica
+        cursor = conn.cursor()
+        if dictionary:
+            cursor.row_factory = lambda cur, row: {
+                column[0]: value for column, value in zip(cur.description, row)
+            }
+        return cursor
+
+    def _prepare(self, conn, sql: str):
+        # O sqlite3 compila e guarda o statement pelo texto (cached_statements);
+        # o cursor cacheado evita recriá-lo a cada execução
+        return conn.cursor()
+
+    def _describe(self, cursor) -> Tuple[List[str], List[Optional[str]]]:
+        """Nomes das colunas; os tipos são inferidos pelos valores"""
+        columns = [column[0] for column in cursor.description]
+        return columns, [None] * len(columns)
+
+    def _translate(self, query: str) -> str:
+        return to_qmark(query)
+
+    def _primary_key_columns(self, conn, table: str) -> Optional[Tuple[str, ...]]:
+        # table_info: (cid, name, type, notnull, dflt_value, pk), pk = posição na chave
+        rows = conn.execute(f"PRAGMA table_info({self.quote(table)})").fetchall()
+        key = sorted((row[5], row[1]) for row in rows if row[5])
+        return tuple(name for _, name in key) or None
+
+    def _inserted_key(self, cursor, table: str, key: Sequence[str]) -> Optional[Tuple[Any, ...]]:
+        # lastrowid é o rowid, que só coincide com a chave em INTEGER PRIMARY KEY
+        if not cursor.lastrowid:
+            return None
+        try:
+            cursor.execute(
+                f"SELECT {', '.join(self.quote(column) for column in key)} FROM {self.quote(table)} WHERE rowid = ?",
+                (cursor.lastrowid,)
+            )
+            row = cursor.fetchone()
+        except sqlite3.Error:
+            return None  # Tabela WITHOUT ROWID
+        return tuple(row) if row else None
+
+    def _list_tables(self, conn) -> List[str]:
+        rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+        return [row[0] for row in rows.fetchall()]
+
+    def _table_ddl(self, conn, table: str) -> Optional[str]:
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        return row[0] if row else None
+
+    def _start_snapshot(self, connections: List[Any], at_snapshot: Callable[[], Any]) -> Any:
+        # Um BEGIN IMMEDIATE em outra conexão segura os escritores enquanto
+        # cada leitura fixa o mesmo instante do WAL (fixado na primeira leitura)
+        lock = self._open_connection()
+        try:
+            lock.execute("BEGIN IMMEDIATE")
+            for conn in connections:
+                conn.execute("BEGIN")
+                conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            return at_snapshot()
+        finally:
+            lock.rollback()
+            lock.close()
+
+    def upsert_sql(self, table: str, columns: Sequence[str], key: Sequence[str]) -> Optional[str]:
+        if sqlite3.sqlite_version_info < (3, 24):
+            return None  # Sem ON CONFLICT ... DO UPDATE
+        names = ', '.join(self.quote(column) for column in columns)
+        updates = ', '.join(f"{self.quote(column)} = excluded.{self.quote(column)}"
+                            for column in columns if column not in key)
+        conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        return (f"INSERT INTO {self.quote(table)} ({names}) VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON CONFLICT ({', '.join(self.quote(column) for column in key)}) {conflict}")
+
+    def describe_target(self) -> str:
+        return self.path
@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+
+class StatementCacheStats:
+    """Contadores agregados de todos os caches de statements de um nó"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def record(self, hit: bool, evicted: int = 0):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.evictions += evicted
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+class StatementCache:
+    """
+    Cache LRU de prepared statements de uma conexão
+
+    Chaveado pelo texto SQL: a primeira execução prepara o statement no
+    servidor (parse e plano) e as seguintes reaproveitam o handle, enviando
+    apenas os parâmetros. Statements menos usados recentemente são
+    fechados quando a capacidade é excedida. Como prepared statements
+    pertencem a uma conexão, cada conexão tem o seu cache; não é
+    compartilhado entre threads (a conexão está emprestada a uma só).
+    """
+
+    def __init__(self, prepare: Callable[[str], Any], close: Callable[[Any], None],
+                 capacity: int = 64, stats: StatementCacheStats = None):
+        self._prepare = prepare
+        self._close = close
+        self.capacity = capacity
+        self.stats = stats or StatementCacheStats()
+        self._statements: 'OrderedDict[str, Any]' = OrderedDict()
+
+    def get(self, sql: str) -> Any:
+        """
+        Retorna o statement preparado para o SQL, preparando se necessário
+
+        Args:
+            sql: Texto da query com placeholders
+
+        Returns:
+            Handle do statement (ex.: cursor preparado)
+        """
+        statement = self._statements.get(sql)
+        if statement is not None:
+            self._statements.move_to_end(sql)
+            self.stats.record(hit=True)
+            return statement
+
+        statement = self._prepare(sql)
+        self._statements[sql] = statement
+        evicted = 0
+        while len(self._statements) > self.capacity:
+            _, old = self._statements.popitem(last=False)
+            self._close_quietly(old)
+            evicted += 1
+        self.stats.record(hit=False, evicted=evicted)
+        return statement
+
+    def discard(self, sql: str):
+        """Remove um statement (ex.: após erro que o invalidou)"""
+        statement = self._statements.pop(sql, None)
+        if statement is not None:
+            self._close_quietly(statement)
+
+    def clear(self):
+        """Fecha todos os statements do cache"""
+        while self._statements:
+            _, statement = self._statements.popitem()
+            self._close_quietly(statement)
+
+    def __len__(self):
+        return len(self._statements)
+
+    def _close_quietly(self, statement: Any):
+        try:
+            self._close(statement)
+        except Exception:
+            pass
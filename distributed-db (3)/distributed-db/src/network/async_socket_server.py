@@ -0,0 +1,186 @@
+import asyncio
+import threading
+import logging
+import socket
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Iterator, Optional, Set
+from ..core.models import Message
+from .socket_server import HandlerResult, SocketServer
+from .framing import FrameError, MAX_FRAME_SIZE, is_control_frame, read_frame_async
+
+
+class AsyncSocketServer(SocketServer):
+    """
+    Servidor de sockets baseado em asyncio
+
+    Mantém o mesmo contrato de message_handler do SocketServer, mas atende
+    todas as conexões em um único event loop. Os handlers (que podem
+    bloquear no MySQL, como handle_query) executam em um pool de threads
+    limitado, de modo que o número de threads não cresce com o número de
+    clientes conectados. Frames do plano de controle (heartbeat, eleição)
+    usam um pool separado e pequeno, então não esperam atrás de queries
+    quando o pool dos handlers está todo ocupado.
+    """
+
+    # Maior mensagem aceita em uma linha legada (QUERY_RESPONSE grandes)
+    MAX_LINE_SIZE = MAX_FRAME_SIZE
+
+    # Tempo máximo que uma resposta RPC espera o cliente esvaziar o buffer
+    REPLY_TIMEOUT = 30
+
+    def __init__(self, host: str, port: int, message_handler: Callable[[Message], HandlerResult],
+                 backlog: int = 1024, max_workers: int = 32, control_workers: int = 4):
+        super().__init__(host, port, message_handler, backlog)
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.control_workers = control_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._control_executor: Optional[ThreadPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._started = threading.Event()
+        self._start_error: Optional[BaseException] = None
+
+    def start(self):
+        """Inicia o event loop em uma thread dedicada"""
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='handler')
+        self._rpc_executor = self._executor  # Requisições RPC usam o mesmo pool de handlers
+        self._control_executor = ThreadPoolExecutor(max_workers=self.control_workers,
+                                                    thread_name_prefix='control')
+        self._loop = asyncio.new_event_loop()
+        self.running = True
+
+        threading.Thread(target=self._run_loop, daemon=True).start()
+        self._started.wait()
+
+        if self._start_error:
+            self.running = False
+            self.logger.error(f"Erro ao iniciar servidor: {self._start_error}")
+            raise self._start_error
+
+        self.logger.info(f"Servidor asyncio iniciado em {self.host}:{self.port}")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(asyncio.start_server(
+                self._handle_connection,
+                '0.0.0.0',
+                self.port,
+                backlog=self.backlog,
+                limit=self.MAX_LINE_SIZE
+            ))
+            self.port = self._server.sockets[0].getsockname()[1]
+        except Exception as e:
+            self._start_error = e
+            self._started.set()
+            return
+
+        self._started.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Lida com mensagens de um cliente
+
+        Args:
+            reader: Stream de leitura da conexão
+            writer: Stream de escrita da conexão
+        """
+        address = writer.get_extra_info('peername')
+        self._writers.add(writer)
+        self.logger.debug(f"Nova conexão de {address}")
+        loop = asyncio.get_running_loop()
+
+        def reply(data: bytes):
+            # Chamado pelas threads do pool (respostas RPC): espera o drain
+            future = asyncio.run_coroutine_threadsafe(self._write(writer, data), loop)
+            try:
+                future.result(self.REPLY_TIMEOUT)
+            except FutureTimeout:
+                future.cancel()
+                raise socket.timeout("Cliente não consumiu a resposta RPC a tempo")
+
+        try:
+            while self.running:
+                frame = await read_frame_async(reader)
+                if frame is None:
+                    break
+
+                # Handler pode bloquear (MySQL): executa fora do event loop
+                executor = self._control_executor if is_control_frame(frame) else self._executor
+                response = await loop.run_in_executor(executor, self._process_frame, frame, reply)
+                if isinstance(response, Future):
+                    # Trabalho agendado pelo handler: espera sem ocupar thread
+                    response = await asyncio.wrap_future(response)
+                if isinstance(response, bytes):
+                    writer.write(response)
+                    await writer.drain()
+                elif response is not None:
+                    await self._send_stream_async(writer, response)
+
+        except FrameError as e:
+            self.logger.warning(f"Frame inválido recebido de {address}: {e} - encerrando conexão")
+        except ConnectionError:
+            pass
+        except Exception as e:
+            self.logger.error(f"Erro ao lidar com cliente {address}: {e}")
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+            self.logger.debug(f"Conexão com {address} fechada")
+
+    @staticmethod
+    async def _write(writer: asyncio.StreamWriter, data: bytes):
+        writer.write(data)
+        await writer.drain()
+
+    async def _send_stream_async(self, writer: asyncio.StreamWriter, parts: Iterator[bytes]):
+        """
+        Envia uma resposta em streaming, uma mensagem por vez
+
+        Cada lote é produzido no pool de threads (lê do MySQL) e o próximo
+        só é pedido depois que drain() confirma que o buffer de escrita
+        esvaziou, limitando a memória ao ritmo de consumo do cliente.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                part = await loop.run_in_executor(self._executor, next, parts, None)
+                if part is None:
+                    break
+                writer.write(part)
+                await writer.drain()
+        finally:
+            await loop.run_in_executor(self._executor, parts.close)
+
+    async def _shutdown(self):
+        if self._server:
+            self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        if self._server:
+            await self._server.wait_closed()
+
+    def stop(self):
+        """Para o servidor"""
+        self.running = False
+
+        if self._loop and self._loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+            try:
+                future.result(timeout=5)
+            except Exception:
+                pass
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        if self._control_executor:
+            self._control_executor.shutdown(wait=False)
+
+        self.logger.info("Servidor parado")
@@ -0,0 +1,349 @@
+import struct
+import uuid
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from typing import Any, Tuple
+from ..core.models import Message, MessageType, CommunicationType
+
+
+# Tabelas de ordinais dos enums. Novos membros devem ser adicionados ao
+# final dos enums para manter os ordinais estáveis entre versões.
+MESSAGE_TYPES = list(MessageType)
+MESSAGE_TYPE_ORDINALS = {member: index for index, member in enumerate(MESSAGE_TYPES)}
+COMMUNICATION_TYPES = list(CommunicationType)
+COMMUNICATION_TYPE_ORDINALS = {member: index for index, member in enumerate(COMMUNICATION_TYPES)}
+
+# Bits de presença dos campos opcionais da mensagem
+_HAS_TRANSACTION_ID = 0x01
+_HAS_UUID_TRANSACTION = 0x02
+_HAS_QUERY = 0x04
+_HAS_DATA = 0x08
+_HAS_TIMESTAMP = 0x10
+_HAS_TARGET_NODES = 0x20
+_HAS_REQUEST_ID = 0x40
+_HAS_PARAMS = 0x80
+
+# Tags dos valores de `data`
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _BYTES, _LIST, _DICT, _DATETIME, _DATE, _DECIMAL, _TIMEDELTA = range(13)
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_DATE = date(1970, 1, 1)
+_HEADER = struct.Struct('!BBB')  # tipo, comunicação, presença
+_DOUBLE = struct.Struct('!d')
+
+
+class BinaryFormatError(ValueError):
+    """Corpo binário truncado ou com tag desconhecida"""
+
+
+def _write_uvarint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _write_varint(out: bytearray, value: int):
+    # Zigzag: inteiros pequenos negativos também ocupam poucos bytes
+    _write_uvarint(out, (value << 1) if value >= 0 else ((-value << 1) - 1))
+
+
+def _read_uvarint(buf, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    try:
+        while True:
+            byte = buf[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result, pos
+            shift += 7
+    except IndexError:
+        raise BinaryFormatError("Varint truncado")
+
+
+def _read_varint(buf, pos: int) -> Tuple[int, int]:
+    value, pos = _read_uvarint(buf, pos)
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1), pos
+
+
+def _write_str(out: bytearray, value: str):
+    encoded = value.encode('utf-8')
+    _write_uvarint(out, len(encoded))
+    out += encoded
+
+
+def _read_str(buf, pos: int) -> Tuple[str, int]:
+    length, pos = _read_uvarint(buf, pos)
+    end = pos + length
+    if end > len(buf):
+        raise BinaryFormatError("String truncada")
+    return bytes(buf[pos:end]).decode('utf-8'), end
+
+
+def _micros(delta: timedelta) -> int:
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _write_value(out: bytearray, value: Any):
+    # bool antes de int: bool é subclasse de int
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif isinstance(value, int):
+        out.append(_INT)
+        _write_varint(out, value)
+    elif isinstance(value, str):
+        out.append(_STR)
+        _write_str(out, value)
+    elif isinstance(value, float):
+        out.append(_FLOAT)
+        out += _DOUBLE.pack(value)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        _write_uvarint(out, len(value))
+        for key, item in value.items():
+            _write_str(out, str(key))
+            _write_value(out, item)
+    elif isinstance(value, (list, tuple)):
+        out.append(_LIST)
+        _write_uvarint(out, len(value))
+        for item in value:
+            _write_value(out, item)
+    elif isinstance(value, datetime):
+        out.append(_DATETIME)
+        _write_varint(out, _micros(value.replace(tzinfo=None) - _EPOCH))
+    elif isinstance(value, date):
+        out.append(_DATE)
+        _write_varint(out, (value - _EPOCH_DATE).days)
+    elif isinstance(value, Decimal):
+        out.append(_DECIMAL)
+        _write_str(out, str(value))
+    elif isinstance(value, timedelta):
+        out.append(_TIMEDELTA)
+        _write_varint(out, _micros(value))
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        out.append(_BYTES)
+        _write_uvarint(out, len(value))
+        out += value
+    else:
+        raise TypeError(f"Tipo não suportado na codificação binária: {type(value).__name__}")
+
+
+def _read_value(buf, pos: int) -> Tuple[Any, int]:
+    try:
+        tag = buf[pos]
+    except IndexError:
+        raise BinaryFormatError("Valor truncado")
+    pos += 1
+
+    if tag == _STR:
+        return _read_str(buf, pos)
+    if tag == _INT:
+        return _read_varint(buf, pos)
+    if tag == _NONE:
+        return None, pos
+    if tag == _TRUE:
+        return True, pos
+    if tag == _FALSE:
+        return False, pos
+    if tag == _FLOAT:
+        if pos + _DOUBLE.size > len(buf):
+            raise BinaryFormatError("Float truncado")
+        return _DOUBLE.unpack_from(buf, pos)[0], pos + _DOUBLE.size
+    if tag == _DICT:
+        count, pos = _read_uvarint(buf, pos)
+        result = {}
+        for _ in range(count):
+            key, pos = _read_str(buf, pos)
+            result[key], pos = _read_value(buf, pos)
+        return result, pos
+    if tag == _LIST:
+        count, pos = _read_uvarint(buf, pos)
+        result = []
+        for _ in range(count):
+            item, pos = _read_value(buf, pos)
+            result.append(item)
+        return result, pos
+    if tag == _DATETIME:
+        micros, pos = _read_varint(buf, pos)
+        return _EPOCH + timedelta(microseconds=micros), pos
+    if tag == _DATE:
+        days, pos = _read_varint(buf, pos)
+        return _EPOCH_DATE + timedelta(days=days), pos
+    if tag == _DECIMAL:
+        text, pos = _read_str(buf, pos)
+        return Decimal(text), pos
+    if tag == _TIMEDELTA:
+        micros, pos = _read_varint(buf, pos)
+        return timedelta(microseconds=micros), pos
+    if tag == _BYTES:
+        length, pos = _read_uvarint(buf, pos)
+        if pos + length > len(buf):
+            raise BinaryFormatError("Bytes truncados")
+        return bytes(buf[pos:pos + length]), pos + length
+    raise BinaryFormatError(f"Tag desconhecida: {tag}")
+
+
+def _uuid_bytes(transaction_id: str):
+    """Retorna os 16 bytes do UUID se o id estiver na forma canônica"""
+    if len(transaction_id) != 36:
+        return None
+    try:
+        parsed = uuid.UUID(transaction_id)
+    except ValueError:
+        return None
+    return parsed.bytes if str(parsed) == transaction_id else None
+
+
+def encode_message(message: Message) -> bytes:
+    """
+    Codifica mensagem no formato binário compacto
+
+    Layout: tipo (u8), comunicação (u8), bits de presença (u8), sender_id
+    (varint), request_id (uvarint, se presente) e em seguida apenas os
+    demais campos presentes. Enums viajam como ordinais, timestamps como
+    microssegundos desde a época (varint) e transaction_ids UUID como 16
+    bytes. O checksum não é incluído: a
+    integridade é garantida pelo CRC32 do frame.
+
+    Args:
+        message: Mensagem a ser codificada
+
+    Returns:
+        Bytes do corpo
+    """
+    presence = 0
+    transaction_uuid = None
+    if message.transaction_id is not None:
+        presence |= _HAS_TRANSACTION_ID
+        transaction_uuid = _uuid_bytes(message.transaction_id)
+        if transaction_uuid is not None:
+            presence |= _HAS_UUID_TRANSACTION
+    if message.query is not None:
+        presence |= _HAS_QUERY
+    if message.data is not None:
+        presence |= _HAS_DATA
+    if message.timestamp is not None:
+        presence |= _HAS_TIMESTAMP
+    if message.target_nodes is not None:
+        presence |= _HAS_TARGET_NODES
+    if message.request_id is not None:
+        presence |= _HAS_REQUEST_ID
+    if message.params is not None:
+        presence |= _HAS_PARAMS
+
+    out = bytearray(_HEADER.pack(
+        MESSAGE_TYPE_ORDINALS[message.message_type],
+        COMMUNICATION_TYPE_ORDINALS[message.communication_type],
+        presence
+    ))
+    _write_varint(out, message.sender_id)
+    if message.request_id is not None:
+        _write_uvarint(out, message.request_id)
+
+    if transaction_uuid is not None:
+        out += transaction_uuid
+    elif message.transaction_id is not None:
+        _write_str(out, message.transaction_id)
+    if message.query is not None:
+        _write_str(out, message.query)
+    if message.timestamp is not None:
+        _write_varint(out, _micros(message.timestamp.replace(tzinfo=None) - _EPOCH))
+    if message.target_nodes is not None:
+        _write_uvarint(out, len(message.target_nodes))
+        for node_id in message.target_nodes:
+            _write_varint(out, node_id)
+    if message.params is not None:
+        _write_value(out, list(message.params))
+    if message.data is not None:
+        _write_value(out, message.data)
+
+    return bytes(out)
+
+
+def decode_message(buf) -> Message:
+    """
+    Decodifica mensagem do formato binário compacto
+
+    Args:
+        buf: Corpo binário (bytes ou memoryview)
+
+    Returns:
+        Mensagem decodificada
+    """
+    if len(buf) < _HEADER.size:
+        raise BinaryFormatError("Cabeçalho binário truncado")
+    type_ordinal, communication_ordinal, presence = _HEADER.unpack_from(buf)
+    try:
+        message_type = MESSAGE_TYPES[type_ordinal]
+        communication_type = COMMUNICATION_TYPES[communication_ordinal]
+    except IndexError:
+        raise BinaryFormatError("Ordinal de enum desconhecido")
+
+    sender_id, pos = _read_varint(buf, _HEADER.size)
+    transaction_id = query = data = timestamp = target_nodes = request_id = params = None
+    if presence & _HAS_REQUEST_ID:
+        request_id, pos = _read_uvarint(buf, pos)
+
+    if presence & _HAS_UUID_TRANSACTION:
+        if pos + 16 > len(buf):
+            raise BinaryFormatError("UUID truncado")
+        transaction_id = str(uuid.UUID(bytes=bytes(buf[pos:pos + 16])))
+        pos += 16
+    elif presence & _HAS_TRANSACTION_ID:
+        transaction_id, pos = _read_str(buf, pos)
+    if presence & _HAS_QUERY:
+        query, pos = _read_str(buf, pos)
+    if presence & _HAS_TIMESTAMP:
+        micros, pos = _read_varint(buf, pos)
+        timestamp = _EPOCH + timedelta(microseconds=micros)
+    if presence & _HAS_TARGET_NODES:
+        count, pos = _read_uvarint(buf, pos)
+        target_nodes = []
+        for _ in range(count):
+            node_id, pos = _read_varint(buf, pos)
+            target_nodes.append(node_id)
+    if presence & _HAS_PARAMS:
+        params, pos = _read_value(buf, pos)
+    if presence & _HAS_DATA:
+        data, pos = _read_value(buf, pos)
+
+    if pos != len(buf):
+        raise BinaryFormatError("Bytes extras no fim da mensagem")
+
+    return Message(
+        message_type=message_type,
+        sender_id=sender_id,
+        transaction_id=transaction_id,
+        query=query,
+        data=data,
+        timestamp=timestamp,
+        communication_type=communication_type,
+        target_nodes=target_nodes,
+        request_id=request_id,
+        params=params
+    )
+
+
+def encode_value(value: Any) -> bytes:
+    """
+    Codifica um valor avulso (listas, dicts e os tipos de coluna) no formato binário
+
+    Usado para payloads que não são mensagens, como os trechos de um snapshot.
+    """
+    out = bytearray()
+    _write_value(out, value)
+    return bytes(out)
+
+
+def decode_value(buf) -> Any:
+    """Decodifica um valor gerado por encode_value"""
+    value, pos = _read_value(buf, 0)
+    if pos != len(buf):
+        raise BinaryFormatError("Bytes sobrando após o valor")
+    return value
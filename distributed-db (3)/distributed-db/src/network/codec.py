@@ -0,0 +1,145 @@
+import json
+import struct
+import zlib
+from typing import List, Optional
+from ..core.models import Message
+from ..core.checksum import ChecksumValidator
+from ..core.result_set import to_json_value
+from .framing import Frame, HELLO_TYPE_CODE, encode_frame, encode_line
+from . import binary_format
+
+
+# Flags do cabeçalho do frame
+FLAG_CRC32 = 0x0001   # Corpo prefixado com CRC32 (4 bytes) dos bytes codificados
+FLAG_BINARY = 0x0002  # Corpo no formato binário compacto em vez de JSON
+
+ENCODING_JSON = 'json'
+ENCODING_BINARY = 'binary'
+SUPPORTED_ENCODINGS = (ENCODING_BINARY, ENCODING_JSON)
+
+_CRC32 = struct.Struct('!I')
+
+
+class ChecksumError(ValueError):
+    """Integridade da mensagem não confere"""
+
+
+class MessageCodec:
+    """
+    Codifica e decodifica mensagens em uma única passada
+
+    Em frames, a mensagem é serializada para JSON uma única vez e o CRC32
+    é calculado sobre exatamente esses bytes e transportado no frame. O
+    receptor verifica o CRC32 sobre os bytes recebidos antes de fazer um
+    único json.loads. Linhas legadas (e frames sem FLAG_CRC32) continuam
+    usando o checksum MD5 dentro do próprio JSON.
+
+    O corpo de um frame pode estar em JSON (legível, útil para depuração)
+    ou no formato binário compacto (FLAG_BINARY), negociado por conexão
+    com um frame HELLO.
+    """
+
+    @staticmethod
+    def encode(message: Message, framed: bool = True, encoding: str = ENCODING_JSON) -> bytes:
+        """
+        Serializa mensagem pronta para envio
+
+        Args:
+            message: Mensagem a ser enviada
+            framed: True para frame binário, False para linha legada
+            encoding: Codificação do corpo do frame ('json' ou 'binary')
+
+        Returns:
+            Bytes prontos para envio
+        """
+        if framed and encoding == ENCODING_BINARY:
+            body = binary_format.encode_message(message)
+            return encode_frame(_CRC32.pack(zlib.crc32(body)) + body, message.message_type,
+                                FLAG_CRC32 | FLAG_BINARY)
+
+        message_dict = message.to_dict()
+
+        if not framed:
+            message_dict = ChecksumValidator.add_checksum(message_dict)
+            return encode_line(json.dumps(message_dict, default=to_json_value).encode('utf-8'))
+
+        body = json.dumps(message_dict, separators=(',', ':'), default=to_json_value).encode('utf-8')
+        return encode_frame(_CRC32.pack(zlib.crc32(body)) + body, message.message_type, FLAG_CRC32)
+
+    @staticmethod
+    def encoding_of(frame: Frame) -> str:
+        """Retorna a codificação usada no corpo do frame"""
+        return ENCODING_BINARY if frame.flags & FLAG_BINARY else ENCODING_JSON
+
+    @staticmethod
+    def encode_hello(encodings: List[str]) -> bytes:
+        """Frame HELLO com as codificações aceitas, em ordem de preferência"""
+        return encode_frame(json.dumps({'encodings': encodings}).encode('utf-8'), type_code=HELLO_TYPE_CODE)
+
+    @staticmethod
+    def is_hello(frame: Frame) -> bool:
+        return frame.framed and frame.type_code == HELLO_TYPE_CODE
+
+    @staticmethod
+    def answer_hello(frame: Frame) -> bytes:
+        """
+        Escolhe a primeira codificação do cliente que este nó suporta
+
+        Args:
+            frame: Frame HELLO recebido
+
+        Returns:
+            Frame HELLO de resposta com a codificação escolhida
+        """
+        try:
+            offered = json.loads(frame.body).get('encodings', [])
+        except (ValueError, AttributeError):
+            offered = []
+        chosen = next((enc for enc in offered if enc in SUPPORTED_ENCODINGS), ENCODING_JSON)
+        return encode_frame(json.dumps({'encoding': chosen}).encode('utf-8'), type_code=HELLO_TYPE_CODE)
+
+    @staticmethod
+    def parse_hello_reply(frame: Optional[Frame]) -> str:
+        """Extrai a codificação escolhida pelo nó remoto (JSON se inválida)"""
+        if frame is None or not MessageCodec.is_hello(frame):
+            return ENCODING_JSON
+        try:
+            chosen = json.loads(frame.body).get('encoding')
+        except (ValueError, AttributeError):
+            return ENCODING_JSON
+        return chosen if chosen in SUPPORTED_ENCODINGS else ENCODING_JSON
+
+    @staticmethod
+    def decode(frame: Frame) -> Optional[Message]:
+        """
+        Decodifica e valida um frame recebido
+
+        Args:
+            frame: Frame lido da conexão
+
+        Returns:
+            Mensagem decodificada, ou None se o frame estiver vazio
+
+        Raises:
+            ChecksumError: Se a integridade não conferir
+            ValueError: Se o corpo não for uma mensagem válida
+        """
+        if frame.flags & FLAG_CRC32:
+            if len(frame.body) < _CRC32.size:
+                raise ChecksumError("Frame sem espaço para o CRC32")
+            (expected,) = _CRC32.unpack_from(frame.body)
+            body = memoryview(frame.body)[_CRC32.size:]
+            if zlib.crc32(body) != expected:
+                raise ChecksumError("CRC32 do frame não confere")
+            if frame.flags & FLAG_BINARY:
+                return binary_format.decode_message(body)
+            return Message.from_dict(json.loads(body.tobytes()))
+
+        if not frame.body.strip():
+            return None
+
+        # Formato legado: checksum MD5 no JSON
+        message_dict = json.loads(frame.body)
+        if not ChecksumValidator.verify_message(message_dict):
+            raise ChecksumError("Checksum MD5 da mensagem não confere")
+        return Message.from_dict(message_dict)
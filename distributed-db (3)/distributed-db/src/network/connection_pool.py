@@ -0,0 +1,256 @@
+import socket
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Optional, Tuple
+from ..core.models import NodeInfo
+
+
+class PeerUnavailableError(ConnectionError):
+    """Nó em backoff após falhas consecutivas de conexão"""
+
+
+class PooledConnection:
+    """Conexão TCP de longa duração com um nó"""
+
+    def __init__(self, sock: socket.socket, node_id: int, address: Tuple[str, int]):
+        self.sock = sock
+        self.node_id = node_id
+        self.address = address
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.reused = False
+        self.encoding = 'json'  # Codificação negociada com o nó
+
+    def is_healthy(self) -> bool:
+        """
+        Verifica, sem bloquear, se a conexão ainda está utilizável
+
+        Uma conexão ociosa não deve ter dados pendentes: EOF indica que o
+        nó remoto fechou o socket e dados inesperados indicam que o fluxo
+        está dessincronizado. Em ambos os casos a conexão é descartada.
+        """
+        try:
+            self.sock.setblocking(False)
+            try:
+                self.sock.recv(1, socket.MSG_PEEK)
+            finally:
+                self.sock.setblocking(True)
+        except (BlockingIOError, InterruptedError):
+            return True
+        except OSError:
+            return False
+        return False
+
+    def sendall(self, payload: bytes, timeout: float):
+        self.sock.settimeout(timeout)
+        self.sock.sendall(payload)
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class _PeerState:
+    """Estado do pool para um único nó"""
+
+    def __init__(self, address: Tuple[str, int]):
+        self.address = address
+        self.idle: Deque[PooledConnection] = deque()
+        self.in_use = 0
+        self.failures = 0
+        self.next_attempt = 0.0
+
+
+class ConnectionPool:
+    """
+    Pool de conexões persistentes indexado por node_id
+
+    Mantém até `max_connections_per_peer` conexões por nó, reaproveita
+    conexões ociosas após um health check, fecha as que ficaram ociosas
+    por mais de `idle_timeout` segundos e aplica backoff exponencial
+    entre tentativas de reconexão a um nó que está falhando.
+    """
+
+    def __init__(self, connect_timeout: float = 5, idle_timeout: float = 60,
+                 max_connections_per_peer: int = 4, backoff_base: float = 0.5,
+                 backoff_max: float = 30, on_connect: Optional[Callable[[PooledConnection], None]] = None):
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.max_connections_per_peer = max_connections_per_peer
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.on_connect = on_connect  # Handshake executado em cada conexão nova
+        self.logger = logging.getLogger(__name__)
+        self._peers: Dict[int, _PeerState] = {}
+        self._cond = threading.Condition()
+        self._reaper: Optional[threading.Thread] = None
+        self._closed = False
+
+    @contextmanager
+    def connection(self, node: NodeInfo, timeout: Optional[float] = None):
+        """
+        Context manager que empresta uma conexão para o nó
+
+        A conexão volta ao pool ao final do bloco; se o bloco levantar
+        exceção, a conexão é considerada quebrada e fechada.
+        """
+        conn = self.acquire(node, timeout)
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def acquire(self, node: NodeInfo, timeout: Optional[float] = None) -> PooledConnection:
+        """
+        Obtém uma conexão saudável para o nó, criando uma nova se necessário
+
+        Args:
+            node: Nó de destino
+            timeout: Tempo máximo de espera por uma conexão livre
+
+        Returns:
+            Conexão emprestada (deve ser devolvida com release)
+        """
+        self._ensure_reaper()
+        wait_timeout = self.connect_timeout if timeout is None else timeout
+        deadline = time.monotonic() + wait_timeout
+        address = (node.host, node.port)
+
+        with self._cond:
+            state = self._peers.get(node.node_id)
+            if state is None or state.address != address:
+                if state is not None:
+                    self._close_idle(state)
+                state = _PeerState(address)
+                self._peers[node.node_id] = state
+
+            while True:
+                self._evict_expired(state)
+
+                while state.idle:
+                    conn = state.idle.pop()
+                    if conn.is_healthy():
+                        conn.reused = True
+                        state.in_use += 1
+                        return conn
+                    conn.close()
+
+                if state.in_use < self.max_connections_per_peer:
+                    now = time.monotonic()
+                    if now < state.next_attempt:
+                        raise PeerUnavailableError(
+                            f"Nó {node.node_id} em backoff por mais {state.next_attempt - now:.1f}s"
+                        )
+                    state.in_use += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout(f"Nenhuma conexão livre para o nó {node.node_id}")
+                self._cond.wait(remaining)
+
+        # Conecta fora do lock para não bloquear outros nós
+        try:
+            sock = socket.create_connection(address, timeout=self.connect_timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            with self._cond:
+                state.in_use -= 1
+                state.failures += 1
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (state.failures - 1)))
+                state.next_attempt = time.monotonic() + delay
+                self._cond.notify_all()
+            self.logger.debug(f"Falha ao conectar ao nó {node.node_id} - nova tentativa em {delay:.1f}s")
+            raise
+
+        with self._cond:
+            state.failures = 0
+            state.next_attempt = 0.0
+
+        self.logger.debug(f"Nova conexão persistente com nó {node.node_id}")
+        conn = PooledConnection(sock, node.node_id, address)
+        if self.on_connect:
+            try:
+                self.on_connect(conn)
+            except BaseException:
+                self.release(conn, discard=True)
+                raise
+        return conn
+
+    def release(self, conn: PooledConnection, discard: bool = False):
+        """
+        Devolve uma conexão ao pool
+
+        Args:
+            conn: Conexão emprestada por acquire
+            discard: Se True, fecha a conexão em vez de reaproveitá-la
+        """
+        with self._cond:
+            state = self._peers.get(conn.node_id)
+            if state is not None and state.address == conn.address:
+                state.in_use -= 1
+                if not discard and not self._closed:
+                    conn.last_used = time.monotonic()
+                    state.idle.append(conn)
+                    conn = None
+            self._cond.notify_all()
+
+        if conn is not None:
+            conn.close()
+
+    def evict_idle(self):
+        """Fecha conexões ociosas há mais de idle_timeout segundos"""
+        with self._cond:
+            for state in self._peers.values():
+                self._evict_expired(state)
+
+    def close_all(self):
+        """Fecha todas as conexões ociosas e impede novos reaproveitamentos"""
+        with self._cond:
+            self._closed = True
+            for state in self._peers.values():
+                self._close_idle(state)
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict[int, dict]:
+        """Retorna estatísticas de conexões por nó"""
+        with self._cond:
+            return {
+                node_id: {
+                    'idle': len(state.idle),
+                    'in_use': state.in_use,
+                    'failures': state.failures
+                }
+                for node_id, state in self._peers.items()
+            }
+
+    def _evict_expired(self, state: _PeerState):
+        now = time.monotonic()
+        while state.idle and now - state.idle[0].last_used > self.idle_timeout:
+            state.idle.popleft().close()
+
+    def _close_idle(self, state: _PeerState):
+        while state.idle:
+            state.idle.popleft().close()
+
+    def _ensure_reaper(self):
+        if self._reaper is not None:
+            return
+        with self._cond:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+                self._reaper.start()
+
+    def _reap_loop(self):
+        while not self._closed:
+            time.sleep(max(1.0, self.idle_timeout / 2))
+            self.evict_idle()
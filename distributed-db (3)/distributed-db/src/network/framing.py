@@ -0,0 +1,228 @@
+import socket
+import struct
+import asyncio
+from typing import NamedTuple, Optional
+from ..core.models import CONTROL_MESSAGE_TYPES, MessageType
+
+
+# Cabeçalho fixo: magic (2), versão (1), tipo (1), flags (2), tamanho do corpo (4)
+# O primeiro byte do magic não é ASCII, então nunca inicia uma linha JSON
+FRAME_MAGIC = b'\xddB'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('!2sBBHI')
+
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+# Códigos de tipo no cabeçalho. Novos tipos devem ser sempre adicionados
+# ao final de MessageType para não mudar os códigos existentes.
+MESSAGE_TYPE_CODES = {message_type: code for code, message_type in enumerate(MessageType, start=1)}
+CODE_MESSAGE_TYPES = {code: message_type for message_type, code in MESSAGE_TYPE_CODES.items()}
+
+# Frame de controle usado na negociação de codificação por conexão
+HELLO_TYPE_CODE = 0xFF
+
+# Mensagens do plano de controle, identificáveis pelo cabeçalho sem parse
+CONTROL_TYPE_CODES = frozenset(MESSAGE_TYPE_CODES[message_type] for message_type in CONTROL_MESSAGE_TYPES)
+
+WIRE_FORMAT_FRAMED = 'framed'
+WIRE_FORMAT_LINE = 'line'
+
+
+class FrameError(ValueError):
+    """Frame malformado ou maior que o limite permitido"""
+
+
+class Frame(NamedTuple):
+    """Mensagem lida da conexão, em frame binário ou em linha legada"""
+    framed: bool
+    type_code: int
+    flags: int
+    body: bytes
+
+
+def encode_frame(body: bytes, message_type: Optional[MessageType] = None, flags: int = 0,
+                 type_code: Optional[int] = None) -> bytes:
+    """
+    Monta um frame com cabeçalho de tamanho fixo
+
+    Args:
+        body: Corpo já serializado
+        message_type: Tipo da mensagem (informativo, permite roteamento sem parse)
+        flags: Flags do frame
+        type_code: Código explícito para frames de controle (ex.: HELLO)
+
+    Returns:
+        Bytes prontos para envio
+    """
+    if len(body) > MAX_FRAME_SIZE:
+        raise FrameError(f"Frame de {len(body)} bytes excede o limite de {MAX_FRAME_SIZE}")
+    if type_code is None:
+        type_code = MESSAGE_TYPE_CODES.get(message_type, 0)
+    return FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, type_code, flags, len(body)) + body
+
+
+def is_control_frame(frame: Frame) -> bool:
+    """O frame traz uma mensagem do plano de controle? (linhas legadas: não)"""
+    return frame.framed and frame.type_code in CONTROL_TYPE_CODES
+
+
+def encode_line(body: bytes) -> bytes:
+    """Monta uma mensagem no formato legado delimitado por \\n"""
+    return body + b'\n'
+
+
+def encode_wire(body: bytes, message_type: Optional[MessageType], framed: bool, flags: int = 0) -> bytes:
+    """Serializa o corpo no formato de frame ou de linha"""
+    return encode_frame(body, message_type, flags) if framed else encode_line(body)
+
+
+def _parse_header(header) -> tuple:
+    magic, version, type_code, flags, length = FRAME_HEADER.unpack_from(header)
+    if magic != FRAME_MAGIC:
+        raise FrameError("Magic inválido no cabeçalho do frame")
+    if version > FRAME_VERSION:
+        raise FrameError(f"Versão de frame não suportada: {version}")
+    if length > MAX_FRAME_SIZE:
+        raise FrameError(f"Frame de {length} bytes excede o limite de {MAX_FRAME_SIZE}")
+    return type_code, flags, length
+
+
+def parse_frame(data: bytes) -> Frame:
+    """
+    Interpreta um frame binário completo já em memória
+
+    Args:
+        data: Cabeçalho seguido do corpo
+
+    Returns:
+        Frame decodificado
+    """
+    type_code, flags, length = _parse_header(data)
+    if len(data) != FRAME_HEADER.size + length:
+        raise FrameError("Tamanho do frame não confere com o cabeçalho")
+    return Frame(True, type_code, flags, bytes(data[FRAME_HEADER.size:]))
+
+
+class FrameReader:
+    """
+    Lê frames de um socket bloqueante usando um buffer reutilizável
+
+    Os bytes são recebidos com recv_into diretamente em um bytearray, e
+    cada mensagem é copiada uma única vez (via memoryview) quando está
+    completa. Não há decodificação por pedaço, então caracteres UTF-8
+    multibyte divididos entre dois recv não causam erro, e o custo de ler
+    uma mensagem grande é linear no seu tamanho.
+
+    Aceita tanto frames binários quanto linhas JSON legadas (\\n), detectando
+    o formato pelo primeiro byte de cada mensagem.
+    """
+
+    def __init__(self, sock: socket.socket, initial_size: int = 64 * 1024,
+                 max_frame_size: int = MAX_FRAME_SIZE):
+        self.sock = sock
+        self.max_frame_size = max_frame_size
+        self._buf = bytearray(initial_size)
+        self._start = 0
+        self._end = 0
+        self._scan = 0  # Posição até onde já procuramos \n
+        self._want = 0  # Bytes necessários para completar a mensagem atual
+
+    def read_frame(self) -> Optional[Frame]:
+        """
+        Lê a próxima mensagem completa
+
+        Returns:
+            Frame lido, ou None se a conexão foi fechada
+        """
+        while True:
+            frame = self._parse()
+            if frame is not None:
+                return frame
+            if not self._fill():
+                return None
+
+    def _parse(self) -> Optional[Frame]:
+        start, end = self._start, self._end
+        available = end - start
+        if available == 0:
+            self._want = 1
+            return None
+
+        with memoryview(self._buf) as view:
+            if self._buf[start] == FRAME_MAGIC[0]:
+                if available < FRAME_HEADER.size:
+                    self._want = FRAME_HEADER.size
+                    return None
+                type_code, flags, length = _parse_header(view[start:start + FRAME_HEADER.size])
+                total = FRAME_HEADER.size + length
+                if available < total:
+                    self._want = total
+                    return None
+                body = view[start + FRAME_HEADER.size:start + total].tobytes()
+                self._consume(start + total)
+                return Frame(True, type_code, flags, body)
+
+            newline = self._buf.find(b'\n', max(self._scan, start), end)
+            if newline < 0:
+                if available >= self.max_frame_size:
+                    raise FrameError(f"Linha excede o limite de {self.max_frame_size} bytes")
+                self._scan = end
+                self._want = available + 1
+                return None
+            body = view[start:newline].tobytes()
+            self._consume(newline + 1)
+            return Frame(False, 0, 0, body)
+
+    def _consume(self, position: int):
+        if position >= self._end:
+            self._start = self._end = self._scan = 0
+        else:
+            self._start = self._scan = position
+
+    def _fill(self) -> bool:
+        """Recebe mais bytes do socket; retorna False em EOF"""
+        needed = max(self._want, self._end - self._start + 1)
+        if self._start + needed > len(self._buf) or self._end == len(self._buf):
+            # Compacta: move os bytes pendentes para o início do buffer
+            pending = self._end - self._start
+            if self._start:
+                self._buf[:pending] = self._buf[self._start:self._end]
+                self._scan -= self._start
+                self._start, self._end = 0, pending
+            if needed > len(self._buf) or self._end == len(self._buf):
+                self._buf.extend(bytes(max(needed, 2 * len(self._buf)) - len(self._buf)))
+
+        with memoryview(self._buf) as view:
+            received = self.sock.recv_into(view[self._end:])
+        if received == 0:
+            return False
+        self._end += received
+        return True
+
+
+async def read_frame_async(reader: asyncio.StreamReader,
+                           max_frame_size: int = MAX_FRAME_SIZE) -> Optional[Frame]:
+    """
+    Versão asyncio de FrameReader.read_frame
+
+    Returns:
+        Frame lido, ou None se a conexão foi fechada
+    """
+    try:
+        first = await reader.readexactly(1)
+        if first[0] == FRAME_MAGIC[0]:
+            header = first + await reader.readexactly(FRAME_HEADER.size - 1)
+            type_code, flags, length = _parse_header(header)
+            if length > max_frame_size:
+                raise FrameError(f"Frame de {length} bytes excede o limite de {max_frame_size}")
+            body = await reader.readexactly(length)
+            return Frame(True, type_code, flags, body)
+
+        if first == b'\n':
+            return Frame(False, 0, 0, b'')
+        line = await reader.readuntil(b'\n')
+        return Frame(False, 0, 0, first + line[:-1])
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise FrameError("Linha excede o limite do buffer")
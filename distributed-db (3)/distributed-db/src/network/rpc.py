@@ -0,0 +1,224 @@
+import socket
+import logging
+import itertools
+import threading
+import dataclasses
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeout
+from typing import Dict, Optional, Tuple
+from ..core.models import Message, NodeInfo
+from .framing import FrameError, FrameReader
+from .codec import ENCODING_BINARY, ENCODING_JSON, MessageCodec
+
+
+class RpcConnection:
+    """
+    Conexão multiplexada com um nó
+
+    Cada requisição recebe um request_id único na conexão e é registrada
+    em uma tabela de futures pendentes. Uma thread leitora recebe as
+    respostas, que podem chegar fora de ordem, e resolve a future com o
+    mesmo request_id. Assim, centenas de requisições podem estar em
+    andamento ao mesmo tempo sobre um único socket.
+    """
+
+    def __init__(self, sock: socket.socket, node_id: int, address: Tuple[str, int],
+                 reader: Optional[FrameReader] = None, encoding: str = ENCODING_JSON):
+        self.sock = sock
+        self.node_id = node_id
+        self.address = address
+        self.encoding = encoding
+        self.closed = False
+        self.logger = logging.getLogger(__name__)
+        self._reader = reader or FrameReader(sock)
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Future] = {}
+        self._lock = threading.Lock()        # Protege _pending e closed
+        self._write_lock = threading.Lock()  # Um frame inteiro por vez no socket
+        self._thread = threading.Thread(target=self._read_loop, daemon=True,
+                                        name=f'rpc-reader-{node_id}')
+        self._thread.start()
+
+    def call(self, message: Message) -> Future:
+        """
+        Envia uma requisição sem esperar a resposta
+
+        Args:
+            message: Mensagem de requisição (o request_id é atribuído aqui)
+
+        Returns:
+            Future resolvida com a mensagem de resposta. Cancelar a future
+            (ex.: após um timeout) descarta a resposta quando ela chegar.
+        """
+        future = Future()
+        with self._lock:
+            if self.closed:
+                raise ConnectionError(f"Conexão RPC com nó {self.node_id} encerrada")
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+        future.add_done_callback(lambda f: f.cancelled() and self._forget(request_id))
+
+        payload = MessageCodec.encode(dataclasses.replace(message, request_id=request_id), True, self.encoding)
+        try:
+            with self._write_lock:
+                self.sock.sendall(payload)
+        except OSError as e:
+            self._fail(e)
+            raise
+        return future
+
+    @property
+    def in_flight(self) -> int:
+        """Número de requisições aguardando resposta"""
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        """Fecha a conexão; requisições pendentes falham com ConnectionError"""
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._fail(ConnectionError(f"Conexão RPC com nó {self.node_id} fechada"))
+
+    def _forget(self, request_id: int):
+        with self._lock:
+            self._pending.pop(request_id, None)
+
+    def _read_loop(self):
+        error: Exception = ConnectionError(f"Nó {self.node_id} encerrou a conexão RPC")
+        try:
+            while True:
+                frame = self._reader.read_frame()
+                if frame is None:
+                    break
+
+                try:
+                    response = MessageCodec.decode(frame)
+                except (ValueError, KeyError) as e:
+                    # A future correspondente expira pelo timeout do chamador
+                    self.logger.warning(f"Resposta RPC inválida do nó {self.node_id} - descartada ({e})")
+                    continue
+
+                if response is None or response.request_id is None:
+                    continue
+
+                with self._lock:
+                    future = self._pending.pop(response.request_id, None)
+                if future is not None:
+                    try:
+                        future.set_result(response)
+                    except InvalidStateError:
+                        pass  # Cancelada pelo chamador
+
+        except (OSError, FrameError) as e:
+            error = ConnectionError(f"Conexão RPC com nó {self.node_id} falhou: {e}")
+        finally:
+            self._fail(error)
+
+    def _fail(self, error: Exception):
+        with self._lock:
+            self.closed = True
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            try:
+                future.set_exception(error)
+            except InvalidStateError:
+                pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RpcClient:
+    """
+    Mantém uma conexão multiplexada por nó e expõe chamadas com futures
+
+    As conexões são abertas sob demanda (com negociação de codificação
+    via HELLO) e reabertas na próxima chamada se caírem.
+    """
+
+    def __init__(self, connect_timeout: float = 5, encoding: str = ENCODING_BINARY,
+                 handshake_timeout: float = 1):
+        self.connect_timeout = connect_timeout
+        self.encoding = encoding
+        self.handshake_timeout = handshake_timeout
+        self.logger = logging.getLogger(__name__)
+        self._connections: Dict[int, RpcConnection] = {}
+        self._lock = threading.Lock()
+
+    def call(self, message: Message, node: NodeInfo) -> Future:
+        """
+        Envia requisição para o nó e retorna uma future com a resposta
+
+        Args:
+            message: Mensagem de requisição
+            node: Nó de destino
+
+        Returns:
+            Future resolvida com a mensagem de resposta
+        """
+        return self._connection_for(node).call(message)
+
+    def request(self, message: Message, node: NodeInfo, timeout: Optional[float] = None) -> Message:
+        """
+        Envia requisição e aguarda a resposta
+
+        Raises:
+            socket.timeout: Se a resposta não chegar dentro do prazo
+            ConnectionError: Se a conexão cair antes da resposta
+        """
+        timeout = self.connect_timeout if timeout is None else timeout
+        future = self.call(message, node)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise socket.timeout(f"Sem resposta do nó {node.node_id} em {timeout}s")
+
+    def close(self):
+        """Fecha todas as conexões multiplexadas"""
+        with self._lock:
+            connections, self._connections = list(self._connections.values()), {}
+        for conn in connections:
+            conn.close()
+
+    def _connection_for(self, node: NodeInfo) -> RpcConnection:
+        address = (node.host, node.port)
+        with self._lock:
+            conn = self._connections.get(node.node_id)
+            if conn is not None and not conn.closed and conn.address == address:
+                return conn
+
+        # Conecta fora do lock para não bloquear chamadas a outros nós
+        new_conn = self._connect(node, address)
+        with self._lock:
+            conn = self._connections.get(node.node_id)
+            if conn is not None and not conn.closed and conn.address == address:
+                new_conn.close()  # Outra thread conectou primeiro
+                return conn
+            self._connections[node.node_id] = new_conn
+        if conn is not None:
+            conn.close()
+        return new_conn
+
+    def _connect(self, node: NodeInfo, address: Tuple[str, int]) -> RpcConnection:
+        sock = socket.create_connection(address, timeout=self.connect_timeout)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            reader = FrameReader(sock)
+            encoding = ENCODING_JSON
+            if self.encoding != ENCODING_JSON:
+                sock.settimeout(self.handshake_timeout)
+                sock.sendall(MessageCodec.encode_hello([self.encoding, ENCODING_JSON]))
+                try:
+                    encoding = MessageCodec.parse_hello_reply(reader.read_frame())
+                except (socket.timeout, FrameError):
+                    encoding = ENCODING_JSON
+            sock.settimeout(None)  # A thread leitora bloqueia até a próxima resposta
+        except BaseException:
+            sock.close()
+            raise
+
+        self.logger.debug(f"Conexão RPC com nó {node.node_id} aberta ({encoding})")
+        return RpcConnection(sock, node.node_id, address, reader, encoding)
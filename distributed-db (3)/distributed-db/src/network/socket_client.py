@@ -1,16 +1,152 @@
 import socket
 import logging
-import json
-from typing import List
-from ..core.models import Message, NodeInfo, CommunicationType
-from ..core.checksum import ChecksumValidator
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+from ..core.models import CONTROL_MESSAGE_TYPES, Message, NodeInfo, CommunicationType, DeliveryStatus
+from .connection_pool import ConnectionPool, PooledConnection, PeerUnavailableError
+from .framing import FrameError, FrameReader, WIRE_FORMAT_FRAMED
+from .codec import ENCODING_BINARY, ENCODING_JSON, MessageCodec
+from .rpc import RpcClient
+
+
+def count_delivered(outcomes: Dict[int, DeliveryStatus]) -> int:
+    """Conta quantos nós receberam a mensagem com sucesso"""
+    return sum(1 for status in outcomes.values() if status == DeliveryStatus.DELIVERED)
 
 
 class SocketClient:
-    """Cliente de sockets para enviar mensagens para outros nós"""
+    """
+    Cliente de sockets para enviar mensagens para outros nós
+    
+    Mensagens do plano de controle (heartbeat, eleição, votos) têm uma
+    faixa própria: conexões dedicadas com cada nó e threads de envio
+    separadas. Assim não esperam por uma conexão ocupada com replicação
+    nem ficam na fila atrás de um frame grande no mesmo socket.
+    """
     
-    def __init__(self):
+    def __init__(self, timeout: float = 5, max_connections_per_peer: int = 4, idle_timeout: float = 60,
+                 fanout_workers: int = 16, wire_format: str = WIRE_FORMAT_FRAMED,
+                 encoding: str = ENCODING_BINARY, handshake_timeout: float = 1,
+                 control_connections_per_peer: int = 1, control_workers: int = 4):
         self.logger = logging.getLogger(__name__)
+        self.timeout = timeout
+        self.wire_format = wire_format
+        self.peer_wire_formats: Dict[int, str] = {}  # Nós legados que só entendem linhas
+        self.encoding = encoding
+        self.handshake_timeout = handshake_timeout
+        self.pool = ConnectionPool(
+            connect_timeout=timeout,
+            idle_timeout=idle_timeout,
+            max_connections_per_peer=max_connections_per_peer,
+            on_connect=self._negotiate
+        )
+        self._executor = ThreadPoolExecutor(max_workers=fanout_workers, thread_name_prefix='fanout')
+        
+        # Faixa do plano de controle
+        self.control_pool = ConnectionPool(
+            connect_timeout=timeout,
+            idle_timeout=idle_timeout,
+            max_connections_per_peer=control_connections_per_peer,
+            on_connect=self._negotiate
+        )
+        self._control_executor = ThreadPoolExecutor(max_workers=control_workers, thread_name_prefix='control')
+        self.rpc = RpcClient(connect_timeout=timeout, encoding=encoding, handshake_timeout=handshake_timeout)
+    
+    def set_peer_wire_format(self, node_id: int, wire_format: str):
+        """Define o formato de envio para um nó ('framed' ou 'line')"""
+        self.peer_wire_formats[node_id] = wire_format
+    
+    def _is_framed(self, node_id: int) -> bool:
+        return self.peer_wire_formats.get(node_id, self.wire_format) == WIRE_FORMAT_FRAMED
+    
+    def _negotiate(self, conn: PooledConnection):
+        """
+        Negocia a codificação do corpo em uma conexão nova
+        
+        Envia um frame HELLO com as codificações preferidas; se o nó não
+        responder (versão antiga) a conexão segue em JSON.
+        """
+        if self.encoding == ENCODING_JSON or not self._is_framed(conn.node_id):
+            return
+        
+        try:
+            conn.sock.settimeout(self.handshake_timeout)
+            conn.sock.sendall(MessageCodec.encode_hello([self.encoding, ENCODING_JSON]))
+            conn.encoding = MessageCodec.parse_hello_reply(FrameReader(conn.sock, initial_size=256).read_frame())
+        except (socket.timeout, FrameError):
+            conn.encoding = ENCODING_JSON
+        self.logger.debug(f"Codificação negociada com nó {conn.node_id}: {conn.encoding}")
+    
+    def _encode(self, message: Message, framed: bool = True, encoding: str = ENCODING_JSON,
+                payloads: Optional[dict] = None) -> bytes:
+        """
+        Serializa mensagem com checksum em frame binário ou linha legada
+        
+        Se `payloads` for informado, reaproveita a serialização já feita
+        para o mesmo formato e codificação.
+        """
+        if payloads is None:
+            return MessageCodec.encode(message, framed, encoding)
+        key = (framed, encoding if framed else ENCODING_JSON)
+        payload = payloads.get(key)
+        if payload is None:
+            payload = payloads[key] = MessageCodec.encode(message, framed, encoding)
+        return payload
+    
+    def _lane(self, message: Message) -> Tuple[ConnectionPool, ThreadPoolExecutor]:
+        """Pool de conexões e threads de envio da faixa da mensagem"""
+        if message.message_type in CONTROL_MESSAGE_TYPES:
+            return self.control_pool, self._control_executor
+        return self.pool, self._executor
+    
+    def _send_payload(self, message: Message, target_node: NodeInfo, timeout: Optional[float] = None,
+                      payloads: Optional[dict] = None):
+        """
+        Serializa e envia a mensagem por uma conexão do pool da sua faixa
+        
+        Se uma conexão reaproveitada falhar (ex.: o nó reiniciou), tenta
+        uma única vez com uma conexão nova antes de propagar o erro.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        payloads = {} if payloads is None else payloads
+        framed = self._is_framed(target_node.node_id)
+        pool, _ = self._lane(message)
+        for attempt in range(2):
+            conn = pool.acquire(target_node, timeout)
+            try:
+                payload = self._encode(message, framed, conn.encoding, payloads)
+                conn.sendall(payload, timeout)
+            except socket.timeout:
+                pool.release(conn, discard=True)
+                raise
+            except OSError:
+                pool.release(conn, discard=True)
+                if conn.reused and attempt == 0:
+                    continue
+                raise
+            pool.release(conn)
+            return
+    
+    def _deliver(self, message: Message, target_node: NodeInfo, timeout: Optional[float] = None,
+                 payloads: Optional[dict] = None) -> DeliveryStatus:
+        """Envia mensagem para um nó e classifica o resultado da entrega"""
+        try:
+            self._send_payload(message, target_node, timeout, payloads)
+            self.logger.debug(f"Mensagem {message.message_type.value} enviada para nó {target_node.node_id}")
+            return DeliveryStatus.DELIVERED
+            
+        except socket.timeout:
+            self.logger.error(f"Timeout ao enviar mensagem para nó {target_node.node_id}")
+            return DeliveryStatus.TIMED_OUT
+        except ConnectionRefusedError:
+            self.logger.error(f"Conexão recusada pelo nó {target_node.node_id}")
+            return DeliveryStatus.REFUSED
+        except PeerUnavailableError as e:
+            self.logger.debug(str(e))
+            return DeliveryStatus.REFUSED
+        except Exception as e:
+            self.logger.error(f"Erro ao enviar mensagem para nó {target_node.node_id}: {e}")
+            return DeliveryStatus.FAILED
     
     def send_message(self, message: Message, target_node: NodeInfo) -> bool:
         """
@@ -23,35 +159,76 @@ class SocketClient:
         Returns:
             True se enviado com sucesso, False caso contrário
         """
-        try:
-            # Serializa mensagem
-            message_str = message.to_json()
-            message_dict = json.loads(message_str)
-            
-            # Adiciona checksum
-            message_dict = ChecksumValidator.add_checksum(message_dict)
-            message_str = json.dumps(message_dict)
+        return self._deliver(message, target_node) == DeliveryStatus.DELIVERED
+    
+    def fanout(self, message: Message, target_nodes: List[NodeInfo],
+               deadline: Optional[float] = None) -> Dict[int, DeliveryStatus]:
+        """
+        Envia a mesma mensagem para vários nós em paralelo
+        
+        A mensagem é serializada uma única vez por formato e os envios
+        rodam no pool de threads limitado do cliente. Nós que não concluírem dentro do
+        prazo são reportados como TIMED_OUT sem atrasar os demais.
+        
+        Args:
+            message: Mensagem a ser enviada
+            target_nodes: Lista de nós de destino
+            deadline: Prazo total da chamada em segundos (padrão: timeout do cliente)
             
-            # Cria socket e conecta
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(5)  # Timeout de 5 segundos
-                sock.connect((target_node.host, target_node.port))
-                
-                # Envia mensagem (adiciona \n como delimitador)
-                sock.sendall((message_str + '\n').encode('utf-8'))
-                
-            self.logger.debug(f"Mensagem {message.message_type.value} enviada para nó {target_node.node_id}")
-            return True
+        Returns:
+            Dicionário node_id -> resultado da entrega
+        """
+        if not target_nodes:
+            return {}
+        
+        deadline = self.timeout if deadline is None else deadline
+        payloads = {}  # (formato, codificação) -> bytes, compartilhado entre os envios
+        
+        if len(target_nodes) == 1:
+            node = target_nodes[0]
+            return {node.node_id: self._deliver(message, node, deadline, payloads)}
+        
+        _, executor = self._lane(message)
+        futures = {
+            executor.submit(self._deliver, message, node, deadline, payloads): node.node_id
+            for node in target_nodes
+        }
+        done, _ = wait(futures, timeout=deadline)
+        
+        outcomes = {}
+        for future, node_id in futures.items():
+            if future in done:
+                outcomes[node_id] = future.result()
+            else:
+                outcomes[node_id] = DeliveryStatus.TIMED_OUT
+                self.logger.warning(f"Prazo de {deadline}s esgotado ao enviar para nó {node_id}")
+        return outcomes
+    
+    def call(self, message: Message, target_node: NodeInfo) -> Future:
+        """
+        Envia uma requisição que espera resposta, sem bloquear
+        
+        Usa a conexão multiplexada com o nó: várias chamadas podem estar
+        em andamento ao mesmo tempo e as respostas chegam em qualquer ordem.
+        
+        Args:
+            message: Mensagem de requisição
+            target_node: Nó de destino
             
-        except socket.timeout:
-            self.logger.error(f"Timeout ao enviar mensagem para nó {target_node.node_id}")
-            return False
-        except ConnectionRefusedError:
-            self.logger.error(f"Conexão recusada pelo nó {target_node.node_id}")
-            return False
-        except Exception as e:
-            self.logger.error(f"Erro ao enviar mensagem para nó {target_node.node_id}: {e}")
-            return False
+        Returns:
+            Future resolvida com a mensagem de resposta
+        """
+        if not self._is_framed(target_node.node_id):
+            raise ConnectionError(f"Nó {target_node.node_id} usa formato legado e não suporta RPC")
+        return self.rpc.call(message, target_node)
+    
+    def close(self):
+        """Fecha as conexões persistentes com os outros nós"""
+        self._executor.shutdown(wait=False)
+        self._control_executor.shutdown(wait=False)
+        self.pool.close_all()
+        self.control_pool.close_all()
+        self.rpc.close()
     
     def broadcast_message(self, message: Message, nodes: List[NodeInfo], exclude_self: int = None) -> int:
         """
@@ -65,14 +242,8 @@ class SocketClient:
         Returns:
             Número de nós que receberam com sucesso
         """
-        success_count = 0
-        
-        for node in nodes:
-            if exclude_self and node.node_id == exclude_self:
-                continue
-            
-            if self.send_message(message, node):
-                success_count += 1
+        targets = [n for n in nodes if not (exclude_self and n.node_id == exclude_self)]
+        success_count = count_delivered(self.fanout(message, targets))
         
         self.logger.info(f"Broadcast: {success_count}/{len(nodes)} nós alcançados")
         return success_count
@@ -88,18 +259,14 @@ class SocketClient:
         Returns:
             Número de nós que receberam com sucesso
         """
-        success_count = 0
-        
-        for node in target_nodes:
-            if self.send_message(message, node):
-                success_count += 1
+        success_count = count_delivered(self.fanout(message, target_nodes))
         
         self.logger.info(f"Multicast: {success_count}/{len(target_nodes)} nós alcançados")
         return success_count
     
-    def send_by_type(self, message: Message, all_nodes: List[NodeInfo], sender_id: int) -> int:
+    def resolve_targets(self, message: Message, all_nodes: List[NodeInfo], sender_id: int) -> List[NodeInfo]:
         """
-        Envia mensagem de acordo com o tipo de comunicação especificado
+        Determina os nós de destino de acordo com o tipo de comunicação
         
         Args:
             message: Mensagem a ser enviada
@@ -107,26 +274,59 @@ class SocketClient:
             sender_id: ID do nó remetente
             
         Returns:
-            Número de nós que receberam com sucesso
+            Lista de nós de destino
         """
         if message.communication_type == CommunicationType.UNICAST:
             # Envia para um nó específico
             if message.target_nodes and len(message.target_nodes) > 0:
                 target_id = message.target_nodes[0]
-                target_node = next((n for n in all_nodes if n.node_id == target_id), None)
-                if target_node:
-                    return 1 if self.send_message(message, target_node) else 0
-            return 0
+                return [n for n in all_nodes if n.node_id == target_id][:1]
+            return []
             
         elif message.communication_type == CommunicationType.BROADCAST:
             # Envia para todos exceto o remetente
-            return self.broadcast_message(message, all_nodes, exclude_self=sender_id)
+            return [n for n in all_nodes if n.node_id != sender_id]
             
         elif message.communication_type == CommunicationType.MULTICAST:
             # Envia para grupo específico
             if message.target_nodes:
-                target_nodes = [n for n in all_nodes if n.node_id in message.target_nodes]
-                return self.multicast_message(message, target_nodes)
-            return 0
+                return [n for n in all_nodes if n.node_id in message.target_nodes]
+            return []
+        
+        return []
+    
+    def send_by_type_detailed(self, message: Message, all_nodes: List[NodeInfo], sender_id: int,
+                              deadline: Optional[float] = None) -> Dict[int, DeliveryStatus]:
+        """
+        Envia mensagem de acordo com o tipo de comunicação e retorna o resultado por nó
+        
+        Args:
+            message: Mensagem a ser enviada
+            all_nodes: Lista de todos os nós disponíveis
+            sender_id: ID do nó remetente
+            deadline: Prazo total da chamada em segundos
+            
+        Returns:
+            Dicionário node_id -> resultado da entrega
+        """
+        targets = self.resolve_targets(message, all_nodes, sender_id)
+        outcomes = self.fanout(message, targets, deadline)
         
-        return 0
+        if message.communication_type != CommunicationType.UNICAST:
+            kind = message.communication_type.value.capitalize()
+            self.logger.info(f"{kind}: {count_delivered(outcomes)}/{len(targets)} nós alcançados")
+        return outcomes
+    
+    def send_by_type(self, message: Message, all_nodes: List[NodeInfo], sender_id: int) -> int:
+        """
+        Envia mensagem de acordo com o tipo de comunicação especificado
+        
+        Args:
+            message: Mensagem a ser enviada
+            all_nodes: Lista de todos os nós disponíveis
+            sender_id: ID do nó remetente
+            
+        Returns:
+            Número de nós que receberam com sucesso
+        """
+        return count_delivered(self.send_by_type_detailed(message, all_nodes, sender_id))
@@ -1,23 +1,38 @@
 import socket
 import threading
 import logging
-import json
-from typing import Callable, Optional
-from ..core.models import Message
-from ..core.checksum import ChecksumValidator
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Callable, Iterator, Optional, Union
+from ..core.models import CONTROL_MESSAGE_TYPES, Message
+from .framing import Frame, FrameError, FrameReader
+from .codec import ChecksumError, MessageCodec
+
+
+# O handler pode devolver uma resposta única, um iterador de mensagens
+# (streaming), enviadas uma a uma conforme o cliente consome, ou um Future
+# de qualquer um deles quando o trabalho foi agendado em outro executor
+HandlerResult = Union[Message, Iterator[Message], Future, None]
+
+# Envia bytes de resposta na conexão de origem (seguro entre threads)
+Reply = Callable[[bytes], None]
 
 
 class SocketServer:
     """Servidor de sockets para receber mensagens de outros nós"""
     
-    def __init__(self, host: str, port: int, message_handler: Callable[[Message], None]):
+    def __init__(self, host: str, port: int, message_handler: Callable[[Message], HandlerResult],
+                 backlog: int = 128, rpc_workers: int = 32):
         self.host = host
         self.port = port
         self.message_handler = message_handler
+        self.backlog = backlog
+        self.rpc_workers = rpc_workers
+        self._rpc_executor: Optional[Executor] = None
         self.server_socket: Optional[socket.socket] = None
         self.running = False
         self.logger = logging.getLogger(__name__)
         self.connections = []
+        self._connections_lock = threading.Lock()
     
     def start(self):
         """Inicia o servidor de sockets"""
@@ -25,7 +40,8 @@ class SocketServer:
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.server_socket.bind(('0.0.0.0', self.port))
-            self.server_socket.listen(5)
+            self.port = self.server_socket.getsockname()[1]  # Resolve porta 0 (efêmera)
+            self.server_socket.listen(self.backlog)
             self.running = True
             
             self.logger.info(f"Servidor iniciado em {self.host}:{self.port}")
@@ -51,8 +67,9 @@ class SocketServer:
                     args=(client_socket, address),
                     daemon=True
                 )
+                with self._connections_lock:
+                    self.connections.append((client_socket, address))
                 client_thread.start()
-                self.connections.append((client_socket, address))
                 
             except Exception as e:
                 if self.running:
@@ -66,74 +83,252 @@ class SocketServer:
             client_socket: Socket do cliente
             address: Endereço do cliente
         """
-        buffer = ""
+        reader = FrameReader(client_socket)
+        send_lock = threading.Lock()
+        pending: Optional[Future] = None  # Envio da última resposta adiada
+
+        def reply(data: bytes):
+            # Respostas RPC são enviadas por outras threads
+            with send_lock:
+                client_socket.sendall(data)
 
         try:
             while self.running:
-                raw = client_socket.recv(4096)
+                frame = reader.read_frame()
 
-                if not raw:
+                if frame is None:
                     break
 
-                try:
-                    data = raw.decode('utf-8')
-                except UnicodeDecodeError:
-                    self.logger.warning(f"Dados não-UTF-8 recebidos de {address} - ignorando conexão")
-                    break
-
-                buffer += data
-
-                # Processa mensagens completas (delimitadas por \n)
-                while '\n' in buffer:
-                    message_str, buffer = buffer.split('\n', 1)
-
-                    if message_str.strip():
-                        response_str = self._process_message(message_str)
-                        if response_str:
-                            client_socket.sendall((response_str + '\n').encode('utf-8'))
+                response = self._process_frame(frame, reply)
+                if isinstance(response, Future) or (response is not None and pending and not pending.done()):
+                    # Resposta ainda em processamento: a leitura continua e
+                    # ela é enviada depois das anteriores, na ordem
+                    pending = self._send_after(pending, response, reply)
+                else:
+                    self._write_response(reply, response)
 
+        except FrameError as e:
+            self.logger.warning(f"Frame inválido recebido de {address}: {e} - encerrando conexão")
         except Exception as e:
             self.logger.error(f"Erro ao lidar com cliente {address}: {e}")
         finally:
             client_socket.close()
+            with self._connections_lock:
+                try:
+                    self.connections.remove((client_socket, address))
+                except ValueError:
+                    pass
             self.logger.info(f"Conexão com {address} fechada")
     
-    def _process_message(self, message_str: str) -> Optional[str]:
+    def _write_response(self, reply: Reply, response: Union[bytes, Iterator[bytes], None]):
+        if isinstance(response, bytes):
+            reply(response)
+        elif response is not None:
+            self._send_stream(reply, response)
+
+    def _send_after(self, previous: Optional[Future], response, reply: Reply) -> Future:
         """
-        Processa uma mensagem recebida e retorna resposta serializada, se houver.
+        Envia uma resposta depois que a anterior da conexão foi enviada
 
         Args:
-            message_str: String JSON da mensagem
+            previous: Envio anterior ainda pendente (ou None)
+            response: Bytes, iterador de bytes, ou Future de um deles
+            reply: Envia bytes na conexão
 
         Returns:
-            String JSON da resposta, ou None
+            Future concluído quando esta resposta for enviada
+        """
+        sent = Future()
+
+        def send():
+            try:
+                data = self._result_of(response) if isinstance(response, Future) else response
+                self._write_response(reply, data)
+            except OSError as e:
+                self.logger.debug(f"Conexão encerrada antes da resposta: {e}")
+            finally:
+                sent.set_result(None)
+
+        def schedule(_=None):
+            try:
+                self._get_rpc_executor().submit(send)
+            except RuntimeError:
+                sent.set_result(None)  # Servidor parando
+
+        def after_previous(_=None):
+            if isinstance(response, Future):
+                response.add_done_callback(schedule)
+            else:
+                schedule()
+
+        if previous is not None:
+            previous.add_done_callback(after_previous)
+        else:
+            after_previous()
+        return sent
+
+    def _send_stream(self, reply: Reply, parts: Iterator[bytes]):
+        """
+        Envia uma resposta em streaming, uma mensagem por vez
+
+        sendall bloqueia enquanto o buffer TCP estiver cheio, então o
+        próximo lote só é produzido quando o cliente consome o anterior.
         """
         try:
-            # Parse JSON
-            message_dict = json.loads(message_str)
+            for part in parts:
+                reply(part)
+        finally:
+            parts.close()
 
-            # Valida checksum
-            if not ChecksumValidator.verify_message(message_dict):
-                self.logger.warning("Mensagem recebida com checksum inválido - descartada")
-                return None
+    def _get_rpc_executor(self) -> Executor:
+        if self._rpc_executor is None:
+            with self._connections_lock:
+                if self._rpc_executor is None:
+                    self._rpc_executor = ThreadPoolExecutor(max_workers=self.rpc_workers,
+                                                            thread_name_prefix='rpc')
+        return self._rpc_executor
 
-            # Converte para objeto Message
-            message = Message.from_json(message_str)
+    def _process_frame(self, frame: Frame, reply: Optional[Reply] = None) -> Union[bytes, Iterator[bytes], None]:
+        """
+        Processa um frame recebido e retorna a resposta já no mesmo formato
 
-            self.logger.debug(f"Mensagem recebida: {message.message_type.value} do nó {message.sender_id}")
+        Frames binários são respondidos com frames e linhas legadas com
+        linhas, permitindo conviver com nós antigos durante a migração.
 
-            # Chama handler — pode retornar uma mensagem de resposta
-            response = self.message_handler(message)
+        Mensagens com request_id (RPC multiplexado) não bloqueiam a leitura
+        da conexão: são processadas em paralelo e a resposta, com o mesmo
+        request_id, é enviada por `reply` assim que fica pronta, possivelmente
+        fora da ordem de chegada. Mensagens do plano de controle (heartbeat,
+        eleição) são sempre tratadas na hora, sem passar pela fila RPC.
 
-            if response is not None:
-                resp_dict = json.loads(response.to_json())
-                resp_dict = ChecksumValidator.add_checksum(resp_dict)
-                return json.dumps(resp_dict)
+        Se o handler agendou o trabalho em outro executor, devolve um Future
+        da resposta codificada: a conexão segue lendo e envia a resposta
+        quando ela ficar pronta, mantendo a ordem dos pedidos.
+
+        Args:
+            frame: Frame lido da conexão
+            reply: Envia bytes na conexão de origem (habilita o modo RPC)
 
+        Returns:
+            Bytes da resposta, iterador de bytes (streaming), Future de um deles, ou None
+        """
+        if MessageCodec.is_hello(frame):
+            return MessageCodec.answer_hello(frame)
+
+        try:
+            # Decodifica e valida integridade em uma única passada
+            message = MessageCodec.decode(frame)
+        except ChecksumError as e:
+            self.logger.warning(f"Mensagem recebida com checksum inválido - descartada ({e})")
+            return None
+        except (ValueError, KeyError) as e:
+            self.logger.error(f"Erro ao decodificar mensagem: {e}")
+            return None
+
+        if message is None:
             return None
 
-        except json.JSONDecodeError as e:
-            self.logger.error(f"Erro ao decodificar JSON: {e}")
+        if message.request_id is not None and reply is not None:
+            if message.message_type in CONTROL_MESSAGE_TYPES:
+                self._process_rpc(message, frame, reply)
+            else:
+                self._get_rpc_executor().submit(self._process_rpc, message, frame, reply)
+            return None
+
+        return self._respond(message, frame)
+
+    def _process_rpc(self, message: Message, frame: Frame, reply: Reply):
+        """Processa uma requisição multiplexada e envia a resposta"""
+        response = self._process_message(message)
+        if isinstance(response, Future):
+            # O handler agendou o trabalho: a thread RPC fica livre e a
+            # resposta é enviada quando o Future terminar
+            response.add_done_callback(lambda future: self._deliver_rpc(message, frame, reply, future))
+            return
+        self._send_rpc(message, frame, reply, response)
+
+    def _deliver_rpc(self, message: Message, frame: Frame, reply: Reply, future: Future):
+        # Não envia na thread que concluiu o Future (pode ser a do banco)
+        try:
+            self._get_rpc_executor().submit(self._send_rpc, message, frame, reply, self._result_of(future))
+        except RuntimeError:
+            pass  # Servidor parando
+
+    def _send_rpc(self, message: Message, frame: Frame, reply: Reply, response: HandlerResult):
+        response = self._encode_response(message, frame, response)
+        try:
+            self._write_response(reply, response)
+        except OSError as e:
+            self.logger.debug(f"Conexão encerrada antes da resposta RPC {message.request_id}: {e}")
+
+    def _respond(self, message: Message, frame: Frame) -> Union[bytes, Iterator[bytes], None]:
+        """Executa o handler e codifica a resposta no formato do frame recebido"""
+        response = self._process_message(message)
+        if isinstance(response, Future):
+            # Trabalho agendado pelo handler: devolve um Future da resposta
+            # já codificada, para a conexão enviar na ordem dos pedidos
+            encoded = Future()
+
+            def done(future: Future):
+                try:
+                    encoded.set_result(self._encode_response(message, frame, self._result_of(future)))
+                except Exception as e:
+                    self.logger.error(f"Erro ao codificar resposta: {e}")
+                    encoded.set_result(None)
+
+            response.add_done_callback(done)
+            return encoded
+        return self._encode_response(message, frame, response)
+
+    def _result_of(self, future: Future) -> HandlerResult:
+        try:
+            return future.result()
+        except Exception as e:
+            self.logger.error(f"Erro ao processar mensagem: {e}")
+            return None
+
+    def _encode_response(self, message: Message, frame: Frame,
+                         response: HandlerResult) -> Union[bytes, Iterator[bytes], None]:
+        """Codifica a resposta no formato do frame recebido"""
+        if response is None:
+            return None
+
+        # Responde na mesma codificação da requisição
+        encoding = MessageCodec.encoding_of(frame)
+        if isinstance(response, Message):
+            response.request_id = message.request_id
+            return MessageCodec.encode(response, frame.framed, encoding)
+        return self._encode_stream(response, frame.framed, encoding, message.request_id)
+
+    @staticmethod
+    def _encode_stream(parts: Iterator[Message], framed: bool, encoding: str,
+                       request_id: Optional[int] = None) -> Iterator[bytes]:
+        """Codifica as mensagens de um streaming sob demanda"""
+        try:
+            for part in parts:
+                part.request_id = request_id
+                yield MessageCodec.encode(part, framed, encoding)
+        finally:
+            close = getattr(parts, 'close', None)
+            if close:
+                close()
+    
+    def _process_message(self, message: Message) -> HandlerResult:
+        """
+        Entrega uma mensagem ao handler e retorna a resposta, se houver.
+
+        Args:
+            message: Mensagem recebida
+
+        Returns:
+            Mensagem de resposta, iterador de mensagens, ou None
+        """
+        try:
+            self.logger.debug(f"Mensagem recebida: {message.message_type.value} do nó {message.sender_id}")
+
+            # Chama handler — pode retornar uma mensagem de resposta
+            return self.message_handler(message)
+
         except Exception as e:
             self.logger.error(f"Erro ao processar mensagem: {e}")
         return None
@@ -143,7 +338,9 @@ class SocketServer:
         self.running = False
         
         # Fecha todas as conexões
-        for conn, addr in self.connections:
+        with self._connections_lock:
+            connections = list(self.connections)
+        for conn, addr in connections:
             try:
                 conn.close()
             except:
@@ -152,4 +349,7 @@ class SocketServer:
         if self.server_socket:
             self.server_socket.close()
         
+        if self._rpc_executor:
+            self._rpc_executor.shutdown(wait=False)
+        
         self.logger.info("Servidor parado")
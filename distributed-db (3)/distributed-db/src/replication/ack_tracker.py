@@ -0,0 +1,211 @@
+import time
+import heapq
+import logging
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class _Waiter:
+    """Escrita esperando as confirmações das réplicas"""
+
+    __slots__ = ('transaction_id', 'required', 'label', 'acks', 'failures', 'delivered',
+                 'started', 'future')
+
+    def __init__(self, transaction_id: str, required: int, label: str):
+        self.transaction_id = transaction_id
+        self.required = required
+        self.label = label
+        self.acks = 0  # ACKs de sucesso
+        self.failures = 0  # ACKs de falha
+        self.delivered: Optional[int] = None  # Réplicas que receberam a escrita (None: envio em andamento)
+        self.started = time.monotonic()
+        self.future = Future()
+
+    def unreachable(self) -> bool:
+        """Mesmo que todas as réplicas restantes confirmem, não chega a W"""
+        return self.delivered is not None and self.delivered - self.failures < self.required
+
+
+class AckTracker:
+    """
+    Espera os REPLICATE_ACKs das escritas com consistência síncrona
+
+    Cada escrita que precisa de W confirmações recebe um Future, concluído
+    pelo ACK que completa as W (ou assim que o envio mostra que as réplicas
+    alcançadas não bastam), sem nenhuma thread parada por escrita. Uma
+    única thread expira os prazos, dormindo até o mais próximo.
+
+    O Future é resolvido com o número de ACKs de sucesso recebidos: quem
+    esperava compara com W para saber se a escrita foi confirmada.
+    """
+
+    def __init__(self, name: str = 'ack-tracker'):
+        self.name = name
+        self.logger = logging.getLogger(__name__)
+        self._cond = threading.Condition()
+        self._waiters: Dict[str, _Waiter] = {}
+        self._deadlines: List[Tuple[float, int, _Waiter]] = []  # Heap (prazo, ordem, escrita)
+        self._order = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._running = True
+
+        # Métricas por nível de consistência
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def expect(self, transaction_id: str, required: int, timeout: float, label: str = '') -> Future:
+        """
+        Registra uma escrita que precisa de `required` ACKs
+
+        Deve ser chamado antes de a escrita ser enviada, para que um ACK
+        rápido não chegue antes do registro. Se a transação já está sendo
+        esperada, a nova espera se junta à existente (mesmo Future e prazo,
+        com o maior W) em vez de substituí-la.
+
+        Args:
+            transaction_id: Transação da escrita replicada
+            required: ACKs de réplicas esperados (W)
+            timeout: Prazo em segundos
+            label: Nível de consistência, para as métricas
+
+        Returns:
+            Future resolvido com o número de ACKs de sucesso recebidos
+        """
+        waiter = _Waiter(transaction_id, required, label)
+        if required <= 0:
+            self._finish(waiter, expired=False)
+            return waiter.future
+
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("Rastreador de ACKs encerrado")
+            existing = self._waiters.get(transaction_id)
+            if existing is not None:
+                self.logger.warning(f"Transação {transaction_id} já espera ACKs; reutilizando a espera")
+                existing.required = max(existing.required, required)
+                return existing.future
+            self._waiters[transaction_id] = waiter
+            heapq.heappush(self._deadlines, (waiter.started + timeout, next(self._order), waiter))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._expire_loop, name=self.name, daemon=True)
+                self._thread.start()
+            elif self._deadlines[0][2] is waiter:
+                self._cond.notify()  # Novo prazo mais próximo
+        return waiter.future
+
+    def delivered(self, transaction_id: str, count: int):
+        """
+        Informa a quantas réplicas a escrita foi entregue
+
+        Se não bastam para W, a espera termina na hora em vez de esperar o prazo.
+        """
+        with self._cond:
+            waiter = self._waiters.get(transaction_id)
+            if waiter is None:
+                return
+            waiter.delivered = count
+            if not waiter.unreachable():
+                return
+            del self._waiters[transaction_id]
+        self._finish(waiter, expired=False)
+
+    def ack(self, transaction_id: str, success: bool):
+        """Conta o ACK de uma réplica; conclui a espera ao atingir W"""
+        with self._cond:
+            waiter = self._waiters.get(transaction_id)
+            if waiter is None:
+                return
+            if success:
+                waiter.acks += 1
+            else:
+                waiter.failures += 1
+            if waiter.acks < waiter.required and not waiter.unreachable():
+                return
+            del self._waiters[transaction_id]
+        self._finish(waiter, expired=False)
+
+    def _expire_loop(self):
+        while True:
+            expired = []
+            with self._cond:
+                while self._running and not self._deadlines:
+                    self._cond.wait()
+                if not self._running:
+                    expired = list(self._waiters.values())
+                    self._waiters.clear()
+                    self._deadlines.clear()
+                else:
+                    now = time.monotonic()
+                    while self._deadlines and self._deadlines[0][0] <= now:
+                        _, _, waiter = heapq.heappop(self._deadlines)
+                        if self._waiters.get(waiter.transaction_id) is waiter:
+                            del self._waiters[waiter.transaction_id]
+                            expired.append(waiter)
+                    if not expired and self._deadlines:
+                        self._cond.wait(self._deadlines[0][0] - now)
+
+            for waiter in expired:
+                self._finish(waiter, expired=True)
+            if not self._running:
+                return
+
+    def _finish(self, waiter: _Waiter, expired: bool):
+        elapsed = time.monotonic() - waiter.started
+        with self._cond:
+            stats = self._stats.setdefault(waiter.label, {
+                'writes': 0, 'confirmed': 0, 'timeouts': 0, 'unreachable': 0,
+                'wait_total': 0.0, 'max_wait': 0.0
+            })
+            stats['writes'] += 1
+            if waiter.acks >= waiter.required:
+                stats['confirmed'] += 1
+            elif expired:
+                stats['timeouts'] += 1
+            else:
+                stats['unreachable'] += 1
+            stats['wait_total'] += elapsed
+            stats['max_wait'] = max(stats['max_wait'], elapsed)
+
+        if expired:
+            self.logger.warning(
+                f"Escrita {waiter.transaction_id}: {waiter.acks}/{waiter.required} ACKs no prazo"
+            )
+        waiter.future.set_result(waiter.acks)
+
+    def waiting(self) -> int:
+        """Escritas esperando ACKs"""
+        with self._cond:
+            return len(self._waiters)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna as esperas em andamento e o custo de cada nível de consistência"""
+        with self._cond:
+            return {
+                'waiting': len(self._waiters),
+                'levels': {
+                    label: {
+                        'writes': int(stats['writes']),
+                        'confirmed': int(stats['confirmed']),
+                        'timeouts': int(stats['timeouts']),
+                        'unreachable': int(stats['unreachable']),
+                        'avg_wait_ms': stats['wait_total'] / stats['writes'] * 1000,
+                        'max_wait_ms': stats['max_wait'] * 1000
+                    }
+                    for label, stats in self._stats.items()
+                }
+            }
+
+    def close(self):
+        """Conclui as esperas pendentes com os ACKs recebidos até agora"""
+        with self._cond:
+            self._running = False
+            thread = self._thread
+            pending = [] if thread else list(self._waiters.values())
+            if not thread:
+                self._waiters.clear()
+            self._cond.notify_all()
+        for waiter in pending:
+            self._finish(waiter, expired=True)
+        if thread and thread is not threading.current_thread():
+            thread.join()
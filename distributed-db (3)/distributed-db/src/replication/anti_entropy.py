@@ -0,0 +1,532 @@
+import time
+import logging
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+from ..core.checksum import ChecksumValidator
+from ..core.executor import BoundedExecutor, ExecutorOverloadedError
+from ..core.models import Message, MessageType, NodeInfo, CommunicationType
+from ..core.sql_analysis import analyze
+from ..database.backend import StorageBackend
+
+
+_REPAIR_BATCH = 1000  # Chaves por pedido de linhas ao par
+
+
+def key_id(values: Sequence[Any]) -> str:
+    """Identificador da chave primária, igual em todos os nós (JSON normalizado)"""
+    return ChecksumValidator.calculate_checksum(list(values))
+
+
+def row_hash(row: Sequence[Any]) -> int:
+    """Hash de uma linha inteira"""
+    return int(ChecksumValidator.calculate_checksum(list(row)), 16)
+
+
+class MerkleTree:
+    """
+    Árvore de Merkle das linhas de uma tabela
+
+    As linhas são distribuídas em `leaves` folhas por faixas do hash da
+    chave primária, então as folhas ficam equilibradas qualquer que seja
+    o tipo da chave. Cada folha guarda o hash de cada linha e o XOR deles,
+    atualizado em O(1) a cada linha alterada; os nós internos só são
+    recalculados no caminho das folhas alteradas, quando são pedidos.
+
+    Os nós usam a numeração de um heap: 1 é a raiz, os filhos de i são
+    2i e 2i + 1 e as folhas vão de `leaves` a 2 * leaves - 1.
+    """
+
+    def __init__(self, name: str, key: Sequence[str], leaves: int = 1024):
+        if leaves < 2 or leaves & (leaves - 1):
+            raise ValueError("leaves deve ser uma potência de 2")
+        self.name = name
+        self.key = list(key)
+        self.leaves = leaves
+        self.rows = 0
+        self._entries: List[Dict[str, Tuple[List[Any], int]]] = [{} for _ in range(leaves)]
+        self._xor = [0] * leaves
+        self._digests: List[Optional[str]] = [None] * (2 * leaves)
+        self._dirty: Set[int] = set(range(leaves))  # Folhas com digest desatualizado
+
+    def leaf_of(self, kid: str) -> int:
+        """Folha da chave"""
+        return int(kid[:8], 16) % self.leaves
+
+    def put(self, kid: str, key: List[Any], hashed: int):
+        """Registra a versão atual de uma linha"""
+        leaf = self.leaf_of(kid)
+        old = self._entries[leaf].get(kid)
+        if old is None:
+            self.rows += 1
+        else:
+            self._xor[leaf] ^= old[1]
+        self._entries[leaf][kid] = (key, hashed)
+        self._xor[leaf] ^= hashed
+        self._dirty.add(leaf)
+
+    def remove(self, kid: str):
+        """Retira uma linha apagada"""
+        leaf = self.leaf_of(kid)
+        old = self._entries[leaf].pop(kid, None)
+        if old is not None:
+            self.rows -= 1
+            self._xor[leaf] ^= old[1]
+            self._dirty.add(leaf)
+
+    def entries(self, leaf: int) -> Dict[str, Tuple[List[Any], int]]:
+        """Linhas da folha: id da chave -> (chave, hash)"""
+        return self._entries[leaf]
+
+    def digest(self, index: int) -> str:
+        """Digest do nó (1: raiz)"""
+        if self._dirty:
+            self._update()
+        return self._digests[index]
+
+    def _update(self):
+        parents = set()
+        for leaf in self._dirty:
+            self._digests[self.leaves + leaf] = format(self._xor[leaf], '032x')
+            parents.add((self.leaves + leaf) // 2)
+        self._dirty.clear()
+        while parents:
+            above = set()
+            for index in parents:
+                self._digests[index] = ChecksumValidator.calculate_checksum(
+                    [self._digests[2 * index], self._digests[2 * index + 1]]
+                )
+                if index > 1:
+                    above.add(index // 2)
+            parents = above
+
+
+class AntiEntropy:
+    """
+    Detecta e corrige divergências entre réplicas com árvores de Merkle
+
+    Cada tabela com chave primária tem uma MerkleTree dos hashes das
+    linhas. As escritas avisam as chaves que alteraram (imagens de linhas)
+    e só essas linhas são relidas; escritas sem imagem (modo statement,
+    DDL) marcam a tabela para ser relida por inteiro na próxima rodada.
+
+    Em uma rodada, este nó pede ao par as raízes das árvores, desce só
+    pelos nós cujo digest difere até as folhas divergentes, compara as
+    chaves dessas folhas e copia do par apenas as linhas diferentes
+    (apagando as que só existem aqui). O custo cresce com a divergência,
+    não com o tamanho das tabelas.
+
+    Escritas em trânsito também parecem divergência: a rodada só compara
+    e corrige se a posição de replicação dos dois nós é a mesma no início
+    e continua a mesma antes da correção.
+    """
+
+    def __init__(self, node_id: int, db_manager: StorageBackend, request_callback: Callable,
+                 positions_callback: Callable[[], Dict[str, int]], leaves: int = 1024,
+                 scan_rows: int = 5000, timeout: float = 30):
+        """
+        Args:
+            node_id: ID deste nó
+            db_manager: Banco local
+            request_callback: Envia requisição RPC (mensagem, nó) -> Future
+            positions_callback: Posição de replicação deste nó (origem -> LSN)
+            leaves: Folhas de cada árvore (potência de 2)
+            scan_rows: Linhas por trecho ao reler uma tabela inteira
+            timeout: Prazo de cada resposta do par
+        """
+        self.node_id = node_id
+        self.db_manager = db_manager
+        self.request = request_callback
+        self.positions = positions_callback
+        self.leaves = leaves
+        self.scan_rows = scan_rows
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+        self.executor = BoundedExecutor(max_workers=1, max_queue=16, name='anti-entropy')
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # Uma atualização das árvores por vez
+        self.trees: Dict[str, MerkleTree] = {}  # Tabela (minúsculas) -> árvore
+        self._dirty: Dict[str, Dict[str, List[Any]]] = {}  # Tabela -> chaves alteradas a reler
+        self._stale: Set[str] = set()  # Tabelas a reler por inteiro
+        self._all_stale = True  # Relê todas (início, DDL sem tabela conhecida, snapshot carregado)
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        # Métricas
+        self._rounds = 0
+        self._skipped = 0
+        self._divergent_ranges = 0
+        self._repaired = 0
+        self._deleted = 0
+        self._messages = 0
+        self._last_round_ms = 0.0
+
+    # ------------------------------------------------------------------
+    # Escritas locais
+    # ------------------------------------------------------------------
+
+    def rows_written(self, table: str, keys: List[Sequence[Any]]):
+        """Marca chaves alteradas por uma escrita já confirmada"""
+        with self._lock:
+            dirty = self._dirty.setdefault(table.lower(), {})
+            for key in keys:
+                dirty[key_id(key)] = list(key)
+
+    def image_written(self, image: Dict[str, Any]):
+        """Marca as chaves de uma imagem de linhas (replicação por linha)"""
+        if 'deletes' in image:
+            keys = image.get('deletes') or []
+        elif image.get('upserts'):
+            positions = [image['columns'].index(column) for column in image['key']]
+            keys = [[row[i] for i in positions] for row in image['upserts']]
+        else:
+            return
+        self.rows_written(image['table'], keys)
+
+    def query_written(self, query: Optional[str]):
+        """Marca as tabelas de uma escrita sem imagem para serem relidas"""
+        if not query:
+            return
+        info = analyze(query)
+        if not info.is_write:
+            return
+        with self._lock:
+            if info.tables:
+                self._stale.update(info.tables)
+            else:
+                self._all_stale = True
+
+    def reset(self):
+        """Relê todas as tabelas na próxima rodada (ex.: snapshot carregado)"""
+        with self._lock:
+            self._all_stale = True
+
+    def refresh(self):
+        """Atualiza as árvores: relê as tabelas marcadas e as chaves alteradas"""
+        with self._refresh_lock:
+            with self._lock:
+                rebuild_all, self._all_stale = self._all_stale, False
+                stale, self._stale = self._stale, set()
+                dirty, self._dirty = self._dirty, {}
+
+            if rebuild_all:
+                tables = {table.lower(): table for table in self.db_manager.list_tables()}
+                with self._lock:
+                    for name in set(self.trees) - set(tables):
+                        del self.trees[name]
+                stale = set(tables)
+            else:
+                tables = {name: tree.name for name, tree in self.trees.items()}
+                if stale - set(tables):
+                    tables.update({table.lower(): table for table in self.db_manager.list_tables()})
+
+            for name in stale:
+                dirty.pop(name, None)  # A releitura já vê essas escritas
+                if name in tables:
+                    self._build(tables[name])
+                else:
+                    with self._lock:
+                        self.trees.pop(name, None)  # Tabela apagada
+
+            for name, keys in dirty.items():
+                tree = self.trees.get(name)
+                if tree is not None and keys:
+                    self._reread(tree, list(keys.values()))
+
+    def _build(self, table: str):
+        key = self.db_manager.primary_key(table)
+        if not key:
+            with self._lock:
+                self.trees.pop(table.lower(), None)  # Sem chave não há como corrigir por linha
+            return
+        tree = MerkleTree(table, key, self.leaves)
+        for columns, rows in self.db_manager.scan_table(table, key, self.scan_rows):
+            positions = [columns.index(column) for column in key]
+            for row in rows:
+                values = [row[i] for i in positions]
+                tree.put(key_id(values), values, row_hash(row))
+        with self._lock:
+            self.trees[table.lower()] = tree
+
+    def _reread(self, tree: MerkleTree, keys: List[List[Any]]):
+        columns, rows = self.db_manager.read_rows(tree.name, tree.key, keys)
+        current = {}
+        if rows:
+            positions = [columns.index(column) for column in tree.key]
+            for row in rows:
+                values = [row[i] for i in positions]
+                current[key_id(values)] = (values, row_hash(row))
+        with self._lock:
+            for key in keys:
+                kid = key_id(key)
+                if kid in current:
+                    tree.put(kid, *current[kid])
+                else:
+                    tree.remove(kid)
+
+    # ------------------------------------------------------------------
+    # Lado consultado
+    # ------------------------------------------------------------------
+
+    def handle(self, message: Message) -> Any:
+        """
+        Responde a um pedido ANTI_ENTROPY (op: roots, digests, leaves ou rows)
+
+        Roda na thread da anti-entropia; a resposta volta como Future.
+        """
+        data = message.data or {}
+        handlers = {'roots': self.serve_roots, 'digests': self.serve_digests,
+                    'leaves': self.serve_leaves, 'rows': self.serve_rows}
+        handler = handlers.get(data.get('op'))
+        if handler is None:
+            return self.reply(message, {'error': f"Operação de anti-entropia desconhecida: {data.get('op')}"})
+        try:
+            future = self.executor.submit(handler, data)
+        except (ExecutorOverloadedError, RuntimeError) as e:
+            return self.reply(message, {'error': f"Nó {self.node_id} sem capacidade para a anti-entropia: {e}"})
+
+        response = Future()
+
+        def done(result: Future):
+            try:
+                reply = result.result()
+            except Exception as e:
+                self.logger.error(f"Erro na anti-entropia ({data.get('op')}): {e}")
+                reply = {'error': str(e)}
+            response.set_result(self.reply(message, reply))
+
+        future.add_done_callback(done)
+        return response
+
+    def reply(self, request: Message, data: Dict[str, Any]) -> Message:
+        """Resposta ANTI_ENTROPY a um pedido"""
+        return Message(
+            message_type=MessageType.ANTI_ENTROPY,
+            sender_id=self.node_id,
+            data=data,
+            timestamp=datetime.now(),
+            communication_type=CommunicationType.UNICAST,
+            target_nodes=[request.sender_id]
+        )
+
+    def serve_roots(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Posição de replicação e raiz de cada árvore, depois de atualizá-las"""
+        positions = self.positions()
+        self.refresh()
+        with self._lock:
+            tables = {tree.name: {'root': tree.digest(1), 'rows': tree.rows, 'leaves': tree.leaves}
+                      for tree in self.trees.values()}
+        return {'positions': positions, 'tables': tables}
+
+    def serve_digests(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Digests dos nós pedidos de uma árvore"""
+        tree = self.trees.get(str(data.get('table')).lower())
+        if tree is None:
+            return {'error': f"Tabela {data.get('table')} sem árvore"}
+        with self._lock:
+            return {'digests': [tree.digest(int(index)) for index in data.get('indices') or []]}
+
+    def serve_leaves(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Chaves e hashes das linhas das folhas pedidas"""
+        tree = self.trees.get(str(data.get('table')).lower())
+        if tree is None:
+            return {'error': f"Tabela {data.get('table')} sem árvore"}
+        with self._lock:
+            return {'entries': [[key, format(hashed, '032x')]
+                                for leaf in data.get('leaves') or []
+                                for key, hashed in tree.entries(int(leaf)).values()]}
+
+    def serve_rows(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Linhas atuais das chaves pedidas, com a posição de replicação"""
+        tree = self.trees.get(str(data.get('table')).lower())
+        if tree is None:
+            return {'error': f"Tabela {data.get('table')} sem árvore"}
+        positions = self.positions()
+        columns, rows = self.db_manager.read_rows(tree.name, tree.key, data.get('keys') or [])
+        return {'positions': positions, 'columns': columns, 'rows': rows}
+
+    # ------------------------------------------------------------------
+    # Lado que compara e corrige
+    # ------------------------------------------------------------------
+
+    def compare_with(self, peer: NodeInfo) -> Dict[str, Any]:
+        """
+        Compara as tabelas com as do par e copia dele as linhas divergentes
+
+        Args:
+            peer: Nó de referência (o coordenador)
+
+        Returns:
+            Resumo da rodada: skipped, tables, ranges, repaired, deleted
+        """
+        started = time.monotonic()
+        summary = {'skipped': False, 'tables': 0, 'ranges': 0, 'repaired': 0, 'deleted': 0}
+        positions = self.positions()
+        self.refresh()
+        roots = self._call(peer, {'op': 'roots'})
+        if not self._same(positions, roots.get('positions'), self.positions()):
+            return self._skip(peer, summary)
+
+        for table, remote in (roots.get('tables') or {}).items():
+            tree = self.trees.get(table.lower())
+            if tree is None or tree.leaves != remote['leaves']:
+                self.logger.warning(f"Anti-entropia: {table} sem árvore comparável aqui - ignorada")
+                continue
+            summary['tables'] += 1
+            with self._lock:
+                equal = tree.digest(1) == remote['root']
+            if equal:
+                continue
+            leaves = self._differing_leaves(peer, tree)
+            summary['ranges'] += len(leaves)
+            if not leaves:
+                continue
+            repaired = self._repair(peer, tree, leaves, positions)
+            if repaired is None:
+                return self._skip(peer, summary)
+            summary['repaired'] += repaired[0]
+            summary['deleted'] += repaired[1]
+
+        elapsed = (time.monotonic() - started) * 1000
+        with self._lock:
+            self._rounds += 1
+            self._divergent_ranges += summary['ranges']
+            self._repaired += summary['repaired']
+            self._deleted += summary['deleted']
+            self._last_round_ms = elapsed
+        if summary['ranges']:
+            self.logger.warning(
+                f"Anti-entropia com o nó {peer.node_id}: {summary['ranges']} faixas divergentes, "
+                f"{summary['repaired']} linhas copiadas, {summary['deleted']} apagadas ({elapsed:.0f}ms)"
+            )
+        return summary
+
+    def _skip(self, peer: NodeInfo, summary: Dict[str, Any]) -> Dict[str, Any]:
+        self.logger.info(f"Anti-entropia com o nó {peer.node_id} adiada: replicação em andamento")
+        with self._lock:
+            self._skipped += 1
+        summary['skipped'] = True
+        return summary
+
+    @staticmethod
+    def _same(*positions: Optional[Dict[str, int]]) -> bool:
+        """Todas as posições de replicação iguais (origem ausente = LSN 0)"""
+        if any(position is None for position in positions):
+            return False
+        origins = set().union(*positions)
+        first = positions[0]
+        return all(position.get(origin, 0) == first.get(origin, 0)
+                   for position in positions[1:] for origin in origins)
+
+    def _differing_leaves(self, peer: NodeInfo, tree: MerkleTree) -> List[int]:
+        """Desce pelas subárvores com digest diferente, um nível por pedido"""
+        level = [1]
+        while level[0] < tree.leaves:
+            children = [child for index in level for child in (2 * index, 2 * index + 1)]
+            remote = self._call(peer, {'op': 'digests', 'table': tree.name, 'indices': children})['digests']
+            with self._lock:
+                level = [index for index, digest in zip(children, remote) if tree.digest(index) != digest]
+            if not level:
+                return []
+        return [index - tree.leaves for index in level]
+
+    def _repair(self, peer: NodeInfo, tree: MerkleTree, leaves: List[int],
+                positions: Dict[str, int]) -> Optional[Tuple[int, int]]:
+        """Copia as linhas diferentes das folhas; None se a replicação andou no meio"""
+        remote = {}
+        for key, hashed in self._call(peer, {'op': 'leaves', 'table': tree.name, 'leaves': leaves})['entries']:
+            remote[key_id(key)] = (key, int(hashed, 16))
+        with self._lock:
+            local = {kid: entry for leaf in leaves for kid, entry in tree.entries(leaf).items()}
+        fetch = [key for kid, (key, hashed) in remote.items() if kid not in local or local[kid][1] != hashed]
+        delete = [key for kid, (key, _) in local.items() if kid not in remote]
+
+        copied = 0
+        for start in range(0, len(fetch), _REPAIR_BATCH):
+            reply = self._call(peer, {'op': 'rows', 'table': tree.name, 'keys': fetch[start:start + _REPAIR_BATCH]})
+            if not self._same(positions, reply.get('positions'), self.positions()):
+                return None
+            if reply['rows']:
+                success, error = self.db_manager.load_rows(tree.name, reply['columns'], tree.key, reply['rows'])
+                if not success:
+                    raise RuntimeError(error)
+                copied += len(reply['rows'])
+        if delete:
+            if not self._same(positions, self.positions()):
+                return None
+            success, error, _ = self.db_manager.execute_many(self.db_manager.delete_sql(tree.name, tree.key), delete)
+            if not success:
+                raise RuntimeError(error)
+
+        self.rows_written(tree.name, fetch + delete)
+        self.refresh()
+        return copied, len(delete)
+
+    def _call(self, peer: NodeInfo, data: Dict[str, Any]) -> Dict[str, Any]:
+        message = Message(
+            message_type=MessageType.ANTI_ENTROPY,
+            sender_id=self.node_id,
+            data=data,
+            timestamp=datetime.now(),
+            communication_type=CommunicationType.UNICAST,
+            target_nodes=[peer.node_id]
+        )
+        with self._lock:
+            self._messages += 1
+        response = self.request(message, peer).result(self.timeout)
+        reply = (response.data if response else None) or {}
+        if reply.get('error'):
+            raise RuntimeError(reply['error'])
+        return reply
+
+    # ------------------------------------------------------------------
+    # Execução periódica
+    # ------------------------------------------------------------------
+
+    def start(self, interval: float, peer_callback: Callable[[], Optional[NodeInfo]]):
+        """
+        Compara com o par a cada `interval` segundos, em uma thread própria
+
+        Args:
+            interval: Segundos entre rodadas
+            peer_callback: Nó de referência da rodada (None: pula a rodada)
+        """
+        self._running = True
+
+        def loop():
+            while self._running:
+                time.sleep(interval)
+                peer = peer_callback() if self._running else None
+                if peer is None:
+                    continue
+                try:
+                    self.compare_with(peer)
+                except Exception as e:
+                    self.logger.warning(f"Anti-entropia com o nó {peer.node_id} interrompida: {e}")
+
+        self._thread = threading.Thread(target=loop, name='anti-entropy-loop', daemon=True)
+        self._thread.start()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna o tamanho das árvores e o resultado das rodadas"""
+        with self._lock:
+            return {
+                'tables': len(self.trees),
+                'rows': sum(tree.rows for tree in self.trees.values()),
+                'pending_keys': sum(len(keys) for keys in self._dirty.values()),
+                'stale_tables': len(self._stale),
+                'rounds': self._rounds,
+                'skipped': self._skipped,
+                'divergent_ranges': self._divergent_ranges,
+                'repaired': self._repaired,
+                'deleted': self._deleted,
+                'messages': self._messages,
+                'last_round_ms': self._last_round_ms
+            }
+
+    def close(self):
+        """Para as rodadas e a thread que atende os pares"""
+        self._running = False
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,117 @@
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, FrozenSet, Optional
+from ..core.executor import BoundedExecutor
+
+
+class _Pending:
+    """Tarefa esperando as anteriores que tocam as mesmas tabelas"""
+
+    __slots__ = ('fn', 'waiting', 'future')
+
+    def __init__(self, fn: Callable[[], Any], waiting: int):
+        self.fn = fn
+        self.waiting = waiting
+        self.future = Future()
+
+
+class ApplyScheduler:
+    """
+    Aplica escritas replicadas em paralelo, na ordem entre as que conflitam
+
+    Cada tarefa declara as tabelas que altera. Uma tarefa só começa
+    depois de terminarem as submetidas antes dela que tocam alguma dessas
+    tabelas; tarefas sobre tabelas diferentes rodam ao mesmo tempo nas
+    threads do executor, cada uma com a sua conexão do pool. Uma tarefa
+    sem tabelas conhecidas (DDL, query não reconhecida) é uma barreira:
+    espera todas as anteriores e todas as seguintes esperam por ela.
+    """
+
+    def __init__(self, executor: BoundedExecutor):
+        self.executor = executor
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._last: Dict[str, Future] = {}  # Tabela -> última tarefa submetida que a altera
+        self._barrier: Optional[Future] = None
+        self._waiting = 0  # Tarefas esperando dependências
+
+    def submit(self, fn: Callable[[], Any], tables: Optional[FrozenSet[str]]) -> Future:
+        """
+        Agenda fn() depois das tarefas anteriores que conflitam com ela
+
+        Args:
+            fn: Aplicação de uma ou mais escritas
+            tables: Tabelas alteradas, ou None para uma barreira
+
+        Returns:
+            Future com o resultado de fn
+        """
+        with self._lock:
+            if tables:
+                dependencies = {self._last.get(table) for table in tables}
+            else:
+                dependencies = set(self._last.values())
+            dependencies.add(self._barrier)
+            dependencies = [dep for dep in dependencies if dep is not None and not dep.done()]
+
+            pending = _Pending(fn, len(dependencies))
+            if tables:
+                for table in tables:
+                    self._last[table] = pending.future
+            else:
+                self._last.clear()
+                self._barrier = pending.future
+            if dependencies:
+                self._waiting += 1
+
+        if not dependencies:
+            self._start(pending)
+        for dependency in dependencies:
+            dependency.add_done_callback(lambda _: self._release(pending))
+        return pending.future
+
+    def _release(self, pending: _Pending):
+        with self._lock:
+            pending.waiting -= 1
+            ready = pending.waiting == 0
+            if ready:
+                self._waiting -= 1
+        if ready:
+            self._start(pending)
+
+    def _start(self, pending: _Pending):
+        # required: a escrita já foi aceita e precisa ser aplicada
+        try:
+            self.executor.submit(self._run, pending, required=True)
+        except Exception as e:
+            # Executor encerrado: quem espera a tarefa (e as que dependem dela) não fica preso
+            self.logger.error(f"Erro ao agendar aplicação: {e}")
+            pending.future.set_exception(e)
+
+    @staticmethod
+    def _run(pending: _Pending):
+        if not pending.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = pending.fn()
+        except BaseException as e:
+            pending.future.set_exception(e)
+        else:
+            pending.future.set_result(result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna métricas do agendador e das threads de aplicação"""
+        with self._lock:
+            waiting = self._waiting
+        stats = self.executor.get_stats()
+        return {
+            'workers': stats['max_workers'],
+            'active': stats['active'],
+            'ready': stats['queued'],
+            'waiting_conflicts': waiting
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Encerra as threads de aplicação"""
+        self.executor.shutdown(wait=wait)
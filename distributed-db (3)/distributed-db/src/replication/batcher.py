@@ -0,0 +1,119 @@
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List
+from ..core.models import Message
+
+
+class ReplicationBatcher:
+    """
+    Agrupa REPLICATEs em lotes (group commit da replicação)
+
+    As escritas entram na ordem em que foram gravadas no log e uma thread
+    envia o lote quando a janela de `window_ms` desde a primeira escrita
+    expira ou quando `max_batch` escritas se acumulam, o que vier antes.
+    Enquanto um lote está sendo enviado, as próximas escritas se acumulam:
+    sob carga os lotes crescem sozinhos e, com pouco tráfego, uma escrita
+    espera no máximo a janela.
+    """
+
+    def __init__(self, flush_callback: Callable[[List[Message]], Any], window_ms: float = 5,
+                 max_batch: int = 500, name: str = 'replication-batcher'):
+        """
+        Args:
+            flush_callback: Recebe cada lote, em ordem (chamado na thread do batcher)
+            window_ms: Tempo máximo que uma escrita espera pelo lote
+            max_batch: Escritas por lote
+            name: Nome da thread
+        """
+        if max_batch < 1:
+            raise ValueError("max_batch deve ser ao menos 1")
+        self.flush_callback = flush_callback
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.logger = logging.getLogger(__name__)
+
+        self._cond = threading.Condition()
+        self._pending: List[Message] = []
+        self._first_at = 0.0  # Chegada da escrita mais antiga do lote em formação
+        self._running = True
+
+        # Métricas
+        self._batches = 0
+        self._messages = 0
+        self._largest = 0
+        self._wait_total = 0.0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def add(self, message: Message):
+        """
+        Coloca uma escrita no próximo lote
+
+        Raises:
+            RuntimeError: Se o batcher já foi encerrado
+        """
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("Batcher de replicação encerrado")
+            if not self._pending:
+                self._first_at = time.monotonic()
+                self._cond.notify()
+            self._pending.append(message)
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and self._running:
+                    self._cond.wait()
+                if not self._pending:
+                    return  # Encerrado e sem escritas pendentes
+                deadline = self._first_at + self.window
+                while self._running and len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                self._batches += 1
+                self._messages += len(batch)
+                self._largest = max(self._largest, len(batch))
+                self._wait_total += time.monotonic() - self._first_at
+                if self._pending:
+                    self._first_at = time.monotonic()
+
+            try:
+                self.flush_callback(batch)
+            except Exception as e:
+                # As escritas já estão no log: os seguidores as recuperam pelo catch-up
+                self.logger.error(f"Erro ao enviar lote de {len(batch)} escritas: {e}", exc_info=True)
+
+    def close(self, wait: bool = True):
+        """
+        Envia o que estiver pendente e encerra a thread
+
+        Args:
+            wait: Aguarda o envio do último lote
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if wait and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna métricas dos lotes enviados"""
+        with self._cond:
+            return {
+                'batches': self._batches,
+                'messages': self._messages,
+                'pending': len(self._pending),
+                'avg_batch': self._messages / self._batches if self._batches else 0.0,
+                'max_batch': self._largest,
+                'avg_wait_ms': self._wait_total / self._batches * 1000 if self._batches else 0.0,
+                'window_ms': self.window * 1000
+            }
@@ -0,0 +1,555 @@
+import os
+import json
+import mmap
+import zlib
+import bisect
+import time
+import struct
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from ..core.models import Message
+from ..network import binary_format
+
+
+# Registro no segmento: CRC32 do corpo, LSN e tamanho do corpo, seguidos
+# da mensagem REPLICATE no formato binário
+_RECORD_HEADER = struct.Struct('!IQI')
+# Entrada do índice: posição do registro no segmento + 1 (0 = vazio)
+_INDEX_ENTRY = struct.Struct('!Q')
+
+_SEGMENT_SUFFIX = '.log'
+_INDEX_SUFFIX = '.idx'
+_APPLIED_FILE = 'applied.json'
+
+
+class LogTruncatedError(LookupError):
+    """O LSN pedido já foi removido do log pela retenção"""
+
+
+class _Segment:
+    """
+    Um arquivo de segmento e o seu índice mapeado em memória
+
+    O índice tem uma entrada de tamanho fixo por LSN (posição do registro
+    no arquivo), então achar um LSN custa um acesso ao mmap, sem varrer o
+    segmento.
+    """
+
+    def __init__(self, directory: str, base_lsn: int, index_entries: int):
+        self.base_lsn = base_lsn
+        self.index_entries = index_entries
+        name = os.path.join(directory, f"{base_lsn:020d}")
+        self.path = name + _SEGMENT_SUFFIX
+        self.index_path = name + _INDEX_SUFFIX
+
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self.size = os.fstat(self.fd).st_size
+        self.count = 0
+        self.readers = 0  # Leituras em andamento (read fora do lock do log)
+        self.retire: Optional[Callable[[], None]] = None  # close/delete adiado até a última leitura
+
+        index_size = index_entries * _INDEX_ENTRY.size
+        self.index_fd = os.open(self.index_path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self.index_fd).st_size != index_size:
+            os.ftruncate(self.index_fd, index_size)
+        self.index = mmap.mmap(self.index_fd, index_size)
+
+    @property
+    def last_lsn(self) -> int:
+        return self.base_lsn + self.count - 1
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.index_entries
+
+    def offset_of(self, lsn: int) -> Optional[int]:
+        position = lsn - self.base_lsn
+        if position < 0 or position >= self.count:
+            return None
+        stored = _INDEX_ENTRY.unpack_from(self.index, position * _INDEX_ENTRY.size)[0]
+        return stored - 1 if stored else None
+
+    def read_record(self, offset: int) -> Optional[Tuple[int, bytes, int]]:
+        """Lê o registro na posição; retorna (lsn, corpo, próxima posição) ou None se inválido"""
+        header = os.pread(self.fd, _RECORD_HEADER.size, offset)
+        if len(header) < _RECORD_HEADER.size:
+            return None
+        crc, lsn, length = _RECORD_HEADER.unpack(header)
+        body = os.pread(self.fd, length, offset + _RECORD_HEADER.size)
+        if len(body) < length or zlib.crc32(body) != crc:
+            return None
+        return lsn, body, offset + _RECORD_HEADER.size + length
+
+    def append(self, lsn: int, body: bytes):
+        record = _RECORD_HEADER.pack(zlib.crc32(body), lsn, len(body)) + body
+        os.write(self.fd, record)  # Uma escrita por registro: no máximo o último fica incompleto
+        _INDEX_ENTRY.pack_into(self.index, self.count * _INDEX_ENTRY.size, self.size + 1)
+        self.size += len(record)
+        self.count += 1
+
+    def recover(self) -> int:
+        """
+        Reconstrói o índice varrendo o segmento e descarta um final incompleto
+
+        Returns:
+            Número de bytes descartados
+        """
+        offset = 0
+        self.count = 0
+        while not self.full:
+            record = self.read_record(offset)
+            if record is None or record[0] != self.base_lsn + self.count:
+                break
+            _INDEX_ENTRY.pack_into(self.index, self.count * _INDEX_ENTRY.size, offset + 1)
+            self.count += 1
+            offset = record[2]
+        self.index[self.count * _INDEX_ENTRY.size:] = bytes(len(self.index) - self.count * _INDEX_ENTRY.size)
+
+        discarded = self.size - offset
+        if discarded:
+            os.ftruncate(self.fd, offset)
+            self.size = offset
+        return discarded
+
+    def load_count(self):
+        """Conta os LSNs pelo índice (segmentos antigos, já completos)"""
+        low, high = 0, self.index_entries
+        while low < high:  # Entradas preenchidas formam um prefixo do índice
+            middle = (low + high) // 2
+            if _INDEX_ENTRY.unpack_from(self.index, middle * _INDEX_ENTRY.size)[0]:
+                low = middle + 1
+            else:
+                high = middle
+        self.count = low
+
+    def sync(self):
+        os.fsync(self.fd)
+        self.index.flush()
+
+    def close(self):
+        self.index.close()
+        os.close(self.index_fd)
+        os.close(self.fd)
+
+    def delete(self):
+        self.close()
+        for path in (self.path, self.index_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class ReplicationLog:
+    """
+    Log de replicação append-only do nó, em segmentos
+
+    Cada escrita originada neste nó recebe um LSN (log sequence number)
+    crescente e é gravada, já como mensagem REPLICATE, no segmento atual.
+    Um segmento fecha ao atingir `segment_bytes` (ou o limite do índice) e
+    um novo começa no próximo LSN, que dá nome ao arquivo. Os seguidores
+    que perderam mensagens pedem o intervalo que falta e recebem os
+    registros como estão no disco, sem reexecutar nada neste nó.
+
+    Ao abrir, o último segmento é varrido: registros com CRC inválido ou
+    cortados por uma queda no meio da escrita são descartados.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024,
+                 index_entries: int = 65536, fsync: bool = False, max_segments: int = 0):
+        """
+        Args:
+            directory: Diretório dos segmentos
+            segment_bytes: Tamanho a partir do qual um segmento é fechado
+            index_entries: LSNs por segmento (tamanho do índice mapeado)
+            fsync: fsync a cada registro (senão, os dados sobrevivem à queda
+                do processo, mas não à do sistema operacional)
+            max_segments: Segmentos mantidos (0 = sem limite); os mais
+                antigos são removidos ao abrir um novo
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_entries = index_entries
+        self.fsync = fsync
+        self.max_segments = max_segments
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        self._bases: List[int] = []
+        self._open()
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        bases = sorted(
+            int(name[:-len(_SEGMENT_SUFFIX)]) for name in os.listdir(self.directory)
+            if name.endswith(_SEGMENT_SUFFIX) and name[:-len(_SEGMENT_SUFFIX)].isdigit()
+        )
+        for base in bases:
+            self._segments.append(_Segment(self.directory, base, self.index_entries))
+            self._bases.append(base)
+
+        if not self._segments:
+            self._roll(1)
+            return
+
+        for segment in self._segments[:-1]:
+            segment.load_count()
+        discarded = self._segments[-1].recover()
+        if discarded:
+            self.logger.warning(f"Log de replicação: {discarded} bytes incompletos descartados no final")
+        self.logger.info(
+            f"Log de replicação aberto em {self.directory} - LSNs {self.first_lsn} a {self.last_lsn}"
+        )
+
+    def _roll(self, base_lsn: int):
+        """Abre um novo segmento começando em base_lsn (com o lock)"""
+        self._segments.append(_Segment(self.directory, base_lsn, self.index_entries))
+        self._bases.append(base_lsn)
+        while self.max_segments and len(self._segments) > self.max_segments:
+            oldest = self._segments.pop(0)
+            self._bases.pop(0)
+            self._retire(oldest, oldest.delete)
+            self.logger.info(f"Segmento {oldest.base_lsn} removido do log de replicação")
+
+    @staticmethod
+    def _retire(segment: _Segment, action: Callable[[], None]):
+        """Fecha ou remove o segmento já ou, se alguém o lê, quando a leitura terminar (com o lock)"""
+        if segment.readers:
+            segment.retire = action
+        else:
+            action()
+
+    @property
+    def last_lsn(self) -> int:
+        """Último LSN gravado (0 se o log está vazio)"""
+        return self._segments[-1].last_lsn
+
+    @property
+    def first_lsn(self) -> int:
+        """Menor LSN ainda disponível no log"""
+        return self._segments[0].base_lsn
+
+    def append(self, message: Message) -> int:
+        """
+        Atribui o próximo LSN à mensagem e a grava no log
+
+        O LSN vai em message.data['lsn'], que os seguidores usam para
+        aplicar as escritas na ordem e detectar lacunas.
+
+        Args:
+            message: Mensagem REPLICATE (data é criado se ausente)
+
+        Returns:
+            LSN atribuído
+        """
+        with self._lock:
+            segment = self._segments[-1]
+            if segment.full or segment.size >= self.segment_bytes:
+                self._roll(segment.last_lsn + 1)
+                segment = self._segments[-1]
+            lsn = segment.last_lsn + 1
+            message.data = dict(message.data or {}, lsn=lsn)
+            segment.append(lsn, self.encode(message))
+            if self.fsync:
+                segment.sync()
+            return lsn
+
+    def read(self, from_lsn: int, max_entries: int = 1000, max_bytes: int = 4 * 1024 * 1024) -> List[bytes]:
+        """
+        Lê registros a partir de um LSN, em ordem
+
+        Args:
+            from_lsn: Primeiro LSN desejado
+            max_entries: Máximo de registros
+            max_bytes: Máximo aproximado de bytes (ao menos um registro é lido)
+
+        Returns:
+            Corpos dos registros (mensagens REPLICATE no formato binário)
+
+        Raises:
+            LogTruncatedError: Se from_lsn já foi removido pela retenção
+        """
+        # Os segmentos lidos ficam marcados: a retenção não os fecha no meio da leitura
+        with self._lock:
+            if from_lsn < self.first_lsn:
+                raise LogTruncatedError(f"LSN {from_lsn} anterior ao início do log ({self.first_lsn})")
+            segments = self._segments[bisect.bisect_right(self._bases, from_lsn) - 1:]
+            for segment in segments:
+                segment.readers += 1
+        try:
+            return self._read_segments(segments, from_lsn, max_entries, max_bytes)
+        finally:
+            with self._lock:
+                for segment in segments:
+                    segment.readers -= 1
+                    if not segment.readers and segment.retire is not None:
+                        segment.retire()
+                        segment.retire = None
+
+    @staticmethod
+    def _read_segments(segments: List[_Segment], from_lsn: int, max_entries: int, max_bytes: int) -> List[bytes]:
+        entries = []
+        total = 0
+        lsn = from_lsn
+        position = 0
+        while position < len(segments) and len(entries) < max_entries:
+            segment = segments[position]
+            offset = segment.offset_of(lsn)
+            while offset is not None and len(entries) < max_entries and (not entries or total < max_bytes):
+                record = segment.read_record(offset)
+                if record is None:
+                    break
+                entries.append(record[1])
+                total += len(record[1])
+                lsn += 1
+                offset = record[2] if lsn <= segment.last_lsn else None
+            if entries and total >= max_bytes:
+                break
+            position += 1
+        return entries
+
+    @staticmethod
+    def encode(message: Message) -> bytes:
+        """Corpo de registro de uma mensagem REPLICATE (o formato do log)"""
+        return binary_format.encode_message(message)
+    
+    @staticmethod
+    def decode(entry: bytes) -> Message:
+        """Reconstrói a mensagem REPLICATE de um registro"""
+        return binary_format.decode_message(entry)
+
+    def sync(self):
+        """Força os registros do segmento atual para o disco"""
+        with self._lock:
+            self._segments[-1].sync()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Retorna métricas do log"""
+        with self._lock:
+            return {
+                'first_lsn': self.first_lsn,
+                'last_lsn': self.last_lsn,
+                'segments': len(self._segments),
+                'bytes': sum(segment.size for segment in self._segments)
+            }
+
+    def close(self):
+        """Fecha os segmentos (os dados já estão nos arquivos)"""
+        with self._lock:
+            for segment in self._segments:
+                self._retire(segment, segment.close)
+            self._segments = []
+            self._bases = []
+
+
+class DedupWindow:
+    """
+    Últimas escritas replicadas aplicadas, para reconhecer reenvios
+
+    Um anel de tamanho fixo com as chaves na ordem em que chegaram e um
+    conjunto com as mesmas chaves: consultar custa um acesso ao conjunto
+    e, quando o anel dá a volta, a chave mais antiga sai dos dois. A
+    memória fica limitada a `capacity` chaves, qualquer que seja o volume.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = max(capacity, 1)
+        self._ring: List[Optional[Tuple[int, Any]]] = [None] * self.capacity
+        self._position = 0
+        self._keys = set()
+
+    def __contains__(self, key) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: Tuple[int, Any]):
+        """Registra a chave, descartando a mais antiga se o anel estiver cheio"""
+        if key in self._keys:
+            return
+        oldest = self._ring[self._position]
+        if oldest is not None:
+            self._keys.discard(oldest)
+        self._ring[self._position] = key
+        self._keys.add(key)
+        self._position = (self._position + 1) % self.capacity
+
+    def discard_origin(self, origin: int):
+        """Remove as chaves por LSN de uma origem (o log dela recomeçou)"""
+        for index, key in enumerate(self._ring):
+            if key is not None and key[0] == origin and isinstance(key[1], int):
+                self._ring[index] = None
+                self._keys.discard(key)
+
+    def keys(self) -> List[Tuple[int, Any]]:
+        """Chaves da mais antiga para a mais recente"""
+        ordered = self._ring[self._position:] + self._ring[:self._position]
+        return [key for key in ordered if key is not None]
+
+
+class AppliedState:
+    """
+    Último LSN aplicado de cada nó de origem, persistido em disco
+
+    O arquivo é reescrito por inteiro em um temporário e trocado com
+    os.replace, então uma queda deixa a versão anterior ou a nova, nunca
+    um arquivo pela metade.
+
+    Junto vai a janela de deduplicação: as escritas aplicadas acima do
+    último LSN contíguo (aplicação em paralelo) e as que chegaram sem LSN,
+    pelo transaction_id. Depois de reiniciar, um reenvio dessas escritas é
+    reconhecido em vez de executado de novo. As chaves por LSN que o LSN
+    contíguo já cobre não são gravadas.
+
+    set e remember só alteram a memória: uma thread grava o arquivo no
+    máximo uma vez a cada `flush_interval`, fora do caminho da aplicação
+    (0 grava a cada mudança). Uma queda perde no máximo esse intervalo, e
+    as escritas dele são reaplicadas pelo catch-up, como antes do estado
+    existir. Com fsync, cada gravação passa por fsync do arquivo e do
+    diretório (sobrevive à queda do sistema, não só à do processo).
+    """
+
+    def __init__(self, directory: str, window: int = 10000, flush_interval: float = 0.1, fsync: bool = False):
+        """
+        Args:
+            directory: Diretório do arquivo de estado
+            window: Chaves guardadas na janela de deduplicação
+            flush_interval: Segundos entre gravações do arquivo (0: a cada mudança)
+            fsync: fsync a cada gravação, como no log de replicação
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, _APPLIED_FILE)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._write_lock = threading.Lock()  # Uma gravação do arquivo por vez
+        self._dirty = False
+        self._running = True
+        self._thread: Optional[threading.Thread] = None
+        self._applied: Dict[int, int] = {}
+        self.recent = DedupWindow(window)
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if not isinstance(data.get('applied'), dict):
+                data = {'applied': data}  # Formato antigo: só origem -> LSN
+            self._applied = {int(origin): lsn for origin, lsn in data['applied'].items()}
+            for origin, key in data.get('recent', []):
+                self.recent.add((origin, key))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            self.logger.error(f"Estado de replicação ilegível em {self.path}: {e} - recomeçando do zero")
+
+    def get(self, origin: int) -> int:
+        """Último LSN do nó de origem já aplicado aqui (0 se nenhum)"""
+        return self._applied.get(origin, 0)
+
+    def set(self, origin: int, lsn: int, recent: Iterable[Tuple[int, Any]] = ()):
+        """
+        Registra que o LSN do nó de origem foi aplicado
+
+        Args:
+            origin: Nó de origem
+            lsn: Último LSN contíguo aplicado
+            recent: Chaves de escritas aplicadas acima desse LSN
+        """
+        with self._lock:
+            self._applied[origin] = lsn
+            for key in recent:
+                self.recent.add(key)
+            self._changed()
+        if not self.flush_interval:
+            self.flush()
+
+    def reset(self, origin: int, lsn: int):
+        """Adota um novo LSN aplicado e esquece as escritas da origem acima dele (grava na hora)"""
+        with self._lock:
+            self._applied[origin] = lsn
+            self.recent.discard_origin(origin)
+            self._dirty = True
+        self.flush()
+
+    def remember(self, keys: Iterable[Tuple[int, Any]]):
+        """Registra escritas aplicadas que chegaram sem LSN"""
+        with self._lock:
+            for key in keys:
+                self.recent.add(key)
+            self._changed()
+        if not self.flush_interval:
+            self.flush()
+
+    def _changed(self):
+        """Marca o estado para a próxima gravação (com o lock)"""
+        self._dirty = True
+        if not self.flush_interval or not self._running:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._flush_loop, name='applied-state', daemon=True)
+            self._thread.start()
+        self._cond.notify()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while self._running and not self._dirty:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                # Junta as mudanças do intervalo em uma gravação
+                deadline = time.monotonic() + self.flush_interval
+                while self._running and time.monotonic() < deadline:
+                    self._cond.wait(deadline - time.monotonic())
+            try:
+                self.flush()
+            except OSError as e:
+                self.logger.error(f"Erro ao gravar o estado de replicação em {self.path}: {e}")
+
+    def flush(self):
+        """Grava o estado no arquivo, se mudou desde a última gravação"""
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                self._dirty = False
+                applied = dict(self._applied)
+                recent = [list(key) for key in self.recent.keys()
+                          if not isinstance(key[1], int) or key[1] > applied.get(key[0], 0)]
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump({'applied': applied, 'recent': recent}, f)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            if self.fsync:
+                self._sync_directory()
+
+    def _sync_directory(self):
+        """fsync do diretório, para que a troca do arquivo sobreviva a uma queda do sistema"""
+        if not hasattr(os, 'O_DIRECTORY'):
+            return  # Windows: não há como abrir o diretório
+        fd = os.open(os.path.dirname(self.path), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def snapshot(self) -> Dict[int, int]:
+        """Cópia do estado atual"""
+        with self._lock:
+            return dict(self._applied)
+
+    def close(self):
+        """Encerra a thread de gravação e grava o que faltava"""
+        with self._cond:
+            self._running = False
+            thread = self._thread
+            self._cond.notify_all()
+        if thread and thread is not threading.current_thread():
+            thread.join()
+        self.flush()
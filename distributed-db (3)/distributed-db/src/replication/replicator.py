@@ -1,26 +1,139 @@
+import time
+import base64
 import logging
-from typing import List, Callable
+import threading
+from collections import deque
+from concurrent.futures import Future
+from functools import partial
+from typing import Any, Deque, Dict, FrozenSet, List, Callable, Optional, Tuple
 from datetime import datetime
-from ..core.models import Message, MessageType, NodeInfo, CommunicationType
-from ..database.mysql_manager import MySQLManager
+from ..core.models import Message, MessageType, NodeInfo, CommunicationType, DeliveryStatus
+from ..core.sql_analysis import analyze, KIND_DELETE, KIND_INSERT, KIND_REPLACE, KIND_UPDATE
+from ..database.backend import StorageBackend
+from .ack_tracker import AckTracker
+from .anti_entropy import AntiEntropy
+from .apply_scheduler import ApplyScheduler
+from .replication_log import AppliedState, DedupWindow, LogTruncatedError, ReplicationLog
+from .table_locks import TableLocks
+
+
+# Escritas de linhas: ordenadas pelas tabelas que alteram. As demais
+# (DDL, TRUNCATE, queries não reconhecidas) são barreiras.
+_ROW_WRITE_KINDS = frozenset((KIND_INSERT, KIND_UPDATE, KIND_DELETE, KIND_REPLACE))
+_RATE_WINDOW = 10  # Segundos da janela da taxa de aplicação
 
 
 class Replicator:
     """
     Gerencia replicação de alterações entre nós
     Garante que todas as alterações sejam propagadas
+
+    Com um log de replicação, cada escrita originada aqui recebe um LSN e
+    é gravada antes de ser enviada. Os seguidores aplicam as escritas de
+    cada origem na ordem dos LSNs, guardam o último aplicado e, quando
+    percebem que ficaram para trás (nó reiniciado, mensagem perdida),
+    pedem o intervalo que falta à origem (REPLICATION_PULL) em lotes.
+
+    Com um ApplyScheduler, as escritas recebidas são aplicadas em
+    paralelo: as que alteram as mesmas tabelas continuam na ordem dos
+    LSNs e as independentes usam conexões diferentes ao mesmo tempo. O
+    LSN aplicado só avança até onde todas as anteriores terminaram.
+
+    Os ACKs também alimentam o AckTracker, onde as escritas com
+    consistência síncrona esperam W confirmações antes de responder.
+
+    No modo por linha (row_images), a origem envia junto com a query as
+    imagens das linhas que ela alterou e os seguidores aplicam upserts e
+    deletes pela chave primária em vez de reexecutar o SQL. As escritas
+    enviadas como SQL levam as linhas afetadas na origem; um seguidor que
+    afeta outro número de linhas registra a divergência.
+    
+    Aplicar é idempotente: cada escrita tem uma chave (origem e LSN, ou
+    origem e transaction_id se não veio com LSN) e as aplicadas ficam em
+    uma janela de deduplicação limitada, salva junto com o LSN aplicado.
+    Um REPLICATE repetido (reenvio após um prazo estourado, reconexão,
+    catch-up depois de reiniciar) é confirmado sem ser executado de novo,
+    então a origem pode reenviar sem medo.
     """
     
-    def __init__(self, node_id: int, db_manager: MySQLManager, send_message_callback: Callable):
+    def __init__(self, node_id: int, db_manager: StorageBackend, send_message_callback: Callable,
+                 fanout_callback: Optional[Callable] = None, replication_log: Optional[ReplicationLog] = None,
+                 applied_state: Optional[AppliedState] = None, request_callback: Optional[Callable] = None,
+                 pull_batch_size: int = 1000, pull_timeout: float = 30,
+                 apply_scheduler: Optional[ApplyScheduler] = None, row_images: bool = False,
+                 row_image_max_rows: int = 10000, rebuild_callback: Optional[Callable] = None,
+                 anti_entropy: Optional[AntiEntropy] = None, delivery_retries: int = 0):
+        """
+        Args:
+            node_id: ID deste nó
+            db_manager: Banco local
+            send_message_callback: Envia mensagem (retorna nº de entregas)
+            fanout_callback: Envia mensagem e retorna node_id -> DeliveryStatus
+            replication_log: Log das escritas originadas neste nó
+            applied_state: Último LSN aplicado por nó de origem
+            request_callback: Envia requisição RPC (mensagem, nó) -> Future
+            pull_batch_size: Registros por REPLICATION_PULL no catch-up
+            pull_timeout: Prazo da resposta a cada REPLICATION_PULL
+            apply_scheduler: Aplica as escritas recebidas em paralelo (None: na
+                thread que as recebeu, uma transação por lote)
+            row_images: Replica as linhas alteradas em vez de só o SQL
+            row_image_max_rows: Acima disso, a escrita segue só como SQL
+            rebuild_callback: Chamado com o nó de origem quando o intervalo que
+                falta já saiu do log dele (só um snapshot recupera este nó)
+            anti_entropy: Árvores de Merkle avisadas das linhas alteradas
+            delivery_retries: Reenvios de um REPLICATE aos nós que não
+                responderam no prazo
+        """
         self.node_id = node_id
         self.db_manager = db_manager
         self.send_message = send_message_callback
+        self.fanout = fanout_callback  # Retorna node_id -> DeliveryStatus
+        self.log = replication_log
+        self.applied_state = applied_state
+        self.request = request_callback
+        self.pull_batch_size = pull_batch_size
+        self.pull_timeout = pull_timeout
+        self.apply_scheduler = apply_scheduler
+        self.row_images = row_images
+        self.row_image_max_rows = row_image_max_rows
+        self.rebuild = rebuild_callback
+        self.anti_entropy = anti_entropy
+        self.delivery_retries = delivery_retries
         self.logger = logging.getLogger(__name__)
         self.pending_replications = {}  # transaction_id -> ack_count
+        self._pending_lock = threading.Lock()
+        self.table_locks = TableLocks()  # Commit e posição de replicação sem outra escrita na mesma tabela no meio
+        self.ack_tracker = AckTracker()  # Escritas esperando W ACKs
+        self._held: Dict[int, Dict[int, Message]] = {}  # origem -> LSN -> REPLICATE que chegou antes da vez
+        self._peer_lsn: Dict[int, int] = {}  # origem -> último LSN anunciado no heartbeat anterior
+        self._restarted = set()  # Origens cujo log recomeçou do zero
+        
+        # Aplicação fora de ordem entre tabelas: próximo LSN a despachar e
+        # LSNs já aplicados acima do último contíguo (com o timestamp da origem)
+        self._order_lock = threading.Lock()
+        self._next_lsn: Dict[int, int] = {}
+        self._done: Dict[int, Dict[int, Optional[datetime]]] = {}
+        self._seen_lsn: Dict[int, int] = {}  # Maior LSN recebido de cada origem
+        self._applied_at: Dict[int, Optional[datetime]] = {}  # Timestamp da última escrita aplicada
+        self._applied_total = 0
+        self._rate: Deque[Tuple[float, int]] = deque()  # (instante, escritas) na janela da taxa
+        
+        # Deduplicação: escritas já aplicadas (persistidas no estado aplicado,
+        # se houver) e as sem LSN em andamento
+        self._recent = applied_state.recent if applied_state is not None else DedupWindow()
+        self._applying = set()
+        self._duplicates = 0  # REPLICATEs repetidos ignorados
+        
+        # Verificação de determinismo
+        self._stats_lock = threading.Lock()
+        self._captured = 0  # Escritas enviadas com imagens de linhas
+        self._nondeterministic = 0  # Escritas não determinísticas enviadas só como SQL
+        self._sql_fallbacks = 0  # Escritas que no modo por linha seguiram como SQL
+        self._divergences = 0  # Escritas que afetaram aqui outro número de linhas que na origem
     
     def is_write_query(self, query: str) -> bool:
         """
-        Verifica se a query é de escrita (INSERT, UPDATE, DELETE)
+        Verifica se a query é de escrita (INSERT, UPDATE, DELETE, DDL)
         
         Args:
             query: Query SQL
@@ -28,11 +141,173 @@ class Replicator:
         Returns:
             True se é query de escrita, False caso contrário
         """
-        query_upper = query.strip().upper()
-        write_commands = ['INSERT', 'UPDATE', 'DELETE', 'CREATE', 'DROP', 'ALTER', 'TRUNCATE']
-        return any(query_upper.startswith(cmd) for cmd in write_commands)
+        return analyze(query).is_write
+    
+    @property
+    def last_lsn(self) -> int:
+        """Último LSN gravado no log deste nó (0 sem log)"""
+        return self.log.last_lsn if self.log else 0
+    
+    def positions(self) -> Dict[str, int]:
+        """
+        Posição de replicação dos dados deste nó
+        
+        O último LSN do próprio log e o último aplicado de cada origem: um
+        nó que copiar os dados daqui continua a replicação desses pontos.
+        """
+        positions = {str(origin): lsn for origin, lsn in
+                     (self.applied_state.snapshot() if self.applied_state else {}).items()}
+        positions[str(self.node_id)] = self.last_lsn
+        return positions
+    
+    def reset_positions(self, positions: Dict[int, int]):
+        """
+        Adota a posição de replicação de um snapshot carregado
+        
+        Descarta o que estava guardado ou em andamento de cada origem; o
+        catch-up seguinte busca as escritas posteriores ao snapshot.
+        """
+        if self.applied_state is None:
+            return
+        with self._order_lock:
+            for origin, lsn in positions.items():
+                if origin == self.node_id:
+                    continue
+                self.applied_state.reset(origin, lsn)
+                for state in (self._held, self._next_lsn, self._done, self._seen_lsn):
+                    state.pop(origin, None)
+                self._restarted.discard(origin)
+    
+    def query_message(self, query: str, transaction_id: str, params: Optional[List[Any]] = None,
+                      rows_affected: Optional[int] = None, row_image: Optional[Dict[str, Any]] = None) -> Message:
+        """
+        Monta o REPLICATE de uma query
+        
+        Args:
+            query: Query de escrita
+            transaction_id: ID da transação
+            params: Parâmetros da query
+            rows_affected: Linhas afetadas na origem (para a verificação de determinismo)
+            row_image: Linhas alteradas, como retornadas por execute_with_row_images
+        """
+        data = {}
+        if row_image is not None:
+            data['row_image'] = row_image
+        elif rows_affected is not None:
+            data['rows_affected'] = rows_affected
+        return Message(
+            message_type=MessageType.REPLICATE,
+            sender_id=self.node_id,
+            transaction_id=transaction_id,
+            query=query,
+            params=params,
+            data=data or None,
+            timestamp=datetime.now(),
+            communication_type=CommunicationType.BROADCAST
+        )
+    
+    def execute_write(self, query: str, transaction_id: str, params: Optional[List[Any]] = None
+                      ) -> Tuple[bool, Optional[Any], Optional[str], int, Optional[Message]]:
+        """
+        Executa uma escrita local e monta o REPLICATE correspondente
+        
+        No modo por linha, captura as linhas alteradas junto com a
+        escrita. Uma escrita não determinística (NOW(), RAND(), UUID()...)
+        que segue só como SQL pode divergir nas réplicas e é registrada.
+        
+        Args:
+            query: Query de escrita
+            transaction_id: ID da transação
+            params: Parâmetros da query
+            
+        Returns:
+            Tupla (sucesso, dados, erro, rows_affected, REPLICATE ou None se falhou)
+        """
+        image = None
+        if self.row_images:
+            success, data, error, rows_affected, image = self.db_manager.execute_with_row_images(
+                query, params, self.row_image_max_rows
+            )
+        else:
+            success, data, error, rows_affected = self.db_manager.execute_query(query, params)
+        if not success:
+            return success, data, error, rows_affected, None
+        
+        self._track(query, image)
+        if image is not None:
+            with self._stats_lock:
+                self._captured += 1
+        elif self.row_images:
+            with self._stats_lock:
+                self._sql_fallbacks += 1
+        if image is None and not analyze(query).deterministic:
+            with self._stats_lock:
+                self._nondeterministic += 1
+            self.logger.warning(f"Escrita não determinística replicada como SQL (réplicas podem divergir): "
+                                f"{query[:80]}")
+        return success, data, error, rows_affected, self.query_message(
+            query, transaction_id, params, rows_affected=rows_affected, row_image=image
+        )
+    
+    def bulk_message(self, query: Optional[str], data: Dict[str, Any], transaction_id: str) -> Message:
+        """Monta o REPLICATE de uma escrita em lote ({'rows': ...} ou {'statements': ...})"""
+        return Message(
+            message_type=MessageType.REPLICATE,
+            sender_id=self.node_id,
+            transaction_id=transaction_id,
+            query=query,
+            data=data,
+            timestamp=datetime.now(),
+            communication_type=CommunicationType.BROADCAST
+        )
+    
+    def ordered(self, query: Optional[str], data: Optional[Dict[str, Any]] = None):
+        """
+        Segura as tabelas de uma escrita local da execução até o record
+        
+        Escritas na mesma tabela esperam umas pelas outras, então os LSNs
+        seguem a ordem dos commits; escritas em tabelas diferentes (que os
+        seguidores aplicam em paralelo) não se bloqueiam. DDL e queries não
+        reconhecidas seguram todas as tabelas.
+        
+        Args:
+            query: Query de escrita (ou de 'rows' de um lote)
+            data: Dados de um lote ({'rows': ...} ou {'statements': ...})
+        
+        Returns:
+            Context manager que segura as tabelas
+        """
+        return self.table_locks.hold(self._query_tables(query, data))
+    
+    def quiesce(self):
+        """
+        Segura todas as tabelas: as escritas em andamento terminam de gravar
+        a posição (LSN no log ou LSN aplicado) e as próximas esperam
+        
+        Um snapshot aberto dentro dele vê dados e positions() do mesmo instante.
+        """
+        return self.table_locks.hold(None)
     
-    def replicate_query(self, query: str, transaction_id: str, all_nodes: List[NodeInfo]) -> bool:
+    def record(self, replicate_msg: Message) -> Message:
+        """
+        Grava o REPLICATE no log de replicação, atribuindo o LSN
+        
+        Deve ser chamado logo após a escrita local, na thread que a fez e
+        ainda dentro de ordered(), para que a ordem dos LSNs siga a ordem
+        dos commits; o envio (ship) pode ficar para outra thread.
+        
+        Args:
+            replicate_msg: Mensagem REPLICATE
+            
+        Returns:
+            A mesma mensagem, com data['lsn'] se houver log
+        """
+        if self.log:
+            self.log.append(replicate_msg)
+        return replicate_msg
+    
+    def replicate_query(self, query: str, transaction_id: str, all_nodes: List[NodeInfo],
+                        params: Optional[List[Any]] = None) -> bool:
         """
         Replica uma query para todos os outros nós
         
@@ -40,6 +315,7 @@ class Replicator:
             query: Query SQL para replicar
             transaction_id: ID da transação
             all_nodes: Lista de todos os nós
+            params: Parâmetros da query (None para SQL sem placeholders)
             
         Returns:
             True se replicação foi iniciada, False caso contrário
@@ -48,32 +324,256 @@ class Replicator:
             self.logger.debug("Query SELECT não precisa de replicação")
             return False
         
-        self.logger.info(f"Iniciando replicação da query: {query[:50]}...")
+        return self.ship(self.record(self.query_message(query, transaction_id, params)), all_nodes)
+    
+    def replicate_bulk(self, query: Optional[str], data: Dict[str, Any], transaction_id: str,
+                       all_nodes: List[NodeInfo]) -> bool:
+        """
+        Replica uma escrita em lote como uma única mensagem
         
-        # Cria mensagem de replicação
-        replicate_msg = Message(
-            message_type=MessageType.REPLICATE,
+        Os outros nós aplicam o lote inteiro em uma transação, como o nó
+        de origem, em vez de receber um REPLICATE por linha.
+        
+        Args:
+            query: Query SQL com placeholders (lote de linhas) ou None
+            data: {'rows': [...]} ou {'statements': [...]}
+            transaction_id: ID da transação
+            all_nodes: Lista de todos os nós
+            
+        Returns:
+            True se replicação foi iniciada, False caso contrário
+        """
+        return self.ship(self.record(self.bulk_message(query, data, transaction_id)), all_nodes)
+    
+    def ship(self, replicate_msg: Message, all_nodes: List[NodeInfo]) -> bool:
+        """
+        Envia um REPLICATE (já gravado no log) aos outros nós
+        
+        Args:
+            replicate_msg: Mensagem REPLICATE
+            all_nodes: Lista de todos os nós
+            
+        Returns:
+            True se ao menos um nó recebeu a mensagem
+        """
+        if self.is_bulk(replicate_msg.data):
+            data = replicate_msg.data
+            size = len(data.get('rows') or data.get('statements') or [])
+            self.logger.info(f"Iniciando replicação de lote com {size} itens")
+            description = replicate_msg.query or f"lote de {size} statements"
+        else:
+            self.logger.info(f"Iniciando replicação da query: {replicate_msg.query[:50]}...")
+            description = replicate_msg.query
+        return self._broadcast(replicate_msg, all_nodes, description, replicate_msg.params)
+    
+    def ship_batch(self, messages: List[Message], all_nodes: List[NodeInfo]) -> bool:
+        """
+        Envia várias escritas (já gravadas no log) em uma única mensagem
+        
+        O REPLICATE_BATCH leva os REPLICATEs na ordem dos LSNs, no mesmo
+        formato dos registros do log; cada seguidor aplica o lote em uma
+        transação e confirma tudo em um único REPLICATE_ACK.
+        
+        Args:
+            messages: Mensagens REPLICATE, na ordem em que foram gravadas
+            all_nodes: Lista de todos os nós
+            
+        Returns:
+            True se ao menos um nó recebeu o lote
+        """
+        if len(messages) == 1:
+            return self.ship(messages[0], all_nodes)
+        
+        self.logger.info(f"Iniciando replicação de {len(messages)} escritas em um lote")
+        batch_msg = Message(
+            message_type=MessageType.REPLICATE_BATCH,
             sender_id=self.node_id,
-            transaction_id=transaction_id,
-            query=query,
+            data={'entries': [ReplicationLog.encode(message) for message in messages],
+                  'last_lsn': self.last_lsn},
             timestamp=datetime.now(),
             communication_type=CommunicationType.BROADCAST
         )
+        return self._broadcast(batch_msg, all_nodes, f"lote de {len(messages)} escritas", tracked=messages)
+    
+    def _broadcast(self, replicate_msg: Message, all_nodes: List[NodeInfo], description: str,
+                   params: Optional[List[Any]] = None, tracked: Optional[List[Message]] = None) -> bool:
+        """
+        Envia o REPLICATE aos outros nós e registra os ACKs esperados
+        
+        Em um REPLICATE_BATCH, `tracked` são as escritas do lote, cada uma
+        registrada com a sua transação.
+        """
+        transaction_id = replicate_msg.transaction_id
+        tracked = tracked or [replicate_msg]
+        
+        # Registra antes do envio, como o ack_tracker: o ACK de uma réplica
+        # rápida pode chegar antes de o fanout (e os reenvios) terminar
+        now = datetime.now()
+        with self._pending_lock:
+            for message in tracked:
+                self.pending_replications[message.transaction_id] = {
+                    'query': description if message is replicate_msg else message.query,
+                    'params': params if message is replicate_msg else message.params,
+                    'lsn': self.lsn_of(message),
+                    'expected_acks': len(all_nodes),  # Limite até saber quem recebeu
+                    'received_acks': 0,
+                    'failed_nodes': [],
+                    'timestamp': now
+                }
         
         # Envia para todos os outros nós
-        success_count = self.send_message(replicate_msg, all_nodes)
-        
-        # Registra replicação pendente
-        self.pending_replications[transaction_id] = {
-            'query': query,
-            'expected_acks': len(all_nodes) - 1,  # Todos exceto este nó
-            'received_acks': 0,
-            'timestamp': datetime.now()
-        }
+        failed_nodes = []
+        if self.fanout:
+            outcomes = self.fanout(replicate_msg, all_nodes)
+            for _ in range(self.delivery_retries):
+                # Sem resposta no prazo não diz se a réplica recebeu; como ela
+                # ignora escritas repetidas, reenviar é seguro
+                timed_out = [node for node in all_nodes
+                             if outcomes.get(node.node_id) == DeliveryStatus.TIMED_OUT]
+                if not timed_out:
+                    break
+                self.logger.info(f"Reenviando {transaction_id or description} a {len(timed_out)} nós sem resposta")
+                outcomes.update(self.fanout(replicate_msg, timed_out))
+            delivered = [nid for nid, status in outcomes.items() if status == DeliveryStatus.DELIVERED]
+            failed_nodes = [nid for nid, status in outcomes.items() if status != DeliveryStatus.DELIVERED]
+            success_count = len(delivered)
+            expected_acks = success_count  # Só espera ACK de quem recebeu
+            
+            if failed_nodes:
+                details = ", ".join(f"{nid}={outcomes[nid].value}" for nid in failed_nodes)
+                self.logger.warning(f"Replicação {transaction_id or description} não entregue a: {details}")
+        else:
+            success_count = self.send_message(replicate_msg, all_nodes)
+            expected_acks = len(all_nodes) - 1
+        
+        # Ajusta os ACKs esperados a quem recebeu; os que já chegaram contam
+        for message in tracked:
+            self.ack_tracker.delivered(message.transaction_id, success_count)
+            with self._pending_lock:
+                replication = self.pending_replications.get(message.transaction_id)
+                if replication is None:
+                    continue  # Já confirmada por todos
+                replication['expected_acks'] = expected_acks
+                replication['failed_nodes'] = failed_nodes
+                if replication['received_acks'] >= expected_acks:
+                    del self.pending_replications[message.transaction_id]
         
         self.logger.info(f"Replicação enviada para {success_count} nós")
         return success_count > 0
     
+    @staticmethod
+    def lsn_of(message: Message) -> Optional[int]:
+        """LSN de um REPLICATE (None se a origem não tem log)"""
+        return message.data.get('lsn') if isinstance(message.data, dict) else None
+    
+    @classmethod
+    def dedup_key(cls, message: Message) -> Optional[Tuple[int, Any]]:
+        """Chave da escrita na janela de deduplicação (None se não tem LSN nem transação)"""
+        lsn = cls.lsn_of(message)
+        if lsn is not None:
+            return message.sender_id, lsn
+        if message.transaction_id:
+            return message.sender_id, message.transaction_id
+        return None
+    
+    @staticmethod
+    def is_bulk(data: Optional[Dict[str, Any]]) -> bool:
+        """Verifica se o conteúdo da mensagem é uma escrita em lote"""
+        return bool(data) and ('rows' in data or 'statements' in data)
+    
+    def apply_bulk(self, query: Optional[str], data: Dict[str, Any]) -> Tuple[bool, Optional[str], int]:
+        """
+        Aplica uma escrita em lote localmente, em uma transação
+        
+        Args:
+            query: Query SQL com placeholders (para 'rows')
+            data: {'rows': [...]} ou {'statements': [...]}
+            
+        Returns:
+            Tupla (sucesso, erro, linhas_afetadas); para 'statements', o
+            número de statements executados
+        """
+        statements = data.get('statements')
+        if statements is not None:
+            if not all(isinstance(sql, str) and self.is_write_query(sql) for sql in statements):
+                return False, "Lote aceita apenas queries de escrita", 0
+            success, error = self.db_manager.execute_transaction(statements)
+            for sql in statements:
+                self._track(sql)
+            return success, error, len(statements) if success else 0
+        
+        if not query or not self.is_write_query(query):
+            return False, "Lote aceita apenas queries de escrita", 0
+        result = self.db_manager.execute_many(query, data.get('rows') or [])
+        self._track(query)
+        return result
+    
+    def _track(self, query: Optional[str], image: Optional[Dict[str, Any]] = None):
+        """Avisa a anti-entropia das linhas (ou, sem imagem, das tabelas) alteradas"""
+        if self.anti_entropy is None:
+            return
+        if image is not None:
+            self.anti_entropy.image_written(image)
+        else:
+            self.anti_entropy.query_written(query)
+    
+    def _track_message(self, message: Message):
+        """Avisa a anti-entropia de uma escrita replicada aplicada aqui"""
+        if self.anti_entropy is None:
+            return
+        image = self.row_image_of(message)
+        if image is not None:
+            self._track(None, image)
+            return
+        data = message.data if isinstance(message.data, dict) else {}
+        for sql in (data.get('statements') if self.is_bulk(data) else None) or [message.query]:
+            self._track(sql)
+    
+    @staticmethod
+    def row_image_of(message: Message) -> Optional[Dict[str, Any]]:
+        """Imagens de linhas do REPLICATE (None se a escrita segue só como SQL)"""
+        return message.data.get('row_image') if isinstance(message.data, dict) else None
+    
+    def _row_sql(self, image: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Statement que aplica cada linha da imagem (None: reexecuta o SQL original)"""
+        if image is None:
+            return None
+        if 'deletes' in image:
+            return self.db_manager.delete_sql(image['table'], image['key'])
+        return self.db_manager.upsert_sql(image['table'], image['columns'], image['key'])
+    
+    def apply_row_image(self, image: Dict[str, Any]) -> Tuple[bool, Optional[str], int]:
+        """
+        Aplica as linhas capturadas na origem, em uma transação
+        
+        Returns:
+            Tupla (sucesso, erro, linhas_afetadas)
+        """
+        rows = image.get('deletes') if 'deletes' in image else image.get('upserts')
+        if not rows:
+            return True, None, 0  # A escrita não alterou nenhuma linha na origem
+        return self.db_manager.execute_many(self._row_sql(image), rows)
+    
+    def _statements_of(self, message: Message) -> List[Tuple[str, Optional[List[Any]]]]:
+        """Statements (query, params) que aplicam uma escrita avulsa"""
+        image = self.row_image_of(message)
+        sql = self._row_sql(image)
+        if sql is not None:
+            return [(sql, values) for values in (image.get('deletes') if 'deletes' in image else image.get('upserts'))]
+        return [(message.query, message.params)]
+    
+    def _check_rows(self, message: Message, rows_affected: int):
+        """Compara as linhas afetadas aqui com as da origem (verificação de determinismo)"""
+        expected = message.data.get('rows_affected') if isinstance(message.data, dict) else None
+        if expected is None or expected == rows_affected:
+            return
+        with self._stats_lock:
+            self._divergences += 1
+        self.logger.warning(
+            f"Divergência na escrita {self.lsn_of(message)} do nó {message.sender_id}: "
+            f"{rows_affected} linhas afetadas aqui, {expected} na origem - {(message.query or '')[:80]}"
+        )
+    
     def handle_replication_request(self, message: Message) -> bool:
         """
         Processa requisição de replicação de outro nó
@@ -88,11 +588,18 @@ class Replicator:
         transaction_id = message.transaction_id
         sender_id = message.sender_id
         
-        self.logger.info(f"Replicando query do nó {sender_id}: {query[:50]}...")
+        self.logger.info(f"Replicando query do nó {sender_id}: {(query or 'lote de statements')[:50]}...")
         
         try:
-            # Executa query localmente
-            success, data, error, rows_affected = self.db_manager.execute_query(query)
+            # Executa query (ou lote, ou imagens de linhas) localmente
+            if self.is_bulk(message.data):
+                success, error, rows_affected = self.apply_bulk(query, message.data)
+            elif self._row_sql(self.row_image_of(message)) is not None:
+                success, error, rows_affected = self.apply_row_image(self.row_image_of(message))
+            else:
+                success, data, error, rows_affected = self.db_manager.execute_query(query, message.params)
+                if success:
+                    self._check_rows(message, rows_affected)
             
             if success:
                 self.logger.info(f"Replicação executada com sucesso - {rows_affected} linhas afetadas")
@@ -105,6 +612,506 @@ class Replicator:
             self.logger.error(f"Exceção ao replicar query: {e}")
             return False
     
+    def receive(self, message: Message) -> List[Tuple[Message, bool]]:
+        """
+        Aplica um REPLICATE respeitando a ordem dos LSNs da origem
+        
+        Um LSN já aplicado é ignorado (reenvio ou catch-up que chegou
+        antes); um LSN adiantado fica guardado até os anteriores chegarem.
+        Deve ser chamado para uma origem de cada vez (o nó usa a chave
+        ('replicate', origem) no executor do banco).
+        
+        Args:
+            message: Mensagem REPLICATE
+            
+        Returns:
+            Lista (mensagem, sucesso) das escritas concluídas nesta chamada,
+            na ordem: a recebida e as guardadas que ela liberou. Vazia se a
+            mensagem ficou aguardando.
+        """
+        return self.receive_batch([message])
+    
+    def receive_batch(self, messages: List[Message]) -> List[Tuple[Message, bool]]:
+        """
+        Aplica um lote de REPLICATEs da mesma origem e aguarda o resultado
+        
+        Veja submit_batch.
+        
+        Returns:
+            Lista (mensagem, sucesso) das escritas concluídas nesta chamada
+        """
+        return self.submit_batch(messages).result()
+    
+    def submit_batch(self, messages: List[Message]) -> Future:
+        """
+        Agenda a aplicação de um lote de REPLICATEs da mesma origem
+        
+        LSNs repetidos são ignorados e adiantados ficam guardados até a
+        vez, como em receive. As escritas consecutivas são agrupadas por
+        tabelas em comum e cada grupo é aplicado em uma transação; se algo
+        falhar, o grupo é desfeito e aplicado uma a uma. Com o agendador,
+        grupos sem tabelas em comum rodam em paralelo e esta chamada
+        retorna sem esperar; sem ele, o lote é aplicado aqui mesmo.
+        
+        Args:
+            messages: Mensagens REPLICATE, todas do mesmo nó de origem
+            
+        Returns:
+            Future com a lista (mensagem, sucesso) das escritas concluídas
+        """
+        results, origin, run = self._take_in_order(messages)
+        groups = self._group(run, split=self.apply_scheduler is not None)
+        
+        if self.apply_scheduler is None:
+            for group in groups:
+                results += self._apply_group(origin, group)
+            future = Future()
+            future.set_result(results)
+            return future
+        
+        futures = [
+            self.apply_scheduler.submit(partial(self._apply_group, origin, group), self._tables_of(group))
+            for group in groups
+        ]
+        return self._gather(results, futures, groups)
+    
+    def _take_in_order(self, messages: List[Message]) -> Tuple[List[Tuple[Message, bool]], Optional[int], List[Message]]:
+        """Separa repetidas, guarda adiantadas e retorna (repetidas, origem, escritas na vez)"""
+        if not messages:
+            return [], None, []
+        if self.applied_state is None or any(self.lsn_of(m) is None for m in messages):
+            return self._take_unordered(messages)
+        
+        origin = messages[0].sender_id
+        duplicates = []
+        run = []
+        with self._order_lock:
+            next_lsn = self._next_lsn.get(origin) or self.applied_state.get(origin) + 1
+            held = self._held.setdefault(origin, {})
+            for message in sorted(messages, key=self.lsn_of):
+                lsn = self.lsn_of(message)
+                self._seen_lsn[origin] = max(self._seen_lsn.get(origin, 0), lsn)
+                if lsn < next_lsn:
+                    self.logger.debug(f"LSN {lsn} do nó {origin} já aplicado - ignorado")
+                    duplicates.append((message, True))
+                elif lsn > next_lsn:
+                    held[lsn] = message
+                    self.logger.info(f"LSN {lsn} do nó {origin} fora de ordem (esperado {next_lsn}) - "
+                                     f"{len(held)} aguardando")
+                else:
+                    run.append(message)
+                    next_lsn += 1
+            
+            # Guardadas que ficaram na vez (e as que o catch-up já trouxe)
+            for stale in [lsn for lsn in held if lsn < next_lsn]:
+                del held[stale]
+            while next_lsn in held:
+                run.append(held.pop(next_lsn))
+                next_lsn += 1
+            self._next_lsn[origin] = next_lsn
+            
+            # Na vez, mas aplicadas antes de o nó reiniciar (acima do LSN contíguo salvo)
+            repeated = [message for message in run if self.dedup_key(message) in self._recent]
+            if repeated:
+                self.logger.info(f"{len(repeated)} escritas do nó {origin} já aplicadas antes - ignoradas")
+                run = [message for message in run if self.dedup_key(message) not in self._recent]
+                duplicates += [(message, True) for message in repeated]
+                self._mark_done(origin, repeated)
+            self._duplicates += len(duplicates)
+        return duplicates, origin, run
+    
+    def _take_unordered(self, messages: List[Message]) -> Tuple[List[Tuple[Message, bool]], None, List[Message]]:
+        """Sem LSNs: separa as transações já aplicadas ou em andamento"""
+        duplicates = []
+        run = []
+        with self._order_lock:
+            for message in messages:
+                key = self.dedup_key(message)
+                if key is not None and (key in self._recent or key in self._applying):
+                    self.logger.debug(f"Transação {message.transaction_id} do nó {message.sender_id} "
+                                      f"já aplicada - ignorada")
+                    duplicates.append((message, True))
+                    continue
+                if key is not None:
+                    self._applying.add(key)
+                run.append(message)
+            self._duplicates += len(duplicates)
+        return duplicates, None, run
+    
+    def _write_tables(self, message: Message) -> Optional[FrozenSet[str]]:
+        """Tabelas alteradas pela escrita, ou None se ela deve ser uma barreira"""
+        image = self.row_image_of(message)
+        if image is not None:
+            return frozenset((image['table'],))
+        return self._query_tables(message.query, message.data)
+    
+    def _query_tables(self, query: Optional[str], data: Optional[Dict[str, Any]]) -> Optional[FrozenSet[str]]:
+        """Tabelas alteradas pela query ou pelos statements do lote (None: barreira)"""
+        statements = data.get('statements') if self.is_bulk(data) else None
+        tables = set()
+        for query in statements if statements is not None else [query]:
+            info = analyze(query) if isinstance(query, str) else None
+            if info is None or info.kind not in _ROW_WRITE_KINDS or not info.tables:
+                return None
+            tables |= info.tables
+        return frozenset(tables)
+    
+    def _tables_of(self, group: List[Message]) -> Optional[FrozenSet[str]]:
+        tables = set()
+        for message in group:
+            message_tables = self._write_tables(message)
+            if message_tables is None:
+                return None
+            tables |= message_tables
+        return frozenset(tables)
+    
+    def _group(self, run: List[Message], split: bool) -> List[List[Message]]:
+        """
+        Divide escritas consecutivas em grupos, cada um aplicado em uma transação
+        
+        Lotes (rows/statements) e barreiras ficam sozinhos. Entre eles, as
+        queries avulsas formam um grupo só ou, com split, um grupo por
+        conjunto de tabelas relacionadas, mantendo a ordem dentro de cada um.
+        """
+        groups: List[List[Message]] = []
+        segment: List[Message] = []
+        for message in run:
+            if self.is_bulk(message.data) or self._write_tables(message) is None:
+                groups += self._split_by_tables(segment) if split else [segment] if segment else []
+                segment = []
+                groups.append([message])
+            else:
+                segment.append(message)
+        groups += self._split_by_tables(segment) if split else [segment] if segment else []
+        return groups
+    
+    def _split_by_tables(self, segment: List[Message]) -> List[List[Message]]:
+        """Agrupa as escritas cujas tabelas se ligam direta ou indiretamente (union-find)"""
+        parent: Dict[str, str] = {}
+        
+        def find(table: str) -> str:
+            while parent[table] != table:
+                parent[table] = parent[parent[table]]
+                table = parent[table]
+            return table
+        
+        for message in segment:
+            tables = sorted(self._write_tables(message))
+            for table in tables:
+                parent.setdefault(table, table)
+            for table in tables[1:]:
+                parent[find(table)] = find(tables[0])
+        
+        groups: Dict[str, List[Message]] = {}
+        for message in segment:
+            groups.setdefault(find(min(self._write_tables(message))), []).append(message)
+        return list(groups.values())
+    
+    def _gather(self, results: List[Tuple[Message, bool]], futures: List[Future],
+                groups: List[List[Message]]) -> Future:
+        """Future com os resultados de todos os grupos, quando o último terminar (grupo com erro: falha)"""
+        combined = Future()
+        if not futures:
+            combined.set_result(results)
+            return combined
+        
+        remaining = [len(futures)]
+        lock = threading.Lock()
+        
+        def group_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            gathered = list(results)
+            for future, group in zip(futures, groups):
+                error = future.exception()
+                if error is None:
+                    gathered += future.result()
+                else:
+                    self.logger.error(f"Erro ao aplicar grupo de {len(group)} escritas: {error}")
+                    gathered += [(message, False) for message in group]
+            combined.set_result(gathered)
+        
+        for future in futures:
+            future.add_done_callback(group_done)
+        return combined
+    
+    def _apply_group(self, origin: Optional[int], group: List[Message]) -> List[Tuple[Message, bool]]:
+        """Aplica um grupo em uma transação (ou uma a uma, se falhar) e avança o LSN aplicado"""
+        # Do commit ao LSN aplicado, como na origem: um snapshot não pega um sem o outro
+        with self.table_locks.hold(self._tables_of(group)):
+            return self._apply_locked(origin, group)
+    
+    def _apply_locked(self, origin: Optional[int], group: List[Message]) -> List[Tuple[Message, bool]]:
+        try:
+            if len(group) > 1:
+                statements = []
+                positions = []  # Índice do statement de cada escrita enviada como SQL
+                for message in group:
+                    positions.append(None if self._row_sql(self.row_image_of(message)) else len(statements))
+                    statements.extend(self._statements_of(message))
+                counts: List[int] = []
+                success, error = self.db_manager.execute_transaction(statements, rows_affected=counts)
+                if success:
+                    for message, position in zip(group, positions):
+                        if position is not None:
+                            self._check_rows(message, counts[position])
+                    self.logger.info(f"Lote de {len(group)} escritas replicadas aplicado em uma transação")
+                    return [(message, True) for message in group]
+                self.logger.warning(f"Lote de {len(group)} escritas falhou ({error}) - aplicando uma a uma")
+            # Avança mesmo com erro (ex.: chave duplicada), como antes do log:
+            # parar aqui bloquearia todas as escritas seguintes da origem
+            return [(message, self.handle_replication_request(message)) for message in group]
+        except Exception as e:
+            self.logger.error(f"Exceção ao aplicar {len(group)} escritas replicadas: {e}", exc_info=True)
+            return [(message, False) for message in group]
+        finally:
+            for message in group:
+                self._track_message(message)
+            self._complete(origin, group)
+    
+    def _complete(self, origin: Optional[int], group: List[Message]):
+        """Registra escritas aplicadas e avança o LSN aplicado até o último contíguo"""
+        now = time.monotonic()
+        with self._order_lock:
+            self._applied_total += len(group)
+            self._rate.append((now, len(group)))
+            while self._rate and self._rate[0][0] < now - _RATE_WINDOW:
+                self._rate.popleft()
+            if origin is not None:
+                self._mark_done(origin, group)
+                return
+            
+            keys = [key for key in map(self.dedup_key, group) if key is not None]
+            self._applying.difference_update(keys)
+            if keys and self.applied_state is not None:
+                self.applied_state.remember(keys)
+            elif keys:
+                for key in keys:
+                    self._recent.add(key)
+    
+    def _mark_done(self, origin: int, group: List[Message]):
+        """Avança o LSN aplicado até o último contíguo (chamado com _order_lock)"""
+        done = self._done.setdefault(origin, {})
+        for message in group:
+            done[self.lsn_of(message)] = message.timestamp
+        applied = advanced = self.applied_state.get(origin)
+        while advanced + 1 in done:
+            advanced += 1
+            self._applied_at[origin] = done.pop(advanced)
+        
+        # As aplicadas fora de ordem vão para a janela: o LSN salvo não as cobre
+        ahead = [(origin, lsn) for lsn in map(self.lsn_of, group) if lsn > advanced]
+        if advanced != applied or ahead:
+            self.applied_state.set(origin, advanced, ahead)
+    
+    def held_count(self, origin: Optional[int] = None) -> int:
+        """Mensagens aguardando LSNs anteriores (de uma origem ou de todas)"""
+        if origin is not None:
+            return len(self._held.get(origin) or {})
+        return sum(len(held) for held in self._held.values())
+    
+    def _next_expected(self, origin: int) -> int:
+        """Próximo LSN da origem ainda não recebido (despachado ou aplicado)"""
+        with self._order_lock:
+            return self._next_lsn.get(origin) or self.applied_state.get(origin) + 1
+    
+    def get_apply_stats(self) -> Dict[str, Any]:
+        """
+        Retorna vazão da aplicação, atraso de cada origem e REPLICATEs repetidos
+        
+        O atraso em LSNs compara o maior LSN conhecido da origem (recebido
+        ou anunciado no heartbeat) com o último aplicado aqui; o atraso em
+        segundos usa o timestamp da última escrita aplicada, no relógio da
+        origem.
+        """
+        now = time.monotonic()
+        with self._order_lock:
+            while self._rate and self._rate[0][0] < now - _RATE_WINDOW:
+                self._rate.popleft()
+            recent = sum(count for _, count in self._rate)
+            lag = {}
+            if self.applied_state is not None:
+                for origin in set(self._seen_lsn) | set(self._peer_lsn):
+                    applied = self.applied_state.get(origin)
+                    behind = max(self._seen_lsn.get(origin, 0), self._peer_lsn.get(origin, 0)) - applied
+                    applied_at = self._applied_at.get(origin)
+                    seconds = (datetime.now() - applied_at).total_seconds() if behind > 0 and applied_at else 0.0
+                    lag[str(origin)] = {'lsns': max(behind, 0), 'seconds': max(seconds, 0.0)}
+            return {
+                'applied': self._applied_total,
+                'writes_per_s': recent / _RATE_WINDOW,
+                'scheduler': self.apply_scheduler.get_stats() if self.apply_scheduler else None,
+                'lag': lag,
+                'duplicates': self._duplicates,
+                'dedup_window': len(self._recent)
+            }
+    
+    def needs_catch_up(self, origin: int, peer_last_lsn: int) -> bool:
+        """
+        Decide, a cada heartbeat da origem, se este nó ficou para trás
+        
+        Uma diferença momentânea é normal (REPLICATEs em trânsito). Pede o
+        catch-up só se o que a origem já tinha gravado no heartbeat
+        anterior ainda não foi aplicado aqui.
+        
+        Args:
+            origin: Nó que enviou o heartbeat
+            peer_last_lsn: Último LSN do log da origem
+            
+        Returns:
+            True se o intervalo que falta deve ser pedido à origem
+        """
+        if self.applied_state is None or self.request is None:
+            return False
+        previous = self._peer_lsn.get(origin)
+        self._peer_lsn[origin] = peer_last_lsn
+        applied = self._next_expected(origin) - 1  # Recebido, mesmo que ainda aplicando
+        if previous is not None and max(previous, peer_last_lsn) < applied:
+            # Dois heartbeats seguidos abaixo do que já foi aplicado: a origem
+            # perdeu o log (ex.: diretório apagado) e recomeçou os LSNs. Sem
+            # recomeçar aqui também, as novas escritas seriam descartadas
+            self._restarted.add(origin)
+            return True
+        if previous is None:
+            previous = peer_last_lsn  # Primeiro heartbeat (ex.: este nó acabou de subir)
+        return applied < min(previous, peer_last_lsn)
+    
+    def catch_up(self, origin_node: NodeInfo) -> int:
+        """
+        Busca e aplica as escritas da origem que este nó ainda não tem
+        
+        Os registros vêm em lotes de REPLICATION_PULL; o próximo lote é
+        pedido antes de aplicar o atual, então rede e banco trabalham ao
+        mesmo tempo. Deve rodar na mesma chave de execução que os
+        REPLICATEs da origem.
+        
+        Args:
+            origin_node: Nó de origem
+            
+        Returns:
+            Número de escritas aplicadas
+        """
+        if self.applied_state is None or self.request is None:
+            return 0
+        
+        origin = origin_node.node_id
+        if origin in self._restarted:
+            self._restarted.discard(origin)
+            self.logger.warning(f"Log de replicação do nó {origin} recomeçou - LSN aplicado zerado")
+            with self._order_lock:
+                self.applied_state.reset(origin, 0)
+                for state in (self._held, self._next_lsn, self._done, self._seen_lsn):
+                    state.pop(origin, None)
+        first = self._next_expected(origin)
+        applied = 0
+        future = self._pull(origin_node, first)
+        while future is not None:
+            try:
+                response = future.result(self.pull_timeout)
+            except Exception as e:
+                self.logger.warning(f"Catch-up do nó {origin} interrompido: {e}")
+                break
+            
+            data = (response.data if response else None) or {}
+            if data.get('error'):
+                self.logger.error(f"Catch-up do nó {origin} impossível: {data['error']}")
+                if data.get('first_lsn') and self.rebuild is not None:
+                    self.rebuild(origin_node)  # O intervalo saiu do log: só um snapshot resolve
+                break
+            entries = data.get('entries') or []
+            if not entries:
+                break
+            
+            messages = [self.decode_entry(entry) for entry in entries]
+            last = self.lsn_of(messages[-1])
+            future = self._pull(origin_node, last + 1) if last < data.get('last_lsn', 0) else None
+            applied += len(self.receive_batch(messages))
+        
+        if applied:
+            self.logger.info(f"Catch-up do nó {origin}: {applied} escritas aplicadas "
+                             f"(LSN {first} a {self.applied_state.get(origin)})")
+        return applied
+    
+    def _pull(self, origin_node: NodeInfo, from_lsn: int) -> Optional[Future]:
+        pull_msg = Message(
+            message_type=MessageType.REPLICATION_PULL,
+            sender_id=self.node_id,
+            data={'from_lsn': from_lsn, 'max_entries': self.pull_batch_size},
+            timestamp=datetime.now(),
+            communication_type=CommunicationType.UNICAST,
+            target_nodes=[origin_node.node_id]
+        )
+        try:
+            return self.request(pull_msg, origin_node)
+        except OSError as e:
+            self.logger.warning(f"Erro ao pedir o log de replicação ao nó {origin_node.node_id}: {e}")
+            return None
+    
+    @staticmethod
+    def decode_entry(entry) -> Message:
+        """Mensagem REPLICATE de um registro recebido em um REPLICATE_BATCH"""
+        if isinstance(entry, str):
+            entry = base64.b64decode(entry)  # Conexão negociada em JSON
+        return ReplicationLog.decode(entry)
+    
+    def serve_pull(self, message: Message) -> Message:
+        """
+        Responde a um REPLICATION_PULL com registros do log deste nó
+        
+        Args:
+            message: Pedido com data['from_lsn'] e data['max_entries']
+            
+        Returns:
+            REPLICATE_BATCH com os registros e o último LSN do log
+        """
+        data = message.data or {}
+        reply: Dict[str, Any] = {'last_lsn': self.last_lsn}
+        if self.log is None:
+            reply.update(entries=[], error=f"Nó {self.node_id} sem log de replicação")
+        else:
+            try:
+                reply['entries'] = self.log.read(
+                    data.get('from_lsn', 1),
+                    max_entries=min(data.get('max_entries') or self.pull_batch_size, self.pull_batch_size)
+                )
+            except LogTruncatedError as e:
+                reply.update(entries=[], first_lsn=self.log.first_lsn, error=str(e))
+        
+        return Message(
+            message_type=MessageType.REPLICATE_BATCH,
+            sender_id=self.node_id,
+            data=reply,
+            timestamp=datetime.now(),
+            communication_type=CommunicationType.UNICAST,
+            target_nodes=[message.sender_id]
+        )
+    
+    def get_determinism_stats(self) -> Dict[str, Any]:
+        """Escritas replicadas por linha ou como SQL, não determinísticas e divergências"""
+        with self._stats_lock:
+            return {
+                'mode': 'row' if self.row_images else 'statement',
+                'row_images': self._captured,
+                'sql_fallbacks': self._sql_fallbacks,
+                'nondeterministic': self._nondeterministic,
+                'divergences': self._divergences
+            }
+    
+    def get_replication_stats(self) -> Dict[str, Any]:
+        """Retorna métricas do log e do estado aplicado"""
+        return {
+            'log': self.log.get_stats() if self.log else None,
+            'applied': {str(origin): lsn for origin, lsn in
+                        (self.applied_state.snapshot() if self.applied_state else {}).items()},
+            'held': self.held_count(),
+            'pending_acks': self.get_pending_replications_count(),
+            'apply': self.get_apply_stats(),
+            'consistency': self.ack_tracker.get_stats(),
+            'determinism': self.get_determinism_stats()
+        }
+    
     def send_replication_ack(self, transaction_id: str, sender_id: int, success: bool, all_nodes: List[NodeInfo]):
         """
         Envia ACK de replicação de volta ao nó originador
@@ -128,40 +1135,74 @@ class Replicator:
         self.send_message(ack_msg, all_nodes)
         self.logger.debug(f"ACK de replicação enviado para nó {sender_id}")
     
+    def send_replication_acks(self, results: List[Tuple[Message, bool]], all_nodes: List[NodeInfo]):
+        """
+        Confirma escritas aplicadas, com um único ACK por nó de origem
+        
+        Args:
+            results: Pares (mensagem REPLICATE, sucesso), como retornados por receive_batch
+            all_nodes: Lista de todos os nós
+        """
+        by_origin: Dict[int, Dict[str, bool]] = {}
+        for message, success in results:
+            by_origin.setdefault(message.sender_id, {})[message.transaction_id] = success
+        
+        for origin, outcomes in by_origin.items():
+            if len(outcomes) == 1:
+                (transaction_id, success), = outcomes.items()
+                self.send_replication_ack(transaction_id, origin, success, all_nodes)
+                continue
+            ack_msg = Message(
+                message_type=MessageType.REPLICATE_ACK,
+                sender_id=self.node_id,
+                data={'results': outcomes},
+                timestamp=datetime.now(),
+                communication_type=CommunicationType.UNICAST,
+                target_nodes=[origin]
+            )
+            self.send_message(ack_msg, all_nodes)
+            self.logger.debug(f"ACK de {len(outcomes)} replicações enviado para nó {origin}")
+    
     def handle_replication_ack(self, message: Message) -> bool:
         """
         Processa ACK de replicação
         
         Args:
-            message: Mensagem de ACK
+            message: Mensagem de ACK (de uma transação, ou data['results']
+                com transaction_id -> sucesso de um lote)
             
         Returns:
             True se todas as replicações foram confirmadas, False caso contrário
         """
-        transaction_id = message.transaction_id
-        sender_id = message.sender_id
-        success = message.data.get('success', False) if message.data else False
+        results = message.data.get('results') if message.data else None
+        if results is not None:
+            confirmed = [self._count_ack(tid, message.sender_id, success) for tid, success in results.items()]
+            return all(confirmed)
         
-        if transaction_id not in self.pending_replications:
-            self.logger.warning(f"ACK recebido para transação desconhecida: {transaction_id}")
-            return False
-        
-        replication = self.pending_replications[transaction_id]
-        replication['received_acks'] += 1
+        success = message.data.get('success', False) if message.data else False
+        return self._count_ack(message.transaction_id, message.sender_id, success)
+    
+    def _count_ack(self, transaction_id: str, sender_id: int, success: bool) -> bool:
+        self.ack_tracker.ack(transaction_id, success)
+        with self._pending_lock:
+            replication = self.pending_replications.get(transaction_id)
+            if replication is None:
+                self.logger.warning(f"ACK recebido para transação desconhecida: {transaction_id}")
+                return False
+            
+            replication['received_acks'] += 1
+            received, expected = replication['received_acks'], replication['expected_acks']
+            
+            # Verifica se todas as replicações foram confirmadas
+            confirmed = received >= expected
+            if confirmed:
+                del self.pending_replications[transaction_id]
         
         status = "sucesso" if success else "falha"
-        self.logger.info(
-            f"ACK de replicação do nó {sender_id} ({status}) - "
-            f"{replication['received_acks']}/{replication['expected_acks']}"
-        )
-        
-        # Verifica se todas as replicações foram confirmadas
-        if replication['received_acks'] >= replication['expected_acks']:
+        self.logger.info(f"ACK de replicação do nó {sender_id} ({status}) - {received}/{expected}")
+        if confirmed:
             self.logger.info(f"Todas as replicações confirmadas para transação {transaction_id}")
-            del self.pending_replications[transaction_id]
-            return True
-        
-        return False
+        return confirmed
     
     def get_pending_replications_count(self) -> int:
         """Retorna número de replicações pendentes"""
@@ -175,16 +1216,15 @@ class Replicator:
             timeout_seconds: Timeout em segundos
         """
         current_time = datetime.now()
-        to_remove = []
         
-        for tid, replication in self.pending_replications.items():
-            elapsed = (current_time - replication['timestamp']).total_seconds()
-            if elapsed > timeout_seconds:
+        with self._pending_lock:
+            to_remove = [
+                tid for tid, replication in self.pending_replications.items()
+                if (current_time - replication['timestamp']).total_seconds() > timeout_seconds
+            ]
+            for tid in to_remove:
+                replication = self.pending_replications.pop(tid)
                 self.logger.warning(
                     f"Replicação {tid} expirou - "
                     f"recebidos {replication['received_acks']}/{replication['expected_acks']} ACKs"
                 )
-                to_remove.append(tid)
-        
-        for tid in to_remove:
-            del self.pending_replications[tid]
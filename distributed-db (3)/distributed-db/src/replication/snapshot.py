@@ -0,0 +1,420 @@
+import time
+import uuid
+import zlib
+import queue
+import base64
+import logging
+import threading
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
+from ..core.executor import BoundedExecutor, ExecutorOverloadedError
+from ..core.models import Message, MessageType, NodeInfo, CommunicationType
+from ..database.backend import StorageBackend
+from ..network.binary_format import BinaryFormatError, decode_value, encode_value
+
+
+class SnapshotError(RuntimeError):
+    """Snapshot interrompido (doador indisponível, trecho corrompido, erro ao gravar)"""
+
+
+class _Session:
+    """Leitura consistente aberta no doador para um nó que está carregando"""
+
+    def __init__(self, session_id: str, connections: List[Any], tables: Dict[str, Optional[List[str]]]):
+        self.session_id = session_id
+        self.connections: 'queue.Queue[Any]' = queue.Queue()
+        for conn in connections:
+            self.connections.put(conn)
+        self.all_connections = connections
+        self.tables = tables  # Tabela -> chave primária
+        self.last_used = time.monotonic()
+        self.chunks = 0
+        self.bytes_sent = 0
+
+
+class SnapshotDonor:
+    """
+    Lado doador do protocolo SNAPSHOT
+
+    Um 'begin' fixa um instante do banco em várias conexões (escritas
+    bloqueadas só enquanto elas abrem a leitura) e registra, nesse mesmo
+    instante, a posição de replicação: o último LSN do log deste nó e o
+    aplicado de cada origem. Cada 'chunk' devolve as próximas linhas de
+    uma tabela na ordem da chave primária, codificadas no formato binário,
+    comprimidas com zlib e com o CRC32 do payload. Tabelas diferentes são
+    lidas em paralelo (uma conexão do snapshot por vez cada) e a vazão
+    total é limitada para não roubar latência das queries do doador.
+    """
+
+    def __init__(self, node_id: int, db_manager: StorageBackend, positions_callback: Callable[[], Dict[str, int]],
+                 parallel: int = 4, max_mb_per_s: float = 0, compress_level: int = 1,
+                 session_timeout: float = 300, max_chunk_rows: int = 50000,
+                 quiesce_callback: Optional[Callable[[], ContextManager]] = None):
+        """
+        Args:
+            node_id: ID deste nó
+            db_manager: Banco local
+            positions_callback: Posição de replicação (origem -> LSN), chamada com as escritas bloqueadas
+            parallel: Conexões de leitura por snapshot (tabelas lidas ao mesmo tempo)
+            max_mb_per_s: Limite de envio em MB/s, somando os snapshots (0: sem limite)
+            compress_level: Nível do zlib (1: mais rápido)
+            session_timeout: Segundos sem pedidos até o snapshot ser descartado
+            max_chunk_rows: Maior trecho aceito por pedido
+            quiesce_callback: Context manager que espera as escritas já
+                commitadas gravarem a posição de replicação e segura as
+                próximas (o bloqueio do banco só segura os commits)
+        """
+        self.node_id = node_id
+        self.db_manager = db_manager
+        self.positions = positions_callback
+        self.parallel = max(1, parallel)
+        self.max_bytes_per_s = max_mb_per_s * 1024 * 1024
+        self.compress_level = compress_level
+        self.session_timeout = session_timeout
+        self.max_chunk_rows = max_chunk_rows
+        self.quiesce = quiesce_callback or nullcontext
+        self.logger = logging.getLogger(__name__)
+        self.executor = BoundedExecutor(max_workers=self.parallel, max_queue=64, name='snapshot')
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, _Session] = {}
+        self._next_send = 0.0  # Instante em que o próximo trecho pode sair (limite de vazão)
+
+        # Métricas
+        self._served = 0
+        self._chunks = 0
+        self._bytes_raw = 0
+        self._bytes_sent = 0
+        self._throttled = 0.0
+
+    def handle(self, message: Message) -> Any:
+        """
+        Responde a um pedido SNAPSHOT (op: begin, chunk ou end)
+
+        begin e chunk leem o banco e rodam nas threads do snapshot; a
+        resposta volta como Future.
+
+        Returns:
+            Mensagem SNAPSHOT de resposta, ou Future dela
+        """
+        data = message.data or {}
+        op = data.get('op')
+        if op == 'end':
+            self.end(data.get('session'))
+            return self._reply(message, {})
+        if op not in ('begin', 'chunk'):
+            return self._reply(message, {'error': f"Operação de snapshot desconhecida: {op}"})
+
+        self.expire_sessions()
+        work = self.begin if op == 'begin' else self.chunk
+        try:
+            future = self.executor.submit(work, data)
+        except (ExecutorOverloadedError, RuntimeError) as e:
+            return self._reply(message, {'error': f"Nó {self.node_id} sem capacidade para o snapshot: {e}"})
+
+        response = Future()
+
+        def done(result: Future):
+            try:
+                reply = result.result()
+            except Exception as e:
+                self.logger.error(f"Erro no snapshot ({op}): {e}")
+                reply = {'error': str(e)}
+            response.set_result(self._reply(message, reply))
+
+        future.add_done_callback(done)
+        return response
+
+    def _reply(self, request: Message, data: Dict[str, Any]) -> Message:
+        return Message(
+            message_type=MessageType.SNAPSHOT,
+            sender_id=self.node_id,
+            data=data,
+            timestamp=datetime.now(),
+            communication_type=CommunicationType.UNICAST,
+            target_nodes=[request.sender_id]
+        )
+
+    def begin(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Abre um snapshot
+
+        Returns:
+            ID da sessão, tabelas (nome, chave, CREATE TABLE) e a posição de replicação
+        """
+        tables = {table: self.db_manager.primary_key(table) for table in self.db_manager.list_tables()}
+        connections = min(self.parallel, max(1, int(data.get('parallel') or self.parallel)), max(1, len(tables)))
+        with self.quiesce():
+            opened, positions = self.db_manager.open_snapshot(connections, self.positions)
+        try:
+            described = [
+                {'name': table, 'key': list(key) if key else None,
+                 'ddl': self.db_manager.table_ddl(opened[0], table)}
+                for table, key in tables.items()
+            ]
+        except Exception:
+            self.db_manager.close_snapshot(opened)
+            raise
+
+        session = _Session(uuid.uuid4().hex, opened, {t['name']: t['key'] for t in described})
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._served += 1
+        self.logger.info(f"Snapshot {session.session_id} aberto: {len(described)} tabelas, "
+                         f"{connections} conexões, posição {positions}")
+        return {'session': session.session_id, 'tables': described, 'positions': positions}
+
+    def chunk(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Lê o próximo trecho de uma tabela
+
+        Args:
+            data: session, table, after (última chave recebida), offset
+                (linhas recebidas, tabelas sem chave) e limit
+
+        Returns:
+            payload (zlib do formato binário), crc, rows, last_key e done
+        """
+        with self._lock:
+            session = self._sessions.get(data.get('session'))
+        if session is None:
+            return {'error': f"Snapshot {data.get('session')} desconhecido ou expirado"}
+        table = data.get('table')
+        if table not in session.tables:
+            return {'error': f"Tabela {table} fora do snapshot"}
+        key = session.tables[table]
+        limit = max(1, min(int(data.get('limit') or 1000), self.max_chunk_rows))
+
+        session.last_used = time.monotonic()
+        conn = session.connections.get()
+        try:
+            columns, rows = self.db_manager.read_chunk(
+                conn, table, key, data.get('after'), int(data.get('offset') or 0), limit
+            )
+        finally:
+            session.connections.put(conn)
+
+        raw = encode_value({'columns': columns, 'rows': rows})
+        payload = zlib.compress(raw, self.compress_level)
+        last_key = None
+        if key and rows:
+            positions = [columns.index(column) for column in key]
+            last_key = [rows[-1][i] for i in positions]
+
+        self._throttle(len(payload))
+        session.last_used = time.monotonic()
+        with self._lock:
+            session.chunks += 1
+            session.bytes_sent += len(payload)
+            self._chunks += 1
+            self._bytes_raw += len(raw)
+            self._bytes_sent += len(payload)
+        return {
+            'payload': payload,
+            'crc': zlib.crc32(payload),
+            'rows': len(rows),
+            'last_key': last_key,
+            'done': len(rows) < limit
+        }
+
+    def _throttle(self, size: int):
+        """Espera a vez do trecho para a soma dos envios não passar de max_mb_per_s"""
+        if self.max_bytes_per_s <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next_send, now)
+            self._next_send = start + size / self.max_bytes_per_s
+            self._throttled += start - now
+        if start > now:
+            time.sleep(start - now)
+
+    def end(self, session_id: Optional[str]):
+        """Encerra o snapshot e fecha as suas conexões"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self.db_manager.close_snapshot(session.all_connections)
+            self.logger.info(f"Snapshot {session_id} encerrado: {session.chunks} trechos, "
+                             f"{session.bytes_sent / 1024 / 1024:.1f} MB")
+
+    def expire_sessions(self):
+        """Descarta snapshots abandonados (nó que caiu no meio da carga)"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [session_id for session_id, session in self._sessions.items()
+                       if now - session.last_used > self.session_timeout]
+        for session_id in expired:
+            self.logger.warning(f"Snapshot {session_id} expirou sem pedidos")
+            self.end(session_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna snapshots servidos, em andamento e o volume enviado"""
+        with self._lock:
+            return {
+                'served': self._served,
+                'open': len(self._sessions),
+                'chunks': self._chunks,
+                'mb_raw': self._bytes_raw / 1024 / 1024,
+                'mb_sent': self._bytes_sent / 1024 / 1024,
+                'throttled_s': self._throttled
+            }
+
+    def close(self):
+        """Encerra os snapshots abertos e as threads de leitura"""
+        with self._lock:
+            sessions = list(self._sessions)
+        for session_id in sessions:
+            self.end(session_id)
+        self.executor.shutdown(wait=False)
+
+
+class SnapshotLoader:
+    """
+    Lado que recebe o snapshot: copia as tabelas de um doador
+
+    Cria as tabelas que não existem aqui, apaga as linhas das demais e
+    busca os trechos de várias tabelas em paralelo (os de uma mesma tabela
+    em sequência, cada um a partir da última chave recebida). Um trecho
+    cujo CRC não confere é pedido de novo. Devolve a posição de
+    replicação do doador, a partir da qual a replicação incremental
+    continua.
+    """
+
+    def __init__(self, node_id: int, db_manager: StorageBackend, request_callback: Callable,
+                 parallel: int = 4, chunk_rows: int = 5000, timeout: float = 60, retries: int = 3):
+        """
+        Args:
+            node_id: ID deste nó
+            db_manager: Banco local
+            request_callback: Envia requisição RPC (mensagem, nó) -> Future
+            parallel: Tabelas copiadas ao mesmo tempo
+            chunk_rows: Linhas por trecho
+            timeout: Prazo de cada resposta do doador
+            retries: Tentativas por trecho
+        """
+        self.node_id = node_id
+        self.db_manager = db_manager
+        self.request = request_callback
+        self.parallel = max(1, parallel)
+        self.chunk_rows = chunk_rows
+        self.timeout = timeout
+        self.retries = max(1, retries)
+        self.logger = logging.getLogger(__name__)
+
+        # Métricas do último snapshot carregado
+        self.stats: Dict[str, Any] = {}
+
+    def load(self, donor: NodeInfo) -> Dict[int, int]:
+        """
+        Substitui os dados locais pelos do doador
+
+        Args:
+            donor: Nó que envia o snapshot
+
+        Returns:
+            Posição de replicação do snapshot (origem -> LSN)
+
+        Raises:
+            SnapshotError: Se a cópia não pôde ser concluída
+        """
+        started = time.monotonic()
+        begin = self._call(donor, {'op': 'begin', 'parallel': self.parallel})
+        session = begin['session']
+        tables = begin.get('tables') or []
+        self.logger.info(f"Snapshot do nó {donor.node_id}: {len(tables)} tabelas")
+        try:
+            self._prepare_tables(tables)
+            with ThreadPoolExecutor(max_workers=min(self.parallel, max(1, len(tables))),
+                                    thread_name_prefix='snapshot-load') as pool:
+                copied = list(pool.map(lambda table: self._copy_table(donor, session, table), tables))
+        finally:
+            try:
+                self._call(donor, {'op': 'end', 'session': session})
+            except SnapshotError as e:
+                self.logger.warning(f"Erro ao encerrar o snapshot no nó {donor.node_id}: {e}")
+
+        elapsed = time.monotonic() - started
+        rows = sum(count for count, _ in copied)
+        self.stats = {
+            'donor': donor.node_id,
+            'tables': len(tables),
+            'rows': rows,
+            'mb_received': sum(size for _, size in copied) / 1024 / 1024,
+            'seconds': elapsed
+        }
+        self.logger.info(f"Snapshot do nó {donor.node_id} carregado: {rows} linhas em {elapsed:.1f}s")
+        return {int(origin): lsn for origin, lsn in (begin.get('positions') or {}).items()}
+
+    def _prepare_tables(self, tables: List[Dict[str, Any]]):
+        existing = set(self.db_manager.list_tables())
+        for table in tables:
+            name = table['name']
+            if name not in existing:
+                if not table.get('ddl'):
+                    raise SnapshotError(f"Tabela {name} não existe aqui e o doador não enviou o CREATE TABLE")
+                success, _, error, _ = self.db_manager.execute_query(table['ddl'])
+                if not success:
+                    raise SnapshotError(f"Erro ao criar {name}: {error}")
+            elif not self.db_manager.clear_table(name):
+                raise SnapshotError(f"Erro ao limpar {name}")
+
+    def _copy_table(self, donor: NodeInfo, session: str, table: Dict[str, Any]) -> Tuple[int, int]:
+        name, key = table['name'], table.get('key')
+        after, offset, received = None, 0, 0
+        while True:
+            reply, columns, rows = self._fetch(donor, {
+                'op': 'chunk', 'session': session, 'table': name,
+                'after': after, 'offset': offset, 'limit': self.chunk_rows
+            })
+            if rows:
+                success, error = self.db_manager.load_rows(name, columns, key, rows)
+                if not success:
+                    raise SnapshotError(error)
+            offset += len(rows)
+            received += len(reply['payload'])
+            after = reply.get('last_key')
+            if reply.get('done'):
+                self.logger.info(f"Snapshot: {name} copiada ({offset} linhas)")
+                return offset, received
+
+    def _fetch(self, donor: NodeInfo, request: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str], List[List[Any]]]:
+        """Pede um trecho, conferindo o CRC e repetindo o pedido se não bater"""
+        error = None
+        for _ in range(self.retries):
+            reply = self._call(donor, request)
+            payload = reply.get('payload') or b''
+            if isinstance(payload, str):
+                payload = base64.b64decode(payload)  # Conexão negociada em JSON
+            if zlib.crc32(payload) != reply.get('crc'):
+                error = f"CRC do trecho de {request['table']} não confere"
+                self.logger.warning(f"{error} - pedindo de novo")
+                continue
+            try:
+                chunk = decode_value(zlib.decompress(payload))
+            except (zlib.error, BinaryFormatError) as e:
+                error = f"Trecho de {request['table']} ilegível: {e}"
+                self.logger.warning(f"{error} - pedindo de novo")
+                continue
+            reply['payload'] = payload
+            return reply, chunk['columns'], chunk['rows']
+        raise SnapshotError(error)
+
+    def _call(self, donor: NodeInfo, data: Dict[str, Any]) -> Dict[str, Any]:
+        message = Message(
+            message_type=MessageType.SNAPSHOT,
+            sender_id=self.node_id,
+            data=data,
+            timestamp=datetime.now(),
+            communication_type=CommunicationType.UNICAST,
+            target_nodes=[donor.node_id]
+        )
+        try:
+            response = self.request(message, donor).result(self.timeout)
+        except Exception as e:
+            raise SnapshotError(f"Nó {donor.node_id} não respondeu ao snapshot ({data['op']}): {e}")
+        reply = (response.data if response else None) or {}
+        if reply.get('error'):
+            raise SnapshotError(reply['error'])
+        return reply
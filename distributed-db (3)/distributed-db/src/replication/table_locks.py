@@ -0,0 +1,61 @@
+import threading
+from contextlib import contextmanager
+from typing import FrozenSet, Iterable, Iterator, Optional
+
+
+class TableLocks:
+    """
+    Exclusão mútua por tabela entre escritas e o registro da sua posição
+
+    Uma escrita segura as tabelas que altera do commit até gravar a sua
+    posição de replicação (o LSN no log, na origem; o LSN aplicado, no
+    seguidor). Assim duas escritas na mesma tabela recebem LSNs na ordem
+    dos commits, e quem segura todas as tabelas (None) vê os dados e as
+    posições de um mesmo instante.
+
+    As tabelas são adquiridas de uma vez, nunca uma a uma, então não há
+    deadlock entre escritas. Quem pede todas as tabelas espera as escritas
+    em andamento e passa na frente das que chegarem depois.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._held = set()  # Tabelas seguradas por escritas em andamento
+        self._active = 0  # Escritas em andamento
+        self._exclusive = False  # Alguém segura todas as tabelas
+        self._exclusive_waiting = 0
+
+    @contextmanager
+    def hold(self, tables: Optional[Iterable[str]]) -> Iterator[None]:
+        """
+        Segura as tabelas durante o bloco
+
+        Args:
+            tables: Tabelas alteradas, ou None para todas (DDL, query não
+                reconhecida, snapshot)
+        """
+        wanted: Optional[FrozenSet[str]] = frozenset(tables) if tables else None
+        with self._cond:
+            if wanted is None:
+                self._exclusive_waiting += 1
+                try:
+                    while self._exclusive or self._active:
+                        self._cond.wait()
+                finally:
+                    self._exclusive_waiting -= 1
+                self._exclusive = True
+            else:
+                while self._exclusive or self._exclusive_waiting or not self._held.isdisjoint(wanted):
+                    self._cond.wait()
+                self._held |= wanted
+                self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                if wanted is None:
+                    self._exclusive = False
+                else:
+                    self._held -= wanted
+                    self._active -= 1
+                self._cond.notify_all()
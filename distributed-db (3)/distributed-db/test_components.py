@@ -3,10 +3,45 @@
 Script de testes para validar componentes do DDB
 """
 
+import os
 import sys
 import json
-from src.core.models import Message, MessageType, NodeInfo, NodeStatus, CommunicationType
+import time
+import socket
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import as_completed
+from src.core.models import (
+    ConsistencyLevel, Message, MessageType, NodeInfo, NodeStatus, CommunicationType, DeliveryStatus
+)
 from src.core.checksum import ChecksumValidator
+from src.core.models import QueryResult
+from src.core.result_set import ResultSet
+from src.database.connection_pool import DatabasePool, PoolTimeoutError
+from src.database.statement_cache import StatementCache
+from src.database.query_cache import QueryCache
+from src.database.sqlite_manager import SQLiteManager
+from src.core.sql_analysis import analyze, row_target
+from src.core.executor import BoundedExecutor, ExecutorOverloadedError
+from src.network.socket_server import SocketServer
+from src.network.socket_client import SocketClient
+from src.network.async_socket_server import AsyncSocketServer
+from src.network.framing import Frame, FrameReader, encode_frame, encode_line, parse_frame
+from src.network.codec import ChecksumError, MessageCodec, ENCODING_BINARY
+from src.network import binary_format
+from src.network.rpc import RpcClient
+from src.replication.replication_log import AppliedState, DedupWindow, LogTruncatedError, ReplicationLog
+from src.replication.replicator import Replicator
+from src.replication.batcher import ReplicationBatcher
+from src.replication.apply_scheduler import ApplyScheduler
+from src.replication.table_locks import TableLocks
+from src.replication.ack_tracker import AckTracker
+from src.replication.snapshot import SnapshotDonor, SnapshotLoader
+from src.replication.anti_entropy import AntiEntropy, MerkleTree
+from concurrent.futures import Future
+from client_app import DDBClient
+from decimal import Decimal
 from datetime import datetime
 
 
@@ -110,6 +145,1383 @@ def test_node_info():
     print("✓ Teste de NodeInfo passou!")
 
 
+def test_connection_pool_reuse():
+    """Testa reaproveitamento de conexões persistentes do SocketClient"""
+    print("\n=== Testando Pool de Conexões ===")
+    
+    received = []
+    done = threading.Event()
+    
+    def handler(message):
+        received.append(message)
+        if len(received) == 5:
+            done.set()
+        return None
+    
+    server = SocketServer('127.0.0.1', 0, handler)
+    server.start()
+    client = SocketClient()
+    
+    try:
+        node = NodeInfo(node_id=2, host='127.0.0.1', port=server.port)
+        for _ in range(5):
+            message = Message(message_type=MessageType.REPLICATE, sender_id=1, timestamp=datetime.now())
+            assert client.send_message(message, node), "Envio deveria ter sucesso"
+        
+        assert done.wait(5), "Servidor deveria receber as 5 mensagens"
+        print(f"✓ {len(received)} mensagens recebidas")
+        
+        assert len(server.connections) == 1, "Mensagens deveriam compartilhar uma única conexão"
+        print(f"✓ Conexões abertas no servidor: {len(server.connections)}")
+        
+        stats = client.pool.get_stats()[2]
+        assert stats['idle'] == 1 and stats['in_use'] == 0
+        print(f"✓ Estado do pool: {stats}")
+    finally:
+        client.close()
+        server.stop()
+    
+    print("✓ Teste de pool de conexões passou!")
+
+
+def test_connection_pool_backoff():
+    """Testa backoff de reconexão para nó indisponível"""
+    print("\n=== Testando Backoff de Reconexão ===")
+    
+    client = SocketClient(timeout=1)
+    try:
+        # Porta reservada e fechada: conexão recusada
+        node = NodeInfo(node_id=7, host='127.0.0.1', port=1)
+        message = Message(message_type=MessageType.REPLICATE, sender_id=1)
+        
+        assert not client.send_message(message, node)
+        assert client.pool.get_stats()[7]['failures'] == 1
+        print("✓ Primeira falha registrada")
+        
+        # Segunda tentativa imediata cai no backoff sem abrir socket
+        start = time.monotonic()
+        assert not client.send_message(message, node)
+        assert client.pool.get_stats()[7]['failures'] == 1
+        print(f"✓ Falha rápida durante backoff ({(time.monotonic() - start) * 1000:.1f}ms)")
+    finally:
+        client.close()
+    
+    print("✓ Teste de backoff passou!")
+
+
+def test_parallel_fanout():
+    """Testa fan-out paralelo com resultado por nó"""
+    print("\n=== Testando Fan-out Paralelo ===")
+    
+    servers = [SocketServer('127.0.0.1', 0, lambda message: None) for _ in range(2)]
+    for server in servers:
+        server.start()
+    client = SocketClient(timeout=2)
+    
+    try:
+        nodes = [
+            NodeInfo(node_id=1, host='127.0.0.1', port=0),
+            NodeInfo(node_id=2, host='127.0.0.1', port=servers[0].port),
+            NodeInfo(node_id=3, host='127.0.0.1', port=servers[1].port),
+            NodeInfo(node_id=4, host='127.0.0.1', port=1),  # Nó fora do ar
+        ]
+        message = Message(
+            message_type=MessageType.HEARTBEAT,
+            sender_id=1,
+            communication_type=CommunicationType.BROADCAST
+        )
+        
+        outcomes = client.send_by_type_detailed(message, nodes, sender_id=1)
+        print(f"✓ Resultados: { {nid: status.value for nid, status in outcomes.items()} }")
+        
+        assert 1 not in outcomes, "Remetente não deve receber o próprio broadcast"
+        assert outcomes[2] == DeliveryStatus.DELIVERED
+        assert outcomes[3] == DeliveryStatus.DELIVERED
+        assert outcomes[4] == DeliveryStatus.REFUSED
+        assert client.send_by_type(message, nodes, sender_id=1) == 2
+    finally:
+        client.close()
+        for server in servers:
+            server.stop()
+    
+    print("✓ Teste de fan-out paralelo passou!")
+
+
+def test_async_socket_server():
+    """Testa servidor asyncio com o mesmo contrato de handler"""
+    print("\n=== Testando AsyncSocketServer ===")
+    
+    def handler(message):
+        return Message(
+            message_type=MessageType.QUERY_RESPONSE,
+            sender_id=1,
+            transaction_id=message.transaction_id,
+            data={'echo': message.query}
+        )
+    
+    server = AsyncSocketServer('127.0.0.1', 0, handler, max_workers=2)
+    server.start()
+    
+    try:
+        request = Message(message_type=MessageType.QUERY, sender_id=9999, transaction_id="t-1", query="SELECT 'ç'")
+        request_dict = ChecksumValidator.add_checksum(json.loads(request.to_json()))
+        
+        with socket.create_connection(('127.0.0.1', server.port), timeout=5) as sock:
+            sock.sendall((json.dumps(request_dict) + '\n').encode('utf-8'))
+            buffer = b''
+            while b'\n' not in buffer:
+                buffer += sock.recv(4096)
+        
+        response_dict = json.loads(buffer.split(b'\n')[0].decode('utf-8'))
+        assert ChecksumValidator.verify_message(response_dict)
+        response = Message.from_json(json.dumps(response_dict))
+        print(f"✓ Resposta recebida: {response.data}")
+        
+        assert response.transaction_id == "t-1"
+        assert response.data == {'echo': "SELECT 'ç'"}
+    finally:
+        server.stop()
+    
+    print("✓ Teste de AsyncSocketServer passou!")
+
+
+def test_frame_reader():
+    """Testa leitura de frames binários e linhas legadas no mesmo fluxo"""
+    print("\n=== Testando Framing ===")
+    
+    left, right = socket.socketpair()
+    try:
+        body = json.dumps({"query": "SELECT 'ação'", "pad": "x" * 200000}).encode('utf-8')
+        stream = (
+            encode_line(b'{"legacy": "\xc3\xa7"}')
+            + encode_frame(body, MessageType.QUERY_RESPONSE)
+            + encode_frame(b'', MessageType.HEARTBEAT)
+        )
+        
+        # Envia em pedaços de 7 bytes para cortar caracteres multibyte e cabeçalhos
+        def writer():
+            for i in range(0, len(stream), 7):
+                left.sendall(stream[i:i + 7])
+            left.close()
+        
+        thread = threading.Thread(target=writer)
+        thread.start()
+        
+        reader = FrameReader(right, initial_size=16)
+        line = reader.read_frame()
+        assert not line.framed and json.loads(line.body.decode('utf-8')) == {"legacy": "ç"}
+        print("✓ Linha legada lida com caractere multibyte dividido")
+        
+        frame = reader.read_frame()
+        assert frame.framed and frame.body == body
+        print(f"✓ Frame de {len(frame.body)} bytes lido")
+        
+        empty = reader.read_frame()
+        assert empty.framed and empty.body == b''
+        
+        assert reader.read_frame() is None, "EOF deveria retornar None"
+        thread.join()
+    finally:
+        right.close()
+    
+    print("✓ Teste de framing passou!")
+
+
+def test_message_codec():
+    """Testa codec de passada única com CRC32 sobre os bytes do frame"""
+    print("\n=== Testando MessageCodec ===")
+    
+    message = Message(
+        message_type=MessageType.REPLICATE,
+        sender_id=2,
+        transaction_id="tx-9",
+        query="UPDATE users SET name='José' WHERE id=1",
+        timestamp=datetime.now(),
+        communication_type=CommunicationType.BROADCAST
+    )
+    
+    left, right = socket.socketpair()
+    try:
+        left.sendall(MessageCodec.encode(message) + MessageCodec.encode(message, framed=False))
+        reader = FrameReader(right)
+        
+        decoded = MessageCodec.decode(reader.read_frame())
+        assert decoded.query == message.query and decoded.timestamp == message.timestamp
+        print("✓ Frame com CRC32 decodificado")
+        
+        legacy = MessageCodec.decode(reader.read_frame())
+        assert legacy.query == message.query
+        print("✓ Linha legada com MD5 decodificada")
+    finally:
+        left.close()
+        right.close()
+    
+    # Corrompe um byte do corpo: CRC32 deve rejeitar
+    wire = bytearray(MessageCodec.encode(message))
+    wire[-5] ^= 0x01
+    try:
+        MessageCodec.decode(parse_frame(wire))
+        assert False, "Frame corrompido deveria ser rejeitado"
+    except ChecksumError:
+        print("✓ Frame corrompido rejeitado")
+    
+    print("✓ Teste de codec passou!")
+
+
+def test_binary_encoding():
+    """Testa codificação binária compacta e negociação por conexão"""
+    print("\n=== Testando Codificação Binária ===")
+    
+    message = Message(
+        message_type=MessageType.QUERY_RESPONSE,
+        sender_id=3,
+        transaction_id="6f1c2a3e-1b2c-4d5e-8f90-a1b2c3d4e5f6",
+        data={
+            'success': True,
+            'rows': [[1, 'Ana', datetime(2024, 5, 1, 12, 30, 0, 123456), Decimal('10.50'), None, -7, 2.5]],
+        },
+        timestamp=datetime.now(),
+        communication_type=CommunicationType.UNICAST,
+        target_nodes=[9999]
+    )
+    
+    body = binary_format.encode_message(message)
+    decoded = binary_format.decode_message(body)
+    assert decoded == message, "Mensagem deveria sobreviver ao round-trip"
+    heartbeat = Message(message_type=MessageType.HEARTBEAT, sender_id=1, timestamp=message.timestamp)
+    json_size = len(MessageCodec.encode(heartbeat))
+    binary_size = len(MessageCodec.encode(heartbeat, encoding=ENCODING_BINARY))
+    print(f"✓ Round-trip binário ok; HEARTBEAT {json_size} -> {binary_size} bytes")
+    assert binary_size < json_size
+    
+    received = []
+    server = SocketServer('127.0.0.1', 0, lambda m: received.append(m))
+    server.start()
+    client = SocketClient(encoding=ENCODING_BINARY)
+    try:
+        node = NodeInfo(node_id=2, host='127.0.0.1', port=server.port)
+        assert client.send_message(message, node)
+        deadline = time.monotonic() + 5
+        while not received and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert received and received[0].data == message.data
+        
+        conn = client.pool.acquire(node)
+        assert conn.encoding == ENCODING_BINARY, "Conexão deveria ter negociado binário"
+        client.pool.release(conn)
+        print("✓ Codificação binária negociada com o servidor")
+    finally:
+        client.close()
+        server.stop()
+    
+    print("✓ Teste de codificação binária passou!")
+
+
+def test_result_set():
+    """Testa resultado tabular em QUERY_RESPONSE"""
+    print("\n=== Testando ResultSet Tabular ===")
+    
+    created = datetime(2024, 5, 1, 12, 30, 15)
+    data = ResultSet.from_rows(
+        ['id', 'name', 'balance', 'created_at'],
+        [(1, 'Ana', Decimal('10.50'), created), (2, 'Bruno', None, created)]
+    )
+    assert data.types == ['int', 'str', 'decimal', 'datetime']
+    
+    result = QueryResult(success=True, data=data, node_id=1, rows_affected=2)
+    message = Message(
+        message_type=MessageType.QUERY_RESPONSE,
+        sender_id=1,
+        data=result.to_dict(),
+        timestamp=datetime.now()
+    )
+    
+    for framed, encoding in ((False, 'json'), (True, 'json'), (True, ENCODING_BINARY)):
+        wire = MessageCodec.encode(message, framed, encoding)
+        frame = parse_frame(wire) if framed else Frame(False, 0, 0, wire.rstrip(b'\n'))
+        received = QueryResult.from_dict(MessageCodec.decode(frame).data)
+        rows = received.data
+        assert isinstance(rows, ResultSet) and len(rows) == 2
+        assert rows[0]['name'] == 'Ana' and rows[0][0] == 1
+        assert rows[0]['balance'] == Decimal('10.50')
+        assert rows[1]['created_at'] == created, f"Datetime não preservado em {encoding}"
+        assert dict(rows[1]) == {'id': 2, 'name': 'Bruno', 'balance': None, 'created_at': created}
+        print(f"✓ Linhas indexáveis por nome ({'frame' if framed else 'linha'}/{encoding})")
+    
+    print("✓ Teste de ResultSet passou!")
+
+
+def test_streaming_result():
+    """Testa SELECT em streaming com RESULT_CHUNK"""
+    print("\n=== Testando Streaming de Resultados ===")
+    
+    closed = threading.Event()
+    
+    def handler(message):
+        def chunks():
+            try:
+                fetch_size = message.data['fetch_size']
+                for seq in range(5):
+                    rows = [(seq * fetch_size + i, f'user{i}') for i in range(fetch_size)]
+                    result = QueryResult(success=True, data=ResultSet(['id', 'name'], ['int', 'str'], rows))
+                    yield Message(MessageType.RESULT_CHUNK, 1, data=dict(result.to_dict(), seq=seq, last=False))
+                yield Message(MessageType.RESULT_CHUNK, 1, data=dict(QueryResult(success=True).to_dict(), last=True))
+            finally:
+                closed.set()
+        return chunks()
+    
+    for server_class in (SocketServer, AsyncSocketServer):
+        server = server_class('127.0.0.1', 0, handler)
+        server.start()
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as config:
+            json.dump({'nodes': [{'node_id': 1, 'network': {'host': '127.0.0.1', 'port': server.port}}]}, config)
+        try:
+            client = DDBClient(config.name, ENCODING_BINARY)
+            rows = list(client.stream_query("SELECT id, name FROM users", fetch_size=100))
+            assert len(rows) == 500, f"Esperado 500 linhas, recebido {len(rows)}"
+            assert rows[499]['id'] == 499 and rows[0]['name'] == 'user0'
+            print(f"✓ {server_class.__name__}: 500 linhas recebidas em 5 lotes")
+            
+            # Abandonar o iterador fecha a conexão e o gerador no servidor
+            closed.clear()
+            stream = client.stream_query("SELECT id, name FROM users", fetch_size=100)
+            next(stream)
+            stream.close()
+            assert closed.wait(2), "Gerador do servidor deveria ser fechado"
+            print(f"✓ {server_class.__name__}: streaming abandonado libera o servidor")
+        finally:
+            server.stop()
+            os.unlink(config.name)
+    
+    print("✓ Teste de streaming passou!")
+
+
+def test_rpc_multiplexing():
+    """Testa várias requisições em andamento sobre uma única conexão"""
+    print("\n=== Testando RPC Multiplexado ===")
+    
+    def handler(message):
+        # Requisições mais antigas demoram mais: respostas chegam fora de ordem
+        index = int(message.query)
+        time.sleep(0.002 * (20 - index % 20))
+        return Message(MessageType.QUERY_RESPONSE, 1, query=message.query, data={'index': index})
+    
+    for server_class in (SocketServer, AsyncSocketServer):
+        server = server_class('127.0.0.1', 0, handler)
+        server.start()
+        client = RpcClient(encoding=ENCODING_BINARY)
+        node = NodeInfo(node_id=1, host='127.0.0.1', port=server.port)
+        try:
+            start = time.time()
+            futures = [client.call(Message(MessageType.QUERY, 9999, query=str(i)), node) for i in range(200)]
+            order = []
+            for future in as_completed(futures, timeout=10):
+                order.append(future.result().data['index'])
+            elapsed = time.time() - start
+            
+            assert sorted(order) == list(range(200)), "Todas as respostas devem chegar"
+            assert order != sorted(order), "Respostas deveriam chegar fora de ordem"
+            for i, future in enumerate(futures):
+                assert future.result().query == str(i), "Resposta associada à requisição errada"
+            assert len(client._connections) == 1
+            print(f"✓ {server_class.__name__}: 200 requisições em 1 conexão ({elapsed:.2f}s)")
+        finally:
+            client.close()
+            server.stop()
+    
+    print("✓ Teste de RPC multiplexado passou!")
+
+
+def test_bulk_write():
+    """Testa escrita em lote dividida em BULK_WRITE"""
+    print("\n=== Testando Escrita em Lote ===")
+    
+    received = []
+    
+    def handler(message):
+        assert message.message_type == MessageType.BULK_WRITE
+        rows = message.data['rows']
+        received.append(rows)
+        failed = any(row[0] == 'falha' for row in rows)
+        result = QueryResult(success=not failed, error="linha inválida" if failed else None,
+                             node_id=1, rows_affected=0 if failed else len(rows))
+        return Message(MessageType.QUERY_RESPONSE, 1, data=result.to_dict())
+    
+    server = SocketServer('127.0.0.1', 0, handler)
+    server.start()
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as config:
+        json.dump({'nodes': [{'node_id': 1, 'network': {'host': '127.0.0.1', 'port': server.port}}]}, config)
+    try:
+        client = DDBClient(config.name, ENCODING_BINARY)
+        query = "INSERT INTO users (name, email) VALUES (%s, %s)"
+        rows = [(f'user{i}', f'user{i}@ddb.com') for i in range(2500)]
+        
+        summary = client.bulk_write(query, rows=rows, batch_size=1000)
+        assert summary == {'success': True, 'batches': 3, 'rows_affected': 2500, 'errors': []}, summary
+        assert sorted(len(batch) for batch in received) == [500, 1000, 1000]
+        assert sorted(map(tuple, sum(received, []))) == sorted(rows), "Todas as linhas devem chegar"
+        print(f"✓ 2500 linhas enviadas em {summary['batches']} mensagens BULK_WRITE")
+        
+        summary = client.bulk_write(query, rows=rows[:10] + [('falha', '')], batch_size=5)
+        assert not summary['success'] and summary['rows_affected'] == 10
+        assert summary['errors'] == ["linha inválida"], summary
+        print("✓ Lote com erro reportado sem afetar os demais")
+        client.close()
+    finally:
+        server.stop()
+        os.unlink(config.name)
+    
+    print("✓ Teste de escrita em lote passou!")
+
+
+def test_db_executor():
+    """Testa o executor do banco: fila limitada, ordem por chave e respostas adiadas"""
+    print("\n=== Testando Executor do Banco ===")
+    
+    executor = BoundedExecutor(max_workers=2, max_queue=2, name='teste')
+    release = threading.Event()
+    running = [executor.submit(release.wait) for _ in range(2)]
+    time.sleep(0.05)
+    queued = [executor.submit(time.sleep, 0) for _ in range(2)]
+    try:
+        executor.submit(time.sleep, 0)
+        assert False, "Fila cheia deveria recusar"
+    except ExecutorOverloadedError:
+        pass
+    required = executor.submit(time.sleep, 0, required=True)
+    release.set()
+    for future in running + queued + [required]:
+        future.result(timeout=2)
+    stats = executor.get_stats()
+    assert stats['rejected'] == 1 and stats['completed'] == 5 and stats['workers'] == 2, stats
+    executor.shutdown()
+    print("✓ Fila cheia recusa na hora; tarefas obrigatórias passam")
+    
+    executor = BoundedExecutor(max_workers=3, name='teste')
+    order = []
+    futures = [executor.submit(lambda i=i: (time.sleep(0.01 * (3 - i)), order.append(i)), key='tx')
+               for i in range(3)]
+    for future in futures:
+        future.result(timeout=2)
+    assert order == [0, 1, 2], order
+    executor.shutdown()
+    print("✓ Tarefas da mesma chave executam em ordem")
+    
+    # Handler que devolve Future: a conexão segue lendo e responde em ordem
+    db = BoundedExecutor(max_workers=4, name='db')
+    
+    def handler(message):
+        if message.message_type == MessageType.HEARTBEAT:
+            return Message(MessageType.ACK, 1, query=message.query)
+        delay = 0.05 * (3 - int(message.query))
+        return db.submit(lambda: (time.sleep(delay), Message(MessageType.QUERY_RESPONSE, 1, query=message.query))[1])
+    
+    for server_class in (SocketServer, AsyncSocketServer):
+        server = server_class('127.0.0.1', 0, handler)
+        server.start()
+        sock = socket.create_connection(('127.0.0.1', server.port))
+        try:
+            requests = [Message(MessageType.QUERY, 9999, query=str(i)) for i in range(3)]
+            requests.append(Message(MessageType.HEARTBEAT, 9999, query='hb'))
+            for request in requests:
+                sock.sendall(MessageCodec.encode(request, True, ENCODING_BINARY))
+            reader = FrameReader(sock)
+            answers = [MessageCodec.decode(reader.read_frame()).query for _ in requests]
+            assert answers == ['0', '1', '2', 'hb'], answers
+            
+            client = RpcClient(encoding=ENCODING_BINARY)
+            node = NodeInfo(node_id=1, host='127.0.0.1', port=server.port)
+            futures = [client.call(Message(MessageType.QUERY, 9999, query=str(i)), node) for i in range(3)]
+            assert [f.result(timeout=2).query for f in futures] == ['0', '1', '2']
+            client.close()
+            print(f"✓ {server_class.__name__}: respostas adiadas entregues na ordem dos pedidos")
+        finally:
+            sock.close()
+            server.stop()
+    db.shutdown()
+    print("✓ Teste de executor do banco passou!")
+
+
+def test_control_lane():
+    """Testa a faixa do plano de controle com o plano de dados saturado"""
+    print("\n=== Testando Faixa de Controle ===")
+    
+    release = threading.Event()
+    heartbeats = []
+    
+    def handler(message):
+        if message.message_type == MessageType.HEARTBEAT:
+            heartbeats.append(message.sender_id)
+            return None
+        release.wait(5)  # Handler de dados preso (banco saturado)
+        return None
+    
+    for server_class in (SocketServer, AsyncSocketServer):
+        heartbeats.clear()
+        release.clear()
+        server = (server_class('127.0.0.1', 0, handler, max_workers=2) if server_class is AsyncSocketServer
+                  else server_class('127.0.0.1', 0, handler))
+        server.start()
+        client = SocketClient(timeout=1, max_connections_per_peer=2)
+        node = NodeInfo(node_id=1, host='127.0.0.1', port=server.port)
+        try:
+            # Ocupa todas as conexões de dados e todas as threads de handler
+            for _ in range(2):
+                assert client.send_message(Message(MessageType.QUERY, 2, query='SELECT SLEEP(5)'), node)
+            busy = [client.pool.acquire(node, 1) for _ in range(2)]
+            
+            start = time.time()
+            assert client.send_message(Message(MessageType.HEARTBEAT, 2), node)
+            while not heartbeats and time.time() - start < 2:
+                time.sleep(0.01)
+            elapsed = time.time() - start
+            assert heartbeats == [2], "Heartbeat deveria chegar com o plano de dados ocupado"
+            assert elapsed < 0.5, f"Heartbeat demorou {elapsed:.2f}s"
+            print(f"✓ {server_class.__name__}: heartbeat entregue em {elapsed * 1000:.1f}ms com dados saturados")
+            for conn in busy:
+                client.pool.release(conn)
+        finally:
+            release.set()
+            client.close()
+            server.stop()
+    print("✓ Teste de faixa de controle passou!")
+
+
+def test_database_pool():
+    """Testa pool de conexões com o banco"""
+    print("\n=== Testando Pool de Conexões do Banco ===")
+    
+    validations = []
+    
+    def validate(conn):
+        validations.append(conn)
+        return True
+    
+    pool = DatabasePool(
+        connect=lambda: sqlite3.connect(':memory:', check_same_thread=False),
+        validate=validate,
+        min_size=1,
+        max_size=2,
+        checkout_timeout=0.2,
+        validation_interval=0.1,
+        max_lifetime=60
+    )
+    pool.open()
+    assert pool.get_stats()['size'] == 1
+    
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second and not validations, "Conexões recentes não devem ser validadas"
+    print("✓ Conexões criadas sob demanda até max_size")
+    
+    try:
+        pool.acquire()
+        assert False, "Checkout deveria expirar com o pool esgotado"
+    except PoolTimeoutError:
+        print("✓ Checkout expira com o pool esgotado")
+    
+    # Um waiter é liberado quando uma conexão volta ao pool
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(pool.acquire(timeout=2)))
+    waiter.start()
+    time.sleep(0.05)
+    assert pool.get_stats()['waiters'] == 1
+    pool.release(first)
+    waiter.join(2)
+    assert acquired == [first], "Waiter deveria receber a conexão devolvida"
+    print("✓ Conexão devolvida entregue a quem esperava")
+    
+    pool.release(acquired[0])
+    time.sleep(0.15)
+    reused = pool.acquire()
+    assert reused is first and validations == [first], "Conexão ociosa deve ser validada antes do reuso"
+    print("✓ Validação apenas após o intervalo de ociosidade")
+    
+    pool.max_lifetime = 0
+    pool.release(reused)
+    pool.release(second, discard=True)
+    stats = pool.get_stats()
+    assert stats['size'] == 0 and stats['discarded'] == 2, f"Conexões deveriam ser recicladas: {stats}"
+    assert stats['timeouts'] == 1 and stats['max_waiters'] == 1
+    print(f"✓ Reciclagem por idade e métricas: {stats['checkouts']} checkouts, "
+          f"máx. espera {stats['max_checkout_ms']:.0f}ms")
+    
+    pool.close()
+    print("✓ Teste de pool do banco passou!")
+
+
+def test_statement_cache():
+    """Testa cache LRU de prepared statements"""
+    print("\n=== Testando Cache de Prepared Statements ===")
+    
+    prepared = []
+    closed = []
+    
+    def prepare(sql):
+        prepared.append(sql)
+        return f"stmt:{sql}"
+    
+    cache = StatementCache(prepare=prepare, close=closed.append, capacity=2)
+    
+    select = "SELECT * FROM users WHERE id = %s"
+    update = "UPDATE users SET name = %s WHERE id = %s"
+    delete = "DELETE FROM users WHERE id = %s"
+    
+    assert cache.get(select) == f"stmt:{select}"
+    for _ in range(3):
+        cache.get(select)
+    assert prepared == [select], "Statement repetido não deve ser preparado de novo"
+    print("✓ Statement preparado uma vez e reaproveitado")
+    
+    cache.get(update)
+    cache.get(select)   # select passa a ser o mais recente
+    cache.get(delete)   # excede a capacidade: sai o update
+    assert closed == [f"stmt:{update}"] and len(cache) == 2, f"LRU incorreto: {closed}"
+    print("✓ Statement menos usado é fechado ao exceder a capacidade")
+    
+    cache.discard(select)
+    cache.get(select)
+    assert prepared.count(select) == 2, "Statement descartado deve ser preparado de novo"
+    
+    stats = cache.stats.to_dict()
+    assert stats == {'hits': 4, 'misses': 4, 'evictions': 1, 'hit_rate': 0.5}, stats
+    print(f"✓ Contadores: {stats['hits']} hits, {stats['misses']} misses, hit rate {stats['hit_rate']:.0%}")
+    
+    cache.clear()
+    assert len(cache) == 0
+    print("✓ Teste de cache de statements passou!")
+
+
+def test_sql_analysis():
+    """Testa classificação e fingerprint de queries"""
+    print("\n=== Testando Análise de SQL ===")
+    
+    cases = [
+        ("SELECT * FROM users", 'SELECT', False, True),
+        ("  -- relatório\n select id from users", 'SELECT', False, True),
+        ("(SELECT id FROM users) UNION (SELECT id FROM admins)", 'SELECT', False, True),
+        ("WITH recentes AS (SELECT * FROM users) SELECT * FROM recentes", 'SELECT', False, True),
+        ("WITH b AS (SELECT id FROM bans) DELETE FROM users WHERE id IN (SELECT id FROM b)", 'DELETE', True, False),
+        ("SHOW TABLES", 'SHOW', False, True),
+        ("/* carga */ INSERT INTO users (name) VALUES ('SELECT')", 'INSERT', True, False),
+        ("DROP TABLE IF EXISTS logs", 'DROP', True, False),
+        ("CALL arquivar_pedidos(30)", 'CALL', True, False),
+    ]
+    for query, kind, is_write, returns_rows in cases:
+        info = analyze(query)
+        assert (info.kind, info.is_write, info.returns_rows) == (kind, is_write, returns_rows), (query, info)
+    print(f"✓ {len(cases)} queries classificadas (comentários, CTEs, parênteses)")
+    
+    assert analyze("SELECT * FROM users u JOIN orders o ON o.user_id = u.id").tables == {'users', 'orders'}
+    assert analyze("select * from `ddb`.`Users` a, logs b where a.id = b.id").tables == {'users', 'logs'}
+    assert analyze("INSERT INTO users (name) VALUES ('FROM x')").tables == {'users'}
+    assert analyze("WITH r AS (SELECT * FROM users) SELECT * FROM r").tables == {'users'}
+    print("✓ Tabelas extraídas da query")
+    
+    first = analyze("SELECT * FROM users WHERE id IN (1, 2, 3) AND name = 'ana'")
+    second = analyze("select *  from users where id in (7, 8) and name = 'bia'")
+    assert first.fingerprint == second.fingerprint == "select * from users where id in (?+) and name = ?"
+    assert analyze("INSERT INTO logs (a, b) VALUES (1, 'x'), (2, 'y')").fingerprint == "insert into logs (a, b) values (?+)"
+    assert analyze("SELECT get_lock('a', 1)").fingerprint == "select get_lock(?, ?)"
+    assert analyze("CALL limpar((SELECT id FROM users))").tables == frozenset()  # Barreira
+    print(f"✓ Fingerprint: {first.fingerprint}")
+    
+    assert not analyze("UPDATE users SET seen = NOW() WHERE id = 1").deterministic
+    assert not analyze("SELECT @@hostname").deterministic
+    assert analyze("SELECT user, created_at FROM accounts").deterministic
+    print("✓ Funções não determinísticas detectadas")
+    
+    assert analyze("SELECT * FROM users") is analyze("SELECT * FROM users")
+    print("✓ Análise memoizada")
+    print("✓ Teste de análise de SQL passou!")
+
+
+def test_query_cache():
+    """Testa cache de resultados com invalidação por tabela"""
+    print("\n=== Testando Cache de Resultados ===")
+    
+    def result(rows):
+        return ResultSet(['id', 'name'], ['int', 'str'], [(i, 'x' * 100) for i in range(rows)])
+    
+    cache = QueryCache(max_bytes=64 * 1024, ttl=60)
+    key = cache.make_key("SELECT  *\n FROM users WHERE id = %s;", [1])
+    assert cache.get(key) is None
+    assert cache.put(key, result(1), cache.snapshot({'users'}))
+    assert cache.get(cache.make_key("SELECT * FROM users WHERE id = %s", [1])) is not None
+    assert cache.get(cache.make_key("SELECT * FROM users WHERE id = %s", [2])) is None
+    print("✓ Chave por SQL normalizado + parâmetros")
+    
+    orders_key = cache.make_key("SELECT * FROM orders")
+    cache.put(orders_key, result(1), cache.snapshot({'orders'}))
+    assert cache.invalidate_tables({'users'}) == 1
+    assert cache.get(key) is None and cache.get(orders_key) is not None
+    print("✓ Escrita em users invalida só os resultados de users")
+    
+    # Resultado lido antes de uma escrita concorrente não é guardado
+    snapshot = cache.snapshot({'users'})
+    cache.invalidate_tables({'users'})
+    assert not cache.put(key, result(1), snapshot)
+    print("✓ Resultado obsoleto (escrita durante a leitura) descartado")
+    
+    for i in range(20):
+        cache.put(cache.make_key("SELECT * FROM users WHERE id = %s", [i]), result(30), cache.snapshot({'users'}))
+    stats = cache.get_stats()
+    assert stats['bytes'] <= stats['max_bytes'] and stats['evictions'] > 0, stats
+    print(f"✓ Limite de bytes: {stats['entries']} entradas, {stats['evictions']} evicções")
+    
+    cache.ttl = 0
+    cache.put(key, result(1), cache.snapshot({'users'}))
+    assert cache.get(key) is None and cache.get_stats()['expirations'] == 1
+    print(f"✓ TTL e métricas: hit rate {cache.get_stats()['hit_rate']:.0%}")
+    print("✓ Teste de cache de resultados passou!")
+
+
+def test_sqlite_backend():
+    """Testa o banco SQLite embutido pela interface do MySQLManager"""
+    print("\n=== Testando Backend SQLite ===")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SQLiteManager(
+            os.path.join(tmp, 'node.db'), init_script='init_sqlite.sql',
+            pool_min_size=1, pool_max_size=4, query_cache_mb=1
+        )
+        assert db.connect() and db.test_connection()
+        with db.get_cursor(dictionary=True) as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            assert cursor.fetchone()['journal_mode'] == 'wal'
+        print("✓ Esquema criado pelo init_script, journal em WAL")
+        
+        success, _, error, rows = db.execute_query(
+            "INSERT INTO users (name, email) VALUES (%s, %s)", ['Ana', 'ana@ddb.com'])
+        assert success and rows == 1, error
+        success, error, rows = db.execute_many(
+            "INSERT INTO users (name, email) VALUES (%s, %s)",
+            [(f'User {i}', f'user{i}@ddb.com') for i in range(10)], batch_size=4)
+        assert success and rows == 10, error
+        print("✓ Placeholders %s traduzidos; escrita em lote em uma transação")
+        
+        query = "SELECT id, name FROM users WHERE email = %s"
+        success, result, _, _ = db.execute_query(query, ['ana@ddb.com'])
+        assert success and result[0]['name'] == 'Ana' and result.types[0] == 'int'
+        db.execute_query(query, ['ana@ddb.com'])
+        assert db.get_query_cache_stats()['hits'] == 1
+        
+        assert db.begin_transaction('t1')
+        db.execute_query("UPDATE users SET name = 'Ana B' WHERE email = 'ana@ddb.com'", transaction_id='t1')
+        assert db.execute_query(query, ['ana@ddb.com'])[1][0]['name'] == 'Ana'  # Ainda não commitado
+        assert db.commit('t1')
+        assert db.execute_query(query, ['ana@ddb.com'])[1][0]['name'] == 'Ana B'
+        print("✓ Transação isolada até o commit, que invalida o cache")
+        
+        success, _, error, _ = db.execute_query("INSERT INTO users (name, email) VALUES (%s, %s)",
+                                                ['Dup', 'ana@ddb.com'])
+        assert not success and 'UNIQUE' in error
+        chunks = list(db.stream_query("SELECT * FROM users ORDER BY id", fetch_size=5))
+        assert [len(chunk) for chunk in chunks] == [5, 5, 1]
+        print("✓ Erros do SQLite reportados; streaming em lotes")
+        db.disconnect()
+    print("✓ Teste de backend SQLite passou!")
+
+
+def test_replication_log():
+    """Testa o log de replicação em segmentos e o catch-up do seguidor"""
+    print("\n=== Testando Log de Replicação ===")
+    
+    def replicate(i):
+        return Message(message_type=MessageType.REPLICATE, sender_id=1, transaction_id=f'tx-{i}',
+                       query="INSERT INTO users (name, email) VALUES (%s, %s)",
+                       params=[f'User {i}', f'user{i}@ddb.com'], timestamp=datetime.now())
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        log_dir = os.path.join(tmp, 'log')
+        log = ReplicationLog(log_dir, segment_bytes=1024, index_entries=8)
+        lsns = [log.append(replicate(i)) for i in range(1, 31)]
+        assert lsns == list(range(1, 31)) and log.get_stats()['segments'] > 3
+        entries = log.read(6, max_entries=10)
+        assert [ReplicationLog.decode(e).data['lsn'] for e in entries] == list(range(6, 16))
+        assert ReplicationLog.decode(entries[0]).params == ['User 6', 'user6@ddb.com']
+        print(f"✓ 30 LSNs em {log.get_stats()['segments']} segmentos; leitura atravessa segmentos pelo índice")
+        
+        log.close()
+        last_segment = sorted(os.listdir(log_dir))[-2]  # .log antes do .idx
+        with open(os.path.join(log_dir, last_segment), 'ab') as f:
+            f.write(b'\x00\x01registro cortado')
+        log = ReplicationLog(log_dir, segment_bytes=1024, index_entries=8, max_segments=2)
+        assert log.last_lsn == 30 and log.append(replicate(31)) == 31
+        for i in range(32, 50):
+            log.append(replicate(i))
+        try:
+            log.read(1)
+            assert False, "LSN removido pela retenção deveria falhar"
+        except LogTruncatedError:
+            pass
+        
+        errors = []
+        
+        def reader():
+            for _ in range(300):
+                try:
+                    log.read(log.first_lsn, max_entries=20)
+                except LogTruncatedError:
+                    pass
+                except Exception as e:
+                    errors.append(e)
+        
+        thread = threading.Thread(target=reader)
+        thread.start()
+        for i in range(50, 350):
+            log.append(replicate(i))
+        thread.join()
+        assert not errors, errors
+        log.close()
+        print("✓ Final incompleto descartado ao reabrir; retenção remove segmentos antigos sem cortar leituras")
+        
+        origin_db = SQLiteManager(os.path.join(tmp, 'origin.db'), init_script='init_sqlite.sql', pool_max_size=2)
+        follower_db = SQLiteManager(os.path.join(tmp, 'follower.db'), init_script='init_sqlite.sql', pool_max_size=2)
+        assert origin_db.connect() and follower_db.connect()
+        origin = Replicator(1, origin_db, lambda msg, nodes: 0,
+                            replication_log=ReplicationLog(os.path.join(tmp, 'origin')), pull_batch_size=4)
+        
+        def request(message, node):
+            future = Future()
+            future.set_result(origin.serve_pull(message))
+            return future
+        
+        follower = Replicator(2, follower_db, lambda msg, nodes: 0, applied_state=AppliedState(os.path.join(tmp, 'f')),
+                              request_callback=request)
+        messages = [origin.record(replicate(i)) for i in range(1, 11)]
+        assert [m.data['lsn'] for m in messages] == list(range(1, 11))
+        
+        assert follower.receive(messages[2]) == [] and follower.held_count(1) == 1
+        assert len(follower.receive(messages[0])) == 1
+        assert [m.data['lsn'] for m, ok in follower.receive(messages[1])] == [2, 3]
+        assert follower.receive(messages[1])[0][1]  # Repetido: ignorado
+        print("✓ Seguidor aplica na ordem dos LSNs, guarda adiantados e ignora repetidos")
+        
+        assert not follower.needs_catch_up(1, 3)
+        assert not follower.needs_catch_up(1, 10)  # Pode estar em trânsito
+        assert follower.needs_catch_up(1, 10)  # Continua faltando no heartbeat seguinte
+        assert follower.catch_up(NodeInfo(1, 'localhost', 0)) == 7
+        follower.applied_state.flush()
+        assert AppliedState(os.path.join(tmp, 'f')).get(1) == 10
+        count = follower_db.execute_query("SELECT COUNT(*) AS n FROM users")[1][0]['n']
+        assert count == 10, count
+        print("✓ Catch-up em lotes pelo REPLICATION_PULL; LSN aplicado persistido")
+        origin_db.disconnect()
+        follower_db.disconnect()
+    print("✓ Teste de log de replicação passou!")
+
+
+def test_replication_batching():
+    """Testa o envio de escritas replicadas em lotes e a aplicação em uma transação"""
+    print("\n=== Testando Replicação em Lotes ===")
+    
+    batches = []
+    batcher = ReplicationBatcher(batches.append, window_ms=50, max_batch=4)
+    for i in range(10):
+        batcher.add(Message(message_type=MessageType.REPLICATE, sender_id=1, transaction_id=f'tx-{i}'))
+    batcher.close()
+    assert [len(batch) for batch in batches] == [4, 4, 2], batches
+    assert [m.transaction_id for batch in batches for m in batch] == [f'tx-{i}' for i in range(10)]
+    print(f"✓ Lotes por tamanho e janela, em ordem: {batcher.get_stats()['batches']} envios para 10 escritas")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        shipped, acks = [], []
+        origin = Replicator(1, None, lambda msg, nodes: 0,
+                            fanout_callback=lambda msg, nodes: shipped.append(msg) or {2: DeliveryStatus.DELIVERED},
+                            replication_log=ReplicationLog(os.path.join(tmp, 'origin')))
+        db = SQLiteManager(os.path.join(tmp, 'follower.db'), init_script='init_sqlite.sql', pool_max_size=2)
+        assert db.connect()
+        follower = Replicator(2, db, lambda msg, nodes: acks.append(msg) or 1,
+                              applied_state=AppliedState(os.path.join(tmp, 'f')))
+        
+        emails = ['a@ddb.com', 'b@ddb.com', 'a@ddb.com', 'c@ddb.com']  # Terceiro: chave duplicada
+        for round_emails in (emails[:2], emails[2:]):
+            messages = [origin.record(origin.query_message(
+                "INSERT INTO users (name, email) VALUES (%s, %s)", f'tx-{email}-{len(shipped)}', ['X', email]))
+                for email in round_emails]
+            assert origin.ship_batch(messages, [])
+            wire = MessageCodec.decode(parse_frame(MessageCodec.encode(shipped[-1], True, ENCODING_BINARY)))
+            assert wire.message_type == MessageType.REPLICATE_BATCH
+            results = follower.receive_batch([Replicator.decode_entry(e) for e in wire.data['entries']])
+            follower.send_replication_acks(results, [])
+        
+        assert [ok for ok in acks[0].data['results'].values()] == [True, True]
+        assert [ok for ok in acks[1].data['results'].values()] == [False, True]
+        assert db.execute_query("SELECT COUNT(*) AS n FROM users")[1][0]['n'] == 3
+        assert follower.applied_state.get(1) == 4
+        print("✓ Lote aplicado em uma transação; com erro, aplicado uma a uma")
+        
+        assert origin.get_pending_replications_count() == 4
+        assert origin.handle_replication_ack(acks[0]) and origin.handle_replication_ack(acks[1])
+        assert origin.get_pending_replications_count() == 0
+        print("✓ Um REPLICATE_ACK confirma todas as escritas do lote")
+        
+        # ACK que chega antes de o fanout retornar
+        def fanout_acked(msg, nodes):
+            origin.handle_replication_ack(Message(message_type=MessageType.REPLICATE_ACK, sender_id=2,
+                                                  transaction_id=msg.transaction_id, data={'success': True}))
+            return {2: DeliveryStatus.DELIVERED}
+        origin.fanout = fanout_acked
+        origin.ship(origin.record(origin.query_message("DELETE FROM users", 'tx-early')), [])
+        assert origin.get_pending_replications_count() == 0
+        origin.fanout = lambda msg, nodes: {2: DeliveryStatus.DELIVERED}
+        origin.ship(origin.record(origin.query_message("DELETE FROM users", 'tx-lost')), [])
+        origin.cleanup_old_replications(timeout_seconds=0)
+        assert origin.get_pending_replications_count() == 0
+        print("✓ ACK antecipado confirma a escrita; as sem ACK expiram")
+        db.disconnect()
+    print("✓ Teste de replicação em lotes passou!")
+
+
+def test_parallel_apply():
+    """Testa a aplicação paralela de escritas replicadas com ordem por tabela"""
+    print("\n=== Testando Aplicação Paralela da Replicação ===")
+    
+    scheduler = ApplyScheduler(BoundedExecutor(max_workers=4, name='apply'))
+    events = []
+    lock = threading.Lock()
+    
+    def task(name, delay):
+        def run():
+            with lock:
+                events.append(('start', name))
+            time.sleep(delay)
+            with lock:
+                events.append(('end', name))
+            return name
+        return run
+    
+    start = time.perf_counter()
+    futures = [
+        scheduler.submit(task('a1', 0.1), frozenset({'a'})),
+        scheduler.submit(task('b1', 0.1), frozenset({'b'})),
+        scheduler.submit(task('a2', 0.01), frozenset({'a'})),
+        scheduler.submit(task('ab', 0.01), frozenset({'a', 'b'})),
+        scheduler.submit(task('ddl', 0.01), None),
+        scheduler.submit(task('c1', 0.01), frozenset({'c'})),
+    ]
+    assert [f.result(5) for f in futures] == ['a1', 'b1', 'a2', 'ab', 'ddl', 'c1']
+    elapsed = time.perf_counter() - start
+    
+    position = {event: index for index, event in enumerate(events)}
+    assert position[('start', 'b1')] < position[('end', 'a1')]  # Tabelas diferentes: em paralelo
+    assert position[('end', 'a1')] < position[('start', 'a2')] < position[('end', 'a2')] < position[('start', 'ab')]
+    assert position[('end', 'b1')] < position[('start', 'ab')]
+    assert position[('end', 'ab')] < position[('start', 'ddl')] < position[('end', 'ddl')] < position[('start', 'c1')]
+    assert elapsed < 0.25, elapsed
+    scheduler.shutdown()
+    print(f"✓ Mesma tabela em ordem, tabelas diferentes em paralelo, DDL como barreira ({elapsed * 1000:.0f}ms)")
+    
+    locks = TableLocks()
+    order = []
+    
+    def write(name, tables, delay):
+        with locks.hold(tables):
+            with lock:
+                order.append(('start', name))
+            time.sleep(delay)
+            with lock:
+                order.append(('end', name))
+    
+    threads = [threading.Thread(target=write, args=args) for args in
+               [('a1', ['a'], 0.05), ('b1', ['b'], 0.05), ('a2', ['a', 'c'], 0.01), ('ddl', None, 0.01)]]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+    position = {event: index for index, event in enumerate(order)}
+    assert position[('start', 'b1')] < position[('end', 'a1')] < position[('start', 'a2')]
+    assert position[('end', 'ddl')] == position[('start', 'ddl')] + 1  # Nenhuma escrita no meio
+    print("✓ Commit e LSN seguram a tabela: mesma tabela em sequência, outras em paralelo, DDL sozinha")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        origin = Replicator(1, None, None, replication_log=ReplicationLog(os.path.join(tmp, 'origin')))
+        db = SQLiteManager(os.path.join(tmp, 'follower.db'), init_script='init_sqlite.sql', pool_max_size=4)
+        assert db.connect()
+        follower = Replicator(2, db, None, applied_state=AppliedState(os.path.join(tmp, 'f')),
+                              apply_scheduler=ApplyScheduler(BoundedExecutor(max_workers=4, name='apply')))
+        
+        queries = [("CREATE TABLE orders (id INTEGER PRIMARY KEY, user_email TEXT, total REAL)", None)]
+        for i in range(20):
+            queries.append(("INSERT INTO users (name, email) VALUES (%s, %s)", [f'User {i}', f'u{i}@ddb.com']))
+            queries.append(("INSERT INTO orders (user_email, total) VALUES (%s, %s)", [f'u{i}@ddb.com', i * 1.5]))
+        queries.append(("UPDATE orders SET total = total * 2 WHERE user_email = %s", ['u1@ddb.com']))
+        messages = [origin.record(origin.query_message(query, f'tx-{i}', params))
+                    for i, (query, params) in enumerate(queries)]
+        
+        results = follower.submit_batch(messages[:30]).result(10) + follower.submit_batch(messages[30:]).result(10)
+        assert len(results) == len(messages) and all(ok for _, ok in results)
+        assert follower.applied_state.get(1) == len(messages)
+        assert db.execute_query("SELECT COUNT(*) AS n FROM users")[1][0]['n'] == 20
+        assert db.execute_query("SELECT total FROM orders WHERE user_email = 'u1@ddb.com'")[1][0]['total'] == 3.0
+        assert db.execute_query("SELECT total FROM orders WHERE user_email = 'u3@ddb.com'")[1][0]['total'] == 4.5
+        
+        stats = follower.get_apply_stats()
+        assert stats['applied'] == len(messages) and stats['lag']['1']['lsns'] == 0
+        print(f"✓ Seguidor aplica em paralelo e avança o LSN só até o último contíguo "
+              f"({stats['applied']} escritas, atraso 0)")
+        follower.apply_scheduler.shutdown()
+        
+        late = origin.record(origin.query_message("DELETE FROM orders", 'tx-late'))
+        assert [ok for _, ok in follower.submit_batch([late]).result(5)] == [False]
+        print("✓ Grupo que não pôde ser agendado conta como falha, sem travar o lote")
+        db.disconnect()
+    print("✓ Teste de aplicação paralela passou!")
+
+
+def test_consistency_levels():
+    """Testa a espera pelos ACKs das réplicas em cada nível de consistência"""
+    print("\n=== Testando Níveis de Consistência ===")
+    
+    sizes = {level: [level.required_acks(n) for n in (1, 3, 5)] for level in ConsistencyLevel}
+    assert sizes[ConsistencyLevel.ASYNC] == [0, 0, 0]
+    assert sizes[ConsistencyLevel.ONE] == [0, 1, 1]
+    assert sizes[ConsistencyLevel.QUORUM] == [0, 1, 2]
+    assert sizes[ConsistencyLevel.ALL] == [0, 2, 4]
+    print("✓ W por nível: one=1, quorum=maioria contando o nó, all=todas as réplicas")
+    
+    tracker = AckTracker()
+    assert tracker.expect('tx-async', 0, 1.0).result(0) == 0
+    
+    quorum = tracker.expect('tx-quorum', 2, 5.0, 'quorum')
+    assert tracker.expect('tx-quorum', 1, 5.0, 'quorum') is quorum  # Repetida: junta-se à espera
+    tracker.delivered('tx-quorum', 4)
+    tracker.ack('tx-quorum', True)
+    assert not quorum.done()
+    tracker.ack('tx-quorum', True)
+    assert quorum.result(0) == 2
+    tracker.ack('tx-quorum', True)  # ACK atrasado de uma escrita já confirmada
+    print("✓ Escrita concluída pelo ACK que completa W")
+    
+    unreachable = tracker.expect('tx-all', 4, 5.0, 'all')
+    tracker.ack('tx-all', True)
+    tracker.delivered('tx-all', 3)  # Uma réplica fora do ar
+    assert unreachable.result(0) == 1
+    print("✓ Sem réplicas alcançáveis suficientes, a espera termina no envio")
+    
+    start = time.time()
+    expired = tracker.expect('tx-slow', 1, 0.2, 'one')
+    assert expired.result(2) == 0 and 0.15 < time.time() - start < 1.5
+    stats = tracker.get_stats()
+    assert stats['waiting'] == 0
+    assert stats['levels']['quorum']['confirmed'] == 1 and stats['levels']['one']['timeouts'] == 1
+    assert stats['levels']['all']['unreachable'] == 1
+    print(f"✓ Prazo expira sem polling ({stats['levels']['one']['avg_wait_ms']:.0f}ms)")
+    tracker.close()
+    
+    # Os REPLICATE_ACKs recebidos pelo replicador alimentam a espera
+    nodes = [NodeInfo(node_id=i, host='localhost', port=0) for i in (1, 2, 3)]
+    replicator = Replicator(1, None, None, fanout_callback=lambda message, all_nodes: {
+        2: DeliveryStatus.DELIVERED, 3: DeliveryStatus.DELIVERED
+    })
+    message = replicator.query_message("DELETE FROM users WHERE id = %s", 'tx-1', [1])
+    acks = replicator.ack_tracker.expect('tx-1', ConsistencyLevel.QUORUM.required_acks(3), 5.0, 'quorum')
+    replicator.ship(message, nodes)
+    replicator.handle_replication_ack(Message(
+        message_type=MessageType.REPLICATE_ACK, sender_id=3, data={'results': {'tx-1': True}}
+    ))
+    assert acks.result(1) == 1
+    replicator.ack_tracker.close()
+    print("✓ ACK em lote de uma réplica confirma a escrita com quorum de 3 nós")
+    print("✓ Teste de níveis de consistência passou!")
+
+
+def test_row_replication():
+    """Testa a replicação por imagens de linhas e a verificação de determinismo"""
+    print("\n=== Testando Replicação por Linha ===")
+    
+    target = row_target("UPDATE users SET name = %s WHERE email LIKE %s AND id > %s")
+    assert target.table == 'users' and target.where == 'email LIKE %s AND id > %s'
+    assert target.where_params == 1 and target.columns == frozenset({'name'})
+    assert row_target("DELETE FROM users").where == ''
+    assert row_target("INSERT INTO users (name) VALUES ('a')").kind == 'INSERT'
+    for query in ("UPDATE users u SET name = 'a'", "DELETE FROM users ORDER BY id LIMIT 1",
+                  "INSERT INTO users (name) VALUES ('a'), ('b')", "INSERT INTO users (name) SELECT name FROM x"):
+        assert row_target(query) is None, query
+    print("✓ Linhas alteradas identificáveis só em escritas de uma tabela sem LIMIT/JOIN")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        dbs = []
+        for name in ('origin', 'follower'):
+            db = SQLiteManager(os.path.join(tmp, f'{name}.db'), init_script='init_sqlite.sql', pool_max_size=2)
+            assert db.connect()
+            dbs.append(db)
+        origin_db, follower_db = dbs
+        assert origin_db.primary_key('users') == ('id',)
+        
+        origin = Replicator(1, origin_db, None, replication_log=ReplicationLog(os.path.join(tmp, 'log')),
+                            row_images=True)
+        follower = Replicator(2, follower_db, None, applied_state=AppliedState(os.path.join(tmp, 'state')))
+        writes = [
+            ("INSERT INTO users (name, email) VALUES (%s, %s)", ['Ana', 'ana@ddb.com']),
+            ("INSERT INTO users (name, email) VALUES ('Bia', 'bia@ddb.com')", None),
+            ("UPDATE users SET name = name || abs(random() % 1000) WHERE email LIKE %s", ['%@ddb.com']),
+            ("DELETE FROM users WHERE email = %s", ['ana@ddb.com']),
+        ]
+        messages = []
+        for i, (query, params) in enumerate(writes):
+            success, _, _, _, message = origin.execute_write(query, f'tx-{i}', params)
+            assert success and message.data['row_image']['table'] == 'users'
+            messages.append(origin.record(message))
+        assert len(messages[2].data['row_image']['upserts']) == 2 and messages[3].data['row_image']['deletes']
+        
+        assert all(ok for _, ok in follower.receive_batch(messages[:1]) + follower.receive_batch(messages[1:]))
+        rows = [db.execute_query("SELECT id, name, email FROM users ORDER BY id")[1].rows for db in dbs]
+        assert rows[0] == rows[1] and len(rows[0]) == 1
+        print(f"✓ UPDATE com random() aplicado pelas imagens: réplica idêntica ({rows[1][0][1]})")
+        
+        origin_db.execute_query("CREATE TABLE notes (body TEXT)")
+        _, _, _, _, message = origin.execute_write("INSERT INTO notes (body) VALUES ('sem chave')", 'tx-n')
+        assert message.data.get('row_image') is None
+        
+        # Modo statement: o seguidor compara as linhas afetadas com as da origem
+        origin.row_images = False
+        origin_db.execute_query("INSERT INTO users (name, email) VALUES ('Só na origem', 'x@ddb.com')")
+        _, _, _, affected, message = origin.execute_write("DELETE FROM users WHERE email LIKE %s", 'tx-x', ['%@ddb.com'])
+        assert affected == 2 and message.data['rows_affected'] == 2
+        assert follower.receive(origin.record(message))[0][1]
+        assert follower.get_determinism_stats()['divergences'] == 1
+        
+        origin.execute_write("UPDATE users SET name = CURRENT_TIMESTAMP WHERE id = 0", 'tx-y')
+        stats = origin.get_determinism_stats()
+        assert stats['row_images'] == 4 and stats['sql_fallbacks'] == 1 and stats['nondeterministic'] == 1
+        print("✓ Divergência detectada pelas linhas afetadas; escritas sem imagem e não determinísticas contadas")
+        for db in dbs:
+            db.disconnect()
+    print("✓ Teste de replicação por linha passou!")
+
+
+def test_snapshot_transfer():
+    """Testa a cópia de um nó por snapshot em trechos"""
+    print("\n=== Testando Snapshot ===")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        donor_db = SQLiteManager(os.path.join(tmp, 'donor.db'), init_script='init_sqlite.sql', pool_max_size=4)
+        target_db = SQLiteManager(os.path.join(tmp, 'target.db'), init_script='init_sqlite.sql', pool_max_size=4)
+        assert donor_db.connect() and target_db.connect()
+        donor_db.execute_many("INSERT INTO users (name, email) VALUES (%s, %s)",
+                              [(f'User {i}', f'u{i}@ddb.com') for i in range(1234)])
+        donor_db.execute_query("CREATE TABLE events (kind TEXT, payload BLOB)")  # Sem chave, só no doador
+        donor_db.execute_many("INSERT INTO events VALUES (%s, %s)", [('a', b'\x00\x01'), ('b', None), ('a', b'\xff')])
+        target_db.execute_query("INSERT INTO users (name, email) VALUES ('Antigo', 'old@ddb.com')")
+        
+        donor = SnapshotDonor(1, donor_db, lambda: {'1': 42, '3': 7}, parallel=2)
+        corrupted = []
+        
+        def request(message, node):
+            response = donor.handle(message)
+            if isinstance(response, Future):
+                response = response.result(10)
+            if message.data['op'] == 'chunk' and not corrupted:
+                corrupted.append(message.data['table'])
+                response.data = dict(response.data, crc=response.data['crc'] ^ 1)  # Trecho corrompido
+            future = Future()
+            future.set_result(response)
+            return future
+        
+        loader = SnapshotLoader(2, target_db, request, parallel=2, chunk_rows=500)
+        positions = loader.load(NodeInfo(1, 'localhost', 0))
+        assert positions == {1: 42, 3: 7}
+        
+        for query in ("SELECT * FROM users ORDER BY id", "SELECT * FROM events ORDER BY kind, payload"):
+            rows = [db.execute_query(query)[1].rows for db in (donor_db, target_db)]
+            assert rows[0] == rows[1], query
+        assert loader.stats['rows'] == 1237 and donor.get_stats()['open'] == 0
+        print(f"✓ {loader.stats['rows']} linhas copiadas em trechos; tabela sem chave criada pelo CREATE TABLE do doador")
+        print(f"✓ Trecho de {corrupted[0]} com CRC errado pedido de novo; posição de replicação {positions}")
+        
+        # As escritas feitas depois do snapshot não entram nele
+        snapshot = donor.begin({'parallel': 1})
+        donor_db.execute_query("DELETE FROM users")
+        chunk = donor.chunk({'session': snapshot['session'], 'table': 'users', 'limit': 10000})
+        assert chunk['rows'] == 1234 and chunk['done']
+        donor.end(snapshot['session'])
+        print("✓ Leituras do snapshot isoladas das escritas posteriores")
+        
+        # Escrita com commit feito e LSN ainda não gravado: o snapshot espera o LSN
+        origin = Replicator(1, donor_db, None, replication_log=ReplicationLog(os.path.join(tmp, 'log')))
+        quiesced = SnapshotDonor(1, donor_db, origin.positions, parallel=1, quiesce_callback=origin.quiesce)
+        committed = threading.Event()
+        
+        def write():
+            query = "INSERT INTO users (name, email) VALUES (%s, %s)"
+            with origin.ordered(query):
+                message = origin.execute_write(query, 'tx-s', ['Nova', 'nova@ddb.com'])[4]
+                committed.set()
+                time.sleep(0.1)
+                origin.record(message)
+        
+        thread = threading.Thread(target=write)
+        thread.start()
+        assert committed.wait(5)
+        snapshot = quiesced.begin({'parallel': 1})
+        thread.join()
+        chunk = quiesced.chunk({'session': snapshot['session'], 'table': 'users', 'limit': 10000})
+        assert snapshot['positions']['1'] == 1 and chunk['rows'] == 1
+        quiesced.close()
+        print("✓ Dados e posição do snapshot do mesmo instante (escrita entre commit e LSN esperada)")
+        
+        donor.close()
+        for db in (donor_db, target_db):
+            db.disconnect()
+    print("✓ Teste de snapshot passou!")
+
+
+def test_anti_entropy():
+    """Testa a detecção e correção de divergências com árvores de Merkle"""
+    print("\n=== Testando Anti-entropia ===")
+    
+    tree = MerkleTree('t', ['id'], leaves=8)
+    empty = tree.digest(1)
+    tree.put('ab12', [1], 5)
+    tree.put('cd34', [2], 9)
+    assert tree.digest(1) != empty and tree.rows == 2
+    tree.remove('ab12')
+    tree.remove('cd34')
+    assert tree.digest(1) == empty and tree.rows == 0
+    print("✓ Raiz atualizada incrementalmente (inserir e remover volta ao digest original)")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        dbs = []
+        for name in ('coordinator', 'replica'):
+            db = SQLiteManager(os.path.join(tmp, f'{name}.db'), init_script='init_sqlite.sql', pool_max_size=2)
+            assert db.connect()
+            db.execute_many("INSERT INTO users (id, name, email, created_at) VALUES (%s, %s, %s, '2024-01-01')",
+                            [(i, f'User {i}', f'u{i}@ddb.com') for i in range(1, 3001)])
+            dbs.append(db)
+        coordinator_db, replica_db = dbs
+        positions = {'coordinator': {'1': 10, '2': 3}, 'replica': {'1': 10, '2': 3}}
+        
+        def request_to(target):
+            def request(message, node):
+                response = target.handle(message)
+                if not isinstance(response, Future):
+                    future = Future()
+                    future.set_result(response)
+                    response = future
+                return response
+            return request
+        
+        coordinator = AntiEntropy(1, coordinator_db, None, lambda: positions['coordinator'], leaves=256)
+        replica = AntiEntropy(2, replica_db, request_to(coordinator), lambda: positions['replica'], leaves=256)
+        coordinator.refresh()
+        assert replica.compare_with(NodeInfo(1, 'localhost', 0))['ranges'] == 0
+        
+        # Divergências: linha alterada, linha que falta e linha a mais na réplica
+        replica_db.execute_query("UPDATE users SET name = 'Divergente' WHERE id = 42")
+        replica_db.execute_query("DELETE FROM users WHERE id = 1500")
+        replica_db.execute_query("INSERT INTO users (id, name, email) VALUES (9999, 'Extra', 'x@ddb.com')")
+        replica.query_written("UPDATE users SET name = 'Divergente' WHERE id = 42")
+        
+        positions['replica'] = {'1': 9, '2': 3}  # Escrita do nó 1 ainda em trânsito
+        assert replica.compare_with(NodeInfo(1, 'localhost', 0))['skipped']
+        positions['replica'] = {'1': 10, '2': 3}
+        
+        messages = replica.get_stats()['messages']
+        summary = replica.compare_with(NodeInfo(1, 'localhost', 0))
+        assert summary['ranges'] == 3 and summary['repaired'] == 2 and summary['deleted'] == 1, summary
+        query = "SELECT * FROM users ORDER BY id"
+        assert coordinator_db.execute_query(query)[1].rows == replica_db.execute_query(query)[1].rows
+        print(f"✓ 3 faixas divergentes corrigidas com {replica.get_stats()['messages'] - messages} mensagens "
+              f"(3000 linhas, {summary['repaired']} copiadas, {summary['deleted']} apagada)")
+        
+        # Escrita com imagem de linhas: só a chave alterada é relida
+        coordinator_db.execute_query("UPDATE users SET name = 'Nova' WHERE id = 7")
+        coordinator.image_written({'table': 'users', 'key': ['id'], 'columns': ['id'], 'upserts': [[7]]})
+        coordinator.refresh()
+        rebuilt = AntiEntropy(3, coordinator_db, None, lambda: {}, leaves=256)
+        rebuilt.refresh()
+        assert coordinator.trees['users'].digest(1) == rebuilt.trees['users'].digest(1)
+        print("✓ Árvore atualizada pela imagem de linhas igual à reconstruída do zero")
+        
+        for component in (coordinator, replica, rebuilt):
+            component.close()
+        for db in dbs:
+            db.disconnect()
+    print("✓ Teste de anti-entropia passou!")
+
+
+def test_replication_dedup():
+    """Testa a aplicação idempotente de REPLICATEs repetidos"""
+    print("\n=== Testando Deduplicação da Replicação ===")
+    
+    window = DedupWindow(capacity=3)
+    for key in [(1, 1), (1, 2), (1, 'tx-a'), (1, 2), (1, 3)]:
+        window.add(key)
+    assert (1, 1) not in window and (1, 2) in window and len(window) == 3
+    assert window.keys() == [(1, 2), (1, 'tx-a'), (1, 3)]
+    print("✓ Janela limitada: a chave mais antiga sai quando o anel dá a volta")
+    
+    def increment(sender_id, transaction_id, lsn=None):
+        return Message(message_type=MessageType.REPLICATE, sender_id=sender_id, transaction_id=transaction_id,
+                       query="UPDATE counters SET value = value + 1 WHERE id = 1", timestamp=datetime.now(),
+                       data={'lsn': lsn} if lsn else None)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SQLiteManager(os.path.join(tmp, 'follower.db'), pool_max_size=2)
+        assert db.connect()
+        db.execute_query("CREATE TABLE counters (id INTEGER PRIMARY KEY, value INTEGER)")
+        db.execute_query("INSERT INTO counters (id, value) VALUES (1, 0)")
+        
+        def value():
+            return db.execute_query("SELECT value FROM counters WHERE id = 1")[1][0]['value']
+        
+        state_dir = os.path.join(tmp, 'state')
+        follower = Replicator(2, db, None, applied_state=AppliedState(state_dir))
+        once = increment(3, 'tx-sem-lsn')
+        assert len(follower.receive_batch([once, once])) == 2 and follower.receive(once)[0][1]
+        assert value() == 1
+        print("✓ Sem LSN: a mesma transação repetida (no lote e depois) é aplicada uma vez")
+        
+        # LSN 2 aplicado antes do 1 (em paralelo) e o nó caiu antes do 1
+        follower.applied_state.close()
+        crashed = AppliedState(state_dir)
+        crashed.set(1, 0, [(1, 2)])
+        crashed.close()
+        db.execute_query("UPDATE counters SET value = value + 1 WHERE id = 1")
+        follower = Replicator(2, db, None, applied_state=AppliedState(state_dir))
+        results = follower.receive_batch([increment(1, None, 1), increment(1, None, 2), increment(1, None, 2)])
+        assert len(results) == 3 and all(ok for _, ok in results)
+        assert value() == 3 and follower.applied_state.get(1) == 2
+        assert follower.get_apply_stats()['duplicates'] == 2
+        follower.applied_state.close()
+        with open(follower.applied_state.path) as f:
+            saved = json.load(f)
+        assert saved['applied'] == {'1': 2} and saved['recent'] == [[3, 'tx-sem-lsn']]
+        assert (3, 'tx-sem-lsn') in AppliedState(state_dir).recent
+        print("✓ Depois de reiniciar, o LSN aplicado fora de ordem não é executado de novo")
+        
+        with open(follower.applied_state.path, 'w') as f:
+            json.dump({'1': 5}, f)
+        assert AppliedState(state_dir).get(1) == 5
+        print("✓ Estado aplicado no formato antigo continua legível")
+        
+        lazy = AppliedState(os.path.join(tmp, 'lazy'), flush_interval=0.05)
+        for lsn in range(1, 101):
+            lazy.set(7, lsn)
+        assert not os.path.exists(lazy.path)  # Nada gravado no caminho da aplicação
+        time.sleep(0.3)
+        assert AppliedState(os.path.join(tmp, 'lazy')).get(7) == 100
+        lazy.close()
+        print("✓ Estado gravado em segundo plano, uma vez por intervalo")
+        
+        delivered = []
+        outcomes = [{2: DeliveryStatus.TIMED_OUT}, {2: DeliveryStatus.DELIVERED}]
+        
+        def fanout(message, nodes):
+            delivered.append(message)
+            return outcomes.pop(0)
+        
+        origin = Replicator(4, None, None, fanout_callback=fanout, delivery_retries=1)
+        assert origin.ship(origin.query_message(increment(4, None).query, 'tx-reenviada'), [NodeInfo(2, 'localhost', 0)])
+        assert len(follower.receive_batch(delivered)) == 2 and value() == 4
+        print("✓ Origem reenvia a quem não respondeu no prazo; o seguidor aplica uma vez")
+        db.disconnect()
+    print("✓ Teste de deduplicação da replicação passou!")
+
+
 def test_config_loading():
     """Testa carregamento de configuração"""
     print("\n=== Testando Carregamento de Configuração ===")
@@ -142,6 +1554,32 @@ def run_all_tests():
         test_message_serialization,
         test_message_with_checksum,
         test_node_info,
+        test_connection_pool_reuse,
+        test_connection_pool_backoff,
+        test_parallel_fanout,
+        test_async_socket_server,
+        test_frame_reader,
+        test_message_codec,
+        test_binary_encoding,
+        test_result_set,
+        test_streaming_result,
+        test_rpc_multiplexing,
+        test_bulk_write,
+        test_db_executor,
+        test_control_lane,
+        test_database_pool,
+        test_statement_cache,
+        test_sql_analysis,
+        test_query_cache,
+        test_sqlite_backend,
+        test_replication_log,
+        test_replication_batching,
+        test_parallel_apply,
+        test_consistency_levels,
+        test_row_replication,
+        test_snapshot_transfer,
+        test_anti_entropy,
+        test_replication_dedup,
         test_config_loading
     ]
     